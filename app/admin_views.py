@@ -1,9 +1,9 @@
-from datetime import date
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.db.models import Count, Sum, Q
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.http import HttpResponse, JsonResponse
 from django.views.decorators.http import require_POST
 from django.core.mail import EmailMultiAlternatives
@@ -18,7 +18,8 @@ from companies.models import Company, Staff, Service, EmailLog
 from bookings.models import Booking, Customer
 from billing.models import Plan, Subscription, Transaction
 from users.models import UserProfile
-from users.models import DailyVisit
+from app.metrics import get_platform_metrics, platform_series
+from app.pagination import COMPANY_ORDERING, SUBSCRIPTION_ORDERING, USER_ORDERING, paginate
 import qrcode
 from io import BytesIO
 import traceback
@@ -27,24 +28,30 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+# Rows per page of the platform admin lists
+ADMIN_PAGE_SIZE = 25
+
+
 def is_superuser(user):
     return user.is_superuser or user.is_staff
 
 
+def _company_count(model):
+    """Correlated subquery counting `model` rows of each company"""
+    counts = model.objects.filter(company=OuterRef('pk')).order_by().values('company').annotate(count=Count('pk'))
+    return Coalesce(Subquery(counts.values('count'), output_field=IntegerField()), 0)
+
+
 @login_required
 @user_passes_test(is_superuser)
 def admin_dashboard(request):
     """Super admin dashboard to manage entire platform"""
     
-    # Statistics
-    total_users = User.objects.count()
-    total_companies = Company.objects.count()
-    total_bookings = Booking.objects.count()
-    total_revenue = Transaction.objects.aggregate(Sum('amount'))['amount__sum'] or 0
-
-    # Visits
-    total_visits = DailyVisit.objects.count()
-    today_visits = DailyVisit.objects.filter(date=date.today()).count()
+    # Statistics from the periodically refreshed snapshot
+    metrics = get_platform_metrics()
+    series = platform_series()
+    today = timezone.localdate().isoformat()
+    today_visits = series['visits'][-1] if series['dates'][-1] == today else 0
     
     # Recent activity
     recent_companies = Company.objects.order_by('-created_at')[:5]
@@ -56,23 +63,25 @@ def admin_dashboard(request):
     active_subscriptions = Subscription.objects.filter(is_active=True).select_related('company', 'plan')
     
     # Plans statistics
-    plans = Plan.objects.annotate(
-        subscription_count=Count('subscription', filter=Q(subscription__is_active=True))
-    )
+    plans = list(Plan.objects.all())
+    for plan in plans:
+        plan.subscription_count = metrics.plan_counts.get(str(plan.id), 0)
     
     context = {
-        'total_users': total_users,
-        'total_companies': total_companies,
-        'total_bookings': total_bookings,
-        'total_revenue': total_revenue,
+        'total_users': metrics.total_users,
+        'total_companies': metrics.total_companies,
+        'total_bookings': metrics.total_bookings,
+        'total_revenue': metrics.total_revenue,
         'recent_companies': recent_companies,
         'recent_users': recent_users,
         'recent_bookings': recent_bookings,
         'recent_transactions': recent_transactions,
         'active_subscriptions': active_subscriptions,
         'plans': plans,
-        'total_visits': total_visits,
+        'total_visits': metrics.total_visits,
         'today_visits': today_visits,
+        'metrics_refreshed_at': metrics.refreshed_at,
+        'series': series,
     }
     
     return render(request, 'admin_dashboard/dashboard.html', context)
@@ -82,10 +91,20 @@ def admin_dashboard(request):
 @user_passes_test(is_superuser)
 def manage_users(request):
     """View and manage all users"""
-    users = User.objects.select_related('userprofile').order_by('-date_joined')
+    users = User.objects.select_related('userprofile__company')
+    
+    search_query = request.GET.get('search', '').strip()
+    if search_query:
+        users = users.filter(
+            Q(username__icontains=search_query) |
+            Q(email__icontains=search_query) |
+            Q(userprofile__full_name__icontains=search_query) |
+            Q(userprofile__company__name__icontains=search_query)
+        )
     
     context = {
-        'users': users,
+        'users': paginate(request, users, USER_ORDERING, ADMIN_PAGE_SIZE, with_count=True),
+        'search_query': search_query,
     }
     
     return render(request, 'admin_dashboard/manage_users.html', context)
@@ -166,14 +185,28 @@ def send_activation_email(request, user_id):
 @user_passes_test(is_superuser)
 def manage_companies(request):
     """View and manage all companies"""
-    companies = Company.objects.select_related('administrator').annotate(
-        staff_count=Count('staff'),
-        service_count=Count('service'),
-        booking_count=Count('booking')
-    ).order_by('-created_at')
+    companies = Company.objects.all()
+    
+    search_query = request.GET.get('search', '').strip()
+    if search_query:
+        companies = companies.filter(
+            Q(name__icontains=search_query) |
+            Q(city__icontains=search_query) |
+            Q(email__icontains=search_query) |
+            Q(administrator__username__icontains=search_query) |
+            Q(administrator__email__icontains=search_query)
+        )
+    
+    # Counted per company of the page only; joining the three tables would multiply rows
+    companies = companies.select_related('administrator').annotate(
+        staff_count=_company_count(Staff),
+        service_count=_company_count(Service),
+        booking_count=_company_count(Booking),
+    )
     
     context = {
-        'companies': companies,
+        'companies': paginate(request, companies, COMPANY_ORDERING, ADMIN_PAGE_SIZE, with_count=True),
+        'search_query': search_query,
     }
     
     return render(request, 'admin_dashboard/manage_companies.html', context)
@@ -196,7 +229,7 @@ def manage_plans(request):
 @user_passes_test(is_superuser)
 def manage_subscriptions(request):
     """View all subscriptions"""
-    subscriptions = Subscription.objects.select_related('company', 'plan').order_by('-start_date')
+    subscriptions = Subscription.objects.select_related('company', 'plan')
     
     # Filter options
     status_filter = request.GET.get('status', 'all')
@@ -205,9 +238,17 @@ def manage_subscriptions(request):
     elif status_filter == 'inactive':
         subscriptions = subscriptions.filter(is_active=False)
     
+    search_query = request.GET.get('search', '').strip()
+    if search_query:
+        subscriptions = subscriptions.filter(
+            Q(company__name__icontains=search_query) |
+            Q(plan__name__icontains=search_query)
+        )
+    
     context = {
-        'subscriptions': subscriptions,
+        'subscriptions': paginate(request, subscriptions, SUBSCRIPTION_ORDERING, ADMIN_PAGE_SIZE, with_count=True),
         'status_filter': status_filter,
+        'search_query': search_query,
     }
     
     return render(request, 'admin_dashboard/manage_subscriptions.html', context)
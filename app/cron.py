@@ -0,0 +1,19 @@
+from app.metrics import refresh_platform_metrics
+
+
+def refresh_metrics():
+    """
+    Add new users, companies, bookings, visits and transactions to the platform metrics.
+    This should be run every 15 minutes.
+    """
+    snapshot = refresh_platform_metrics()
+    print(f"Platform metrics refreshed: {snapshot.total_bookings} bookings, {snapshot.total_visits} visits.")
+
+
+def rebuild_metrics():
+    """
+    Recompute the platform metrics from scratch, accounting for deleted rows.
+    This should be run daily.
+    """
+    refresh_platform_metrics(full=True)
+    print("Platform metrics rebuilt.")
@@ -0,0 +1,26 @@
+"""
+Management command to check that the hot queries are served by indexes
+"""
+from django.core.management.base import BaseCommand, CommandError
+from app.query_audit import audit_queries
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the registered hot queries and fail if any of them scans its whole table'
+
+    def handle(self, *args, **options):
+        failures = []
+        for name, plan, full_scan in audit_queries():
+            if full_scan is None:
+                self.stdout.write(self.style.WARNING(f"?  {name}: plans of this database are not checked"))
+            elif full_scan:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"✗  {name}: full table scan"))
+            else:
+                self.stdout.write(f"✓  {name}")
+            if options['verbosity'] > 1 or full_scan:
+                self.stdout.write(f"   {plan}".replace('\n', '\n   '))
+
+        if failures:
+            raise CommandError(f"{len(failures)} hot queries scan a whole table: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS('All hot queries use an index'))
@@ -0,0 +1,23 @@
+"""
+Management command to update the platform metrics shown on the superuser dashboard
+"""
+from django.core.management.base import BaseCommand
+from app.metrics import refresh_platform_metrics
+
+
+class Command(BaseCommand):
+    help = 'Add rows created since the last run to the platform metrics snapshot (--full recomputes it)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recompute totals and the daily series from scratch',
+        )
+
+    def handle(self, *args, **options):
+        snapshot = refresh_platform_metrics(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Platform metrics: {snapshot.total_users} users, {snapshot.total_companies} companies, "
+            f"{snapshot.total_bookings} bookings, {snapshot.total_visits} visits, {snapshot.total_revenue} revenue"
+        ))
@@ -0,0 +1,120 @@
+"""
+Platform metrics snapshot behind the superuser dashboard
+
+The dashboard reads PlatformMetrics and PlatformDailyMetrics instead of
+counting whole tables. refresh_platform_metrics() adds only the rows of
+each source table with an id past the watermark it recorded last time,
+grouped per day. Rows deleted since, or committed late with a lower id,
+are picked up by the nightly full rebuild.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from billing.models import Subscription, Transaction
+from bookings.models import Booking
+from companies.models import Company
+from users.models import DailyVisit
+from .models import PlatformDailyMetrics, PlatformMetrics
+
+# (model, watermark field, total field, daily field, day of a row, summed field or None to count)
+SOURCES = [
+    (User, 'user_watermark', 'total_users', 'new_users', lambda: TruncDate('date_joined'), None),
+    (Company, 'company_watermark', 'total_companies', 'new_companies', lambda: TruncDate('created_at'), None),
+    (Booking, 'booking_watermark', 'total_bookings', 'bookings', lambda: TruncDate('created_at'), None),
+    (DailyVisit, 'visit_watermark', 'total_visits', 'visits', lambda: F('date'), None),
+    (Transaction, 'transaction_watermark', 'total_revenue', 'revenue', lambda: TruncDate('transaction_date'), 'amount'),
+]
+
+DAILY_FIELDS = ['visits', 'new_users', 'new_companies', 'bookings', 'revenue']
+
+
+def _add_new_rows(snapshot: PlatformMetrics) -> dict:
+    """Add rows past each watermark to the snapshot totals; returns {day: {daily field: delta}}"""
+    deltas = defaultdict(lambda: defaultdict(int))
+    for model, watermark_field, total_field, daily_field, day, summed in SOURCES:
+        rows = model.objects.filter(pk__gt=getattr(snapshot, watermark_field)).order_by()
+        # Fix the upper bound first so rows inserted meanwhile wait for the next run
+        upper = rows.aggregate(upper=Max('pk'))['upper']
+        if upper is None:
+            continue
+        value = Sum(summed) if summed else Count('pk')
+        total = 0
+        for row in rows.filter(pk__lte=upper).annotate(day=day()).values('day').annotate(value=value):
+            deltas[row['day']][daily_field] += row['value'] or 0
+            total += row['value'] or 0
+        setattr(snapshot, total_field, getattr(snapshot, total_field) + total)
+        setattr(snapshot, watermark_field, upper)
+    return deltas
+
+
+def _apply_daily(deltas: dict):
+    existing = {row.date: row for row in PlatformDailyMetrics.objects.filter(date__in=list(deltas))}
+    created = []
+    for day, values in deltas.items():
+        row = existing.get(day) or PlatformDailyMetrics(date=day)
+        for field, delta in values.items():
+            setattr(row, field, getattr(row, field) + delta)
+        if day not in existing:
+            created.append(row)
+    PlatformDailyMetrics.objects.bulk_create(created)
+    PlatformDailyMetrics.objects.bulk_update(list(existing.values()), DAILY_FIELDS)
+
+
+def refresh_platform_metrics(full: bool = False) -> PlatformMetrics:
+    """
+    Bring the snapshot up to date with rows added since the last refresh
+
+    With full=True totals and the daily series are recomputed from scratch.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        PlatformMetrics.objects.get_or_create(pk=1)
+        # One refresh at a time
+        snapshot = PlatformMetrics.objects.select_for_update().get(pk=1)
+        if full:
+            PlatformDailyMetrics.objects.all().delete()
+            for _model, watermark_field, total_field, *_rest in SOURCES:
+                setattr(snapshot, watermark_field, 0)
+                setattr(snapshot, total_field, Decimal('0') if total_field == 'total_revenue' else 0)
+            snapshot.full_refreshed_at = now
+
+        _apply_daily(_add_new_rows(snapshot))
+        # Active subscriptions per plan: a handful of rows, recounted every time
+        snapshot.plan_counts = {
+            str(plan_id): count
+            for plan_id, count in Subscription.objects.filter(is_active=True).order_by()
+            .values_list('plan_id').annotate(count=Count('id'))
+        }
+        snapshot.refreshed_at = now
+        snapshot.save()
+    return snapshot
+
+
+def get_platform_metrics() -> PlatformMetrics:
+    """The current snapshot, built on first use"""
+    snapshot = PlatformMetrics.objects.filter(pk=1).first()
+    if snapshot is None or snapshot.refreshed_at is None:
+        snapshot = refresh_platform_metrics(full=True)
+    return snapshot
+
+
+def platform_series(days: int = None) -> dict:
+    """Daily visits, bookings and revenue of the last `days` days (zero on days without activity)"""
+    days = days or getattr(settings, 'PLATFORM_METRICS_SERIES_DAYS', 30)
+    end = timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    rows = {row.date: row for row in PlatformDailyMetrics.objects.filter(date__gte=start, date__lte=end)}
+    dates = [start + timedelta(days=offset) for offset in range(days)]
+    return {
+        'dates': [day.isoformat() for day in dates],
+        'visits': [rows[day].visits if day in rows else 0 for day in dates],
+        'bookings': [rows[day].bookings if day in rows else 0 for day in dates],
+        'revenue': [float(rows[day].revenue) if day in rows else 0 for day in dates],
+    }
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlatformDailyMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('visits', models.PositiveIntegerField(default=0)),
+                ('new_users', models.PositiveIntegerField(default=0)),
+                ('new_companies', models.PositiveIntegerField(default=0)),
+                ('bookings', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'verbose_name_plural': 'platform daily metrics',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PlatformMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_users', models.PositiveIntegerField(default=0)),
+                ('total_companies', models.PositiveIntegerField(default=0)),
+                ('total_bookings', models.PositiveIntegerField(default=0)),
+                ('total_visits', models.PositiveIntegerField(default=0)),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('plan_counts', models.JSONField(blank=True, default=dict)),
+                ('user_watermark', models.BigIntegerField(default=0)),
+                ('company_watermark', models.BigIntegerField(default=0)),
+                ('booking_watermark', models.BigIntegerField(default=0)),
+                ('visit_watermark', models.BigIntegerField(default=0)),
+                ('transaction_watermark', models.BigIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+                ('full_refreshed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'platform metrics',
+            },
+        ),
+    ]
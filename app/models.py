@@ -0,0 +1,49 @@
+from django.db import models
+
+
+class PlatformMetrics(models.Model):
+    """
+    Platform-wide totals for the superuser dashboard (a single row)
+
+    Maintained by app.metrics: new rows of each source table past its
+    watermark are added every few minutes, and a nightly full rebuild
+    accounts for deletions.
+    """
+    total_users = models.PositiveIntegerField(default=0)
+    total_companies = models.PositiveIntegerField(default=0)
+    total_bookings = models.PositiveIntegerField(default=0)
+    total_visits = models.PositiveIntegerField(default=0)
+    total_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Active subscriptions per plan id
+    plan_counts = models.JSONField(default=dict, blank=True)
+    # Highest id of each source table already counted
+    user_watermark = models.BigIntegerField(default=0)
+    company_watermark = models.BigIntegerField(default=0)
+    booking_watermark = models.BigIntegerField(default=0)
+    visit_watermark = models.BigIntegerField(default=0)
+    transaction_watermark = models.BigIntegerField(default=0)
+    refreshed_at = models.DateTimeField(blank=True, null=True)
+    full_refreshed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name_plural = 'platform metrics'
+
+    def __str__(self):
+        return f"Platform metrics at {self.refreshed_at}"
+
+
+class PlatformDailyMetrics(models.Model):
+    """Platform activity of one day: visits, sign-ups, bookings made and revenue"""
+    date = models.DateField(unique=True)
+    visits = models.PositiveIntegerField(default=0)
+    new_users = models.PositiveIntegerField(default=0)
+    new_companies = models.PositiveIntegerField(default=0)
+    bookings = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['date']
+        verbose_name_plural = 'platform daily metrics'
+
+    def __str__(self):
+        return f"Platform metrics of {self.date}"
@@ -0,0 +1,246 @@
+"""
+Keyset (cursor) pagination for long lists
+
+A page is read as "the next N rows after the last key shown" instead of
+COUNT(*) plus OFFSET, so a deep page costs what the first one does. Links
+carry an opaque cursor with the ordering key of the first or last row of
+the page. The total is optional and approximate: exact up to COUNT_CAP
+rows, a planner estimate beyond that on PostgreSQL.
+"""
+import base64
+import binascii
+import datetime
+import json
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+
+# Rows counted exactly before falling back to an estimate
+COUNT_CAP = 1000
+
+AFTER = 'after'
+BEFORE = 'before'
+
+# Orderings of the paginated lists; each ends in id so keys are unique
+BOOKING_ORDERING = ['-date', '-start_time', 'id']
+CUSTOMER_ORDERING = ['name', 'id']
+COMPANY_ORDERING = ['-created_at', '-id']
+USER_ORDERING = ['-date_joined', '-id']
+SUBSCRIPTION_ORDERING = ['-start_date', '-id']
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder keeping microseconds, which it cuts to milliseconds"""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            # A truncated key sorts before its own row and the page would skip past it
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(list(values), cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str, ordering: list, model=None):
+    """
+    Key values of a cursor in `ordering`, or None if it is missing, malformed
+    or does not fit the ordering
+
+    With a model, each value goes through its field's to_python, so a
+    tampered cursor is rejected here instead of failing in the query.
+    """
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(ordering):
+        return None
+    if model is None:
+        return values
+    try:
+        return [model._meta.get_field(_field(field)).to_python(value) for field, value in zip(ordering, values)]
+    except (FieldDoesNotExist, ValidationError, TypeError):
+        return None
+
+
+def _field(ordering_field: str) -> str:
+    return ordering_field.lstrip('-')
+
+
+def _descending(ordering_field: str, reverse: bool) -> bool:
+    return ordering_field.startswith('-') != reverse
+
+
+def _key(item, ordering: list) -> list:
+    if isinstance(item, dict):
+        return [item[_field(field)] for field in ordering]
+    return [getattr(item, _field(field)) for field in ordering]
+
+
+def keyset_filter(ordering: list, values: list, reverse: bool = False) -> Q:
+    """Rows strictly after `values` in `ordering` (before them with reverse=True)"""
+    condition = Q()
+    for idx, field in enumerate(ordering):
+        lookup = 'lt' if _descending(field, reverse) else 'gt'
+        step = Q(**{f"{_field(field)}__{lookup}": values[idx]})
+        for previous, value in zip(ordering[:idx], values):
+            step &= Q(**{_field(previous): value})
+        condition |= step
+    return condition
+
+
+def _fits(values: list, key: list) -> bool:
+    """Cursor values of the same types as a row's key, so they can be compared in Python"""
+    return all(
+        value is None or mine is None or isinstance(value, type(mine))
+        for value, mine in zip(values, key)
+    )
+
+
+def _comes_after(key: list, values: list, ordering: list, reverse: bool) -> bool:
+    for field, mine, theirs in zip(ordering, key, values):
+        if mine == theirs:
+            continue
+        return mine < theirs if _descending(field, reverse) else mine > theirs
+    return False
+
+
+def approximate_count(queryset, cap: int = COUNT_CAP):
+    """(count, exact): exact up to `cap` rows, then a planner estimate on PostgreSQL or `cap`"""
+    # Only the keys: annotations of the rows (e.g. counting subqueries) are not evaluated
+    count = queryset.order_by().values('pk')[:cap + 1].count()
+    if count <= cap:
+        return count, True
+    if connections[queryset.db].vendor == 'postgresql':
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        return max(int(plan[0]['Plan']['Plan Rows']), count), False
+    return cap, False
+
+
+class KeysetPage:
+    """One page of rows with cursors to its neighbours"""
+
+    def __init__(self, object_list: list, ordering: list, has_next: bool, has_previous: bool,
+                 count: int = None, count_is_exact: bool = True):
+        self.object_list = object_list
+        self.ordering = ordering
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.count = count
+        self.count_is_exact = count_is_exact
+        self.next_url = self.previous_url = self.first_url = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def has_other_pages(self) -> bool:
+        return self.has_next or self.has_previous
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(_key(self.object_list[-1], self.ordering)) if self.has_next and self.object_list else None
+
+    @property
+    def previous_cursor(self):
+        return encode_cursor(_key(self.object_list[0], self.ordering)) if self.has_previous and self.object_list else None
+
+    @property
+    def count_label(self) -> str:
+        """'42', '~12500' (estimate) or '1000+' (capped), '' when not counted"""
+        if self.count is None:
+            return ''
+        if self.count_is_exact:
+            return str(self.count)
+        return f"{self.count}+" if self.count == COUNT_CAP else f"~{self.count}"
+
+    def set_links(self, request):
+        """Fill next_url/previous_url/first_url with the request's other parameters kept"""
+        params = request.GET.copy()
+        for name in (AFTER, BEFORE, 'page'):
+            params.pop(name, None)
+        self.first_url = f"?{params.urlencode()}"
+        for attr, name, cursor in (('next_url', AFTER, self.next_cursor), ('previous_url', BEFORE, self.previous_cursor)):
+            if cursor:
+                linked = params.copy()
+                linked[name] = cursor
+                setattr(self, attr, f"?{linked.urlencode()}")
+
+    def as_dict(self) -> dict:
+        """Paging fields for JSON responses"""
+        data = {
+            'has_next': self.has_next,
+            'has_previous': self.has_previous,
+            'next_cursor': self.next_cursor,
+            'previous_cursor': self.previous_cursor,
+        }
+        if self.count is not None:
+            data['total_count'] = self.count
+            data['total_count_exact'] = self.count_is_exact
+        return data
+
+
+def keyset_page(items, ordering: list, per_page: int, after: str = None, before: str = None,
+                with_count: bool = False) -> KeysetPage:
+    """
+    Page of a queryset (or of an already sorted list) in `ordering`
+
+    The ordering must end in a unique field (id) so every row has a distinct
+    key. `after` and `before` are cursors from a previous page; without them
+    this is the first page.
+    """
+    ordering = list(ordering)
+    model = None if isinstance(items, list) else items.model
+    after_values = decode_cursor(after, ordering, model)
+    before_values = decode_cursor(before, ordering, model) if after_values is None else None
+    values = after_values or before_values
+    if values is not None and isinstance(items, list) and items and not _fits(values, _key(items[0], ordering)):
+        values = after_values = before_values = None
+    reverse = before_values is not None
+
+    if isinstance(items, list):
+        rows = items[::-1] if reverse else items
+        if values is not None:
+            rows = [item for item in rows if _comes_after(_key(item, ordering), values, ordering, reverse)]
+        rows = rows[:per_page + 1]
+        count, exact = (len(items), True) if with_count else (None, True)
+    else:
+        queryset = items
+        if with_count:
+            count, exact = approximate_count(queryset)
+        else:
+            count, exact = None, True
+        if values is not None:
+            queryset = queryset.filter(keyset_filter(ordering, values, reverse))
+        flipped = [_field(field) if field.startswith('-') else f"-{field}" for field in ordering]
+        rows = list(queryset.order_by(*(flipped if reverse else ordering))[:per_page + 1])
+
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if reverse:
+        rows.reverse()
+        return KeysetPage(rows, ordering, has_next=True, has_previous=more, count=count, count_is_exact=exact)
+    return KeysetPage(rows, ordering, has_next=more, has_previous=after_values is not None,
+                      count=count, count_is_exact=exact)
+
+
+def paginate(request, items, ordering: list, per_page: int, with_count: bool = False) -> KeysetPage:
+    """keyset_page with the cursors read from ?after= / ?before= and links for the templates"""
+    page = keyset_page(
+        items, ordering, per_page,
+        after=request.GET.get(AFTER), before=request.GET.get(BEFORE), with_count=with_count,
+    )
+    page.set_links(request)
+    return page
@@ -0,0 +1,88 @@
+"""
+Registry of hot queries and EXPLAIN-based detection of full table scans
+
+Each entry builds the queryset a hot path runs (with placeholder ids and
+dates) and names the table that must be reached through an index. On
+PostgreSQL sequential scans are disabled while explaining, so the verdict
+is "is there a usable index" rather than "is the table small enough to
+scan"; SQLite's planner picks an index whenever one applies.
+"""
+import json
+import re
+from datetime import timedelta
+from django.db import connections, transaction
+from django.utils import timezone
+
+from app.pagination import BOOKING_ORDERING
+from bookings.models import Booking
+from companies.models import StaffOutOfOffice
+from whatsapp_bot.conversation_store import ACTIVE_STATES
+from whatsapp_bot.models import WhatsAppConversation
+
+
+def _today():
+    return timezone.localdate()
+
+
+def _now():
+    return timezone.now()
+
+
+# (name, model whose table must not be scanned, queryset factory)
+HOT_QUERIES = [
+    ('bot alternative dates', Booking, lambda: Booking.objects.filter(
+        staff_id__in=[1, 2], status__in=[1, 3]).overlapping(_now(), _now() + timedelta(days=14))),
+    ('calendar day', Booking, lambda: Booking.objects.filter(
+        company_id=1, date=_today(), status__in=[0, 1, 3]).order_by('start_time')),
+    ('bookings list', Booking, lambda: Booking.objects.filter(
+        company_id=1, status=1).order_by(*BOOKING_ORDERING)[:25]),
+    ('utilization range', Booking, lambda: Booking.objects.filter(
+        company_id=1, date__gte=_today() - timedelta(days=90), date__lte=_today(), status__in=[1, 3])),
+    ('reminder job', Booking, lambda: Booking.objects.filter(
+        date=_today() + timedelta(days=1), reminder_sent=False, status=1).order_by('start_time')),
+    ('customer history', Booking, lambda: Booking.objects.filter(
+        customer_id=1, company_id=1).order_by(*BOOKING_ORDERING)[:25]),
+    ('booking overlap', Booking, lambda: Booking.objects.filter(
+        staff_id=1, status__in=[1, 3]).overlapping(_now(), _now() + timedelta(hours=1))),
+    ('out-of-office overlap', StaffOutOfOffice, lambda: StaffOutOfOffice.objects.filter(
+        staff_id=1).overlapping(_now(), _now() + timedelta(hours=1))),
+    ('conversation lookup', WhatsAppConversation, lambda: WhatsAppConversation.objects.filter(
+        phone_number='whatsapp:+34600000000', current_state__in=ACTIVE_STATES).order_by('-updated_at')[:1]),
+    ('idle conversation cleanup', WhatsAppConversation, lambda: WhatsAppConversation.objects.filter(
+        current_state='idle', last_message_at__lt=_now() - timedelta(hours=24)).values_list('id', flat=True)[:1000]),
+]
+
+
+def _postgres_scans(node: dict, table: str) -> bool:
+    if node.get('Node Type') == 'Seq Scan' and node.get('Relation Name') == table:
+        return True
+    return any(_postgres_scans(child, table) for child in node.get('Plans', []))
+
+
+def explain(queryset):
+    """(plan text, vendor) of a queryset"""
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with transaction.atomic(using=queryset.db):
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain(format='json'), connection.vendor
+    return queryset.explain(), connection.vendor
+
+
+def scans_table(plan: str, vendor: str, table: str):
+    """True if the plan reads all of `table`, None when the backend's plans are not understood"""
+    if vendor == 'postgresql':
+        return _postgres_scans(json.loads(plan)[0]['Plan'], table)
+    if vendor == 'sqlite':
+        return re.search(rf'\bSCAN (TABLE )?{re.escape(table)}\b', plan) is not None
+    return None
+
+
+def audit_queries(queries=None) -> list:
+    """[(name, plan, full scan)] for each registered hot query"""
+    results = []
+    for name, model, build in queries or HOT_QUERIES:
+        plan, vendor = explain(build())
+        results.append((name, plan, scans_table(plan, vendor, model._meta.db_table)))
+    return results
@@ -0,0 +1,72 @@
+"""
+Time ranges stored as [start, end) timestamp columns
+
+Bookings (start_at/end_at) and absences (start_datetime/end_datetime)
+carry aware timestamps, so "what overlaps this window" is a single
+comparison instead of date and time columns combined in Python. On
+PostgreSQL the condition is written as tstzrange(start, end) &&
+tstzrange(...), the form the GiST indexes of the range migrations answer
+with one index probe; other databases use the plain comparison and the
+(staff, start, end) btree indexes.
+"""
+from datetime import date, datetime, time, timedelta
+from django.conf import settings
+from django.db import models
+from django.db.models import BooleanField, DateTimeField, F, Func, Value
+from django.utils import timezone
+
+
+def aware(value: datetime) -> datetime:
+    """A naive datetime read as local time, made aware when time zones are on"""
+    if settings.USE_TZ and timezone.is_naive(value):
+        return timezone.make_aware(value)
+    return value
+
+
+def local_datetime(day: date, at: time) -> datetime:
+    return aware(datetime.combine(day, at))
+
+
+def day_bounds(day: date) -> tuple:
+    """[start, end) of a local day"""
+    start = local_datetime(day, time.min)
+    return start, local_datetime(day + timedelta(days=1), time.min)
+
+
+class Overlaps(Func):
+    """The row's [start_field, end_field) overlaps [start, end)"""
+    output_field = BooleanField()
+
+    def __init__(self, start_field: str, end_field: str, start: datetime, end: datetime):
+        super().__init__(
+            F(start_field), F(end_field),
+            Value(aware(start), output_field=DateTimeField()), Value(aware(end), output_field=DateTimeField()),
+        )
+
+    def _compiled(self, compiler, connection):
+        return [compiler.compile(expression) for expression in self.get_source_expressions()]
+
+    def as_sql(self, compiler, connection, **extra_context):
+        (row_start, row_start_params), (row_end, row_end_params), (start, start_params), (end, end_params) = (
+            self._compiled(compiler, connection)
+        )
+        return f"({row_start} < {end} AND {row_end} > {start})", [
+            *row_start_params, *end_params, *row_end_params, *start_params,
+        ]
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        (row_start, row_start_params), (row_end, row_end_params), (start, start_params), (end, end_params) = (
+            self._compiled(compiler, connection)
+        )
+        return f"tstzrange({row_start}, {row_end}, '[)') && tstzrange({start}, {end}, '[)')", [
+            *row_start_params, *row_end_params, *start_params, *end_params,
+        ]
+
+
+class TimeRangeQuerySet(models.QuerySet):
+    """QuerySet of rows with a [start, end) range in the fields named by range_fields"""
+    range_fields = ('start_at', 'end_at')
+
+    def overlapping(self, start: datetime, end: datetime):
+        """Rows whose range overlaps [start, end); naive bounds are local time"""
+        return self.filter(Overlaps(*self.range_fields, start, end))
@@ -4,19 +4,21 @@ from django.conf import settings
 from django.utils.translation import get_language
 
 
-def send_whatsapp_template(to, content_sid, variables):
+def send_whatsapp_template(to, content_sid, variables, status_callback=None):
     
     client = Client(
         settings.TWILIO_ACCOUNT_SID,
         settings.TWILIO_AUTH_TOKEN
     )
 
+    extra = {'status_callback': status_callback} if status_callback else {}
     try:
         message = client.messages.create(
             from_=settings.TWILIO_WHATSAPP_FROM,
             to=f'whatsapp:{to}',
             content_sid=content_sid,
             content_variables=json.dumps(variables),
+            **extra
         )
         print("WhatsApp message sent successfully.")
     except Exception as e:
@@ -252,6 +252,68 @@ TWILIO_REMINDER_TEMPLATE_SID = ""
 # WhatsApp AI Integration Settings
 OPENAI_API_KEY = ""
 OPENAI_MODEL = ""
+# One shared OpenAI client: timeouts in seconds, retries per call, pooled connections
+OPENAI_CONNECT_TIMEOUT = 3.0
+OPENAI_READ_TIMEOUT = 15.0
+OPENAI_MAX_RETRIES = 1
+OPENAI_MAX_CONNECTIONS = 20
+# USD per million tokens, for the usage metrics and daily rollups (OpenAIUsageDaily)
+OPENAI_PRICING = {
+    'gpt-4o-mini': {'prompt': 0.15, 'completion': 0.60},
+    'gpt-4o': {'prompt': 2.50, 'completion': 10.00},
+    'gpt-4.1-mini': {'prompt': 0.40, 'completion': 1.60},
+    'gpt-4.1-nano': {'prompt': 0.10, 'completion': 0.40},
+}
+# Seconds between writes of in-process usage totals to the daily rollup table (by a background thread)
+OPENAI_USAGE_FLUSH_INTERVAL = 60.0
+# Skip OpenAI when the rule-based parser explains this share of the message (0-1)
+WHATSAPP_FAST_PATH_MIN_CONFIDENCE = 1.0
+# OpenAI intent cache: entries, lifetime in seconds and an optional CACHES alias
+# to persist answers across restarts (e.g. a DatabaseCache; run createcachetable)
+WHATSAPP_INTENT_CACHE_SIZE = 5000
+WHATSAPP_INTENT_CACHE_TTL = 6 * 3600
+WHATSAPP_INTENT_CACHE_ALIAS = None
+# Message log: buffered bulk writes with a local write-ahead file, old rows archived monthly
+WHATSAPP_MESSAGE_LOG_DIR = os.path.join(BASE_DIR, 'var', 'whatsapp')
+WHATSAPP_MESSAGE_LOG_FLUSH_SIZE = 50
+WHATSAPP_MESSAGE_LOG_FLUSH_INTERVAL = 2.0
+# Write the message log from a background thread (False writes it in the request)
+WHATSAPP_MESSAGE_LOG_ASYNC = True
+WHATSAPP_MESSAGE_RETENTION_DAYS = 180
+# When a day is full, offer up to this many closest dates within the next N days,
+# giving up when the search takes longer than the budget
+WHATSAPP_ALTERNATIVE_DAYS = 14
+WHATSAPP_ALTERNATIVE_DATES = 3
+WHATSAPP_ALTERNATIVE_BUDGET_MS = 300
+# Retried webhooks (same MessageSid) get the stored reply: seconds to keep it
+# (claims are rows in ProcessedMessage, pruned hourly by cron), and how long a
+# retry waits for a first delivery that is still running
+WHATSAPP_DEDUP_TTL = 24 * 3600
+WHATSAPP_DEDUP_WAIT = 5.0
+# Senders over WHATSAPP_RATE_LIMIT messages per window (seconds) are shed before the message is handled.
+# Messages from one number are handled one at a time; those that had to wait are answered
+# in one pass, after giving the rest of the burst the coalescing window (seconds) to arrive.
+# A message still waiting for its number's lock after WHATSAPP_PHONE_LOCK_WAIT is not handled.
+# Counters, locks and waiting messages are database rows shared by all workers, pruned hourly by cron.
+WHATSAPP_RATE_LIMIT = 20
+WHATSAPP_RATE_LIMIT_WINDOW = 60
+WHATSAPP_COALESCE_WINDOW = 0.8
+WHATSAPP_PHONE_LOCK_WAIT = 10.0
+# Twilio delivery status callbacks for replies and reminders, applied in batches
+# by a background thread (False applies each callback in the request)
+WHATSAPP_STATUS_CALLBACKS = True
+WHATSAPP_STATUS_ASYNC = True
+WHATSAPP_STATUS_FLUSH_SIZE = 200
+WHATSAPP_STATUS_FLUSH_INTERVAL = 5.0
+
+# Customer autocomplete backend: 'auto' (pg_trgm when installed), 'postgres' or 'memory'
+CUSTOMER_SEARCH_BACKEND = 'auto'
+
+# Seconds a utilization/demand heatmap stays cached when nothing changes
+UTILIZATION_CACHE_TTL = 15 * 60
+
+# Days of visits/bookings/revenue charted on the platform admin dashboard
+PLATFORM_METRICS_SERIES_DAYS = 30
 
 # CORS settings for Flutter app
 CORS_ALLOWED_ORIGINS = [
@@ -294,6 +356,14 @@ HIJACK_LOGOUT_REDIRECT_URL = '/admin/'  # Redirect to admin after releasing hija
 CRONJOBS = [
     # ('0 0 * * *', 'billing.cron.expire_subscriptions'), # Daily at midnight
     ('0 14 * * *', 'bookings.cron.send_booking_reminders'), # Daily at 14:00 (2 PM)
+    ('15 * * * *', 'whatsapp_bot.cron.cleanup_conversations'), # Hourly
+    ('20 * * * *', 'whatsapp_bot.cron.cleanup_processed_messages'), # Hourly
+    ('25 * * * *', 'whatsapp_bot.cron.cleanup_phone_gates'), # Hourly
+    ('30 3 * * *', 'whatsapp_bot.cron.archive_messages'), # Daily at 03:30
+    ('40 3 * * *', 'bookings.cron.rebuild_customer_totals'), # Daily at 03:40
+    ('45 3 * * *', 'bookings.cron.rebuild_booking_stats'), # Daily at 03:45
+    ('*/15 * * * *', 'app.cron.refresh_metrics'), # Every 15 minutes
+    ('50 3 * * *', 'app.cron.rebuild_metrics'), # Daily at 03:50
 ]
 
 # Import local settings
@@ -0,0 +1,156 @@
+import io
+from datetime import date, time, timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from billing.models import Plan, Subscription, Transaction
+from bookings.models import Booking, Customer
+from companies.models import Company, Service, Staff
+from users.models import DailyVisit
+from .metrics import get_platform_metrics, platform_series, refresh_platform_metrics
+from .models import PlatformDailyMetrics
+from .query_audit import audit_queries
+
+
+class PlatformMetricsTest(TestCase):
+    """Test the incremental platform metrics snapshot"""
+
+    def setUp(self):
+        user = User.objects.create_user('owner', 'owner@test.com', 'pass')
+        self.company = Company.objects.create(administrator=user, name='Salon', address='Calle 1', city='Madrid')
+        self.staff = Staff.objects.create(company=self.company, name='Maria')
+        self.service = Service.objects.create(company=self.company, name='Corte', duration=30, price=10)
+        self.customer = Customer.objects.create(name='Ana', phone='+34 600 000 001')
+        self.plan = Plan.objects.create(name='Basic')
+        self.subscription = Subscription.objects.create(
+            company=self.company, plan=self.plan, start_date=date.today(), end_date=date.today() + timedelta(days=30)
+        )
+        self.today = timezone.localdate()
+
+    def book(self):
+        return Booking.objects.create(
+            company=self.company, staff=self.staff, service=self.service, customer=self.customer,
+            date=self.today, start_time=time(10, 0), status=1
+        )
+
+    def pay(self, number, amount):
+        return Transaction.objects.create(subscription=self.subscription, amount=amount, transaction_id=f"tx-{number}")
+
+    def test_refresh_adds_only_new_rows(self):
+        self.book()
+        self.pay(1, Decimal('20.00'))
+        DailyVisit.objects.create(ip='10.0.0.1', date=self.today)
+        metrics = get_platform_metrics()
+        self.assertEqual((metrics.total_users, metrics.total_companies, metrics.total_bookings), (1, 1, 1))
+        self.assertEqual((metrics.total_visits, metrics.total_revenue), (1, Decimal('20.00')))
+        self.assertEqual(metrics.plan_counts, {str(self.plan.id): 1})
+
+        self.book()
+        self.pay(2, Decimal('5.50'))
+        DailyVisit.objects.create(ip='10.0.0.2', date=self.today)
+        metrics = refresh_platform_metrics()
+        self.assertEqual((metrics.total_bookings, metrics.total_visits, metrics.total_revenue), (2, 2, Decimal('25.50')))
+        day = PlatformDailyMetrics.objects.get(date=self.today)
+        self.assertEqual((day.bookings, day.visits, day.revenue, day.new_users), (2, 2, Decimal('25.50'), 1))
+
+        # Nothing new: totals unchanged
+        self.assertEqual(refresh_platform_metrics().total_bookings, 2)
+        series = platform_series(7)
+        self.assertEqual((len(series['dates']), series['bookings'][-1], series['revenue'][-1]), (7, 2, 25.5))
+
+    def test_full_rebuild_accounts_for_deletions(self):
+        booking = self.book()
+        self.book()
+        refresh_platform_metrics()
+        booking.delete()
+        self.assertEqual(refresh_platform_metrics().total_bookings, 2)
+        metrics = refresh_platform_metrics(full=True)
+        self.assertEqual(metrics.total_bookings, 1)
+        self.assertEqual(PlatformDailyMetrics.objects.get(date=self.today).bookings, 1)
+        self.assertIsNotNone(metrics.full_refreshed_at)
+
+    def test_dashboard_reads_the_snapshot(self):
+        admin = User.objects.create_superuser('root', 'root@test.com', 'pass')
+        self.client.force_login(admin)
+        self.book()
+        response = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_bookings'], 1)
+        self.assertEqual(response.context['today_visits'], 1)
+        self.assertContains(response, 'id="platform-series"')
+
+
+class PlatformAdminListsTest(TestCase):
+    """Test counts, search and pagination of the platform admin lists"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('root', 'root@test.com', 'pass')
+        self.client.force_login(self.admin)
+        owner = User.objects.create_user('owner', 'owner@test.com', 'pass')
+        self.company = Company.objects.create(administrator=owner, name='Salon Luna', address='Calle 1', city='Madrid')
+        staff = [Staff.objects.create(company=self.company, name=name) for name in ('Maria', 'Olga')]
+        services = [Service.objects.create(company=self.company, name=name, duration=30, price=10) for name in ('Corte', 'Tinte', 'Peinado')]
+        customer = Customer.objects.create(name='Ana', phone='+34 600 000 001')
+        for idx in range(4):
+            Booking.objects.create(
+                company=self.company, staff=staff[idx % 2], service=services[idx % 3], customer=customer,
+                date=date(2026, 1, 5), start_time=time(10 + idx, 0), status=1
+            )
+        for idx in range(30):
+            user = User.objects.create_user(f"user{idx:02d}", f"user{idx}@test.com", 'pass')
+            Company.objects.create(administrator=user, name=f"Company {idx:02d}", address='-', city='Sevilla')
+
+    def get(self, name, ip, **params):
+        # A new address per request: the visit counter middleware inserts one row per ip and day
+        response = self.client.get(reverse(name), params, REMOTE_ADDR=ip)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_company_counts_are_not_multiplied(self):
+        companies = self.get('manage_companies', '10.0.0.1', search='luna').context['companies']
+        self.assertEqual(len(companies), 1)
+        company = companies[0]
+        self.assertEqual((company.staff_count, company.service_count, company.booking_count), (2, 3, 4))
+
+    def test_lists_are_paginated(self):
+        first = self.get('manage_companies', '10.0.0.2').context['companies']
+        self.assertEqual((len(first), first.count, first.has_next), (25, 31, True))
+        second = self.get('manage_companies', '10.0.0.3', after=first.next_cursor).context['companies']
+        self.assertEqual(len(second), 6)
+        self.assertFalse({company.id for company in first} & {company.id for company in second})
+
+        users = self.get('manage_users', '10.0.0.4', search='user0').context['users']
+        self.assertEqual(users.count, 10)
+
+    def test_pages_split_inside_one_millisecond(self):
+        # created_at and date_joined carry microseconds; the cursor must not round them away
+        moment = timezone.now().replace(microsecond=500000)
+        for offset, company in enumerate(Company.objects.order_by('id')):
+            Company.objects.filter(pk=company.pk).update(created_at=moment + timedelta(microseconds=offset))
+        for offset, user in enumerate(User.objects.order_by('id')):
+            User.objects.filter(pk=user.pk).update(date_joined=moment + timedelta(microseconds=offset))
+
+        for name, key, ips in (('manage_companies', 'companies', ('10.0.1.1', '10.0.1.2')),
+                               ('manage_users', 'users', ('10.0.1.3', '10.0.1.4'))):
+            first = self.get(name, ips[0]).context[key]
+            second = self.get(name, ips[1], after=first.next_cursor).context[key]
+            self.assertEqual(len(first) + len(second), first.count)
+            self.assertFalse({row.id for row in first} & {row.id for row in second})
+
+
+class QueryPlanAuditTest(TestCase):
+    """Test the EXPLAIN audit of the hot queries"""
+
+    def test_hot_queries_use_indexes(self):
+        out = io.StringIO()
+        call_command('query_plan_audit', stdout=out)
+        self.assertIn('All hot queries use an index', out.getvalue())
+
+    def test_full_scan_is_reported(self):
+        unindexed = [('notes search', Booking, lambda: Booking.objects.filter(notes='vip'))]
+        [(_name, plan, full_scan)] = audit_queries(unindexed)
+        self.assertTrue(full_scan, plan)
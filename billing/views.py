@@ -19,6 +19,7 @@ from .stripe_utils import (
     sync_subscription_from_stripe
 )
 from users.models import UserProfile, Company
+from app.exports import CHUNK_SIZE, export_format, export_response
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
@@ -68,6 +69,31 @@ def subscription_details(request):
         return redirect('index')
 
 
+@login_required
+def export_transactions(request):
+    """Stream the company's billing history as CSV or XLSX"""
+    try:
+        profile = request.user.userprofile
+        if not profile.is_admin:
+            messages.error(request, 'Access denied.')
+            return redirect('index')
+    except UserProfile.DoesNotExist:
+        messages.error(request, 'User profile not found.')
+        return redirect('index')
+
+    transactions = Transaction.objects.filter(subscription__company=profile.company).select_related('subscription__plan')
+    header = ['Date', 'Transaction ID', 'Plan', 'Billing period', 'Status', 'Amount', 'Stripe invoice']
+    rows = (
+        [
+            transaction.transaction_date, transaction.transaction_id, transaction.subscription.plan.name,
+            transaction.subscription.billing_period, transaction.get_payment_status_display(),
+            transaction.amount, transaction.stripe_invoice_id,
+        ]
+        for transaction in transactions.order_by('-transaction_date', '-id').iterator(chunk_size=CHUNK_SIZE)
+    )
+    return export_response(f"transactions_{timezone.localdate():%Y%m%d}", header, rows, export_format(request))
+
+
 def view_plans(request):
     """View all available plans - accessible to everyone"""
     try:
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class BookingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bookings'
+
+    def ready(self):
+        # Keep customer totals, daily stats, autocomplete indexes and time ranges in step with
+        # customer, booking and service writes
+        from . import company_customers, customer_search, daily_stats, time_ranges
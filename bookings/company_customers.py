@@ -0,0 +1,213 @@
+"""
+Running per-company customer totals (CompanyCustomer)
+
+Every booking write moves the totals of its company/customer pair by the
+difference between what the booking counted for before and after the
+write. The state a booking was loaded with is remembered at post_init, so
+no extra read is needed to know it. Writes that bypass save() (queryset
+update(), raw SQL) are repaired by rebuild_company_customers, run nightly.
+
+Both paths lock the company row first, so a rebuild never reads or
+replaces totals while a booking's delta is half applied.
+"""
+import logging
+from collections import Counter
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from companies.models import Company, Service
+from .models import Booking, CompanyCustomer
+
+logger = logging.getLogger(__name__)
+
+CONFIRMED = '1'
+STATE_FIELDS = ['company_id', 'customer_id', 'status', 'service_id', 'date', 'price']
+
+
+def _state(booking):
+    """What the booking counts for, from loaded fields only (None if some are deferred)"""
+    loaded = booking.__dict__
+    if not all(field in loaded for field in STATE_FIELDS):
+        return None
+    state = [loaded[field] for field in STATE_FIELDS]
+    # status is a CharField holding ints: 1 and '1' are the same state
+    state[2] = str(state[2])
+    return tuple(state)
+
+
+class _Delta:
+    def __init__(self):
+        self.bookings = 0
+        self.visits = 0
+        self.spent = Decimal('0')
+        self.services = Counter()
+        self.added_dates = []
+        self.removed_dates = []
+
+    def add(self, state, sign: int, service_prices: dict):
+        _, _, status, service_id, booking_date, price = state
+        self.bookings += sign
+        if status != CONFIRMED:
+            return
+        if price is None:
+            price = service_prices.get(service_id) or 0
+        self.visits += sign
+        self.spent += sign * Decimal(str(price))
+        self.services[str(service_id)] += sign
+        (self.added_dates if sign > 0 else self.removed_dates).append(booking_date)
+
+
+def _service_prices(states) -> dict:
+    needed = {state[3] for state in states if state and state[5] is None and state[2] == CONFIRMED}
+    if not needed:
+        return {}
+    return dict(Service.objects.filter(id__in=needed).values_list('id', 'price'))
+
+
+def apply_booking_change(old_state, new_state):
+    """Move the totals of the affected pairs from old_state to new_state (either may be None)"""
+    if old_state == new_state:
+        return
+    prices = _service_prices([old_state, new_state])
+    deltas = {}
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        if state is None:
+            continue
+        pair = (state[0], state[1])
+        deltas.setdefault(pair, _Delta()).add(state, sign, prices)
+
+    # Companies in a fixed order, so two bookings moved in opposite directions can't deadlock
+    for (company_id, customer_id), delta in sorted(deltas.items()):
+        with transaction.atomic():
+            Company.objects.select_for_update().filter(pk=company_id).first()
+            row = CompanyCustomer.objects.select_for_update().filter(
+                company_id=company_id, customer_id=customer_id
+            ).first()
+            if row is None:
+                if delta.bookings <= 0:
+                    # Already gone (e.g. the customer is being deleted)
+                    continue
+                # A concurrent first booking of the pair may insert the row too:
+                # get_or_create then falls back to reading (and locking) theirs
+                row, _ = CompanyCustomer.objects.select_for_update().get_or_create(
+                    company_id=company_id, customer_id=customer_id
+                )
+            row.booking_count = max(row.booking_count + delta.bookings, 0)
+            if row.booking_count == 0:
+                if row.pk:
+                    row.delete()
+                continue
+            row.visit_count = max(row.visit_count + delta.visits, 0)
+            row.total_spent = max(row.total_spent + delta.spent, Decimal('0'))
+            services = Counter(row.service_counts)
+            services.update(delta.services)
+            row.service_counts = {service_id: count for service_id, count in services.items() if count > 0}
+
+            if any(day in (row.first_visit, row.last_visit) for day in delta.removed_dates):
+                # A boundary visit went away: read the new boundaries
+                bounds = Booking.objects.filter(
+                    company_id=company_id, customer_id=customer_id, status=1
+                ).aggregate(first=Min('date'), last=Max('date'))
+                row.first_visit, row.last_visit = bounds['first'], bounds['last']
+            for day in delta.added_dates:
+                row.first_visit = min(row.first_visit or day, day)
+                row.last_visit = max(row.last_visit or day, day)
+            row.save()
+
+
+def refresh_pair(company_id, customer_id):
+    """Recompute one company/customer pair from its bookings"""
+    rebuild_company_customers(company_id=company_id, customer_id=customer_id)
+
+
+def rebuild_company_customers(company_id=None, customer_id=None, booking_model=Booking,
+                              link_model=CompanyCustomer) -> int:
+    """
+    Recompute CompanyCustomer rows from bookings with two grouped queries
+
+    Scoped to a company and/or customer when given, otherwise the whole
+    table. A company's rebuild holds a lock on its row, the one booking
+    deltas take, so no delta lands between reading and replacing its totals.
+    Models can be passed in so migrations can use historical ones.
+    """
+    bookings = booking_model.objects.all()
+    links = link_model.objects.all()
+    if company_id is not None:
+        bookings = bookings.filter(company_id=company_id)
+        links = links.filter(company_id=company_id)
+    if customer_id is not None:
+        bookings = bookings.filter(customer_id=customer_id)
+        links = links.filter(customer_id=customer_id)
+
+    with transaction.atomic():
+        if company_id is not None:
+            company_model = booking_model._meta.get_field('company').related_model
+            company_model.objects.select_for_update().filter(pk=company_id).first()
+        rows = _customer_rows(bookings, link_model)
+        links.delete()
+        link_model.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def _customer_rows(bookings, link_model) -> list:
+    confirmed = Q(status=1)
+    totals = bookings.order_by().values('company_id', 'customer_id').annotate(
+        bookings=Count('id'),
+        visits=Count('id', filter=confirmed),
+        first=Min('date', filter=confirmed),
+        last=Max('date', filter=confirmed),
+        spent=Sum(Coalesce('price', 'service__price'), filter=confirmed),
+    )
+    services = {}
+    for row in bookings.filter(confirmed).order_by().values('company_id', 'customer_id', 'service_id').annotate(n=Count('id')):
+        services.setdefault((row['company_id'], row['customer_id']), {})[str(row['service_id'])] = row['n']
+
+    return [
+        link_model(
+            company_id=row['company_id'],
+            customer_id=row['customer_id'],
+            booking_count=row['bookings'],
+            visit_count=row['visits'],
+            first_visit=row['first'],
+            last_visit=row['last'],
+            total_spent=row['spent'] or 0,
+            service_counts=services.get((row['company_id'], row['customer_id']), {}),
+        )
+        for row in totals
+    ]
+
+
+@receiver(post_init, sender=Booking)
+def remember_booking_state(sender, instance, **kwargs):
+    instance._aggregate_state = _state(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=Booking)
+def update_on_booking_save(sender, instance, created, **kwargs):
+    old_state = getattr(instance, '_aggregate_state', None)
+    new_state = _state(instance)
+    try:
+        if (not created and old_state is None) or new_state is None:
+            # Loaded with deferred fields: we don't know what it counted for
+            refresh_pair(instance.company_id, instance.customer_id)
+        else:
+            apply_booking_change(None if created else old_state, new_state)
+    except Exception as e:
+        logger.error(f"Could not update customer totals for booking {instance.pk}: {e}", exc_info=True)
+    instance._aggregate_state = new_state
+
+
+@receiver(post_delete, sender=Booking)
+def update_on_booking_delete(sender, instance, **kwargs):
+    old_state = getattr(instance, '_aggregate_state', None) or _state(instance)
+    try:
+        if old_state is None:
+            refresh_pair(instance.company_id, instance.customer_id)
+        else:
+            apply_booking_change(old_state, None)
+    except Exception as e:
+        logger.error(f"Could not update customer totals for booking {instance.pk}: {e}", exc_info=True)
@@ -10,6 +10,7 @@ from app.services import send_whatsapp_template
 from billing.utils import has_whatsapp_feature
 from bookings.models import Booking
 from companies.models import EmailLog
+from whatsapp_bot.delivery_status import status_callback_url
 
 
 def send_booking_reminders():
@@ -78,9 +79,37 @@ def send_booking_reminders():
                     '5': booking.start_time.strftime("%H:%M"),
                     '6': booking.staff.name,
                     '7': booking_link
-                }
+                },
+                status_callback=status_callback_url(booking.company_id, booking.id, 'reminder'),
             )
             print(f"WhatsApp API response: {res}")
         
         booking.reminder_sent = True
-        booking.save()
\ No newline at end of file
+        booking.save()
+
+def rebuild_booking_stats():
+    """
+    Recompute the daily booking rollup of every company.
+    This should be run nightly; booking writes keep it current during the day.
+    """
+    from bookings.daily_stats import rebuild_daily_stats
+
+    company_ids = Booking.objects.order_by().values_list('company_id', flat=True).distinct()
+    rows = sum(rebuild_daily_stats(company_id=company_id) for company_id in company_ids)
+    print(f"Rebuilt {rows} daily booking stats rows.")
+
+
+def rebuild_customer_totals():
+    """
+    Recompute the per-company customer totals (CompanyCustomer).
+    This should be run nightly; it repairs writes that bypassed Booking.save().
+    """
+    from bookings.company_customers import rebuild_company_customers
+
+    from bookings.models import CompanyCustomer
+
+    # One company at a time, each under its own lock; companies left with rows but no bookings are emptied
+    company_ids = set(Booking.objects.order_by().values_list('company_id', flat=True).distinct())
+    company_ids |= set(CompanyCustomer.objects.order_by().values_list('company_id', flat=True).distinct())
+    rows = sum(rebuild_company_customers(company_id=company_id) for company_id in sorted(company_ids))
+    print(f"Rebuilt {rows} company customer rows.")
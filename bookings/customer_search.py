@@ -0,0 +1,294 @@
+"""
+Customer autocomplete scoped to one company
+A company's customers are its CompanyCustomer rows (at least one booking there)
+
+On PostgreSQL with pg_trgm the search runs in the database on trigram
+indexes. Elsewhere each worker keeps a per-company in-memory index (name
+token prefixes and phone digit trigrams), loaded on first use and rebuilt
+when the company's shared cache version moves, which every write of a
+customer or booking of that company does.
+"""
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, defaultdict
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from companies.cache_versions import bump_version, get_version
+from .models import Booking, CompanyCustomer, Customer
+
+logger = logging.getLogger(__name__)
+
+# Name token prefixes longer than this are checked against the full name
+MAX_PREFIX = 8
+# Companies whose index is kept in memory per worker
+MAX_COMPANIES = 200
+# Rebuild at least this often even if no invalidation was seen
+MAX_INDEX_AGE = 300
+# Minimum pg_trgm similarity for a fuzzy name match
+MIN_SIMILARITY = 0.3
+# Most matches a paginated search list works with
+SEARCH_LIMIT = 1000
+# Name of the companies' shared cache version behind the in-memory index
+INDEX_VERSION = 'bookings.customer_search'
+
+
+def normalize_name(text: str) -> str:
+    """Lowercase, without accents and repeated spaces ('José  Pérez' -> 'jose perez')"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(stripped.lower().split())
+
+
+def phone_digits(text: str) -> str:
+    return re.sub(r'\D', '', text or '')
+
+
+def is_phone_query(query: str) -> bool:
+    """Digits with optional +, spaces, dashes or parentheses"""
+    return bool(re.fullmatch(r'[\d\s+()\-.]+', query)) and len(phone_digits(query)) >= 2
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _index_version(company_id):
+    """The company's list version, read from the database so all workers agree on it"""
+    return get_version(company_id, INDEX_VERSION)
+
+
+def _entry(customer: dict) -> dict:
+    return {
+        'id': customer['id'],
+        'name': customer['name'],
+        'phone': customer['phone'],
+        'email': customer['email'],
+    }
+
+
+class _CompanyIndex:
+    """Customers of one company with name prefix and phone trigram postings"""
+
+    def __init__(self, customers: list, version):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.customers = {}
+        self.names = {}
+        self.digits = {}
+        self.prefixes = defaultdict(set)
+        self.phone_grams = defaultdict(set)
+        for customer in customers:
+            customer_id = customer['id']
+            name = normalize_name(customer['name'])
+            digits = phone_digits(customer['phone_normalized'] or customer['phone'])
+            self.customers[customer_id] = _entry(customer)
+            self.names[customer_id] = name
+            self.digits[customer_id] = digits
+            for token in name.split():
+                for length in range(1, min(len(token), MAX_PREFIX) + 1):
+                    self.prefixes[token[:length]].add(customer_id)
+            for gram in _trigrams(digits):
+                self.phone_grams[gram].add(customer_id)
+
+    def match_name(self, query: str) -> list:
+        """Ids whose name tokens start with every query token; falls back to substring"""
+        tokens = normalize_name(query).split()
+        if not tokens:
+            return []
+        matches = None
+        for token in tokens:
+            ids = self.prefixes.get(token[:MAX_PREFIX], set())
+            matches = ids if matches is None else matches & ids
+            if not matches:
+                break
+        matches = [
+            customer_id for customer_id in (matches or ())
+            if all(any(word.startswith(token) for word in self.names[customer_id].split()) for token in tokens)
+        ]
+        if not matches:
+            # Mid-word search ('arcia' for 'Garcia'), as icontains did
+            needle = ' '.join(tokens)
+            matches = [customer_id for customer_id, name in self.names.items() if needle in name]
+        return matches
+
+    def match_phone(self, query: str) -> list:
+        digits = phone_digits(query)
+        if not digits:
+            return []
+        if len(digits) < 3:
+            candidates = self.digits
+        else:
+            candidates = None
+            for gram in _trigrams(digits):
+                ids = self.phone_grams.get(gram, set())
+                candidates = ids if candidates is None else candidates & ids
+                if not candidates:
+                    return []
+        return [customer_id for customer_id in candidates if digits in self.digits[customer_id]]
+
+
+class MemoryCustomerSearch:
+    """Per-company in-memory indexes, LRU-bounded, rebuilt when the company's version changes"""
+
+    def __init__(self, max_companies: int = MAX_COMPANIES):
+        self.max_companies = max_companies
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()
+
+    def _load(self, company_id) -> _CompanyIndex:
+        version = _index_version(company_id)
+        with self._lock:
+            index = self._indexes.get(company_id)
+            if index is not None and index.version == version and time.monotonic() - index.built_at < MAX_INDEX_AGE:
+                self._indexes.move_to_end(company_id)
+                return index
+
+        customers = Customer.objects.filter(company_links__company_id=company_id).values(
+            'id', 'name', 'phone', 'phone_normalized', 'email'
+        )
+        index = _CompanyIndex(list(customers), version)
+        with self._lock:
+            self._indexes[company_id] = index
+            self._indexes.move_to_end(company_id)
+            while len(self._indexes) > self.max_companies:
+                self._indexes.popitem(last=False)
+        logger.debug(f"Built customer index for company {company_id}: {len(index.customers)} customers")
+        return index
+
+    def search(self, company_id, query: str, limit: int = None, phone: bool = None) -> list:
+        index = self._load(company_id)
+        phone = is_phone_query(query) if phone is None else phone
+        ids = index.match_phone(query) if phone else index.match_name(query)
+        if phone:
+            ordered = sorted(ids, key=lambda customer_id: -customer_id)
+        else:
+            needle = normalize_name(query)
+            # Names starting with the query first, then the most recent customers
+            ordered = sorted(ids, key=lambda customer_id: (not index.names[customer_id].startswith(needle), -customer_id))
+        if limit:
+            ordered = ordered[:limit]
+        return [index.customers[customer_id] for customer_id in ordered]
+
+    def forget(self, company_id=None):
+        with self._lock:
+            if company_id is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(company_id, None)
+
+
+class PostgresCustomerSearch:
+    """Trigram search in PostgreSQL (pg_trgm GIN indexes on lower(name) and phone_normalized)"""
+
+    def search(self, company_id, query: str, limit: int = None, phone: bool = None) -> list:
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        customers = Customer.objects.filter(company_links__company_id=company_id)
+        phone = is_phone_query(query) if phone is None else phone
+        if phone:
+            customers = customers.filter(phone_normalized__contains=phone_digits(query)).order_by('-id')
+        else:
+            # No unaccent here: compare lowercase text like the lower(name) index
+            needle = ' '.join(query.lower().split())
+            customers = customers.annotate(
+                name_lower=Lower('name'),
+                similarity=TrigramSimilarity(Lower('name'), needle),
+            ).filter(Q(name_lower__contains=needle) | Q(similarity__gt=MIN_SIMILARITY))
+            customers = customers.order_by('-similarity', '-id')
+        if limit:
+            customers = customers[:limit]
+        return [_entry(customer) for customer in customers.values('id', 'name', 'phone', 'email')]
+
+    def forget(self, company_id=None):
+        pass
+
+
+def _has_pg_trgm() -> bool:
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+_backend = None
+
+
+def get_backend():
+    """pg_trgm when available (CUSTOMER_SEARCH_BACKEND = 'auto'), else the in-memory index"""
+    global _backend
+    if _backend is None:
+        choice = getattr(settings, 'CUSTOMER_SEARCH_BACKEND', 'auto')
+        use_postgres = choice == 'postgres' or (choice == 'auto' and _has_pg_trgm())
+        _backend = PostgresCustomerSearch() if use_postgres else MemoryCustomerSearch()
+    return _backend
+
+
+def search_customers(company, query: str, limit: int = None, phone: bool = None) -> list:
+    """
+    Customers of a company matching a name or phone fragment
+
+    Returns dicts with id, name, phone and email, best matches first.
+    `phone` forces phone (True) or name (False) matching; by default a
+    query made of digits is a phone search.
+    """
+    query = (query or '').strip()
+    if not query or company is None:
+        return []
+    company_id = getattr(company, 'id', company)
+    return get_backend().search(company_id, query, limit=limit, phone=phone)
+
+
+def invalidate_company(company_id):
+    """Drop the company's index here and, through its version row, in every other worker"""
+    get_backend().forget(company_id)
+    bump_version(company_id, INDEX_VERSION)
+
+
+def _link(booking):
+    """(company_id, customer_id) of a booking from loaded fields, None if deferred"""
+    loaded = booking.__dict__
+    if 'company_id' not in loaded or 'customer_id' not in loaded:
+        return None
+    return loaded['company_id'], loaded['customer_id']
+
+
+@receiver(post_init, sender=Booking)
+def remember_booking_link(sender, instance, **kwargs):
+    instance._search_link = _link(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=Booking)
+def invalidate_on_booking_save(sender, instance, created, **kwargs):
+    # Status and time changes don't change who the company's customers are
+    old_link = getattr(instance, '_search_link', None)
+    new_link = _link(instance)
+    if created or old_link is None or old_link != new_link:
+        for company_id in {link[0] for link in (old_link, new_link) if link and link[0]}:
+            invalidate_company(company_id)
+    instance._search_link = new_link
+
+
+@receiver(post_delete, sender=Booking)
+def invalidate_on_booking_delete(sender, instance, **kwargs):
+    if instance.company_id:
+        invalidate_company(instance.company_id)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def invalidate_on_customer(sender, instance, created=False, **kwargs):
+    if created:
+        # Not in any company until its first booking
+        return
+    company_ids = CompanyCustomer.objects.filter(customer_id=instance.pk).values_list('company_id', flat=True)
+    for company_id in company_ids:
+        invalidate_company(company_id)
@@ -0,0 +1,153 @@
+"""
+Daily booking rollup (BookingDailyStats)
+
+One row per company, day, service and staff member with the confirmed
+bookings of that day. A booking write recomputes the company-days it
+touched once its transaction commits; the nightly rebuild_booking_stats
+job recomputes the whole table, repairing writes that bypassed save()
+(queryset update(), raw SQL).
+"""
+import logging
+from datetime import date
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Booking, BookingDailyStats
+
+logger = logging.getLogger(__name__)
+
+
+def rebuild_daily_stats(company_id=None, day=None, booking_model=Booking, stats_model=BookingDailyStats) -> int:
+    """
+    Recompute rollup rows from confirmed bookings with two grouped queries
+
+    Scoped to a company and/or a day when given, otherwise the whole table.
+    A company's rebuilds hold a lock on its row, so two refreshes of the
+    same company-day run one after the other and the later one reads what
+    the earlier one committed. Models can be passed in so migrations can
+    use historical ones.
+    """
+    bookings = booking_model.objects.filter(status=1)
+    stats = stats_model.objects.all()
+    if company_id is not None:
+        bookings = bookings.filter(company_id=company_id)
+        stats = stats.filter(company_id=company_id)
+    if day is not None:
+        bookings = bookings.filter(date=day)
+        stats = stats.filter(date=day)
+
+    with transaction.atomic():
+        if company_id is not None:
+            company_model = booking_model._meta.get_field('company').related_model
+            company_model.objects.select_for_update().filter(pk=company_id).first()
+        rows = _rollup_rows(bookings, stats_model)
+        stats.delete()
+        stats_model.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def _rollup_rows(bookings, stats_model) -> list:
+    totals = bookings.order_by().values('company_id', 'date', 'service_id', 'staff_id').annotate(
+        count=Count('id'), revenue=Sum('price'), minutes=Sum('duration'),
+        customers=Count('customer_id', distinct=True),
+    )
+    return [
+        stats_model(
+            company_id=row['company_id'], date=row['date'],
+            service_id=row['service_id'], staff_id=row['staff_id'],
+            booking_count=row['count'], revenue=row['revenue'] or 0, minutes=row['minutes'] or 0,
+            unique_customers=row['customers'],
+        )
+        for row in totals
+    ]
+
+
+def _refresh_day(company_id, day):
+    try:
+        rebuild_daily_stats(company_id=company_id, day=day)
+    except Exception as e:
+        logger.error(f"Could not refresh booking stats of company {company_id} on {day}: {e}", exc_info=True)
+
+
+def _schedule_refresh(keys):
+    for company_id, day in {key for key in keys if key and None not in key}:
+        transaction.on_commit(lambda company_id=company_id, day=day: _refresh_day(company_id, day))
+
+
+def _day_key(booking):
+    loaded = booking.__dict__
+    if 'company_id' not in loaded or 'date' not in loaded:
+        return None
+    return loaded['company_id'], loaded['date']
+
+
+@receiver(post_init, sender=Booking)
+def remember_booking_day(sender, instance, **kwargs):
+    instance._stats_day = _day_key(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=Booking)
+def refresh_on_booking_save(sender, instance, **kwargs):
+    # A moved booking changes both its old and its new day
+    _schedule_refresh([getattr(instance, '_stats_day', None), (instance.company_id, instance.date)])
+    instance._stats_day = (instance.company_id, instance.date)
+
+
+@receiver(post_delete, sender=Booking)
+def refresh_on_booking_delete(sender, instance, **kwargs):
+    _schedule_refresh([getattr(instance, '_stats_day', None) or (instance.company_id, instance.date)])
+
+
+def _share(part, whole) -> float:
+    return round(part / whole * 100, 1) if whole else 0
+
+
+def company_booking_stats(company, start_date: date = None) -> dict:
+    """
+    Confirmed-booking analytics of a company since start_date (all history when None)
+
+    Totals per service, per staff member and per month are grouped sums of
+    the rollup. Unique customers over the range are not additive across
+    days, so they are counted distinct on the bookings themselves.
+    """
+    rows = BookingDailyStats.objects.filter(company=company).order_by()
+    bookings = Booking.objects.filter(company=company, status=1).order_by()
+    if start_date:
+        rows = rows.filter(date__gte=start_date)
+        bookings = bookings.filter(date__gte=start_date)
+
+    sums = {'booking_count': Sum('booking_count'), 'revenue': Sum('revenue'), 'minutes': Sum('minutes')}
+    total = rows.aggregate(**sums)
+    total_count = total['booking_count'] or 0
+    total_revenue = total['revenue'] or Decimal('0')
+
+    def breakdown(field):
+        customers = dict(
+            bookings.values(field).annotate(customers=Count('customer_id', distinct=True)).values_list(field, 'customers')
+        )
+        return {
+            row[field]: {
+                'booking_count': row['booking_count'],
+                'revenue': row['revenue'],
+                'minutes': row['minutes'],
+                'unique_customers': customers.get(row[field], 0),
+                'share': _share(row['booking_count'], total_count),
+                'revenue_share': _share(row['revenue'], total_revenue),
+            }
+            for row in rows.values(field).annotate(**sums)
+        }
+
+    months = rows.annotate(month=TruncMonth('date')).values('month').annotate(
+        count=Sum('booking_count'), revenue=Sum('revenue')
+    ).order_by('month')
+    return {
+        'booking_count': total_count,
+        'revenue': total_revenue,
+        'services': breakdown('service_id'),
+        'staff': breakdown('staff_id'),
+        'months': [{'month': row['month'], 'count': row['count'], 'revenue': row['revenue']} for row in months],
+    }
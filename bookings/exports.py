@@ -0,0 +1,22 @@
+"""
+Row builders for the bookings export
+"""
+from .models import Booking
+
+BOOKING_EXPORT_HEADER = [
+    'ID', 'Date', 'Start', 'End', 'Customer', 'Phone', 'Email', 'Service', 'Staff',
+    'Duration (min)', 'Price', 'Status', 'Created by', 'Created at', 'Notes',
+]
+
+_STATUS_LABELS = {str(value): label for value, label in Booking.STATUS}
+
+
+def booking_export_rows(bookings, chunk_size: int):
+    """One list per booking, read with a chunked iterator (bookings needs customer, service and staff selected)"""
+    for booking in bookings.iterator(chunk_size=chunk_size):
+        yield [
+            booking.id, booking.date, booking.start_time, booking.end_time,
+            booking.customer.name, booking.booking_phone or booking.customer.phone, booking.customer.email,
+            booking.service.name, booking.staff.name, booking.duration, booking.price,
+            _STATUS_LABELS.get(str(booking.status), booking.status), booking.created_by, booking.created_at, booking.notes,
+        ]
@@ -124,24 +124,8 @@ class BookingForm(forms.ModelForm):
             total_duration = service.duration + service.time_for_servicing
             end_datetime = start_datetime + timedelta(minutes=total_duration)
             
-            # Make timezone-aware if needed
-            check_start = start_datetime
-            check_end = end_datetime
-            
-            if StaffOutOfOffice.objects.filter(staff=staff).exists():
-                first_period = StaffOutOfOffice.objects.filter(staff=staff).first()
-                if timezone.is_aware(first_period.start_datetime):
-                    if timezone.is_naive(check_start):
-                        check_start = timezone.make_aware(check_start)
-                    if timezone.is_naive(check_end):
-                        check_end = timezone.make_aware(check_end)
-            
             # Check if booking overlaps with any out-of-office period
-            conflicting_periods = StaffOutOfOffice.objects.filter(
-                staff=staff,
-                start_datetime__lt=check_end,
-                end_datetime__gt=check_start
-            )
+            conflicting_periods = StaffOutOfOffice.objects.filter(staff=staff).overlapping(start_datetime, end_datetime)
             
             if conflicting_periods.exists():
                 period = conflicting_periods.first()
@@ -168,10 +152,8 @@ class BookingForm(forms.ModelForm):
             pass
         else:
             # New booking - find or create customer
-            # Use filter().first() to handle potential duplicates gracefully
-            customer = Customer.objects.filter(
-                phone=self.cleaned_data['customer_phone']
-            ).first()
+            # Matches any spelling of the number; the oldest customer wins on duplicates
+            customer = Customer.find_by_phone(self.cleaned_data['customer_phone'])
             
             if customer:
                 # Update existing customer info
@@ -266,24 +248,8 @@ class BookingForm(forms.ModelForm):
             # Check if staff is out of office during this booking time
             from companies.models import StaffOutOfOffice
             
-            # Make timezone-aware if needed for comparison
-            check_start = start_datetime
-            check_end = end_datetime
-            
-            if StaffOutOfOffice.objects.filter(staff=staff).exists():
-                first_period = StaffOutOfOffice.objects.filter(staff=staff).first()
-                if timezone.is_aware(first_period.start_datetime):
-                    if timezone.is_naive(check_start):
-                        check_start = timezone.make_aware(check_start)
-                    if timezone.is_naive(check_end):
-                        check_end = timezone.make_aware(check_end)
-            
             # Skip if booking would overlap with any out-of-office period
-            overlapping_periods = StaffOutOfOffice.objects.filter(
-                staff=staff,
-                start_datetime__lt=check_end,
-                end_datetime__gt=check_start
-            )
+            overlapping_periods = StaffOutOfOffice.objects.filter(staff=staff).overlapping(start_datetime, end_datetime)
             
             if overlapping_periods.exists():
                 continue  # Skip this staff member
@@ -305,21 +271,10 @@ class BookingForm(forms.ModelForm):
                 continue
             
             # Check if staff has any conflicting bookings
-            conflicting = Booking.objects.filter(
+            has_conflict = Booking.objects.filter(
                 staff=staff,
-                date=date,
                 status__in=[0, 1]  # Pending or Confirmed
-            ).exclude(pk=self.instance.pk if self.instance.pk else None)
-            
-            has_conflict = False
-            for booking in conflicting:
-                booking_start = datetime.combine(date, booking.start_time)
-                booking_end = datetime.combine(date, booking.end_time)
-                
-                # Check for overlap
-                if start_datetime < booking_end and end_datetime > booking_start:
-                    has_conflict = True
-                    break
+            ).exclude(pk=self.instance.pk if self.instance.pk else None).overlapping(start_datetime, end_datetime).exists()
             
             if not has_conflict:
                 available_staff.append(staff)
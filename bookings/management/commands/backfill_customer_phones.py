@@ -0,0 +1,22 @@
+"""
+Management command to fill the normalized phone column of customers
+"""
+from django.core.management.base import BaseCommand
+from bookings.models import Customer
+from bookings.utils import backfill_normalized_phones
+
+
+class Command(BaseCommand):
+    help = 'Fill Customer.phone_normalized in chunks (needed after imports or raw updates of phone)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Customers read and updated per query',
+        )
+
+    def handle(self, *args, **options):
+        updated = backfill_normalized_phones(Customer, chunk_size=options['chunk_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Updated normalized phone for {updated} customers"))
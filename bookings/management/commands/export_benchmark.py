@@ -0,0 +1,108 @@
+"""
+Management command to check that the bookings export streams in flat memory
+"""
+import time
+import tracemalloc
+from datetime import date, time as dtime, timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import reset_queries, transaction
+from bookings.exports import BOOKING_EXPORT_HEADER, booking_export_rows
+from bookings.models import Booking, Customer, booking_time_range
+from companies.models import Company, Service, Staff
+from app.exports import CHUNK_SIZE, csv_stream, xlsx_stream
+from app.pagination import BOOKING_ORDERING
+
+BENCHMARK_USERNAME = 'export-benchmark'
+
+
+class Command(BaseCommand):
+    help = 'Stream synthetic bookings through the export and report memory use (data is rolled back unless --keep)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Number of bookings to generate')
+        parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv', help='Export format to benchmark')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated company and bookings')
+
+    def handle(self, *args, **options):
+        rows, file_format = options['rows'], options['format']
+        # Everything happens in one transaction, rolled back unless --keep
+        with transaction.atomic():
+            company = self.create_fixture(rows)
+            self.run_export(company, rows, file_format)
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+    def create_fixture(self, rows: int) -> Company:
+        admin, _created = User.objects.get_or_create(username=BENCHMARK_USERNAME)
+        company = Company.objects.filter(administrator=admin).first() or Company.objects.create(
+            administrator=admin, name='Export Benchmark', address='-', city='-'
+        )
+        existing = Booking.objects.filter(company=company).count()
+        if existing >= rows:
+            return company
+
+        self.stdout.write(f"Generating {rows - existing} bookings...")
+        services = [
+            Service.objects.get_or_create(company=company, name=f"Service {idx}", defaults={'duration': 30, 'price': 20})[0]
+            for idx in range(10)
+        ]
+        staff = [Staff.objects.get_or_create(company=company, name=f"Staff {idx}")[0] for idx in range(10)]
+        customers = list(Customer.objects.filter(email__endswith='@export-benchmark.test')) or Customer.objects.bulk_create([
+            Customer(name=f"Customer {idx}", phone=f"+34 600 {idx:06d}", email=f"customer{idx}@export-benchmark.test")
+            for idx in range(5000)
+        ], batch_size=1000)
+
+        first_day = date.today() - timedelta(days=3 * 365)
+        for start in range(existing, rows, 10000):
+            batch = [
+                Booking(
+                    company=company, staff=staff[idx % 10], service=services[idx % 10],
+                    customer=customers[idx % len(customers)], date=first_day + timedelta(days=idx % 1095),
+                    start_time=dtime(9 + idx % 10, 0), end_time=dtime(9 + idx % 10, 30),
+                    duration=30, price=20, status=1, created_by='staff', notes=f"Booking {idx}",
+                )
+                for idx in range(start, min(start + 10000, rows))
+            ]
+            for booking in batch:
+                # bulk_create skips save(), which fills the range overlap queries read
+                booking.start_at, booking.end_at = booking_time_range(
+                    booking.date, booking.start_time, booking.end_time, booking.duration
+                )
+            Booking.objects.bulk_create(batch)
+            reset_queries()
+        return company
+
+    def run_export(self, company, rows: int, file_format: str):
+        bookings = Booking.objects.filter(company=company).select_related('customer', 'staff', 'service').order_by(*BOOKING_ORDERING)
+        stream = csv_stream if file_format == 'csv' else xlsx_stream
+        checkpoint = max(rows // 10, 1)
+        counted = 0
+
+        def counting_rows():
+            nonlocal counted
+            for row in booking_export_rows(bookings, CHUNK_SIZE):
+                counted += 1
+                if counted % checkpoint == 0:
+                    current, peak = tracemalloc.get_traced_memory()
+                    self.stdout.write(
+                        f"{counted:>10} rows  {time.monotonic() - started:7.1f}s  "
+                        f"current {current / 2**20:6.1f} MiB  peak {peak / 2**20:6.1f} MiB"
+                    )
+                yield row
+
+        self.stdout.write(f"Streaming {file_format.upper()} export...")
+        size = 0
+        tracemalloc.start()
+        started = time.monotonic()
+        try:
+            for chunk in stream(BOOKING_EXPORT_HEADER, counting_rows()):
+                size += len(chunk)
+            _current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {counted} rows ({size / 2**20:.1f} MiB) in {elapsed:.1f}s, "
+            f"{counted / elapsed if elapsed else 0:.0f} rows/s, peak traced memory {peak / 2**20:.1f} MiB"
+        ))
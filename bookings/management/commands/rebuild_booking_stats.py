@@ -0,0 +1,20 @@
+"""
+Management command to recompute the daily booking rollup used by analytics
+"""
+from django.core.management.base import BaseCommand
+from bookings.daily_stats import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute BookingDailyStats rows from bookings (after bulk imports or raw updates)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--company-id',
+            type=int,
+            help='Only rebuild the stats of this company',
+        )
+
+    def handle(self, *args, **options):
+        rows = rebuild_daily_stats(company_id=options['company_id'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} daily booking stats rows"))
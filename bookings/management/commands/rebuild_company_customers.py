@@ -0,0 +1,20 @@
+"""
+Management command to recompute the per-company customer totals
+"""
+from django.core.management.base import BaseCommand
+from bookings.company_customers import rebuild_company_customers
+
+
+class Command(BaseCommand):
+    help = 'Recompute CompanyCustomer rows from bookings (after bulk imports or raw updates)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--company-id',
+            type=int,
+            help='Only rebuild the customers of this company',
+        )
+
+    def handle(self, *args, **options):
+        rows = rebuild_company_customers(company_id=options['company_id'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} company customer rows"))
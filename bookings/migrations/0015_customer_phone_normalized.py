@@ -0,0 +1,27 @@
+# Generated by Django 4.2.17 on 2026-10-19 05:41
+
+from django.db import migrations, models
+
+
+def fill_phone_normalized(apps, schema_editor):
+    """Small tables are filled here; large ones can use the backfill_customer_phones command"""
+    from bookings.utils import backfill_normalized_phones
+
+    Customer = apps.get_model('bookings', 'Customer')
+    backfill_normalized_phones(Customer)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0014_booking_created_by'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='phone_normalized',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=50),
+        ),
+        migrations.RunPython(fill_phone_normalized, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+from django.db import DatabaseError, migrations, transaction
+
+
+def _ensure_pg_trgm(connection) -> bool:
+    """Whether pg_trgm is installed, installing it when the role is allowed to"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        if cursor.fetchone() is not None:
+            return True
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DatabaseError:
+        # Not a superuser or the database owner: search falls back to the in-memory index
+        return False
+    return True
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """pg_trgm indexes for customer autocomplete; other databases use the in-memory index"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    if not _ensure_pg_trgm(schema_editor.connection):
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS bookings_customer_name_trgm "
+        "ON bookings_customer USING gin (lower(name) gin_trgm_ops)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS bookings_customer_phone_trgm "
+        "ON bookings_customer USING gin (phone_normalized gin_trgm_ops)"
+    )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS bookings_customer_name_trgm")
+    schema_editor.execute("DROP INDEX IF EXISTS bookings_customer_phone_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0015_customer_phone_normalized'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.17 on 2026-10-19 05:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_company_customers(apps, schema_editor):
+    from bookings.company_customers import rebuild_company_customers
+
+    rebuild_company_customers(
+        booking_model=apps.get_model('bookings', 'Booking'),
+        link_model=apps.get_model('bookings', 'CompanyCustomer'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0022_add_staff_out_of_office_table'),
+        ('bookings', '0016_customer_search_trgm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanyCustomer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('booking_count', models.PositiveIntegerField(default=0)),
+                ('visit_count', models.PositiveIntegerField(default=0)),
+                ('first_visit', models.DateField(blank=True, null=True)),
+                ('last_visit', models.DateField(blank=True, null=True)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('service_counts', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='customer_links', to='companies.company')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='company_links', to='bookings.customer')),
+            ],
+            options={
+                'unique_together': {('company', 'customer')},
+            },
+        ),
+        migrations.RunPython(fill_company_customers, migrations.RunPython.noop),
+    ]
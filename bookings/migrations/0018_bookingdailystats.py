@@ -0,0 +1,43 @@
+# Generated by Django 4.2.17 on 2026-10-19 05:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_daily_stats(apps, schema_editor):
+    from bookings.daily_stats import rebuild_daily_stats
+
+    rebuild_daily_stats(
+        booking_model=apps.get_model('bookings', 'Booking'),
+        stats_model=apps.get_model('bookings', 'BookingDailyStats'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0022_add_staff_out_of_office_table'),
+        ('bookings', '0017_companycustomer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('booking_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('minutes', models.PositiveIntegerField(default=0)),
+                ('unique_customers', models.PositiveIntegerField(default=0)),
+                ('customer_ids', models.JSONField(blank=True, default=list)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='companies.company')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='companies.service')),
+                ('staff', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='companies.staff')),
+            ],
+            options={
+                'unique_together': {('company', 'date', 'service', 'staff')},
+            },
+        ),
+        migrations.RunPython(fill_daily_stats, migrations.RunPython.noop),
+    ]
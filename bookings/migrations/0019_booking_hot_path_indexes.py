@@ -0,0 +1,29 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0018_bookingdailystats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['staff', 'date', 'status'], name='bookings_bo_staff_i_8123b9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['company', 'date', 'status'], name='bookings_bo_company_610f4f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['date', 'reminder_sent', 'status'], name='bookings_bo_date_eabbaa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['customer', 'company'], name='bookings_bo_custome_4120d5_idx'),
+        ),
+    ]
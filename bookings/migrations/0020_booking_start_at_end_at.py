@@ -0,0 +1,76 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:10
+
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+GIST_INDEX = 'bookings_booking_staff_range_gist'
+
+
+def _local(day, at):
+    # Frozen copy of app.ranges.local_datetime; later edits there must not change this migration
+    value = datetime.combine(day, at)
+    return timezone.make_aware(value) if settings.USE_TZ else value
+
+
+def fill_time_ranges(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    bookings = Booking.objects.filter(start_at__isnull=True).select_related('service').order_by('id')
+    batch = []
+    for booking in bookings.iterator(chunk_size=2000):
+        if not booking.date or not booking.start_time:
+            continue
+        start_at = _local(booking.date, booking.start_time)
+        if booking.end_time:
+            end_at = _local(booking.date, booking.end_time)
+        else:
+            end_at = start_at + timedelta(minutes=booking.duration or booking.service.duration or 0)
+        booking.start_at, booking.end_at = start_at, max(start_at, end_at)
+        batch.append(booking)
+        if len(batch) >= 2000:
+            Booking.objects.bulk_update(batch, ['start_at', 'end_at'])
+            batch = []
+    Booking.objects.bulk_update(batch, ['start_at', 'end_at'])
+
+
+def create_gist_index(apps, schema_editor):
+    # btree_gist lets staff_id share the GiST index with the range; PostgreSQL only
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {GIST_INDEX} ON bookings_booking "
+        f"USING gist (staff_id, tstzrange(start_at, end_at, '[)'))"
+    )
+
+
+def drop_gist_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f"DROP INDEX IF EXISTS {GIST_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0019_booking_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='end_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='start_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['staff', 'start_at', 'end_at'], name='bookings_bo_staff_i_dd0a12_idx'),
+        ),
+        migrations.RunPython(fill_time_ranges, migrations.RunPython.noop),
+        migrations.RunPython(create_gist_index, drop_gist_index),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0024_staffoutofoffice_range_gist'),
+        ('bookings', '0020_booking_start_at_end_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerIndexVersion',
+            fields=[
+                ('company', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='companies.company')),
+                ('version', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:47
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0025_companycacheversion'),
+        ('bookings', '0021_customerindexversion'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='CustomerIndexVersion',
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:51
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0022_delete_customerindexversion'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='bookingdailystats',
+            name='customer_ids',
+        ),
+    ]
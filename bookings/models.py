@@ -1,6 +1,9 @@
-from django.db import models
+from datetime import timedelta
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from app.constants import COUNTRY_CHOICES
+from app.ranges import TimeRangeQuerySet, local_datetime
+from bookings.utils import normalize_phone_number
 from companies.models import Company, Staff, Service
 
 
@@ -22,9 +25,26 @@ class Customer(models.Model):
     name = models.CharField(max_length=255)
     country_code = models.CharField(max_length=10, blank=True, null=True, choices=COUNTRY_CHOICES)
     phone = models.CharField(max_length=50)
+    # E.164 form of phone, kept in sync on save; all lookups by phone go through it
+    phone_normalized = models.CharField(max_length=50, blank=True, default='', db_index=True, editable=False)
     email = models.EmailField(blank=True, null=True)
     preferred_language = models.CharField(max_length=5, blank=True, null=True, choices=LANGUAGE_CHOICES, help_text="Customer's preferred language for communications")
 
+    def save(self, *args, **kwargs):
+        self.phone_normalized = normalize_phone_number(self.phone) or ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'phone_normalized'}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def find_by_phone(cls, phone):
+        """Oldest customer with this phone number, whatever its spelling (whatsapp:, spaces, dashes)"""
+        normalized = normalize_phone_number(phone)
+        if not normalized:
+            return None
+        return cls.objects.filter(phone_normalized=normalized).order_by('id').first()
+
     def total_bookings(self):
         return Booking.objects.filter(customer=self, status=1).count()
 
@@ -32,6 +52,24 @@ class Customer(models.Model):
         return self.name
 
 
+# Fields start_at/end_at are derived from
+RANGE_SOURCE_FIELDS = {'date', 'start_time', 'end_time', 'duration', 'service'}
+
+
+def booking_time_range(day, start_time, end_time, minutes) -> tuple:
+    """
+    (start_at, end_at) of a booking
+
+    end_time when set, otherwise start plus `minutes` (the booking's or its
+    service's duration); never before the start.
+    """
+    if not day or not start_time:
+        return None, None
+    start_at = local_datetime(day, start_time)
+    end_at = local_datetime(day, end_time) if end_time else start_at + timedelta(minutes=minutes or 0)
+    return start_at, max(start_at, end_at)
+
+
 class Booking(models.Model):
     STATUS = [
         (0, "Pending"),
@@ -61,6 +99,39 @@ class Booking(models.Model):
     # Store phone at time of booking to avoid issues when customer phone changes
     booking_phone = models.CharField(max_length=50, blank=True, null=True, help_text="Phone number used when booking was created")
     booking_country_code = models.CharField(max_length=10, blank=True, null=True, choices=COUNTRY_CHOICES, help_text="Country code at time of booking")
+    # [start_at, end_at): date and times as aware timestamps, kept in sync on save; overlap queries use them
+    start_at = models.DateTimeField(blank=True, null=True, editable=False)
+    end_at = models.DateTimeField(blank=True, null=True, editable=False)
+
+    objects = TimeRangeQuerySet.as_manager()
+
+    class Meta:
+        # Hot paths, kept honest by the query_plan_audit command
+        indexes = [
+            models.Index(fields=['staff', 'start_at', 'end_at']),  # Overlaps (GiST range index on PostgreSQL)
+            models.Index(fields=['staff', 'date', 'status']),  # Free slots
+            models.Index(fields=['company', 'date', 'status']),  # Calendar, bookings list, analytics
+            models.Index(fields=['date', 'reminder_sent', 'status']),  # Reminder job
+            models.Index(fields=['customer', 'company']),  # Customer history
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or RANGE_SOURCE_FIELDS & set(update_fields):
+            minutes = self.duration
+            if not minutes and not self.end_time and self.service_id:
+                minutes = self.service.duration
+            self.start_at, self.end_at = booking_time_range(
+                self._meta.get_field('date').to_python(self.date),
+                self._meta.get_field('start_time').to_python(self.start_time),
+                self._meta.get_field('end_time').to_python(self.end_time),
+                minutes,
+            )
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'start_at', 'end_at'}
+        # post_save handlers (running customer totals) commit together with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def get_phone_for_notifications(self):
         """Get the phone number to use for notifications (booking_phone or fallback to customer.phone)
@@ -76,3 +147,53 @@ class Booking(models.Model):
 
     def __str__(self):
         return f"{self.customer.name} → {self.service.name} ({self.date})"
+
+
+class CompanyCustomer(models.Model):
+    """
+    A customer of a company (at least one booking there) with running totals
+
+    Kept up to date by bookings.company_customers on every booking write;
+    rebuild_company_customers recomputes it from the bookings table.
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='customer_links')
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='company_links')
+    booking_count = models.PositiveIntegerField(default=0)  # Any status
+    visit_count = models.PositiveIntegerField(default=0)  # Confirmed bookings
+    first_visit = models.DateField(blank=True, null=True)
+    last_visit = models.DateField(blank=True, null=True)
+    total_spent = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Confirmed bookings per service: {"<service_id>": count}
+    service_counts = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['company', 'customer']
+
+    def __str__(self):
+        return f"{self.customer_id} @ {self.company_id}: {self.visit_count} visits"
+
+
+class BookingDailyStats(models.Model):
+    """
+    Confirmed bookings of one company, day, service and staff member
+
+    Maintained by bookings.daily_stats (on booking writes and nightly by the
+    rebuild_booking_stats job); analytics read it instead of the bookings.
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    service = models.ForeignKey(Service, on_delete=models.CASCADE)
+    staff = models.ForeignKey(Staff, on_delete=models.CASCADE)
+    booking_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    minutes = models.PositiveIntegerField(default=0)
+    unique_customers = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Its index also serves the (company, date range) reads
+        unique_together = ['company', 'date', 'service', 'staff']
+
+    def __str__(self):
+        return f"{self.company_id} {self.date} service {self.service_id} staff {self.staff_id}: {self.booking_count}"
+
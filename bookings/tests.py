@@ -1,3 +1,472 @@
-from django.test import TestCase
+import csv
+import io
+import zipfile
+from datetime import date, datetime, time, timedelta
+from xml.etree import ElementTree
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
+from app.pagination import BOOKING_ORDERING, USER_ORDERING, encode_cursor, keyset_page, paginate
+from companies.models import Company, Service, Staff
+from .company_customers import rebuild_company_customers
+from .customer_search import get_backend, search_customers
+from .daily_stats import company_booking_stats, rebuild_daily_stats
+from .models import Booking, BookingDailyStats, CompanyCustomer, Customer
+from .utils import backfill_normalized_phones
+
+
+class CustomerPhoneLookupTest(TestCase):
+    """Test lookups through the normalized phone column"""
+
+    def test_find_by_phone_matches_any_spelling(self):
+        customer = Customer.objects.create(name='Ana', phone='+34 612-345-678')
+        self.assertEqual(customer.phone_normalized, '+34612345678')
+
+        for spelling in ['whatsapp:+34612345678', '+34612345678', '0034 612 345 678']:
+            with self.assertNumQueries(1):
+                self.assertEqual(Customer.find_by_phone(spelling), customer)
+        self.assertIsNone(Customer.find_by_phone(''))
+
+    def test_backfill_fills_stale_rows(self):
+        customer = Customer.objects.create(name='Olga', phone='+34 600 000 001')
+        Customer.objects.filter(pk=customer.pk).update(phone='+34 600 000 002', phone_normalized='')
+
+        self.assertEqual(backfill_normalized_phones(Customer, chunk_size=1), 1)
+        self.assertEqual(Customer.find_by_phone('+34600000002'), customer)
+        self.assertEqual(backfill_normalized_phones(Customer), 0)
+
+
+class CustomerSearchTest(TestCase):
+    """Test the per-company customer autocomplete index"""
+
+    def setUp(self):
+        cache.clear()
+        get_backend().forget()
+        self.salons = []
+        for name in ['Salon A', 'Salon B']:
+            user = User.objects.create_user(name, f'{name[-1]}@test.com', 'pass')
+            company = Company.objects.create(administrator=user, name=name, address='Calle 1', city='Madrid')
+            staff = Staff.objects.create(company=company, name='Maria')
+            service = Service.objects.create(company=company, name='Corte', duration=30, price=10)
+            self.salons.append((company, staff, service))
+
+    def book(self, salon, customer):
+        company, staff, service = salon
+        return Booking.objects.create(
+            company=company, staff=staff, service=service, customer=customer,
+            date=date(2026, 1, 5), start_time=time(10, 0), status=1
+        )
+
+    def test_search_is_scoped_to_the_company(self):
+        jose = Customer.objects.create(name='José Pérez', phone='+34 612 345 678')
+        other = Customer.objects.create(name='Josefa Ruiz', phone='+34 699 000 111')
+        self.book(self.salons[0], jose)
+        self.book(self.salons[1], other)
+        company = self.salons[0][0]
+
+        self.assertEqual([c['id'] for c in search_customers(company, 'jose')], [jose.id])
+        self.assertEqual([c['id'] for c in search_customers(company, 'PEREZ jo')], [jose.id])
+        self.assertEqual([c['id'] for c in search_customers(company, '612 34')], [jose.id])
+        self.assertEqual(search_customers(company, '699'), [])
+        # Warm index: only the version row is read
+        with self.assertNumQueries(1):
+            search_customers(company, 'jos')
+
+    def test_index_follows_bookings_and_customer_edits(self):
+        company = self.salons[0][0]
+        self.assertEqual(search_customers(company, 'lucia'), [])
+
+        lucia = Customer.objects.create(name='Lucia', phone='+34 600 000 003')
+        self.book(self.salons[0], lucia)
+        self.assertEqual([c['name'] for c in search_customers(company, 'lucia')], ['Lucia'])
+
+        lucia.name = 'Lucia Gomez'
+        lucia.save()
+        self.assertEqual([c['name'] for c in search_customers(company, 'gom')], ['Lucia Gomez'])
+
+    def test_moving_a_booking_reaches_other_workers(self):
+        from .customer_search import MemoryCustomerSearch
+
+        company = self.salons[0][0]
+        ana = Customer.objects.create(name='Ana', phone='+34 600 000 004')
+        bea = Customer.objects.create(name='Bea', phone='+34 600 000 005')
+        booking = self.book(self.salons[0], ana)
+        other_worker = MemoryCustomerSearch()
+        self.assertEqual([c['name'] for c in other_worker.search(company.id, 'bea')], [])
+
+        # The edit form saves the whole booking, without update_fields
+        booking = Booking.objects.get(pk=booking.pk)
+        booking.customer = bea
+        booking.save()
+        self.assertEqual([c['name'] for c in other_worker.search(company.id, 'bea')], ['Bea'])
+        self.assertEqual(other_worker.search(company.id, 'ana'), [])
+
+    def test_company_with_bookings_can_be_deleted(self):
+        company = self.salons[0][0]
+        self.book(self.salons[0], Customer.objects.create(name='Ana', phone='+34 600 000 006'))
+        search_customers(company, 'ana')
+
+        # Deleting the bookings bumps the search version while the company goes away
+        company.delete()
+        connection.check_constraints()
+        self.assertFalse(Company.objects.filter(pk=company.pk).exists())
+
+
+class CompanyCustomerTotalsTest(TestCase):
+    """Test the running per-company customer totals"""
+
+    def setUp(self):
+        user = User.objects.create_user('owner', 'owner@test.com', 'pass')
+        self.company = Company.objects.create(administrator=user, name='Salon', address='Calle 1', city='Madrid')
+        self.staff = Staff.objects.create(company=self.company, name='Maria')
+        self.cut = Service.objects.create(company=self.company, name='Corte', duration=30, price=10)
+        self.nails = Service.objects.create(company=self.company, name='Manicura', duration=45, price=20)
+        self.customer = Customer.objects.create(name='Ana', phone='+34 600 000 001')
+
+    def book(self, service, day, status=1, price=None):
+        return Booking.objects.create(
+            company=self.company, staff=self.staff, service=service, customer=self.customer,
+            date=date(2026, 1, day), start_time=time(10, 0), status=status, price=price
+        )
+
+    def totals(self):
+        row = CompanyCustomer.objects.get(company=self.company, customer=self.customer)
+        return (row.booking_count, row.visit_count, row.first_visit, row.last_visit,
+                row.total_spent, row.service_counts)
+
+    def test_totals_follow_booking_changes(self):
+        first = self.book(self.cut, 5)
+        self.book(self.nails, 9, price=25)
+        pending = self.book(self.cut, 12, status=0)
+        self.assertEqual(self.totals(), (3, 2, date(2026, 1, 5), date(2026, 1, 9), 35,
+                                         {str(self.cut.id): 1, str(self.nails.id): 1}))
+
+        pending.status = 1
+        pending.save()
+        self.assertEqual(self.totals(), (3, 3, date(2026, 1, 5), date(2026, 1, 12), 45,
+                                         {str(self.cut.id): 2, str(self.nails.id): 1}))
+
+        first.delete()
+        self.assertEqual(self.totals(), (2, 2, date(2026, 1, 9), date(2026, 1, 12), 35,
+                                         {str(self.cut.id): 1, str(self.nails.id): 1}))
+
+        Booking.objects.get(id=pending.id).delete()
+        Booking.objects.filter(customer=self.customer).get().delete()
+        self.assertFalse(CompanyCustomer.objects.exists())
+
+    def test_concurrent_first_bookings_of_a_pair(self):
+        from unittest import mock
+        from django.db.models import QuerySet
+
+        self.book(self.cut, 5)
+        real_first = QuerySet.first
+
+        def missed_by_the_lookup(queryset):
+            # The other request's insert landed after our lookup found nothing
+            return None if queryset.model is CompanyCustomer else real_first(queryset)
+
+        with mock.patch.object(QuerySet, 'first', missed_by_the_lookup):
+            self.book(self.nails, 9)
+        self.assertEqual(self.totals()[:2], (2, 2))
+
+    def test_rebuild_matches_running_totals(self):
+        self.book(self.cut, 5)
+        self.book(self.nails, 9, price=25)
+        self.book(self.cut, 12, status=0)
+        expected = self.totals()
+
+        # Writes through update() skip the signals until a rebuild
+        Booking.objects.filter(date=date(2026, 1, 12)).update(status=1)
+        self.assertEqual(rebuild_company_customers(company_id=self.company.id), 1)
+        self.assertEqual(self.totals()[:2], (3, 3))
+        Booking.objects.filter(date=date(2026, 1, 12)).update(status=0)
+        rebuild_company_customers()
+        self.assertEqual(self.totals(), expected)
+
+    def test_deltas_and_rebuilds_lock_the_company_first(self):
+        def first_read(queries, table):
+            return next(i for i, query in enumerate(queries) if f'FROM "{table}"' in query['sql'])
+
+        # A booking's delta: the company row before its totals row
+        with CaptureQueriesContext(connection) as queries:
+            self.book(self.cut, 5)
+        self.assertLess(first_read(queries, 'companies_company'), first_read(queries, 'bookings_companycustomer'))
+        # A rebuild: the company row before reading the bookings
+        with CaptureQueriesContext(connection) as queries:
+            rebuild_company_customers(company_id=self.company.id)
+        self.assertLess(first_read(queries, 'companies_company'), first_read(queries, 'bookings_booking'))
+
+
+class KeysetPaginationTest(TestCase):
+    """Test cursor pagination over bookings and in-memory lists"""
+
+    def setUp(self):
+        user = User.objects.create_user('owner', 'owner@test.com', 'pass')
+        company = Company.objects.create(administrator=user, name='Salon', address='Calle 1', city='Madrid')
+        staff = Staff.objects.create(company=company, name='Maria')
+        service = Service.objects.create(company=company, name='Corte', duration=30, price=10)
+        customer = Customer.objects.create(name='Ana', phone='+34 600 000 001')
+        # Ties on date and time so the id tie-breaker matters
+        for day in (5, 5, 6, 7, 7, 7, 8):
+            Booking.objects.create(
+                company=company, staff=staff, service=service, customer=customer,
+                date=date(2026, 1, day), start_time=time(10, 0), status=1
+            )
+        self.bookings = Booking.objects.all()
+        self.expected = list(self.bookings.order_by(*BOOKING_ORDERING).values_list('id', flat=True))
+
+    def test_walks_forward_and_back_without_gaps(self):
+        seen, pages, cursor = [], [], None
+        while True:
+            page = keyset_page(self.bookings, BOOKING_ORDERING, 3, after=cursor)
+            pages.append(page)
+            seen += [booking.id for booking in page]
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(pages), 3)
+
+        back = keyset_page(self.bookings, BOOKING_ORDERING, 3, before=pages[2].previous_cursor)
+        self.assertEqual([booking.id for booking in back], [booking.id for booking in pages[1]])
+        self.assertTrue(back.has_previous and back.has_next)
+
+    def test_count_links_and_lists(self):
+        request = RequestFactory().get('/bookings/', {'status': 'confirmed', 'page': '4'})
+        page = paginate(request, self.bookings, BOOKING_ORDERING, 5, with_count=True)
+        self.assertEqual((page.count, page.count_is_exact, page.count_label), (7, True, '7'))
+        self.assertEqual(page.first_url, '?status=confirmed')
+        self.assertIn('status=confirmed', page.next_url)
+        self.assertIsNone(page.previous_url)
+
+        rows = [{'id': n, 'name': name} for n, name in enumerate(['Ana', 'Ana', 'Bea', 'Carla'], 1)]
+        first = keyset_page(rows, ['name', 'id'], 2)
+        second = keyset_page(rows, ['name', 'id'], 2, after=first.next_cursor)
+        self.assertEqual([row['id'] for row in second], [3, 4])
+        self.assertFalse(second.has_next)
+        # A tampered cursor falls back to the first page
+        self.assertEqual([row['id'] for row in keyset_page(rows, ['name', 'id'], 2, after='garbage')], [1, 2])
+
+    def test_datetime_keys_keep_microseconds(self):
+        joined = timezone.now().replace(microsecond=123000)
+        for n in range(6):
+            User.objects.create_user(f'user{n}', date_joined=joined + timedelta(microseconds=n * 100))
+        users = User.objects.filter(username__startswith='user')
+        expected = list(users.order_by(*USER_ORDERING).values_list('id', flat=True))
+
+        first = keyset_page(users, USER_ORDERING, 2)
+        second = keyset_page(users, USER_ORDERING, 2, after=first.next_cursor)
+        third = keyset_page(users, USER_ORDERING, 2, after=second.next_cursor)
+        self.assertEqual([user.id for page in (first, second, third) for user in page], expected)
+        self.assertFalse(third.has_next)
+        back = keyset_page(users, USER_ORDERING, 2, before=third.previous_cursor)
+        self.assertEqual([user.id for user in back], [user.id for user in second])
+
+    def test_tampered_cursors_fall_back_to_the_first_page(self):
+        first = [booking.id for booking in keyset_page(self.bookings, BOOKING_ORDERING, 3)]
+        for values in (['2026-01-05'], ['x', 'y', 'z'], ['2026-01-05', '10:00', 'x'], [1, 2, 3]):
+            page = keyset_page(self.bookings, BOOKING_ORDERING, 3, after=encode_cursor(values))
+            self.assertEqual([booking.id for booking in page], first)
+            self.assertFalse(page.has_previous)
+
+        rows = [{'id': n, 'name': name} for n, name in enumerate(['Ana', 'Bea', 'Carla'], 1)]
+        page = keyset_page(rows, ['name', 'id'], 2, after=encode_cursor([1, 'x']))
+        self.assertEqual([row['id'] for row in page], [1, 2])
+
+
+class BookingDailyStatsTest(TestCase):
+    """Test the daily booking rollup behind service analytics"""
+
+    def setUp(self):
+        user = User.objects.create_user('owner', 'owner@test.com', 'pass')
+        self.company = Company.objects.create(administrator=user, name='Salon', address='Calle 1', city='Madrid')
+        self.maria = Staff.objects.create(company=self.company, name='Maria')
+        self.olga = Staff.objects.create(company=self.company, name='Olga')
+        self.cut = Service.objects.create(company=self.company, name='Corte', duration=30, price=10)
+        self.ana = Customer.objects.create(name='Ana', phone='+34 600 000 001')
+        self.bea = Customer.objects.create(name='Bea', phone='+34 600 000 002')
+
+    def book(self, staff, customer, day, status=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Booking.objects.create(
+                company=self.company, staff=staff, service=self.cut, customer=customer,
+                date=date(2026, 1, day), start_time=time(10, 0), status=status, price=10, duration=30
+            )
+
+    def test_rollup_follows_writes_and_counts_customers_once(self):
+        self.book(self.maria, self.ana, 5)
+        self.book(self.maria, self.ana, 6)
+        moved = self.book(self.olga, self.bea, 6)
+        self.book(self.olga, self.bea, 7, status=2)
+
+        stats = company_booking_stats(self.company)
+        self.assertEqual((stats['booking_count'], stats['revenue']), (3, 30))
+        self.assertEqual(stats['services'][self.cut.id]['unique_customers'], 2)
+        self.assertEqual(stats['staff'][self.maria.id]['booking_count'], 2)
+        self.assertEqual(stats['staff'][self.maria.id]['unique_customers'], 1)
+        self.assertEqual(stats['staff'][self.olga.id]['minutes'], 30)
+        self.assertEqual(stats['months'], [{'month': date(2026, 1, 1), 'count': 3, 'revenue': 30}])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            moved.date = date(2026, 1, 20)
+            moved.save()
+        self.assertEqual(company_booking_stats(self.company, start_date=date(2026, 1, 10))['booking_count'], 1)
+        self.assertFalse(BookingDailyStats.objects.filter(date=date(2026, 1, 6), staff=self.olga).exists())
+
+    def test_rebuild_matches_incremental_rows(self):
+        self.book(self.maria, self.ana, 5)
+        self.book(self.olga, self.bea, 5)
+        self.book(self.olga, self.ana, 5)
+        fields = ('date', 'service_id', 'staff_id', 'booking_count', 'revenue', 'minutes', 'unique_customers')
+        incremental = sorted(BookingDailyStats.objects.values_list(*fields))
+
+        BookingDailyStats.objects.all().delete()
+        self.assertEqual(rebuild_daily_stats(company_id=self.company.id), 2)
+        self.assertEqual(sorted(BookingDailyStats.objects.values_list(*fields)), incremental)
+
+    def test_refresh_locks_the_company_before_reading(self):
+        self.book(self.maria, self.ana, 5)
+        with CaptureQueriesContext(connection) as queries:
+            rebuild_daily_stats(company_id=self.company.id, day=date(2026, 1, 5))
+            rebuild_daily_stats(company_id=self.company.id, day=date(2026, 1, 5))
+        sql = [query['sql'] for query in queries.captured_queries]
+        company = next(i for i, q in enumerate(sql) if 'FROM "companies_company"' in q)
+        self.assertLess(company, next(i for i, q in enumerate(sql) if 'FROM "bookings_booking"' in q))
+        self.assertEqual(BookingDailyStats.objects.filter(company=self.company, date=date(2026, 1, 5)).count(), 1)
+
+
+class BookingExportTest(TestCase):
+    """Test the streamed CSV/XLSX export of the bookings list"""
+
+    def setUp(self):
+        user = User.objects.create_user('owner', 'owner@test.com', 'pass')
+        company = Company.objects.create(administrator=user, name='Salon', address='Calle 1', city='Madrid')
+        user.userprofile.company = company
+        user.userprofile.is_admin = True
+        user.userprofile.save()
+        staff = Staff.objects.create(company=company, name='Maria')
+        service = Service.objects.create(company=company, name='Corte', duration=30, price=10)
+        ana = Customer.objects.create(name='Ana', phone='+34 600 000 001')
+        bea = Customer.objects.create(name='Bea, "la nueva"', phone='+34 600 000 002')
+        for customer, day, status in ((ana, 5, 1), (bea, 6, 1), (ana, 7, 2)):
+            Booking.objects.create(
+                company=company, staff=staff, service=service, customer=customer,
+                date=date(2026, 1, day), start_time=time(10, 0), price=10, status=status
+            )
+        self.client.force_login(user)
+
+    def export(self, ip='127.0.0.1', **params):
+        # A new address per request: the visit counter middleware inserts one row per ip and day
+        response = self.client.get(reverse('export_bookings'), params, REMOTE_ADDR=ip)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_follows_the_list_filters(self):
+        response, content = self.export(status='confirmed')
+        self.assertIn('.csv"', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(content.decode('utf-8-sig'))))
+        self.assertEqual(rows[0][:2], ['ID', 'Date'])
+        self.assertEqual([row[1] for row in rows[1:]], ['2026-01-06', '2026-01-05'])
+        self.assertEqual(rows[1][4], 'Bea, "la nueva"')
+        self.assertEqual(rows[1][11], 'Confirmed')
+
+        _response, content = self.export(ip='127.0.0.2', status='all', search='Ana')
+        self.assertEqual(len(content.decode('utf-8-sig').splitlines()), 3)
+
+    def test_xlsx_is_a_readable_workbook(self):
+        _response, content = self.export(status='all', format='xlsx')
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertIsNone(archive.testzip())
+            sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        ns = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        rows = sheet.findall('s:sheetData/s:row', ns)
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1].find('s:c[@r="E2"]/s:is/s:t', ns).text, 'Ana')
+        self.assertEqual(rows[1].find('s:c[@r="K2"]/s:v', ns).text, '10.00')
+
+    def test_formulas_are_escaped(self):
+        booking = Booking.objects.get(date=date(2026, 1, 5))
+        Customer.objects.filter(pk=booking.customer_id).update(name='=HYPERLINK("http://evil.test","Ana")')
+        Booking.objects.filter(pk=booking.pk).update(notes='@SUM(A1:A9)')
+
+        _response, content = self.export(ip='127.0.0.3', status='all', search='HYPERLINK')
+        [row] = [row for row in csv.reader(io.StringIO(content.decode('utf-8-sig'))) if row[1] == '2026-01-05']
+        self.assertEqual(row[4], '\'=HYPERLINK("http://evil.test","Ana")')
+        self.assertEqual(row[5], "'+34 600 000 001")
+        self.assertEqual(row[14], "'@SUM(A1:A9)")
+
+        _response, content = self.export(ip='127.0.0.4', status='all', search='HYPERLINK', format='xlsx')
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        ns = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        self.assertTrue(sheet.find('s:sheetData/s:row[2]/s:c[@r="E2"]/s:is/s:t', ns).text.startswith("'="))
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('export_benchmark', rows=50, stdout=out)
+        self.assertIn('Exported 50 rows', out.getvalue())
+        self.assertFalse(Booking.objects.filter(company__name='Export Benchmark').exists())
+
+
+class BookingTimeRangeTest(TestCase):
+    """Test start_at/end_at and the overlap queries built on them"""
+
+    def setUp(self):
+        user = User.objects.create_user('owner', 'owner@test.com', 'pass')
+        company = Company.objects.create(administrator=user, name='Salon', address='Calle 1', city='Madrid')
+        self.staff = Staff.objects.create(company=company, name='Maria')
+        service = Service.objects.create(company=company, name='Corte', duration=45, price=10)
+        customer = Customer.objects.create(name='Ana', phone='+34 600 000 001')
+        self.booking = Booking.objects.create(
+            company=company, staff=self.staff, service=service, customer=customer,
+            date=date(2026, 3, 2), start_time=time(10, 0), end_time=time(11, 0), status=1
+        )
+        self.prebooked = Booking.objects.create(
+            company=company, staff=self.staff, service=service, customer=customer,
+            date=date(2026, 3, 2), start_time=time(12, 0), status=3
+        )
+
+    def window(self, start, end):
+        return set(Booking.objects.filter(staff=self.staff).overlapping(
+            datetime(2026, 3, 2, *start), datetime(2026, 3, 2, *end)
+        ).values_list('id', flat=True))
+
+    def test_ranges_follow_date_and_times(self):
+        self.assertEqual(timezone.localtime(self.booking.start_at).replace(tzinfo=None), datetime(2026, 3, 2, 10, 0))
+        self.assertEqual(self.booking.end_at - self.booking.start_at, timedelta(hours=1))
+        # No end time yet: the service duration
+        self.assertEqual(self.prebooked.end_at - self.prebooked.start_at, timedelta(minutes=45))
+
+        self.booking.start_time = time(9, 0)
+        self.booking.save(update_fields=['start_time'])
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.end_at - self.booking.start_at, timedelta(hours=2))
+
+    def test_overlap_is_half_open(self):
+        self.assertEqual(self.window((10, 30), (10, 45)), {self.booking.id})
+        self.assertEqual(self.window((11, 0), (12, 0)), set())
+        self.assertEqual(self.window((9, 0), (12, 30)), {self.booking.id, self.prebooked.id})
+
+    def test_service_duration_change_moves_ranges(self):
+        service = self.prebooked.service
+        service.duration = 90
+        service.save()
+        self.prebooked.refresh_from_db()
+        self.assertEqual(self.prebooked.end_at - self.prebooked.start_at, timedelta(minutes=90))
+        self.assertEqual(self.window((13, 0), (13, 15)), {self.prebooked.id})
+        # Bookings with their own end time keep it
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.end_at - self.booking.start_at, timedelta(hours=1))
+
+    def test_benchmark_rows_have_ranges(self):
+        call_command('export_benchmark', rows=20, keep=True, stdout=io.StringIO())
+        generated = Booking.objects.filter(company__name='Export Benchmark')
+        self.assertEqual(generated.count(), 20)
+        self.assertFalse(generated.filter(start_at__isnull=True).exists())
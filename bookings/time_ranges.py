@@ -0,0 +1,40 @@
+"""
+Keep Booking.start_at/end_at in step with the service duration
+
+A booking without its own end_time or duration ends start_at plus its
+service's duration, frozen into end_at when the booking is saved. When a
+service's duration changes, those bookings are moved with one UPDATE.
+"""
+import logging
+from datetime import timedelta
+from django.db.models import F, Q
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from companies.models import Service
+from .models import Booking
+
+logger = logging.getLogger(__name__)
+
+
+def refresh_service_time_ranges(service_id, duration) -> int:
+    """Recompute end_at of the service's bookings that take its duration; returns rows moved"""
+    return Booking.objects.filter(
+        Q(duration__isnull=True) | Q(duration=0),
+        service_id=service_id,
+        end_time__isnull=True,
+        start_at__isnull=False,
+    ).update(end_at=F('start_at') + timedelta(minutes=duration or 0))
+
+
+@receiver(post_init, sender=Service)
+def remember_service_duration(sender, instance, **kwargs):
+    instance._range_duration = instance.__dict__.get('duration')
+
+
+@receiver(post_save, sender=Service)
+def update_on_service_save(sender, instance, created, **kwargs):
+    if not created and instance.duration != getattr(instance, '_range_duration', None):
+        moved = refresh_service_time_ranges(instance.pk, instance.duration)
+        logger.info(f"Service {instance.pk} duration changed, moved end of {moved} bookings")
+    instance._range_duration = instance.duration
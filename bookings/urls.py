@@ -4,6 +4,7 @@ from . import views
 urlpatterns = [
     path('book/<int:company_id>/', views.create_booking, name='create_booking'),
     path('booking-list/', views.bookings_list, name='bookings_list'),
+    path('booking-list/export/', views.export_bookings, name='export_bookings'),
     path('confirmation/<str:booking_id>/', views.booking_confirmation, name='booking_confirmation'),
     path('confirm-prebooked/<int:booking_id>/', views.confirm_prebooked_booking, name='confirm_prebooked_booking'),
     path('cancel/<int:booking_id>/<str:delete_code>/', views.cancel_booking, name='cancel_booking'),
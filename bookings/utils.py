@@ -63,6 +63,37 @@ def normalize_phone_number(phone):
     return phone
 
 
+def backfill_normalized_phones(customer_model, chunk_size=1000, stdout=None):
+    """
+    Fill Customer.phone_normalized for rows where it is missing or stale
+
+    Walks the table by primary key in chunks and writes changed rows with
+    bulk_update, so it is safe to run on a live table and to re-run.
+    Takes the model as an argument so migrations can pass the historical one.
+    """
+    last_id = 0
+    updated = 0
+    while True:
+        chunk = list(
+            customer_model.objects.filter(id__gt=last_id).order_by('id').only('id', 'phone', 'phone_normalized')[:chunk_size]
+        )
+        if not chunk:
+            break
+        changed = []
+        for customer in chunk:
+            normalized = normalize_phone_number(customer.phone) or ''
+            if customer.phone_normalized != normalized:
+                customer.phone_normalized = normalized
+                changed.append(customer)
+        if changed:
+            customer_model.objects.bulk_update(changed, ['phone_normalized'], batch_size=chunk_size)
+            updated += len(changed)
+        last_id = chunk[-1].id
+        if stdout:
+            stdout.write(f"Processed customers up to id {last_id}, {updated} updated")
+    return updated
+
+
 def get_country_prefix(country_code):
     """Get the phone prefix for a country code (e.g., 'ES' -> '+34')"""
     if not country_code:
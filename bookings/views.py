@@ -18,9 +18,14 @@ from django.utils.translation import gettext as _
 from notifications.signals import notify
 from .models import Booking, Customer
 from .forms import BookingForm
+from .customer_search import search_customers
+from .exports import BOOKING_EXPORT_HEADER, booking_export_rows
 from companies.models import Company, Staff, Service, WorkingHours, EmailLog, StaffWorkingHours, StaffOutOfOffice
 from users.models import UserProfile
 from app.decorators import subscription_required
+from app.exports import CHUNK_SIZE, export_format, export_response
+from app.pagination import BOOKING_ORDERING, paginate
+from app.ranges import aware, day_bounds, local_datetime
 
 
 logger = logging.getLogger(__name__)
@@ -38,15 +43,8 @@ def is_staff_out_of_office_at_time(staff, check_datetime):
 
 def is_staff_out_all_day(staff, date, work_start_time, work_end_time):
     """Check if staff is out of office for the entire working day"""
-    work_start = datetime.combine(date, work_start_time)
-    work_end = datetime.combine(date, work_end_time)
-    
-    # Make timezone-aware if needed
-    if StaffOutOfOffice.objects.filter(staff=staff).exists():
-        first_period = StaffOutOfOffice.objects.filter(staff=staff).first()
-        if timezone.is_aware(first_period.start_datetime):
-            work_start = timezone.make_aware(work_start)
-            work_end = timezone.make_aware(work_end)
+    work_start = local_datetime(date, work_start_time)
+    work_end = local_datetime(date, work_end_time)
     
     # Check if any out-of-office period completely covers the working hours
     covering_periods = StaffOutOfOffice.objects.filter(
@@ -96,7 +94,7 @@ def create_booking(request, company_id):
             customer_phone = cleaned_phone
             
             # Find or create customer
-            customer = Customer.objects.filter(phone=customer_phone).first()
+            customer = Customer.find_by_phone(customer_phone)
             if customer:
                 customer.name = customer_name
                 if customer_email:
@@ -183,11 +181,8 @@ def create_booking(request, company_id):
                             # Check existing bookings in database
                             existing_conflict = Booking.objects.filter(
                                 staff=candidate_staff,
-                                date=date,
                                 status__in=[1, 3],  # Confirmed or PreBooked
-                                start_time__lt=end_time,
-                                end_time__gt=start_time
-                            ).exists()
+                            ).overlapping(start_datetime, end_datetime).exists()
                             
                             if existing_conflict:
                                 continue  # This staff has a conflict in DB
@@ -211,25 +206,8 @@ def create_booking(request, company_id):
                         
                         staff = available_staff
                     
-                    # Check if staff is out of office during this time
-                    check_start = start_datetime
-                    check_end = end_datetime
-                    
-                    # Make timezone-aware if needed
-                    if StaffOutOfOffice.objects.filter(staff=staff).exists():
-                        first_period = StaffOutOfOffice.objects.filter(staff=staff).first()
-                        if timezone.is_aware(first_period.start_datetime):
-                            if timezone.is_naive(check_start):
-                                check_start = timezone.make_aware(check_start)
-                            if timezone.is_naive(check_end):
-                                check_end = timezone.make_aware(check_end)
-                    
                     # Check if booking would overlap with any out-of-office period
-                    overlapping_periods = StaffOutOfOffice.objects.filter(
-                        staff=staff,
-                        start_datetime__lt=check_end,
-                        end_datetime__gt=check_start
-                    )
+                    overlapping_periods = StaffOutOfOffice.objects.filter(staff=staff).overlapping(start_datetime, end_datetime)
                     if overlapping_periods.exists():
                         raise ValueError(_('This time slot is not available. Staff member is out of office.'))
                     
@@ -643,11 +621,11 @@ def get_available_times(request, company_id, staff_id, service_id, date_str):
         # Get existing bookings for this staff member on this date
         # Exclude the current booking if editing (booking_id parameter)
         booking_id = request.GET.get('booking_id')
+        day_start, day_end = day_bounds(date)
         bookings_query = Booking.objects.filter(
             staff=staff,
-            date=date,
             status__in=[1]  # Confirmed or PreBooked
-        )
+        ).overlapping(day_start, day_end)
         
         if booking_id:
             try:
@@ -655,7 +633,10 @@ def get_available_times(request, company_id, staff_id, service_id, date_str):
             except (ValueError, TypeError):
                 pass
         
-        existing_bookings = bookings_query.values_list('start_time', 'end_time')
+        existing_bookings = list(bookings_query.values_list('start_at', 'end_at'))
+        out_of_office_periods = list(
+            StaffOutOfOffice.objects.filter(staff=staff).overlapping(day_start, day_end).values_list('start_datetime', 'end_datetime')
+        )
         
         # Generate time slots based on company's calendar step setting
         available_times = []
@@ -676,26 +657,10 @@ def get_available_times(request, company_id, staff_id, service_id, date_str):
             if potential_end_time > end_time_dt:
                 break  # Can't start a service that would end after working hours
             
-            # Check if this time slot overlaps with any out-of-office period
-            check_start = current_time
-            check_end = potential_end_time
-            
-            # Make timezone-aware if needed
-            if StaffOutOfOffice.objects.filter(staff=staff).exists():
-                first_period = StaffOutOfOffice.objects.filter(staff=staff).first()
-                if timezone.is_aware(first_period.start_datetime):
-                    if timezone.is_naive(check_start):
-                        check_start = timezone.make_aware(check_start)
-                    if timezone.is_naive(check_end):
-                        check_end = timezone.make_aware(check_end)
-            
             # Skip if booking would overlap with any out-of-office period
-            overlapping_periods = StaffOutOfOffice.objects.filter(
-                staff=staff,
-                start_datetime__lt=check_end,
-                end_datetime__gt=check_start
-            )
-            if overlapping_periods.exists():
+            check_start = aware(current_time)
+            check_end = aware(potential_end_time)
+            if any(check_start < period_end and check_end > period_start for period_start, period_end in out_of_office_periods):
                 current_time += time_step
                 continue
             
@@ -711,12 +676,9 @@ def get_available_times(request, company_id, staff_id, service_id, date_str):
             # Check if this time slot is available (no overlap with existing bookings)
             is_available = True
             for booking_start, booking_end in existing_bookings:
-                booking_start_dt = datetime.combine(date, booking_start)
-                booking_end_dt = datetime.combine(date, booking_end)
-                
                 # Check if the new booking would overlap with existing booking
                 # Overlap occurs if: new_start < existing_end AND new_end > existing_start
-                if current_time < booking_end_dt and potential_end_time > booking_start_dt:
+                if check_start < booking_end and check_end > booking_start:
                     is_available = False
                     break
             
@@ -893,26 +855,8 @@ def get_available_times_any_staff(request, company_id, service_id, date_str):
             # Check if AT LEAST ONE staff member is available at this time
             is_available = False
             for staff in staff_members:
-                # Check if staff is out of office during this time slot
-                check_start = current_time
-                check_end = potential_end_time
-                
-                # Make timezone-aware if needed
-                if StaffOutOfOffice.objects.filter(staff=staff).exists():
-                    first_period = StaffOutOfOffice.objects.filter(staff=staff).first()
-                    if timezone.is_aware(first_period.start_datetime):
-                        if timezone.is_naive(check_start):
-                            check_start = timezone.make_aware(check_start)
-                        if timezone.is_naive(check_end):
-                            check_end = timezone.make_aware(check_end)
-                
                 # Skip if time slot overlaps with any out-of-office period
-                overlapping_periods = StaffOutOfOffice.objects.filter(
-                    staff=staff,
-                    start_datetime__lt=check_end,
-                    end_datetime__gt=check_start
-                )
-                if overlapping_periods.exists():
+                if StaffOutOfOffice.objects.filter(staff=staff).overlapping(current_time, potential_end_time).exists():
                     continue  # Skip this staff member
                 
                 # Skip staff who don't work on this day
@@ -947,23 +891,11 @@ def get_available_times_any_staff(request, company_id, service_id, date_str):
                     if current_time < break_end_dt and potential_end_time > break_start_dt:
                         continue
                 
-                # Get existing bookings for this staff member on this date
-                existing_bookings = Booking.objects.filter(
+                # Check if this time slot is available for this staff
+                staff_available = not Booking.objects.filter(
                     staff=staff,
-                    date=date,
                     status__in=[1]  # Confirmed or PreBooked
-                ).values_list('start_time', 'end_time')
-                
-                # Check if this time slot is available for this staff
-                staff_available = True
-                for booking_start, booking_end in existing_bookings:
-                    booking_start_dt = datetime.combine(date, booking_start)
-                    booking_end_dt = datetime.combine(date, booking_end)
-                    
-                    # Check for overlap
-                    if current_time < booking_end_dt and potential_end_time > booking_start_dt:
-                        staff_available = False
-                        break
+                ).overlapping(current_time, potential_end_time).exists()
                 
                 if staff_available:
                     is_available = True
@@ -1068,22 +1000,8 @@ def booking_calendar(request):
                 }
             
             # Add out of office periods for this staff member on this date
-            date_start = datetime.combine(current_date, dtime.min)
-            date_end = datetime.combine(current_date, dtime.max)
-            
-            # Make timezone-aware if needed
-            if StaffOutOfOffice.objects.filter(staff=s).exists():
-                first_period = StaffOutOfOffice.objects.filter(staff=s).first()
-                if timezone.is_aware(first_period.start_datetime):
-                    date_start = timezone.make_aware(date_start)
-                    date_end = timezone.make_aware(date_end)
-            
             # Get out of office periods that overlap with this day
-            out_of_office_periods = StaffOutOfOffice.objects.filter(
-                staff=s,
-                start_datetime__lt=date_end,
-                end_datetime__gt=date_start
-            )
+            out_of_office_periods = StaffOutOfOffice.objects.filter(staff=s).overlapping(*day_bounds(current_date))
             
             if out_of_office_periods.exists():
                 staff_info['outOfOfficePeriods'] = []
@@ -1372,22 +1290,8 @@ def calendar_api(request):
                 }
             
             # Add out of office periods for this staff member on this date
-            date_start = datetime.combine(current_date, dtime.min)
-            date_end = datetime.combine(current_date, dtime.max)
-            
-            # Make timezone-aware if needed
-            if StaffOutOfOffice.objects.filter(staff=s).exists():
-                first_period = StaffOutOfOffice.objects.filter(staff=s).first()
-                if timezone.is_aware(first_period.start_datetime):
-                    date_start = timezone.make_aware(date_start)
-                    date_end = timezone.make_aware(date_end)
-            
             # Get out of office periods that overlap with this day
-            out_of_office_periods = StaffOutOfOffice.objects.filter(
-                staff=s,
-                start_datetime__lt=date_end,
-                end_datetime__gt=date_start
-            )
+            out_of_office_periods = StaffOutOfOffice.objects.filter(staff=s).overlapping(*day_bounds(current_date))
             
             if out_of_office_periods.exists():
                 staff_info['outOfOfficePeriods'] = []
@@ -1538,26 +1442,25 @@ def update_booking_status(request, booking_id):
 def guess_customer_data(request):
     """API endpoint to guess customer data based on phone or name input"""
     try:
+        profile = request.user.userprofile
         phone = request.GET.get('phone', '')
         name = request.GET.get('name', '')
         
-        customers = Customer.objects.all()
-        
+        # Only this company's customers, from the autocomplete index
         if phone:
-            customers = customers.filter(phone__icontains=phone)
+            customers = search_customers(profile.company, phone, limit=7, phone=True)
         elif name:
-            customers = customers.filter(name__icontains=name)
+            customers = search_customers(profile.company, name, limit=7, phone=False)
         else:
             return JsonResponse({'customers': []})
         
-        customers = customers.order_by('-id')[:7]
         customers_list = []
         for c in customers:
             customers_list.append({
                 # 'country_code': c.country_code,
-                'name': c.name,
-                'email': c.email,
-                'phone': c.phone,
+                'name': c['name'],
+                'email': c['email'],
+                'phone': c['phone'],
             })
         return JsonResponse({'customers': customers_list})
 
@@ -1739,66 +1642,71 @@ def confirm_prebooked_booking(request, booking_id):
     return render(request, 'bookings/confirm_prebooked.html', context)
 
 
+def filter_bookings(request, profile):
+    """Bookings of the user's company (own bookings for staff) with the list's filters applied; returns (bookings, filters)"""
+    # Base queryset
+    if profile.is_admin:
+        bookings = Booking.objects.filter(company=profile.company).select_related('customer', 'staff', 'service')
+    else:
+        bookings = Booking.objects.filter(company=profile.company, staff=profile.staff).select_related('customer', 'staff', 'service')
+
+    # Tabs: status filter
+    status_filter = request.GET.get('status', 'confirmed')
+    if status_filter == 'confirmed':
+        bookings = bookings.filter(status=1)  # Confirmed
+    elif status_filter == 'prebooked':
+        bookings = bookings.filter(status=3)  # PreBooked
+
+    # Search
+    search_query = request.GET.get('search', '').strip()
+    if search_query:
+        bookings = bookings.filter(
+            Q(customer__name__icontains=search_query) |
+            Q(customer__phone__icontains=search_query) |
+            Q(customer__email__icontains=search_query)
+        )
+
+    # Filter by date range
+    date_from = request.GET.get('date_from', '').strip()
+    date_to = request.GET.get('date_to', '').strip()
+    if date_from:
+        try:
+            date_from_obj = datetime.strptime(date_from, '%Y-%m-%d').date()
+            bookings = bookings.filter(date__gte=date_from_obj)
+        except Exception:
+            pass
+    if date_to:
+        try:
+            date_to_obj = datetime.strptime(date_to, '%Y-%m-%d').date()
+            bookings = bookings.filter(date__lte=date_to_obj)
+        except Exception:
+            pass
+
+    # Filter by service
+    service_filter = request.GET.get('service', '').strip()
+    if service_filter:
+        bookings = bookings.filter(service__id=service_filter)
+
+    filters = {
+        'search_query': search_query,
+        'date_from': date_from,
+        'date_to': date_to,
+        'service_filter': service_filter,
+        'status_filter': status_filter,
+    }
+    return bookings, filters
+
+
 @login_required
 @subscription_required
 def bookings_list(request):
     """List of bookings for staff/admin"""
     try:
         profile = request.user.userprofile
-        # Base queryset
-        if profile.is_admin:
-            bookings = Booking.objects.filter(company=profile.company).select_related('customer', 'staff', 'service')
-        else:
-            bookings = Booking.objects.filter(company=profile.company, staff=profile.staff).select_related('customer', 'staff', 'service')
-
-        # Tabs: status filter
-        status_filter = request.GET.get('status', 'confirmed')
-        if status_filter == 'confirmed':
-            bookings = bookings.filter(status=1)  # Confirmed
-        elif status_filter == 'prebooked':
-            bookings = bookings.filter(status=3)  # PreBooked
-
-        # Search
-        search_query = request.GET.get('search', '').strip()
-        if search_query:
-            bookings = bookings.filter(
-                Q(customer__name__icontains=search_query) |
-                Q(customer__phone__icontains=search_query) |
-                Q(customer__email__icontains=search_query)
-            )
-
-        # Filter by date range
-        date_from = request.GET.get('date_from', '').strip()
-        date_to = request.GET.get('date_to', '').strip()
-        from datetime import datetime
-        if date_from:
-            try:
-                date_from_obj = datetime.strptime(date_from, '%Y-%m-%d').date()
-                bookings = bookings.filter(date__gte=date_from_obj)
-            except Exception:
-                pass
-        if date_to:
-            try:
-                date_to_obj = datetime.strptime(date_to, '%Y-%m-%d').date()
-                bookings = bookings.filter(date__lte=date_to_obj)
-            except Exception:
-                pass
+        bookings, filters = filter_bookings(request, profile)
 
-        # Filter by service
-        service_filter = request.GET.get('service', '').strip()
-        if service_filter:
-            bookings = bookings.filter(service__id=service_filter)
-
-        bookings = bookings.order_by('-date', '-start_time')
-
-        # Pagination
-        from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
-        page = request.GET.get('page', 1)
-        paginator = Paginator(bookings, 25)
-        try:
-            bookings_page = paginator.page(page)
-        except (PageNotAnInteger, EmptyPage):
-            bookings_page = paginator.page(1)
+        # Keyset pagination: no OFFSET, the total is capped/estimated
+        bookings_page = paginate(request, bookings, BOOKING_ORDERING, 25, with_count=True)
 
         # For service filter dropdown
         services = Service.objects.filter(company=profile.company, is_active=True)
@@ -1806,12 +1714,8 @@ def bookings_list(request):
         context = {
             'bookings': bookings_page,
             'company': profile.company,
-            'search_query': search_query,
-            'date_from': date_from,
-            'date_to': date_to,
-            'service_filter': service_filter,
             'services': services,
-            'status_filter': status_filter,
+            **filters,
         }
         return render(request, 'bookings/bookings_list.html', context)
     except UserProfile.DoesNotExist:
@@ -1819,6 +1723,21 @@ def bookings_list(request):
         return redirect('/')
 
 
+@login_required
+@subscription_required
+def export_bookings(request):
+    """Stream the bookings list (same filters) as CSV or XLSX"""
+    try:
+        profile = request.user.userprofile
+    except UserProfile.DoesNotExist:
+        messages.error(request, _('User profile not found.'))
+        return redirect('/')
+
+    bookings, _filters = filter_bookings(request, profile)
+    rows = booking_export_rows(bookings.order_by(*BOOKING_ORDERING), CHUNK_SIZE)
+    return export_response(f"bookings_{timezone.localdate():%Y%m%d}", BOOKING_EXPORT_HEADER, rows, export_format(request))
+
+
 @login_required
 @subscription_required
 def notifications_list(request):
@@ -1851,17 +1770,8 @@ def notifications_list(request):
         except Exception:
             pass
     
-    # Sort by date created (newest first)
-    notifications = notifications.order_by('-timestamp')
-    
-    # Pagination
-    from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
-    page = request.GET.get('page', 1)
-    paginator = Paginator(notifications, 20)
-    try:
-        notifications_page = paginator.page(page)
-    except (PageNotAnInteger, EmptyPage):
-        notifications_page = paginator.page(1)
+    # Newest first, keyset paginated
+    notifications_page = paginate(request, notifications, ['-timestamp', 'id'], 20, with_count=True)
     
     context = {
         'notifications': notifications_page,
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CompanyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'companies'
+
+    def ready(self):
+        # Drop cached utilization heatmaps when bookings, schedules or absences change
+        from . import utilization
@@ -0,0 +1,33 @@
+"""
+Cache versions shared by all workers
+
+Per-company data cached in process memory (matchers, rendered texts,
+heatmaps) is stamped with the version it was built from. Every change bumps
+the version row in the database, so a worker that did not see the change
+still notices its copy is stale on the next lookup: one index probe
+instead of rebuilding the data.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import CompanyCacheVersion
+
+
+def get_version(company_id, name: str) -> int:
+    """Current version of a company's cache `name`, 0 before the first change"""
+    return CompanyCacheVersion.objects.filter(company_id=company_id, name=name).values_list(
+        'version', flat=True
+    ).first() or 0
+
+
+def bump_version(company_id, name: str):
+    """Mark every worker's copy of a company's cache `name` as stale"""
+    versions = CompanyCacheVersion.objects.filter(company_id=company_id, name=name)
+    if versions.update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            CompanyCacheVersion.objects.create(company_id=company_id, name=name, version=1)
+    except IntegrityError:
+        # Another request created it in between
+        versions.update(version=F('version') + 1)
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0022_add_staff_out_of_office_table'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='staffoutofoffice',
+            index=models.Index(fields=['staff', 'start_datetime', 'end_datetime'], name='companies_s_staff_i_f53251_idx'),
+        ),
+    ]
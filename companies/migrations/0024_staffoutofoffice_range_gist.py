@@ -0,0 +1,30 @@
+from django.db import migrations
+
+GIST_INDEX = 'companies_staffoutofoffice_range_gist'
+
+
+def create_gist_index(apps, schema_editor):
+    # btree_gist lets staff_id share the GiST index with the range; PostgreSQL only
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {GIST_INDEX} ON companies_staffoutofoffice "
+        f"USING gist (staff_id, tstzrange(start_datetime, end_datetime, '[)'))"
+    )
+
+
+def drop_gist_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f"DROP INDEX IF EXISTS {GIST_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0023_staffoutofoffice_range_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_gist_index, drop_gist_index),
+    ]
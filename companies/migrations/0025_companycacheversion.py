@@ -0,0 +1,26 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0024_staffoutofoffice_range_gist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanyCacheVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('company', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='companies.company')),
+            ],
+            options={
+                'unique_together': {('company', 'name')},
+            },
+        ),
+    ]
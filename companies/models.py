@@ -5,6 +5,7 @@ from django.utils import timezone
 from .utils import company_img_upload
 from PIL import Image
 from django.utils.translation import gettext_lazy as _
+from app.ranges import TimeRangeQuerySet
 
 
 DAYS_OF_WEEK = [
@@ -211,6 +212,10 @@ class StaffWorkingHours(models.Model):
         return f"{self.staff.name} — {self.get_day_of_week_display()} ({self.start_time} - {self.end_time})"
 
 
+class StaffOutOfOfficeQuerySet(TimeRangeQuerySet):
+    range_fields = ('start_datetime', 'end_datetime')
+
+
 class StaffOutOfOffice(models.Model):
     """Track multiple out-of-office periods for staff members"""
     staff = models.ForeignKey(Staff, on_delete=models.CASCADE, related_name="out_of_office_periods")
@@ -219,8 +224,13 @@ class StaffOutOfOffice(models.Model):
     reason = models.CharField(max_length=255, blank=True, help_text="Optional reason (e.g., 'Vacation', 'Sick leave')")
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = StaffOutOfOfficeQuerySet.as_manager()
+    
     class Meta:
         ordering = ['start_datetime']
+        indexes = [
+            models.Index(fields=['staff', 'start_datetime', 'end_datetime']),
+        ]
         verbose_name = "Staff Out of Office"
         verbose_name_plural = "Staff Out of Office Periods"
     
@@ -266,3 +276,21 @@ class CompanyImage(models.Model):
 
     def __str__(self):
         return f"{self.company.name} - Image {self.id}"
+
+
+class CompanyCacheVersion(models.Model):
+    """
+    Version of the company data behind one in-memory cache (service catalog,
+    bot texts, heatmaps...), bumped on every change so that the copies kept
+    by each worker can be checked against it
+    """
+    # No database constraint: a version may be bumped while the company's rows are being deleted
+    company = models.ForeignKey(Company, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    name = models.CharField(max_length=50)
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['company', 'name']
+
+    def __str__(self):
+        return f"{self.company_id} {self.name}: v{self.version}"
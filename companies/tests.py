@@ -1,3 +1,77 @@
+from datetime import date, datetime, time
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
 
-# Create your tests here.
+from bookings.models import Booking, Customer
+from .cache_versions import bump_version
+from .models import Company, Service, Staff, StaffOutOfOffice, WorkingHours
+from .utilization import UTILIZATION_VERSION, company_utilization, compute_utilization
+
+
+class UtilizationHeatmapTest(TestCase):
+    """Test the weekday × hour utilization and demand matrices"""
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('owner', 'owner@test.com', 'pass')
+        self.company = Company.objects.create(administrator=user, name='Salon', address='Calle 1', city='Madrid')
+        self.staff = Staff.objects.create(company=self.company, name='Maria', break_start=time(10, 0), break_end=time(10, 30))
+        self.service = Service.objects.create(company=self.company, name='Corte', duration=30, price=10)
+        self.customer = Customer.objects.create(name='Ana', phone='+34 600 000 001')
+
+    def book(self, day, start, end=None, status=1):
+        return Booking.objects.create(
+            company=self.company, staff=self.staff, service=self.service, customer=self.customer,
+            date=day, start_time=start, end_time=end, status=status
+        )
+
+    def test_matrices_follow_hours_breaks_absences_and_bookings(self):
+        # Mondays 09:00-12:00 only
+        WorkingHours.objects.create(company=self.company, day_of_week=0, start_time=time(9, 0), end_time=time(12, 0))
+        monday = date(2026, 1, 5)
+        self.book(monday, time(9, 0), time(10, 0))
+        self.book(monday, time(11, 0))  # No end time: the service duration counts
+        self.book(monday, time(11, 30), time(12, 0), status=2)
+
+        result = compute_utilization(self.company, monday, date(2026, 1, 11))
+        self.assertEqual(result['available_minutes'][0][9:12], [60, 30, 60])
+        self.assertEqual(result['booked_minutes'][0][9:12], [60, 0, 30])
+        self.assertEqual(result['utilization'][0][8:13], [None, 1.0, 0.0, 0.5, None])
+        self.assertEqual(result['demand'][0][9:12], [1, 0, 1])
+        self.assertEqual(sum(map(sum, result['available_minutes'])), 150)
+        self.assertEqual(result['staff'][0]['booked_minutes'], 90)
+
+        StaffOutOfOffice.objects.create(
+            staff=self.staff,
+            start_datetime=timezone.make_aware(datetime(2026, 1, 5, 11, 0)),
+            end_datetime=timezone.make_aware(datetime(2026, 1, 5, 12, 0)),
+        )
+        result = compute_utilization(self.company, monday, date(2026, 1, 11))
+        self.assertEqual(result['available_minutes'][0][9:12], [60, 30, 0])
+        self.assertIsNone(result['utilization'][0][11])
+
+    def test_cached_until_a_booking_changes(self):
+        for day in range(7):
+            WorkingHours.objects.create(company=self.company, day_of_week=day, start_time=time(9, 0), end_time=time(12, 0))
+        first = company_utilization(self.company, days=7)
+        # Only the shared version is read
+        with self.assertNumQueries(1):
+            self.assertEqual(company_utilization(self.company, days=7), first)
+
+        self.book(timezone.localdate(), time(9, 0), time(9, 30))
+        self.assertEqual(sum(map(sum, company_utilization(self.company, days=7)['booked_minutes'])), 30)
+
+    def test_follows_bookings_made_by_other_workers(self):
+        for day in range(7):
+            WorkingHours.objects.create(company=self.company, day_of_week=day, start_time=time(9, 0), end_time=time(12, 0))
+        company_utilization(self.company, days=7)
+
+        # Saved by another worker: this one's cache never saw the signal, only the version row moves
+        Booking.objects.bulk_create([Booking(
+            company=self.company, staff=self.staff, service=self.service, customer=self.customer,
+            date=timezone.localdate(), start_time=time(9, 0), end_time=time(9, 30), status=1
+        )])
+        bump_version(self.company.id, UTILIZATION_VERSION)
+        self.assertEqual(sum(map(sum, company_utilization(self.company, days=7)['booked_minutes'])), 30)
@@ -27,9 +27,11 @@ urlpatterns = [
     path('services/delete/<int:service_id>/', views.delete_service, name='delete_service'),
     path('working-hours/', views.working_hours, name='working_hours'),
     path('customers/', views.customers_list, name='customers_list'),
+    path('customers/export/', views.export_customers, name='export_customers'),
     path('api/search-customers/', views.search_customers_ajax, name='search_customers_ajax'),
     path('customers/<int:customer_id>/', views.customer_detail, name='customer_detail'),
     path('qr-code/', views.generate_qr_code, name='generate_qr_code'),
     path('whatsapp-qr-code/', views.generate_whatsapp_qr_code, name='generate_whatsapp_qr_code'),
     path('analytics/', views.service_analytics, name='service_analytics'),
+    path('analytics/heatmap/', views.utilization_heatmap, name='utilization_heatmap'),
 ]
@@ -0,0 +1,225 @@
+"""
+Staff utilization and demand heatmaps (weekday × hour of day)
+
+Working hours, breaks, absences and bookings of the range are turned into
+minute-resolution timelines with NumPy: each kind of interval is laid on a
+staff member's timeline with a difference array and a cumulative sum, and
+the masks are folded into weekday × hour matrices. Results are cached per
+company and range until a booking, schedule or absence of the company
+changes, keyed by a version shared by all workers.
+"""
+import logging
+from datetime import date, datetime, time as dtime, timedelta
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from bookings.models import Booking
+from .cache_versions import bump_version, get_version
+from .models import Service, Staff, StaffOutOfOffice, StaffWorkingHours, WorkingHours
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+# Longest range a heatmap covers
+MAX_RANGE_DAYS = 366
+
+
+def _minute(value: dtime) -> int:
+    return value.hour * 60 + value.minute
+
+
+def _mask(starts: np.ndarray, ends: np.ndarray, length: int) -> np.ndarray:
+    """Minutes covered by any [start, end) interval of a timeline of `length` minutes"""
+    starts = np.clip(starts, 0, length)
+    ends = np.clip(ends, 0, length)
+    keep = ends > starts
+    diff = np.zeros(length + 1, dtype=np.int32)
+    np.add.at(diff, starts[keep], 1)
+    np.add.at(diff, ends[keep], -1)
+    return np.cumsum(diff[:-1]) > 0
+
+
+def _fold(mask: np.ndarray, weekdays: np.ndarray) -> np.ndarray:
+    """Minute mask of the range -> minutes per weekday and hour (7 × 24)"""
+    per_day = mask.reshape(len(weekdays), 24, 60).sum(axis=2)
+    matrix = np.zeros((7, 24), dtype=np.int64)
+    np.add.at(matrix, weekdays, per_day)
+    return matrix
+
+
+def _weekly_hours(company, staff_members) -> dict:
+    """(start, end) minutes per weekday for each staff member, as the booking bot resolves them"""
+    company_hours = {
+        row.day_of_week: (_minute(row.start_time), _minute(row.end_time))
+        for row in WorkingHours.objects.filter(company=company, is_day_off=False)
+    }
+    staff_hours = {}
+    for row in StaffWorkingHours.objects.filter(staff__in=staff_members, is_day_off=False):
+        staff_hours.setdefault(row.staff_id, {})[row.day_of_week] = (_minute(row.start_time), _minute(row.end_time))
+
+    weekly = {}
+    for staff in staff_members:
+        hours = {}
+        for day in range(7):
+            if staff.working_days and day not in staff.working_days:
+                continue
+            day_hours = staff_hours.get(staff.id, {}).get(day) or company_hours.get(day)
+            if day_hours:
+                hours[day] = day_hours
+        weekly[staff.id] = hours
+    return weekly
+
+
+def _offsets(moments: list, range_start: datetime) -> np.ndarray:
+    """Aware datetimes -> minutes since the start of the range (local time)"""
+    local = [timezone.localtime(moment).replace(tzinfo=None) if timezone.is_aware(moment) else moment for moment in moments]
+    return np.array([int((moment - range_start).total_seconds() // 60) for moment in local], dtype=np.int64)
+
+
+def compute_utilization(company, start: date, end: date) -> dict:
+    """
+    Booked and available minutes per weekday and hour from start to end (inclusive)
+
+    Available time is working hours minus breaks and out-of-office periods;
+    booked time counts confirmed and pre-booked appointments. Demand is the
+    number of appointments starting in each weekday/hour.
+    """
+    days = (end - start).days + 1
+    length = days * MINUTES_PER_DAY
+    range_start = datetime.combine(start, dtime.min)
+    day_index = np.arange(days)
+    weekdays = (start.weekday() + day_index) % 7
+
+    staff_members = list(Staff.objects.filter(company=company, is_active=True).order_by('name'))
+    weekly = _weekly_hours(company, staff_members)
+
+    absences = {}
+    for staff_id, starts_at, ends_at in StaffOutOfOffice.objects.filter(staff__in=staff_members).overlapping(
+        range_start, datetime.combine(end + timedelta(days=1), dtime.min)
+    ).values_list('staff_id', 'start_datetime', 'end_datetime'):
+        absences.setdefault(staff_id, []).append((starts_at, ends_at))
+
+    rows = np.array(list(
+        Booking.objects.filter(company=company, date__gte=start, date__lte=end, status__in=[1, 3]).values_list(
+            'staff_id', 'date', 'start_time', 'end_time', 'duration', 'service__duration'
+        )
+    ), dtype=object).reshape(-1, 6)
+    if len(rows):
+        booking_staff = rows[:, 0].astype(np.int64)
+        booking_day = np.array([(day - start).days for day in rows[:, 1]], dtype=np.int64)
+        booking_start = np.array([_minute(value) for value in rows[:, 2]], dtype=np.int64)
+        booking_end = np.array([
+            _minute(end_time) if end_time else start_minute + (duration or service_duration or 0)
+            for start_minute, end_time, duration, service_duration in zip(booking_start, rows[:, 3], rows[:, 4], rows[:, 5])
+        ], dtype=np.int64)
+    else:
+        booking_staff = booking_day = booking_start = booking_end = np.zeros(0, dtype=np.int64)
+
+    demand = np.zeros((7, 24), dtype=np.int64)
+    np.add.at(demand, (weekdays[booking_day], np.minimum(booking_start // 60, 23)), 1)
+
+    available_total = np.zeros((7, 24), dtype=np.int64)
+    booked_total = np.zeros((7, 24), dtype=np.int64)
+    staff_results = []
+    for staff in staff_members:
+        hours = weekly[staff.id]
+        template = np.full((7, 2), -1, dtype=np.int64)
+        for day, (opens, closes) in hours.items():
+            template[day] = (opens, closes)
+        working = template[weekdays, 0] >= 0
+        base = day_index[working] * MINUTES_PER_DAY
+        work = _mask(base + template[weekdays[working], 0], base + template[weekdays[working], 1], length)
+
+        block_starts, block_ends = [], []
+        if staff.break_start and staff.break_end:
+            block_starts.append(base + _minute(staff.break_start))
+            block_ends.append(base + _minute(staff.break_end))
+        periods = list(absences.get(staff.id, []))
+        if staff.out_of_office and staff.out_of_office_start and staff.out_of_office_end:
+            periods.append((staff.out_of_office_start, staff.out_of_office_end))
+        if periods:
+            block_starts.append(_offsets([period[0] for period in periods], range_start))
+            block_ends.append(_offsets([period[1] for period in periods], range_start))
+        if block_starts:
+            work &= ~_mask(np.concatenate(block_starts), np.concatenate(block_ends), length)
+
+        mine = booking_staff == staff.id
+        base = booking_day[mine] * MINUTES_PER_DAY
+        booked = _mask(base + booking_start[mine], base + booking_end[mine], length) & work
+
+        available = _fold(work, weekdays)
+        booked = _fold(booked, weekdays)
+        available_total += available
+        booked_total += booked
+        staff_results.append({
+            'id': staff.id,
+            'name': staff.name,
+            'available_minutes': int(available.sum()),
+            'booked_minutes': int(booked.sum()),
+            'utilization': _ratio(booked, available),
+        })
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'days': days,
+        'available_minutes': available_total.tolist(),
+        'booked_minutes': booked_total.tolist(),
+        'utilization': _ratio(booked_total, available_total),
+        'demand': demand.tolist(),
+        'staff': staff_results,
+    }
+
+
+def _ratio(booked: np.ndarray, available: np.ndarray) -> list:
+    """booked / available rounded to 3 places, None where nothing was available"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.round(booked / available, 3)
+    return [[None if available[row, col] == 0 else float(ratio[row, col]) for col in range(24)] for row in range(7)]
+
+
+UTILIZATION_VERSION = 'companies.utilization'
+
+
+def company_utilization(company, days: int = 90) -> dict:
+    """Heatmaps of the last `days` days up to today, cached until the company's schedule or bookings change"""
+    days = max(1, min(days, MAX_RANGE_DAYS))
+    end = timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    version = get_version(company.id, UTILIZATION_VERSION)
+    key = f"companies:utilization:{company.id}:{start}:{end}:{version}"
+    result = cache.get(key)
+    if result is None:
+        result = compute_utilization(company, start, end)
+        cache.set(key, result, getattr(settings, 'UTILIZATION_CACHE_TTL', 15 * 60))
+    return result
+
+
+def invalidate_utilization(company_id):
+    bump_version(company_id, UTILIZATION_VERSION)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@receiver(post_save, sender=Staff)
+@receiver(post_delete, sender=Staff)
+@receiver(post_save, sender=Service)
+@receiver(post_save, sender=WorkingHours)
+@receiver(post_delete, sender=WorkingHours)
+def invalidate_on_company_write(sender, instance, **kwargs):
+    if instance.company_id:
+        invalidate_utilization(instance.company_id)
+
+
+@receiver(post_save, sender=StaffWorkingHours)
+@receiver(post_delete, sender=StaffWorkingHours)
+@receiver(post_save, sender=StaffOutOfOffice)
+@receiver(post_delete, sender=StaffOutOfOffice)
+def invalidate_on_staff_schedule(sender, instance, **kwargs):
+    company_id = Staff.objects.filter(id=instance.staff_id).values_list('company_id', flat=True).first()
+    if company_id:
+        invalidate_utilization(company_id)
@@ -21,17 +21,21 @@ from django.core.mail import send_mail, EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.urls import reverse
 from django.conf import settings
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db.models import Q
 from django.db import models
 from .models import Company, Staff, Service, WorkingHours, CompanyImage, EmailLog, StaffWorkingHours, StaffOutOfOffice
 from .forms import CompanyRegistrationForm, CompanyProfileForm, CompanyStaffForm, CompanyStaffActivateForm, ServiceForm
 from .utils import make_random_password
+from .utilization import MAX_RANGE_DAYS, company_utilization
 from billing.models import Subscription
 from users.models import UserProfile
 from companies.models import DAYS_OF_WEEK
-from bookings.models import Customer, Booking
+from bookings.models import Customer, Booking, CompanyCustomer
+from bookings.customer_search import search_customers, SEARCH_LIMIT
+from bookings.daily_stats import company_booking_stats
 from app.decorators import subscription_required
+from app.exports import CHUNK_SIZE, export_format, export_response
+from app.pagination import BOOKING_ORDERING, CUSTOMER_ORDERING, keyset_page, paginate
 
 
 logger = logging.getLogger(__name__)
@@ -1223,27 +1227,16 @@ def customers_list(request):
     """List of customers for staff/admin"""
     try:
         profile = request.user.userprofile
-        customers = Customer.objects.filter(booking__company=profile.company).distinct()
+        customers = Customer.objects.filter(company_links__company=profile.company)
         
         # Search functionality
         search_query = request.GET.get('search', '').strip()
         if search_query:
-            customers = customers.filter(
-                Q(name__icontains=search_query) | 
-                Q(phone__icontains=search_query)
-            )
-        
-        customers = customers.order_by('name')
+            matches = search_customers(profile.company, search_query, limit=SEARCH_LIMIT)
+            customers = customers.filter(id__in=[customer['id'] for customer in matches])
         
-        # Pagination
-        paginator = Paginator(customers, 25)  # Show 25 customers per page
-        page = request.GET.get('page')
-        try:
-            customers_page = paginator.page(page)
-        except PageNotAnInteger:
-            customers_page = paginator.page(1)
-        except EmptyPage:
-            customers_page = paginator.page(paginator.num_pages)
+        # Keyset pagination on (name, id)
+        customers_page = paginate(request, customers, CUSTOMER_ORDERING, 25, with_count=True)
         
         context = {
             'customers': customers_page,
@@ -1264,50 +1257,69 @@ def search_customers_ajax(request):
     try:
         profile = request.user.userprofile
         search_query = request.GET.get('search', '').strip()
-        page = request.GET.get('page', 1)
-        
-        customers = Customer.objects.filter(booking__company=profile.company).distinct()
         
         if search_query:
-            customers = customers.filter(
-                Q(name__icontains=search_query) | 
-                Q(phone__icontains=search_query)
+            # Matches come from the company's autocomplete index, not a join through bookings
+            customers = sorted(
+                search_customers(profile.company, search_query, limit=SEARCH_LIMIT),
+                key=lambda customer: (customer['name'], customer['id'])
             )
+        else:
+            customers = Customer.objects.filter(company_links__company=profile.company).values('id', 'name', 'phone')
         
-        customers = customers.order_by('name')
-        
-        # Pagination
-        paginator = Paginator(customers, 25)
-        try:
-            customers_page = paginator.page(page)
-        except (PageNotAnInteger, EmptyPage):
-            customers_page = paginator.page(1)
+        # Keyset pagination on (name, id); the total only when asked for (?count=1) or searching
+        customers_page = keyset_page(
+            customers, CUSTOMER_ORDERING, 25,
+            after=request.GET.get('after'), before=request.GET.get('before'),
+            with_count=bool(search_query) or request.GET.get('count') == '1',
+        )
         
         # Build customer data
         customers_data = []
         for customer in customers_page:
             customers_data.append({
-                'id': customer.id,
-                'name': customer.name,
-                'phone': customer.phone,
+                'id': customer['id'],
+                'name': customer['name'],
+                'phone': customer['phone'],
             })
         
         return JsonResponse({
             'success': True,
             'customers': customers_data,
-            'has_previous': customers_page.has_previous(),
-            'has_next': customers_page.has_next(),
-            'current_page': customers_page.number,
-            'total_pages': customers_page.paginator.num_pages,
-            'total_count': customers_page.paginator.count,
-            'previous_page': customers_page.previous_page_number() if customers_page.has_previous() else None,
-            'next_page': customers_page.next_page_number() if customers_page.has_next() else None,
+            **customers_page.as_dict(),
         })
     
     except UserProfile.DoesNotExist:
         return JsonResponse({'error': 'User profile not found'}, status=403)
 
 
+@login_required
+@subscription_required
+def export_customers(request):
+    """Stream the company's customers with their totals as CSV or XLSX"""
+    try:
+        profile = request.user.userprofile
+    except UserProfile.DoesNotExist:
+        messages.error(request, 'User profile not found.')
+        return redirect('/')
+    
+    links = CompanyCustomer.objects.filter(company=profile.company).select_related('customer')
+    search_query = request.GET.get('search', '').strip()
+    if search_query:
+        matches = search_customers(profile.company, search_query, limit=SEARCH_LIMIT)
+        links = links.filter(customer_id__in=[customer['id'] for customer in matches])
+    
+    header = ['ID', 'Name', 'Phone', 'Email', 'Bookings', 'Visits', 'First visit', 'Last visit', 'Total spent']
+    rows = (
+        [
+            link.customer.id, link.customer.name, link.customer.phone, link.customer.email,
+            link.booking_count, link.visit_count, link.first_visit, link.last_visit, link.total_spent,
+        ]
+        for link in links.order_by('customer__name', 'customer__id').iterator(chunk_size=CHUNK_SIZE)
+    )
+    return export_response(f"customers_{timezone.localdate():%Y%m%d}", header, rows, export_format(request))
+
+
 @login_required
 @subscription_required
 def customer_detail(request, customer_id):
@@ -1317,30 +1329,23 @@ def customer_detail(request, customer_id):
         customer = get_object_or_404(Customer, id=customer_id)
         
         # Ensure the customer is associated with the company/staff
-        if not customer.booking_set.filter(company=profile.company).exists():
+        customer_stats = CompanyCustomer.objects.filter(company=profile.company, customer=customer).first()
+        if customer_stats is None:
             messages.error(request, 'Access denied.')
             return redirect('customers_list')
         
-        # Get bookings with pagination
-        customer_bookings_list = customer.booking_set.filter(company=profile.company).order_by('-date', '-start_time')
-        paginator = Paginator(customer_bookings_list, 25)  # Show 25 bookings per page
-        page = request.GET.get('page')
-        try:
-            customer_bookings = paginator.page(page)
-        except PageNotAnInteger:
-            customer_bookings = paginator.page(1)
-        except EmptyPage:
-            customer_bookings = paginator.page(paginator.num_pages)
-        
-        # Get services and their counts (only confirmed bookings)
-        customer_services = Service.objects.filter(booking__customer=customer, booking__company=profile.company, booking__status=1).distinct()
-        service_counter_dict = {}
-        for service in customer_services:
-            count = customer.booking_set.filter(service=service, company=profile.company, status=1).count()
-            service_counter_dict[service.id] = count
+        # Bookings, keyset paginated; the total is on the stats row
+        customer_bookings_list = customer.booking_set.filter(company=profile.company).select_related('service', 'staff')
+        customer_bookings = paginate(request, customer_bookings_list, BOOKING_ORDERING, 25)
+        customer_bookings.count = customer_stats.booking_count
+        
+        # Services and their counts (only confirmed bookings), from the running totals
+        service_counter_dict = {int(service_id): count for service_id, count in customer_stats.service_counts.items()}
+        customer_services = Service.objects.filter(id__in=service_counter_dict)
         
         context = {
             'customer': customer,
+            'customer_stats': customer_stats,
             'company': profile.company,
             'customer_bookings': customer_bookings,
             'customer_services': customer_services,
@@ -1366,7 +1371,7 @@ def update_customer(request, customer_id):
     customer = get_object_or_404(Customer, id=customer_id)
     
     # Ensure the customer is associated with the company
-    if not customer.booking_set.filter(company=profile.company).exists():
+    if not CompanyCustomer.objects.filter(company=profile.company, customer=customer).exists():
         return JsonResponse({'error': _('Access denied')}, status=403)
     
     try:
@@ -1545,32 +1550,24 @@ def service_analytics(request):
         # Get confirmed bookings only (status=1)
         confirmed_bookings = bookings.filter(status=1)
         
+        # Confirmed-booking totals per service, staff and month: grouped sums of the daily rollup
+        stats = company_booking_stats(company, start_date)
+        total_bookings = stats['booking_count']
+        total_revenue = stats['revenue']
+        
         # Service analytics
         service_stats = []
-        total_bookings = confirmed_bookings.count()
-        total_revenue = confirmed_bookings.aggregate(
-            total=Sum('price')
-        )['total'] or 0
-        
         for service in services:
-            service_bookings = confirmed_bookings.filter(service=service)
-            booking_count = service_bookings.count()
-            revenue = service_bookings.aggregate(total=Sum('price'))['total'] or 0
-            
-            # Calculate percentage
-            percentage = (booking_count / total_bookings * 100) if total_bookings > 0 else 0
-            revenue_percentage = (revenue / total_revenue * 100) if total_revenue > 0 else 0
-            
-            # Get unique customers for this service
-            unique_customers = service_bookings.values('customer').distinct().count()
-            
+            row = stats['services'].get(service.id)
+            booking_count = row['booking_count'] if row else 0
+            revenue = row['revenue'] if row else 0
             service_stats.append({
                 'service': service,
                 'booking_count': booking_count,
                 'revenue': revenue,
-                'percentage': round(percentage, 1),
-                'revenue_percentage': round(revenue_percentage, 1),
-                'unique_customers': unique_customers,
+                'percentage': row['share'] if row else 0,
+                'revenue_percentage': row['revenue_share'] if row else 0,
+                'unique_customers': row['unique_customers'] if row else 0,
                 'avg_price': round(revenue / booking_count, 2) if booking_count > 0 else 0,
             })
         
@@ -1602,13 +1599,7 @@ def service_analytics(request):
         
         # Monthly trends (last 12 months or within date range)
         if date_range == 'all' or int(date_range) >= 90:
-            from django.db.models.functions import TruncMonth
-            monthly_data = confirmed_bookings.annotate(
-                month=TruncMonth('date')
-            ).values('month').annotate(
-                count=Count('id'),
-                revenue=Sum('price')
-            ).order_by('month')
+            monthly_data = stats['months']
         else:
             monthly_data = []
         
@@ -1628,19 +1619,12 @@ def service_analytics(request):
         staff_stats = []
         
         for staff in staff_members:
-            staff_bookings = confirmed_bookings.filter(staff=staff)
-            booking_count = staff_bookings.count()
-            revenue = staff_bookings.aggregate(total=Sum('price'))['total'] or 0
-            
-            # Calculate effectiveness percentage
-            effectiveness = (booking_count / total_bookings * 100) if total_bookings > 0 else 0
-            revenue_percentage = (revenue / total_revenue * 100) if total_revenue > 0 else 0
-            
-            # Get unique customers served by this staff member
-            unique_customers = staff_bookings.values('customer').distinct().count()
+            row = stats['staff'].get(staff.id)
+            booking_count = row['booking_count'] if row else 0
+            revenue = row['revenue'] if row else 0
             
             # Calculate time-based metrics
-            total_minutes = staff_bookings.aggregate(total=Sum('duration'))['total'] or 0
+            total_minutes = row['minutes'] if row else 0
             hours = int(total_minutes // 60) if total_minutes > 0 else 0
             minutes = int(total_minutes % 60) if total_minutes > 0 else 0
             avg_duration = round(total_minutes / booking_count, 0) if booking_count > 0 else 0
@@ -1649,9 +1633,9 @@ def service_analytics(request):
                 'staff': staff,
                 'booking_count': booking_count,
                 'revenue': revenue,
-                'effectiveness': round(effectiveness, 1),
-                'revenue_percentage': round(revenue_percentage, 1),
-                'unique_customers': unique_customers,
+                'effectiveness': row['share'] if row else 0,
+                'revenue_percentage': row['revenue_share'] if row else 0,
+                'unique_customers': row['unique_customers'] if row else 0,
                 'avg_booking_value': round(revenue / booking_count, 2) if booking_count > 0 else 0,
                 'total_hours': hours,
                 'total_minutes': minutes,
@@ -1681,4 +1665,25 @@ def service_analytics(request):
     
     except UserProfile.DoesNotExist:
         messages.error(request, 'User profile not found.')
-        return redirect('/')
\ No newline at end of file
+        return redirect('/')
+
+
+@login_required
+@subscription_required
+def utilization_heatmap(request):
+    """JSON weekday × hour utilization and demand heatmaps for the analytics page"""
+    try:
+        profile = request.user.userprofile
+    except UserProfile.DoesNotExist:
+        return JsonResponse({'error': 'User profile not found'}, status=403)
+    if not profile.is_admin:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    # Same range values as the analytics page; 'all' is capped to a year
+    date_range = request.GET.get('range', '90')
+    try:
+        days = MAX_RANGE_DAYS if date_range == 'all' else int(date_range)
+    except (ValueError, TypeError):
+        days = 90
+    
+    return JsonResponse({'success': True, **company_utilization(profile.company, days)})
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import WhatsAppConversation, WhatsAppMessage, PendingBooking
+from .models import (
+    WhatsAppConversation, WhatsAppMessage, PendingBooking, OpenAIUsageDaily,
+    MessageDeliveryStatus, MessageDeliveryDaily
+)
 
 
 @admin.register(WhatsAppConversation)
@@ -31,3 +34,36 @@ class PendingBookingAdmin(admin.ModelAdmin):
     list_filter = ['created_at', 'booking_date']
     search_fields = ['customer_name', 'service_name']
     readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(OpenAIUsageDaily)
+class OpenAIUsageDailyAdmin(admin.ModelAdmin):
+    list_display = ['date', 'company', 'model', 'language', 'calls', 'failures',
+                    'prompt_tokens', 'completion_tokens', 'cost', 'avg_latency_ms']
+    list_filter = ['date', 'model', 'language']
+    search_fields = ['company__name']
+    ordering = ['-date', '-cost']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('company')
+
+
+@admin.register(MessageDeliveryStatus)
+class MessageDeliveryStatusAdmin(admin.ModelAdmin):
+    list_display = ['message_sid', 'company', 'kind', 'to_number', 'status', 'error_code', 'created_at', 'updated_at']
+    list_filter = ['kind', 'status', 'created_at']
+    search_fields = ['message_sid', 'to_number', 'company__name']
+    readonly_fields = ['created_at', 'updated_at', 'delivered_at', 'read_at']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('company')
+
+
+@admin.register(MessageDeliveryDaily)
+class MessageDeliveryDailyAdmin(admin.ModelAdmin):
+    list_display = ['date', 'company', 'kind', 'sent', 'delivered', 'read', 'failed']
+    list_filter = ['date', 'kind']
+    search_fields = ['company__name']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('company')
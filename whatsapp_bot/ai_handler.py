@@ -3,19 +3,67 @@ AI Handler for WhatsApp Booking Bot
 Uses OpenAI to extract booking intent and generate natural language responses
 """
 import logging
+import threading
+import time
 from typing import Dict, Any
-from datetime import datetime
 import json
 from django.conf import settings
+from django.utils import timezone
+
+from .intent_cache import intent_cache
+from .metrics import openai_usage
+from .message_catalog import render
 
 try:
-    from openai import OpenAI
+    import httpx
+    from openai import OpenAI, DefaultHttpxClient
     OPENAI_AVAILABLE = True
 except ImportError:
     OPENAI_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+
+# Extraction prompts per (language, date); only a few days are ever live
+_prompt_cache = {}
+_prompt_lock = threading.Lock()
+
+
+def get_openai_client():
+    """
+    Return the process-wide OpenAI client
+
+    One client means one pooled HTTP connection set with explicit
+    timeouts and a bounded number of retries per call.
+    """
+    global _client, _client_key
+    
+    api_key = getattr(settings, 'OPENAI_API_KEY', None)
+    with _client_lock:
+        if _client is None or _client_key != api_key:
+            timeout = httpx.Timeout(
+                getattr(settings, 'OPENAI_READ_TIMEOUT', 15.0),
+                connect=getattr(settings, 'OPENAI_CONNECT_TIMEOUT', 3.0),
+            )
+            max_connections = getattr(settings, 'OPENAI_MAX_CONNECTIONS', 20)
+            _client = OpenAI(
+                api_key=api_key,
+                timeout=timeout,
+                max_retries=getattr(settings, 'OPENAI_MAX_RETRIES', 1),
+                http_client=DefaultHttpxClient(
+                    timeout=timeout,
+                    limits=httpx.Limits(
+                        max_connections=max_connections,
+                        max_keepalive_connections=max_connections,
+                    ),
+                ),
+            )
+            _client_key = api_key
+        return _client
+
 
 class BookingAI:
     """AI-powered booking assistant"""
@@ -28,13 +76,13 @@ class BookingAI:
         if not api_key:
             raise ValueError("OPENAI_API_KEY not configured in settings")
         
-        self.client = OpenAI(api_key=api_key)
+        self.client = get_openai_client()
         self.model = getattr(settings, 'OPENAI_MODEL', 'gpt-4o-mini')
     
-    def _get_day_names_calendar(self, lang: str) -> tuple:
+    def _get_day_names_calendar(self, lang: str, today=None) -> tuple:
         """Generate calendar reference for date extraction"""
         from datetime import timedelta
-        today = datetime.now().date()
+        today = today or timezone.localdate()
         
         day_names = {
             0: {'es': 'lunes', 'en': 'Monday', 'ru': 'понедельник', 'uk': 'понеділок'},
@@ -156,20 +204,13 @@ Return JSON with these fields (ONLY include fields mentioned in message):
 
 Do NOT include fields that are not mentioned in the message."""
     
-    def _build_extraction_prompt(self, lang: str) -> str:
-        """Build complete extraction prompt from modular components"""
-        today, today_name, dates_reference = self._get_day_names_calendar(lang)
-        today_date = today.strftime('%Y-%m-%d')
-        
+    def _build_static_prompt(self) -> str:
+        """Build the part of the prompt that never changes between requests"""
         return f"""You are a booking assistant AI. Extract booking information from user messages.
-Current language: {lang}
-Today is {today_name}, {today_date}
 
 TASK: Extract ONLY the booking details mentioned in the message.
 Do NOT invent or assume information.
 
-{self._build_date_extraction_prompt(dates_reference, today_date)}
-
 {self._build_time_extraction_prompt()}
 
 {self._build_service_extraction_prompt()}
@@ -178,17 +219,58 @@ Do NOT invent or assume information.
 
 {self._build_output_format_prompt()}"""
     
-    def extract_booking_intent(self, message: str, conversation_state: dict) -> Dict[str, Any]:
+    def _build_extraction_prompt(self, lang: str, today=None) -> str:
+        """
+        Build complete extraction prompt from modular components
+        
+        The static rules come first and the date-dependent calendar last, so
+        the prefix is byte-identical across requests (provider-side prompt
+        caching). The result is memoized per (language, date).
+        """
+        today = today or timezone.localdate()
+        key = (lang, today)
+        prompt = _prompt_cache.get(key)
+        if prompt is not None:
+            return prompt
+        
+        today, today_name, dates_reference = self._get_day_names_calendar(lang, today)
+        today_date = today.strftime('%Y-%m-%d')
+        
+        prompt = f"""{self._build_static_prompt()}
+
+Current language: {lang}
+Today is {today_name}, {today_date}
+
+{self._build_date_extraction_prompt(dates_reference, today_date)}"""
+        
+        with _prompt_lock:
+            # Drop prompts from previous days
+            for old_key in [k for k in _prompt_cache if k[1] != today]:
+                del _prompt_cache[old_key]
+            _prompt_cache[key] = prompt
+        return prompt
+    
+    def extract_booking_intent(self, message: str, conversation_state: dict, company=None) -> Dict[str, Any]:
         """
         Extract booking intent from natural language message
         
         Returns dict with extracted booking information
         """
         lang = conversation_state.get('language', 'es')
+        # One "today" for the cache key and the prompt's calendar
+        today = timezone.localdate()
+        
+        # Identical phrases ("mañana", "por la tarde") are answered from cache
+        cached = intent_cache.get(message, lang, today)
+        if cached is not None:
+            logger.info(f"Cached intent: {cached}")
+            return cached
         
         # Build the system prompt from modular components
-        system_prompt = self._build_extraction_prompt(lang)
+        system_prompt = self._build_extraction_prompt(lang, today)
         
+        response = None
+        started = time.monotonic()
         try:
             response = self.client.chat.completions.create(
                 model=self.model,
@@ -202,13 +284,30 @@ Do NOT invent or assume information.
             
             result = json.loads(response.choices[0].message.content)
             logger.info(f"AI extracted intent: {result}")
+            self._record_usage(response, started, company, lang, success=True)
+            # Only successful answers are cached, never the fallback
+            intent_cache.set(message, lang, result, today)
             return result
             
         except Exception as e:
             logger.error(f"OpenAI API error: {e}")
+            self._record_usage(response, started, company, lang, success=False)
             # Fallback: simple intent detection
             return self._fallback_intent_detection(message)
     
+    def _record_usage(self, response, started: float, company, lang: str, success: bool):
+        """Record tokens and latency of one call (tokens are billed even if parsing failed)"""
+        usage = getattr(response, 'usage', None)
+        openai_usage.record(
+            model=self.model,
+            company_id=company.id if company else None,
+            language=lang,
+            prompt_tokens=getattr(usage, 'prompt_tokens', 0) or 0,
+            completion_tokens=getattr(usage, 'completion_tokens', 0) or 0,
+            seconds=time.monotonic() - started,
+            success=success
+        )
+    
     def _fallback_intent_detection(self, message: str) -> Dict[str, Any]:
         """Simple fallback if AI fails - just return empty dict"""
         return {}
@@ -244,94 +343,22 @@ Do NOT invent or assume information.
     
     def _generate_slots_message(self, slots: list, company, service, date: str, lang: str) -> str:
         """Generate available slots message"""
-        messages = {
-            'es': {
-                'header': "✅ Horarios disponibles para {service} el {date}:\n\n",
-                'slot': "{num}. {time} - {staff}\n",
-                'footer': "\n📝 Responde con el número de tu opción preferida (1-{count})."
-            },
-            'en': {
-                'header': "✅ Available times for {service} on {date}:\n\n",
-                'slot': "{num}. {time} - {staff}\n",
-                'footer': "\n📝 Reply with your preferred option number (1-{count})."
-            },
-            'ru': {
-                'header': "✅ Доступное время для {service} {date}:\n\n",
-                'slot': "{num}. {time} - {staff}\n",
-                'footer': "\n📝 Ответьте номером вашего варианта (1-{count})."
-            },
-            'uk': {
-                'header': "✅ Доступні часи для {service} {date}:\n\n",
-                'slot': "{num}. {time} - {staff}\n",
-                'footer': "\n📝 Відповідайте номером вашого варіанту (1-{count})."
-            }
-        }
-        
-        templates = messages.get(lang, messages['es'])
-        
-        response = templates['header'].format(
-            service=service.name if service else '',
-            date=date
-        )
+        response = render('slots_header', lang, service=service.name if service else '', date=date)
         
         for idx, slot in enumerate(slots, 1):
-            response += templates['slot'].format(
-                num=idx,
-                time=slot['time'],
-                staff=slot['staff']
-            )
+            response += f"{idx}. {slot['time']} - {slot['staff']}\n"
         
-        response += templates['footer'].format(count=len(slots))
+        response += render('slots_footer', lang, count=len(slots))
         return response
     
     def _generate_confirmation_message(self, booking, lang: str) -> str:
         """Generate booking confirmation message"""
-        messages = {
-            'es': """✅ ¡Reserva confirmada!
-
-📅 Fecha: {date}
-🕐 Hora: {time}
-✂️ Servicio: {service}
-👤 Especialista: {staff}
-📍 Salón: {company}
-
-¡Nos vemos pronto! 👋""",
-            'en': """✅ Booking confirmed!
-
-📅 Date: {date}
-🕐 Time: {time}
-✂️ Service: {service}
-👤 Specialist: {staff}
-📍 Salon: {company}
-
-See you soon! 👋""",
-            'ru': """✅ Бронирование подтверждено!
-
-📅 Дата: {date}
-🕐 Время: {time}
-✂️ Услуга: {service}
-👤 Специалист: {staff}
-📍 Салон: {company}
-
-До встречи! 👋""",
-            'uk': """✅ Бронювання підтверджено!
-
-📅 Дата: {date}
-🕐 Час: {time}
-✂️ Послуга: {service}
-👤 Спеціаліст: {staff}
-📍 Салон: {company}
-
-До зустрічі! 👋"""
-        }
-        
-        template = messages.get(lang, messages['es'])
-        
         # Generate booking URL
-        from django.conf import settings
-        booking_url = f"{settings.SITE_URL}/es/bookings/confirmation/{booking.id}/" if hasattr(settings, 'SITE_URL') else f"https://reserva-ya.es/es/bookings/confirmation/{booking.id}/"
+        site_url = getattr(settings, 'SITE_URL', 'https://reserva-ya.es')
+        booking_url = f"{site_url}/es/bookings/confirmation/{booking.id}/"
         
-        response = template.format(
+        response = render(
+            'booking_confirmed', lang,
             date=booking.date.strftime('%d/%m/%Y'),
             time=booking.start_time.strftime('%H:%M'),
             service=booking.service.name,
@@ -340,13 +367,7 @@ See you soon! 👋""",
         )
         
         # Add booking link
-        link_messages = {
-            'es': f"\n🔗 Ver detalles: {booking_url}",
-            'en': f"\n🔗 View details: {booking_url}",
-            'ru': f"\n🔗 Просмотреть детали: {booking_url}",
-            'uk': f"\n🔗 Переглянути деталі: {booking_url}"
-        }
-        response += link_messages.get(lang, link_messages['es'])
+        response += render('booking_details_link', lang, url=booking_url)
         
         return response
     
@@ -354,10 +375,4 @@ See you soon! 👋""",
         """Generate generic AI response"""
         # For now, return a simple message
         # You can enhance this with OpenAI later if needed
-        messages = {
-            'es': "¿En qué puedo ayudarte?",
-            'en': "How can I help you?",
-            'ru': "Чем могу помочь?",
-            'uk': "Як я можу допомогти?"
-        }
-        return messages.get(lang, messages['es'])
+        return render('generic_help', lang)
@@ -5,3 +5,7 @@ class WhatsappBotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'whatsapp_bot'
     verbose_name = 'WhatsApp AI Bot'
+
+    def ready(self):
+        # Connect signal handlers that keep in-memory indexes and caches fresh
+        from . import salon_index, message_catalog
@@ -0,0 +1,181 @@
+"""
+Per-phone backpressure for WhatsApp Booking Bot
+Rate limits senders and serializes messages from the same phone number
+
+Messages that arrive while an earlier one from the same number is still
+being handled wait for it instead of racing on the conversation state.
+The lock, the queue of waiting messages and the rate counters are rows in
+the database, so they hold across workers. The request that gets the lock
+picks up everything queued for the number and answers the burst in one
+pass; the requests whose messages it took return an empty reply.
+"""
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import WhatsAppPhoneLock, WhatsAppQueuedMessage, WhatsAppRateCounter
+
+logger = logging.getLogger(__name__)
+
+# Queued messages outlive any realistic burst
+QUEUE_TTL = 10 * 60
+
+
+class SenderRateLimiter:
+    """Fixed-window message counter per phone number, one database row per number"""
+
+    def __init__(self, limit: int = None, window: int = None):
+        self.limit = limit or getattr(settings, 'WHATSAPP_RATE_LIMIT', 20)
+        self.window = window or getattr(settings, 'WHATSAPP_RATE_LIMIT_WINDOW', 60)
+
+    def hit(self, phone_number: str) -> int:
+        """Count a message and return how many this number sent in the current window"""
+        window = int(time.time() // self.window)
+        counters = WhatsAppRateCounter.objects.filter(phone_number=phone_number)
+        for _ in range(3):
+            if counters.filter(window=window).update(count=F('count') + 1):
+                break
+            # First message of a new window
+            if counters.filter(window__lt=window).update(window=window, count=1):
+                break
+            try:
+                with transaction.atomic():
+                    WhatsAppRateCounter.objects.create(phone_number=phone_number, window=window, count=1)
+                break
+            except IntegrityError:
+                # Another request created it in between
+                continue
+        return counters.values_list('count', flat=True).first() or 1
+
+
+class PhoneBusy(Exception):
+    """The number's lock was not released within WHATSAPP_PHONE_LOCK_WAIT"""
+
+
+class PhoneGate:
+    """Per-number lock with a queue of messages waiting for it"""
+
+    def __init__(self, coalesce_window: float = None, lock_wait: float = None,
+                 lock_timeout: int = 60, max_burst: int = 20):
+        self.coalesce_window = getattr(settings, 'WHATSAPP_COALESCE_WINDOW', 0.8) if coalesce_window is None else coalesce_window
+        self.lock_wait = getattr(settings, 'WHATSAPP_PHONE_LOCK_WAIT', 10.0) if lock_wait is None else lock_wait
+        self.lock_timeout = lock_timeout
+        self.max_burst = max_burst
+
+    @contextmanager
+    def burst(self, phone_number: str, item: dict):
+        """
+        Queue a message and wait for the number's lock
+
+        Yields the queued messages to handle, oldest first (always including
+        this one), or None when the lock holder already took this message.
+        Raises PhoneBusy if the lock is not free within lock_wait: handling
+        the message next to the holder would race on the conversation.
+        """
+        arrived = time.monotonic()
+        seq = WhatsAppQueuedMessage.objects.create(phone_number=phone_number, item=item).pk
+        queued = WhatsAppQueuedMessage.objects.filter(pk=seq)
+        token = uuid.uuid4().hex
+
+        waited = False
+        while not self._acquire(phone_number, token):
+            waited = True
+            if not queued.exists():
+                yield None
+                return
+            if time.monotonic() - arrived >= self.lock_wait:
+                deleted, _ = queued.delete()
+                if not deleted:
+                    # The holder took it just now and answers it
+                    yield None
+                    return
+                raise PhoneBusy(phone_number)
+            time.sleep(0.05)
+
+        try:
+            if waited:
+                # We are in the middle of a burst: give the rest of it a moment to arrive
+                remaining = arrived + self.coalesce_window - time.monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
+            yield self._drain(phone_number, seq) or None
+        finally:
+            WhatsAppPhoneLock.objects.filter(phone_number=phone_number, token=token).delete()
+
+    def _acquire(self, phone_number: str, token: str) -> bool:
+        """Take the number's lock; False while another request holds it"""
+        now = timezone.now()
+        # A holder that died leaves its row behind until it expires
+        WhatsAppPhoneLock.objects.filter(phone_number=phone_number, expires_at__lt=now).delete()
+        try:
+            with transaction.atomic():
+                WhatsAppPhoneLock.objects.create(
+                    phone_number=phone_number,
+                    token=token,
+                    expires_at=now + timedelta(seconds=self.lock_timeout)
+                )
+        except IntegrityError:
+            return False
+        return True
+
+    def _drain(self, phone_number: str, seq: int) -> list:
+        """Take every message still queued for the number, at most max_burst besides this one"""
+        cutoff = timezone.now() - timedelta(seconds=QUEUE_TTL)
+        with transaction.atomic():
+            # Locked rows keep a waiter that gives up from deleting a message taken here
+            rows = list(
+                WhatsAppQueuedMessage.objects.select_for_update().filter(phone_number=phone_number).order_by('id')
+            )
+            WhatsAppQueuedMessage.objects.filter(pk__in=[row.pk for row in rows]).delete()
+        rows = [row for row in rows if row.created_at >= cutoff or row.pk == seq]
+        if len(rows) > self.max_burst:
+            first = min(seq, rows[-self.max_burst].pk)
+            rows = [row for row in rows if row.pk >= first]
+        return [row.item for row in rows]
+
+
+def cleanup_phone_gates(window: int = None) -> int:
+    """Delete expired locks, abandoned queued messages and rate counters of past windows"""
+    window = window or getattr(settings, 'WHATSAPP_RATE_LIMIT_WINDOW', 60)
+    now = timezone.now()
+    deleted = WhatsAppPhoneLock.objects.filter(expires_at__lt=now).delete()[0]
+    deleted += WhatsAppQueuedMessage.objects.filter(
+        created_at__lt=now - timedelta(seconds=QUEUE_TTL)
+    ).delete()[0]
+    deleted += WhatsAppRateCounter.objects.filter(window__lt=int(time.time() // window)).delete()[0]
+    return deleted
+
+
+def coalesce_messages(bodies: list) -> list:
+    """
+    Join consecutive free-text messages into one
+
+    Bare numbers are menu or slot choices and stay separate, so
+    ["quiero manicura", "mañana a las 5", "2"] becomes
+    ["quiero manicura mañana a las 5", "2"].
+    """
+    merged = []
+    joinable = False
+    for body in bodies:
+        body = body.strip()
+        if not body:
+            continue
+        if body.isdigit():
+            merged.append(body)
+            joinable = False
+        elif joinable:
+            merged[-1] = f"{merged[-1]} {body}"
+        else:
+            merged.append(body)
+            joinable = True
+    return merged or ['']
+
+
+rate_limiter = SenderRateLimiter()
+phone_gate = PhoneGate()
@@ -2,15 +2,19 @@
 Booking Handler - Find availability and create bookings
 """
 import logging
+import time
+from collections import defaultdict
 from datetime import datetime, timedelta, time as dtime
 from hashlib import md5
+from django.conf import settings
 from django.utils import timezone
 from django.db.models import Q
-from fuzzywuzzy import fuzz
-from companies.models import Company, Service, Staff, WorkingHours, StaffOutOfOffice
+from companies.models import Company, Service, Staff, WorkingHours, StaffWorkingHours, StaffOutOfOffice
 from bookings.models import Booking, Customer
 from bookings.utils import normalize_phone_number
-from bookings.models import Booking, Customer
+from app.ranges import aware, day_bounds
+from .salon_index import company_name_index
+from .service_matcher import get_company_catalog
 
 logger = logging.getLogger(__name__)
 
@@ -28,23 +32,16 @@ class BookingSearcher:
         companies = Company.objects.filter(online_appointments_enabled=True)
         
         # Try exact match first
-        exact = companies.filter(name__iexact=company_name).first()
-        if exact:
-            return exact
-        
-        # Fuzzy matching
-        best_match = None
-        best_score = 0
+        exact_id = company_name_index.exact(company_name)
+        if exact_id:
+            return companies.filter(id=exact_id).first()
         
-        for company in companies:
-            score = fuzz.ratio(company_name.lower(), company.name.lower())
-            if score > best_score:
-                best_score = score
-                best_match = company
+        # Fuzzy matching over the top trigram candidates only
+        candidates = company_name_index.candidates(company_name)
         
         # Return if confidence is high enough
-        if best_score > 70:
-            return best_match
+        if candidates and candidates[0][1] > 70:
+            return companies.filter(id=candidates[0][0]).first()
         
         return None
     
@@ -55,68 +52,33 @@ class BookingSearcher:
         if not service_name or not company:
             return None
         
-        services = Service.objects.filter(company=company, is_active=True)
-        
-        # Translation mapping for common service terms
-        translations = {
-            'маникюр': 'manicura',
-            'манікюр': 'manicura',
-            'педикюр': 'pedicura',
-            'педікюр': 'pedicura',
-            'стрижка': 'corte',
-            'окрашивание': 'tinte',
-            'фарбування': 'tinte',
-            'японский': 'japonesa',
-            'японська': 'japonesa',
-            'полуперманентный': 'semipermanente',
-            'напівперманентний': 'semipermanente',
-            'без покрытия': 'sin pintar',
-            'без покриття': 'sin pintar',
-            'наращивание': 'extensión',
-            'нарощування': 'extensión',
-            'ногтей': 'uñas',
-            'нігтів': 'uñas',
-        }
-        
-        # Normalize search term and translate
-        search_normalized = service_name.lower().strip()
-        
-        # Apply translations
-        for ru_term, es_term in translations.items():
-            search_normalized = search_normalized.replace(ru_term, es_term)
-        
-        # Remove parentheses
-        search_normalized = search_normalized.replace('(', '').replace(')', '')
-        
-        logger.info(f"AI extracted: '{service_name}' → Normalized: '{search_normalized}'")
+        matcher = get_company_catalog(company.id).services
+        logger.info(f"AI extracted: '{service_name}' → Normalized: '{matcher.normalize_query(service_name)}'")
         
-        # Try exact match first
-        for service in services:
-            service_normalized = service.name.replace('(', '').replace(')', '').lower().strip()
-            if search_normalized == service_normalized:
-                logger.info(f"✓ Exact match: {service.name}")
-                return service
-        
-        # Fuzzy matching
-        best_match = None
-        best_score = 0
-        
-        for service in services:
-            service_normalized = service.name.replace('(', '').replace(')', '').lower().strip()
-            score = fuzz.token_sort_ratio(search_normalized, service_normalized)
-            
-            logger.info(f"  '{service.name}' = {score}%")
-            
-            if score > best_score:
-                best_score = score
-                best_match = service
+        match = matcher.match(service_name, threshold=75)
+        if not match:
+            logger.warning(f"✗ No match found for: '{service_name}'")
+            return None
         
-        if best_score >= 75:
-            logger.info(f"✓ Best fuzzy match: {best_match.name} ({best_score}%)")
-            return best_match
+        service_id, name, score = match
+        logger.info(f"✓ Best match: {name} ({score}%)")
+        return Service.objects.filter(id=service_id, company=company, is_active=True).first()
+    
+    def find_staff(self, company: Company, staff_name: str) -> Staff:
+        """
+        Find active staff member by name using fuzzy matching
+        """
+        if not staff_name or not company:
+            return None
         
-        logger.warning(f"✗ No match found for: '{search_normalized}'")
-        return None
+        match = get_company_catalog(company.id).staff.match(staff_name, threshold=75)
+        if not match:
+            logger.info(f"✗ No staff match for: '{staff_name}'")
+            return None
+        
+        staff_id, name, score = match
+        logger.info(f"✓ Staff match: {name} ({score}%)")
+        return Staff.objects.filter(id=staff_id, company=company, is_active=True).first()
     
     def find_available_slots(self, company: Company, service: Service, 
                             date: datetime.date, time_preference: str = None, staff_id: int = None) -> list:
@@ -144,7 +106,108 @@ class BookingSearcher:
         ]
         """
         available_slots = []
+        logger.info(f"Searching availability for '{service.name}' on {date}")
+        
+        for staff in self._staff_for_service(company, service, staff_id):
+            slots = self._get_staff_available_times(staff, service, date)
+            logger.info(f"  {staff.name}: {len(slots)} slots")
+            
+            # Filter by time preference if specified
+            if time_preference:
+                slots = self._filter_by_time_preference(slots, time_preference)
+            
+            available_slots.extend(slots)
+        
+        # Sort by time
+        available_slots.sort(key=lambda x: x['time'])
+        
+        return available_slots
+    
+    def find_alternative_slots(self, company: Company, service: Service, after_date: datetime.date,
+                               staff_id: int = None, time_preference: str = None,
+                               time_after: str = None, time_before: str = None,
+                               days: int = None, max_dates: int = None, slots_per_date: int = 3) -> list:
+        """
+        Find the closest dates after `after_date` that still have free slots
+        
+        Schedules, bookings and out-of-office periods for the whole window are
+        loaded with a fixed number of queries; days are then checked in memory
+        until `max_dates` dates with slots are found, the window ends or the
+        time budget runs out. Same staff and time constraints as the original
+        search.
+        
+        Returns [{'date': date, 'slots': [slot, ...]}, ...], closest first.
+        """
+        days = days or getattr(settings, 'WHATSAPP_ALTERNATIVE_DAYS', 14)
+        max_dates = max_dates or getattr(settings, 'WHATSAPP_ALTERNATIVE_DATES', 3)
+        budget = getattr(settings, 'WHATSAPP_ALTERNATIVE_BUDGET_MS', 300) / 1000
+        started = time.monotonic()
         
+        staff_members = self._staff_for_service(company, service, staff_id)
+        if not staff_members:
+            return []
+        staff_ids = [staff.id for staff in staff_members]
+        first_date = after_date + timedelta(days=1)
+        last_date = after_date + timedelta(days=days)
+        
+        # Preload the whole window (lowest id first, like .first() in the single-day search)
+        staff_hours = {}
+        for hours in StaffWorkingHours.objects.filter(staff_id__in=staff_ids, is_day_off=False).order_by('id'):
+            staff_hours.setdefault((hours.staff_id, hours.day_of_week), hours)
+        company_hours = {}
+        for hours in WorkingHours.objects.filter(company=company, is_day_off=False).order_by('id'):
+            company_hours.setdefault(hours.day_of_week, hours)
+        
+        window_start, window_end = day_bounds(first_date)[0], day_bounds(last_date)[1]
+        bookings = defaultdict(list)
+        for booking_staff_id, booking_date, start, end in Booking.objects.filter(
+            staff_id__in=staff_ids,
+            status__in=[1, 3]  # Confirmed or PreBooked
+        ).overlapping(window_start, window_end).values_list('staff_id', 'date', 'start_at', 'end_at'):
+            bookings[booking_staff_id, booking_date].append((start, end))
+        
+        out_of_office = defaultdict(list)
+        for period in StaffOutOfOffice.objects.filter(staff_id__in=staff_ids).overlapping(window_start, window_end):
+            out_of_office[period.staff_id].append(period)
+        
+        alternatives = []
+        date = first_date
+        while date <= last_date and len(alternatives) < max_dates:
+            if time.monotonic() - started > budget:
+                logger.warning(f"Alternative search stopped at {date}: over the {budget * 1000:.0f}ms budget")
+                break
+            
+            day_slots = []
+            for staff in staff_members:
+                if self._is_off_day(staff, date):
+                    continue
+                working_hours = staff_hours.get((staff.id, date.weekday())) or company_hours.get(date.weekday())
+                if not working_hours:
+                    continue
+                slots = self._build_slots(
+                    staff, service, date, working_hours,
+                    bookings.get((staff.id, date), []),
+                    out_of_office.get(staff.id, [])
+                )
+                if time_preference:
+                    slots = self._filter_by_time_preference(slots, time_preference)
+                day_slots.extend(slots)
+            
+            if time_after:
+                day_slots = [s for s in day_slots if s['time'] >= time_after]
+            if time_before:
+                day_slots = [s for s in day_slots if s['time'] <= time_before]
+            
+            if day_slots:
+                day_slots.sort(key=lambda x: x['time'])
+                alternatives.append({'date': date, 'slots': day_slots[:slots_per_date]})
+            date += timedelta(days=1)
+        
+        logger.info(f"Found {len(alternatives)} alternative dates in {(time.monotonic() - started) * 1000:.0f}ms")
+        return alternatives
+    
+    def _staff_for_service(self, company: Company, service: Service, staff_id: int = None) -> list:
+        """Staff to search: the requested member, staff assigned to the service, or everyone"""
         # If specific staff is requested, only get that staff member
         if staff_id:
             staff_members = Staff.objects.filter(
@@ -152,7 +215,7 @@ class BookingSearcher:
                 is_active=True,
                 id=staff_id
             )
-            logger.info(f"Searching availability for staff_id={staff_id} for '{service.name}' on {date}")
+            logger.info(f"Searching availability for staff_id={staff_id} for '{service.name}'")
         else:
             # Get staff who can perform this service
             staff_members = Staff.objects.filter(
@@ -161,8 +224,6 @@ class BookingSearcher:
                 services=service
             )
             
-            logger.info(f"Searching availability for '{service.name}' on {date}")
-            
             if not staff_members.exists():
                 # If no staff assigned to service, check all staff
                 staff_members = Staff.objects.filter(company=company, is_active=True)
@@ -170,30 +231,16 @@ class BookingSearcher:
             else:
                 logger.info(f"Found {staff_members.count()} staff for this service")
         
-        for staff in staff_members:
-            slots = self._get_staff_available_times(staff, service, date)
-            logger.info(f"  {staff.name}: {len(slots)} slots")
-            
-            # Filter by time preference if specified
-            if time_preference:
-                slots = self._filter_by_time_preference(slots, time_preference)
-            
-            available_slots.extend(slots)
-        
-        # Sort by time
-        available_slots.sort(key=lambda x: x['time'])
-        
-        return available_slots
+        return list(staff_members)
     
-    def _get_staff_available_times(self, staff: Staff, service: Service, date: datetime.date) -> list:
-        """Get available time slots for a specific staff member"""
+    def _is_off_day(self, staff: Staff, date: datetime.date) -> bool:
+        """Whether the staff member doesn't work at all on this date"""
         day_of_week = date.weekday()
-        logger.info(f"    Checking {staff.name} for {date} (weekday={day_of_week})")
         
         # Check if staff works on this day
         if staff.working_days and day_of_week not in staff.working_days:
             logger.info(f"    ✗ {staff.name} doesn't work on day {day_of_week}. Working days: {staff.working_days}")
-            return []
+            return True
         
         # Check if staff is out of office (legacy fields - for backward compatibility)
         if staff.out_of_office:
@@ -213,35 +260,31 @@ class BookingSearcher:
                 # Check if the date falls within the out-of-office period
                 if out_start <= check_datetime_end and out_end >= check_datetime_start:
                     logger.info(f"    ✗ {staff.name} is out of office (legacy) {staff.out_of_office_start} to {staff.out_of_office_end}")
-                    return []
+                    return True
+        
+        return False
+    
+    def _get_staff_available_times(self, staff: Staff, service: Service, date: datetime.date) -> list:
+        """Get available time slots for a specific staff member"""
+        day_of_week = date.weekday()
+        logger.info(f"    Checking {staff.name} for {date} (weekday={day_of_week})")
+        
+        if self._is_off_day(staff, date):
+            return []
         
         # Check if staff has any out-of-office periods that overlap with this date
         # We'll check individual time slots against these periods later
-        date_start = datetime.combine(date, dtime.min)
-        date_end = datetime.combine(date, dtime.max)
-        
-        # Make timezone-aware if needed
-        if StaffOutOfOffice.objects.filter(staff=staff).exists():
-            first_period = StaffOutOfOffice.objects.filter(staff=staff).first()
-            if timezone.is_aware(first_period.start_datetime):
-                date_start = timezone.make_aware(date_start)
-                date_end = timezone.make_aware(date_end)
+        date_start, date_end = day_bounds(date)
         
         # Get any out-of-office periods that overlap with this date
         # We'll check each time slot against these periods individually
-        out_of_office_periods = StaffOutOfOffice.objects.filter(
-            staff=staff,
-            start_datetime__lte=date_end,
-            end_datetime__gte=date_start
-        )
+        out_of_office_periods = list(StaffOutOfOffice.objects.filter(staff=staff).overlapping(date_start, date_end))
         
-        if out_of_office_periods.exists():
-            logger.info(f"    ℹ {staff.name} has {out_of_office_periods.count()} out-of-office period(s) on this day - will check individual slots")
+        if out_of_office_periods:
+            logger.info(f"    ℹ {staff.name} has {len(out_of_office_periods)} out-of-office period(s) on this day - will check individual slots")
         
         # Get working hours for this day
         # First check staff-specific hours, then fall back to company hours
-        from companies.models import StaffWorkingHours
-        
         staff_hours = StaffWorkingHours.objects.filter(
             staff=staff,
             day_of_week=day_of_week,
@@ -271,15 +314,20 @@ class BookingSearcher:
             return []
         
         # Get existing bookings
-        existing_bookings = Booking.objects.filter(
+        existing_bookings = list(Booking.objects.filter(
             staff=staff,
-            date=date,
             status__in=[1, 3]  # Confirmed or PreBooked
-        ).values_list('start_time', 'end_time')
+        ).overlapping(date_start, date_end).values_list('start_at', 'end_at'))
         
         logger.info(f"    Found {len(existing_bookings)} existing bookings")
         
-        # Generate time slots
+        available_times = self._build_slots(staff, service, date, working_hours, existing_bookings, out_of_office_periods)
+        logger.info(f"    ✓ Generated {len(available_times)} available slots for {staff.name}")
+        return available_times
+    
+    def _build_slots(self, staff: Staff, service: Service, date: datetime.date, working_hours,
+                     existing_bookings, out_of_office_periods) -> list:
+        """Free 30-minute-step slots within working hours, skipping breaks, absences and bookings"""
         available_times = []
         current_time = datetime.combine(date, working_hours.start_time)
         end_time = datetime.combine(date, working_hours.end_time)
@@ -302,19 +350,10 @@ class BookingSearcher:
                     continue
             
             # Check if this time slot overlaps with any out-of-office period
+            check_start = aware(current_time)
+            check_end = aware(potential_end_time)
             slot_blocked_by_out_of_office = False
             for out_period in out_of_office_periods:
-                # Make current_time and potential_end_time timezone-aware if needed
-                check_start = current_time
-                check_end = potential_end_time
-                
-                if timezone.is_aware(out_period.start_datetime):
-                    if timezone.is_naive(check_start):
-                        check_start = timezone.make_aware(check_start)
-                    if timezone.is_naive(check_end):
-                        check_end = timezone.make_aware(check_end)
-                
-                # Check if the slot overlaps with this out-of-office period
                 if check_start < out_period.end_datetime and check_end > out_period.start_datetime:
                     slot_blocked_by_out_of_office = True
                     break
@@ -326,10 +365,7 @@ class BookingSearcher:
             # Check existing bookings
             is_available = True
             for booking_start, booking_end in existing_bookings:
-                booking_start_dt = datetime.combine(date, booking_start)
-                booking_end_dt = datetime.combine(date, booking_end)
-                
-                if current_time < booking_end_dt and potential_end_time > booking_start_dt:
+                if check_start < booking_end and check_end > booking_start:
                     is_available = False
                     break
             
@@ -345,7 +381,6 @@ class BookingSearcher:
             
             current_time += timedelta(minutes=30)
         
-        logger.info(f"    ✓ Generated {len(available_times)} available slots for {staff.name}")
         return available_times
     
     def _filter_by_time_preference(self, slots: list, preference: str) -> list:
@@ -368,8 +403,8 @@ class BookingSearcher:
         """
         # Clean WhatsApp phone number (remove spaces, dashes, parentheses)
         customer_phone = normalize_phone_number(customer_phone)
-        # Find or create customer (use filter().first() to handle duplicates)
-        customer = Customer.objects.filter(phone=customer_phone).first()
+        # Find or create customer (oldest one if there are duplicates)
+        customer = Customer.find_by_phone(customer_phone)
         
         if customer:
             # Update customer info if needed
@@ -398,27 +433,9 @@ class BookingSearcher:
         end_datetime = datetime.combine(booking_date, start_time) + duration
         end_time = end_datetime.time()
         
-        # Check if staff is out of office during this time
-        from companies.models import StaffOutOfOffice
-        from django.utils import timezone as tz
-        
-        check_start = datetime.combine(booking_date, start_time)
-        check_end = end_datetime
-        
-        # Make timezone-aware if needed
-        if StaffOutOfOffice.objects.filter(staff=staff).exists():
-            first_period = StaffOutOfOffice.objects.filter(staff=staff).first()
-            if tz.is_aware(first_period.start_datetime):
-                if tz.is_naive(check_start):
-                    check_start = tz.make_aware(check_start)
-                if tz.is_naive(check_end):
-                    check_end = tz.make_aware(check_end)
-        
         # Check if booking would overlap with any out-of-office period
-        overlapping_periods = StaffOutOfOffice.objects.filter(
-            staff=staff,
-            start_datetime__lt=check_end,
-            end_datetime__gt=check_start
+        overlapping_periods = StaffOutOfOffice.objects.filter(staff=staff).overlapping(
+            datetime.combine(booking_date, start_time), end_datetime
         )
         if overlapping_periods.exists():
             period = overlapping_periods.first()
@@ -0,0 +1,128 @@
+"""
+Conversation state store for WhatsApp Booking Bot
+Reads the conversation once per message and writes its dirty fields once
+
+The row is read on every message rather than cached per worker: the next
+message of a number may land on another worker, and checking that a cached
+copy is current would cost the same query.
+"""
+import copy
+import logging
+from datetime import timedelta
+from django.utils import timezone
+
+from .models import WhatsAppConversation
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATES = ['idle', 'selecting_language', 'selecting_service', 'selecting_staff',
+                 'collecting_info', 'showing_slots', 'confirming']
+# Fields the bot changes while handling a message
+TRACKED_FIELDS = ['conversation_state', 'current_state', 'customer_id', 'company_id']
+# Idle conversations older than this start over (language is asked again)
+IDLE_EXPIRY = timedelta(hours=24)
+def _snapshot(conversation: WhatsAppConversation) -> dict:
+    return {field: copy.deepcopy(getattr(conversation, field)) for field in TRACKED_FIELDS}
+
+
+def _is_expired(conversation: WhatsAppConversation) -> bool:
+    return (
+        conversation.current_state == 'idle'
+        and conversation.last_message_at
+        and conversation.last_message_at < timezone.now() - IDLE_EXPIRY
+    )
+
+
+def _start_tracking(conversation: WhatsAppConversation) -> WhatsAppConversation:
+    conversation._persisted = _snapshot(conversation)
+    return conversation
+
+
+def load_conversation(phone_number: str) -> WhatsAppConversation:
+    """
+    Get the active conversation for a phone number, or start one
+
+    Changes made to it are written by persist_conversation(); save() still
+    writes the whole row right away.
+    """
+    conversation = WhatsAppConversation.objects.filter(
+        phone_number=phone_number,
+        current_state__in=ACTIVE_STATES
+    ).order_by('-updated_at').first()
+
+    if conversation is not None and _is_expired(conversation):
+        # The periodic cleanup job deletes the rest of them in bulk
+        logger.info(f"Conversation for {phone_number} expired, starting over")
+        WhatsAppConversation.objects.filter(pk=conversation.pk, current_state='idle').delete()
+        conversation = None
+
+    if conversation is None:
+        conversation = WhatsAppConversation.objects.create(phone_number=phone_number, current_state='idle')
+        logger.info(f"Created new conversation for {phone_number}")
+
+    return _start_tracking(conversation)
+
+
+def persist_conversation(conversation: WhatsAppConversation) -> bool:
+    """
+    Write changed fields in one UPDATE guarded by the version number
+
+    On a version conflict the row is re-read and our changed fields are
+    applied on top of it once more. Returns False if that also fails.
+    """
+    persisted = getattr(conversation, '_persisted', None)
+    if persisted is None:
+        conversation.save()
+        return True
+
+    changed = {
+        field: getattr(conversation, field)
+        for field in TRACKED_FIELDS
+        if getattr(conversation, field) != persisted[field]
+    }
+    now = timezone.now()
+    values = dict(changed, last_message_at=now, updated_at=now)
+
+    current = conversation
+    for attempt in range(2):
+        updated = WhatsAppConversation.objects.filter(
+            pk=current.pk, version=current.version
+        ).update(version=current.version + 1, **values)
+        if updated:
+            break
+        logger.warning(f"Version conflict saving conversation {conversation.pk} (attempt {attempt + 1})")
+        current = WhatsAppConversation.objects.filter(pk=conversation.pk).first()
+        if current is None:
+            return False
+    else:
+        return False
+
+    if current is not conversation:
+        # Someone else wrote in between: keep their fields we didn't touch
+        for field in TRACKED_FIELDS:
+            if field not in changed:
+                setattr(conversation, field, getattr(current, field))
+
+    conversation.version = current.version + 1
+    conversation.last_message_at = now
+    conversation.updated_at = now
+    conversation._persisted = _snapshot(conversation)
+    return True
+
+
+def cleanup_idle_conversations(batch_size: int = 1000) -> int:
+    """Delete idle conversations without messages for 24 hours, in batches"""
+    cutoff = timezone.now() - IDLE_EXPIRY
+    deleted = 0
+    while True:
+        ids = list(
+            WhatsAppConversation.objects.filter(
+                current_state='idle',
+                last_message_at__lt=cutoff
+            ).values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        WhatsAppConversation.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+    return deleted
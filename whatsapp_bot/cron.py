@@ -0,0 +1,43 @@
+from whatsapp_bot.conversation_store import cleanup_idle_conversations
+
+
+def cleanup_conversations():
+    """
+    Delete idle WhatsApp conversations with no messages for 24 hours.
+    This should be run hourly.
+    """
+    deleted = cleanup_idle_conversations()
+    print(f"Deleted {deleted} idle WhatsApp conversations.")
+
+
+def archive_messages():
+    """
+    Move WhatsApp messages older than the retention period to monthly gzip files.
+    This should be run daily.
+    """
+    from whatsapp_bot.message_log import archive_old_messages
+
+    archived = archive_old_messages()
+    print(f"Archived {archived} WhatsApp messages.")
+
+
+def cleanup_processed_messages():
+    """
+    Delete webhook claims and stored replies older than WHATSAPP_DEDUP_TTL.
+    This should be run hourly.
+    """
+    from whatsapp_bot.message_dedup import cleanup_processed_messages as cleanup
+
+    deleted = cleanup()
+    print(f"Deleted {deleted} processed WhatsApp message claims.")
+
+
+def cleanup_phone_gates():
+    """
+    Delete expired phone locks, abandoned queued messages and old rate counters.
+    This should be run hourly.
+    """
+    from whatsapp_bot.backpressure import cleanup_phone_gates as cleanup
+
+    deleted = cleanup()
+    print(f"Deleted {deleted} stale WhatsApp phone gate rows.")
@@ -0,0 +1,252 @@
+"""
+Delivery status tracking for WhatsApp Booking Bot
+Twilio status callbacks are queued in memory and applied in batches
+
+Callbacks for one message arrive several times (queued, sent, delivered,
+read) and not always in order, so a batch is merged per MessageSid and a
+status never moves backwards. Per-company daily counters are updated in the
+same pass, so rollups are a read of a handful of rows.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import urlencode
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Sum
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import MessageDeliveryStatus, MessageDeliveryDaily, WhatsAppConversation
+
+logger = logging.getLogger(__name__)
+
+FAILED_STATUSES = {'failed', 'undelivered', 'canceled'}
+DELIVERED_STATUSES = {'delivered', 'read'}
+# Later statuses win; failures are final
+STATUS_RANK = {
+    'accepted': 0, 'scheduled': 0, 'queued': 0,
+    'sending': 1, 'sent': 2, 'delivered': 3, 'read': 4,
+    'undelivered': 5, 'failed': 5, 'canceled': 5,
+}
+
+
+def status_callback_url(company_id=None, booking_id=None, kind: str = 'bot_reply'):
+    """
+    Absolute status callback URL; company and booking travel in the query string
+
+    Bot replies use the bare URL so that a retried webhook gets the same TwiML;
+    their company is looked up from the recipient's conversation. None when
+    WHATSAPP_STATUS_CALLBACKS is off.
+    """
+    if not getattr(settings, 'WHATSAPP_STATUS_CALLBACKS', True):
+        return None
+    params = {'kind': kind}
+    if company_id:
+        params['company'] = company_id
+    if booking_id:
+        params['booking'] = booking_id
+    site_url = getattr(settings, 'SITE_URL', 'https://reserva-ya.es').rstrip('/')
+    return f"{site_url}{reverse('whatsapp_bot:status_callback')}?{urlencode(params)}"
+
+
+def _merge(current: dict, event: dict) -> dict:
+    """Fold a callback into the state of its message"""
+    merged = dict(current)
+    for field in ('company_id', 'booking_id', 'to_number'):
+        merged[field] = merged.get(field) or event.get(field)
+    if STATUS_RANK.get(event['status'], 0) >= STATUS_RANK.get(merged.get('status'), -1):
+        merged['status'] = event['status']
+        merged['error_code'] = event.get('error_code') or merged.get('error_code', '')
+    if event['status'] in DELIVERED_STATUSES:
+        merged['delivered_at'] = merged.get('delivered_at') or event.get('delivered_at') or event['at']
+    if event['status'] == 'read':
+        merged['read_at'] = merged.get('read_at') or event.get('read_at') or event['at']
+    return merged
+
+
+def _counted(status: str) -> dict:
+    return {
+        'delivered': status in DELIVERED_STATUSES,
+        'read': status == 'read',
+        'failed': status in FAILED_STATUSES,
+    }
+
+
+class DeliveryStatusQueue:
+    """In-memory queue of status callbacks, flushed with one upsert per batch"""
+
+    # Callbacks held for retry while the database is failing, in multiples of flush_size
+    max_backlog = 50
+
+    def __init__(self, flush_size: int = None, flush_interval: float = None, background: bool = None):
+        self.flush_size = flush_size or getattr(settings, 'WHATSAPP_STATUS_FLUSH_SIZE', 200)
+        self.flush_interval = flush_interval or getattr(settings, 'WHATSAPP_STATUS_FLUSH_INTERVAL', 5.0)
+        self.background = getattr(settings, 'WHATSAPP_STATUS_ASYNC', True) if background is None else background
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._events = []
+        self._thread = None
+        self._pid = None
+
+    def enqueue(self, message_sid: str, status: str, kind: str = 'bot_reply', company_id=None,
+                booking_id=None, to_number: str = '', error_code: str = ''):
+        event = {
+            'message_sid': message_sid,
+            'status': status,
+            'kind': kind,
+            'company_id': company_id,
+            'booking_id': booking_id,
+            'to_number': to_number,
+            'error_code': error_code,
+            'at': timezone.now(),
+        }
+        with self._lock:
+            self._ensure_started()
+            self._events.append(event)
+            full = len(self._events) >= self.flush_size
+
+        if full or not self.background:
+            self.flush()
+
+    def flush(self) -> int:
+        """Apply queued callbacks; returns the number of messages updated"""
+        with self._flush_lock:
+            with self._lock:
+                events, self._events = self._events, []
+            if not events:
+                return 0
+            try:
+                return self._apply(events)
+            except Exception as e:
+                # The batch is one transaction: nothing was applied, so all of it goes back
+                logger.error(f"Could not apply {len(events)} delivery status callbacks: {e}", exc_info=True)
+                with self._lock:
+                    self._events = events + self._events
+                    overflow = len(self._events) - self.flush_size * self.max_backlog
+                    if overflow > 0:
+                        logger.error(f"Dropping {overflow} oldest delivery status callbacks")
+                        del self._events[:overflow]
+                return 0
+
+    def _apply(self, events: list) -> int:
+        # Merge the batch per message before touching the database
+        batch = {}
+        for event in events:
+            sid = event['message_sid']
+            batch[sid] = _merge(batch.get(sid, {'kind': event['kind']}), event)
+
+        # Bot replies don't carry the company: take it from the recipient's conversation
+        unknown = {
+            state['to_number'] for state in batch.values()
+            if not state.get('company_id') and state.get('to_number')
+        }
+        if unknown:
+            companies = dict(
+                WhatsAppConversation.objects.filter(
+                    phone_number__in=list(unknown), company__isnull=False
+                ).order_by('updated_at').values_list('phone_number', 'company_id')
+            )
+            for sid, state in batch.items():
+                if not state.get('company_id'):
+                    state['company_id'] = companies.get(state.get('to_number'))
+
+        now = timezone.now()
+        rollup = {}
+        rows = []
+        with transaction.atomic():
+            existing = {
+                row.message_sid: row
+                for row in MessageDeliveryStatus.objects.select_for_update().filter(message_sid__in=list(batch))
+            }
+            for sid, state in batch.items():
+                row = existing.get(sid)
+                if row is not None:
+                    before = _counted(row.status)
+                    state = _merge({
+                        'company_id': row.company_id, 'booking_id': row.booking_id, 'to_number': row.to_number,
+                        'status': row.status, 'error_code': row.error_code,
+                        'delivered_at': row.delivered_at, 'read_at': row.read_at,
+                    }, dict(state, at=now))
+                    created_at, kind = row.created_at, row.kind
+                else:
+                    before = None
+                    created_at, kind = now, state['kind']
+
+                rows.append(MessageDeliveryStatus(
+                    message_sid=sid, kind=kind, company_id=state.get('company_id'),
+                    booking_id=state.get('booking_id'), to_number=state.get('to_number') or '',
+                    status=state['status'], error_code=state.get('error_code') or '',
+                    created_at=created_at, updated_at=now,
+                    delivered_at=state.get('delivered_at'), read_at=state.get('read_at'),
+                ))
+
+                # Count each message once per stage it reached
+                after = _counted(state['status'])
+                key = (timezone.localdate(created_at), state.get('company_id'), kind)
+                deltas = rollup.setdefault(key, {'sent': 0, 'delivered': 0, 'read': 0, 'failed': 0})
+                if before is None:
+                    deltas['sent'] += 1
+                for stage, reached in after.items():
+                    if reached and not (before and before[stage]):
+                        deltas[stage] += 1
+
+            MessageDeliveryStatus.objects.bulk_create(
+                rows, batch_size=500, update_conflicts=True, unique_fields=['message_sid'],
+                update_fields=['company', 'booking', 'to_number', 'status', 'error_code',
+                               'updated_at', 'delivered_at', 'read_at'],
+            )
+            for (day, company_id, kind), deltas in rollup.items():
+                if not any(deltas.values()):
+                    continue
+                MessageDeliveryDaily.objects.get_or_create(date=day, company_id=company_id, kind=kind)
+                MessageDeliveryDaily.objects.filter(date=day, company_id=company_id, kind=kind).update(
+                    **{stage: F(stage) + count for stage, count in deltas.items() if count}
+                )
+        return len(rows)
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._events = []
+        if self.background:
+            self._thread = threading.Thread(target=self._run, name='whatsapp-delivery-status', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception as e:
+                logger.error(f"Delivery status writer error: {e}", exc_info=True)
+
+
+delivery_statuses = DeliveryStatusQueue()
+
+
+def company_delivery_rollup(company, days: int = 30) -> dict:
+    """Sent/delivered/read/failed totals and rates of a company over the last days, per kind"""
+    since = timezone.localdate() - timedelta(days=days - 1)
+    rows = MessageDeliveryDaily.objects.filter(company=company, date__gte=since).values('kind').annotate(
+        sent=Sum('sent'), delivered=Sum('delivered'), read=Sum('read'), failed=Sum('failed')
+    )
+    rollup = {}
+    for row in rows:
+        sent = row['sent'] or 0
+        rollup[row['kind']] = {
+            'sent': sent,
+            'delivered': row['delivered'],
+            'read': row['read'],
+            'failed': row['failed'],
+            'delivery_rate': round(row['delivered'] / sent, 3) if sent else 0.0,
+            'read_rate': round(row['read'] / sent, 3) if sent else 0.0,
+            'failure_rate': round(row['failed'] / sent, 3) if sent else 0.0,
+        }
+    return rollup
@@ -0,0 +1,122 @@
+"""
+Intent extraction cache for WhatsApp Booking Bot
+LRU + TTL cache in front of OpenAI, keyed by normalized message, language and date
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from django.conf import settings
+from django.utils import timezone
+
+from .intent_parser import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class IntentCache:
+    """
+    In-process LRU cache with per-entry TTL
+
+    Optionally backed by a Django cache alias (e.g. a DatabaseCache) so
+    answers survive restarts and are shared between workers.
+    """
+
+    def __init__(self, max_size: int = 5000, ttl: int = 6 * 3600, persist_alias: str = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.persist_alias = persist_alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'persistent_hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'sets': 0}
+
+    def make_key(self, message: str, lang: str, today=None) -> str:
+        # Relative dates ("mañana") depend on today, so the date is part of the key.
+        # The text is hashed: cache backends limit key length and characters.
+        today = today or timezone.localdate()
+        digest = hashlib.sha1(normalize_text(message).encode()).hexdigest()
+        return f"intent:{lang}:{today.isoformat()}:{digest}"
+
+    def get(self, message: str, lang: str, today=None) -> Optional[Dict[str, Any]]:
+        key = self.make_key(message, lang, today)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return dict(value)
+                del self._entries[key]
+                self._stats['expired'] += 1
+
+        value = self._persistent_get(key)
+        if value is not None:
+            self._store(key, value)
+            with self._lock:
+                self._stats['persistent_hits'] += 1
+            return dict(value)
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def set(self, message: str, lang: str, value: Dict[str, Any], today=None):
+        key = self.make_key(message, lang, today)
+        self._store(key, value)
+        self._persistent_set(key, value)
+        with self._lock:
+            self._stats['sets'] += 1
+
+    def _store(self, key: str, value: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def _persistent_get(self, key: str):
+        if not self.persist_alias:
+            return None
+        try:
+            from django.core.cache import caches
+            return caches[self.persist_alias].get(key)
+        except Exception as e:
+            logger.warning(f"Intent cache backend read failed: {e}")
+            return None
+
+    def _persistent_set(self, key: str, value: Dict[str, Any]):
+        if not self.persist_alias:
+            return
+        try:
+            from django.core.cache import caches
+            caches[self.persist_alias].set(key, value, timeout=self.ttl)
+        except Exception as e:
+            logger.warning(f"Intent cache backend write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+            stats['max_size'] = self.max_size
+        lookups = stats['hits'] + stats['persistent_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['persistent_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for name in self._stats:
+                self._stats[name] = 0
+
+
+intent_cache = IntentCache(
+    max_size=getattr(settings, 'WHATSAPP_INTENT_CACHE_SIZE', 5000),
+    ttl=getattr(settings, 'WHATSAPP_INTENT_CACHE_TTL', 6 * 3600),
+    persist_alias=getattr(settings, 'WHATSAPP_INTENT_CACHE_ALIAS', None),
+)
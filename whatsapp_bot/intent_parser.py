@@ -0,0 +1,292 @@
+"""
+Fast-path intent parser for WhatsApp Booking Bot
+Rule-based extraction of dates, times and services (es/en/ru/uk)
+OpenAI is only called when the rules cannot explain the whole message
+"""
+import logging
+import re
+import time
+from datetime import date as ddate, timedelta
+from typing import Dict, Any, Tuple
+from django.conf import settings
+from django.utils import timezone
+
+from .metrics import intent_path_stats
+
+logger = logging.getLogger(__name__)
+
+
+# Latin accents are folded so "mañana"/"manana" and "sábado"/"sabado" match the same rule.
+# Cyrillic is left untouched (й, ї must not lose their marks).
+LATIN_FOLD = str.maketrans('áéíóúüàèìòùñç', 'aeiouuaeiounc')
+APOSTROPHES = str.maketrans({'’': "'", 'ʼ': "'", '`': "'", '´': "'"})
+PUNCTUATION_RE = re.compile(r"[,;!?¿¡\"()«»]+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, fold Latin accents and strip punctuation that never carries meaning"""
+    text = text.lower().translate(APOSTROPHES).translate(LATIN_FOLD)
+    text = PUNCTUATION_RE.sub(' ', text)
+    return ' '.join(text.split())
+
+
+def _alternation(words) -> str:
+    # Longest first so "despues de las" wins over "despues de"
+    return '|'.join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+
+AFTER_WORDS = ['despues de las', 'despues de la', 'despues de', 'a partir de las', 'a partir de la',
+               'desde las', 'after', 'from', 'после', 'с', 'після', 'від', 'з']
+BEFORE_WORDS = ['antes de las', 'antes de la', 'antes de', 'hasta las', 'hasta la',
+                'before', 'until', 'till', 'by', 'до']
+AT_WORDS = ['a las', 'a la', 'sobre las', 'at', 'around', 'в', 'на', 'о', 'об', 'к']
+
+PM_PARTS = {'de la tarde', 'de la noche', 'in the afternoon', 'in the evening', 'дня', 'вечера', 'вечора'}
+AM_PARTS = {'de la manana', 'in the morning', 'утра', 'ранку'}
+
+TIME_PATTERN = (
+    r"(?P<h>\d{1,2})(?:(?::|h)(?P<m>\d{2}))?"
+    r"(?:\s*(?P<ampm>a\.m\.|p\.m\.|am|pm|hs|h)(?!\w))?"
+    rf"(?:\s+(?P<part>{_alternation(PM_PARTS | AM_PARTS)})(?!\w))?"
+)
+
+PREP_TIME_RE = re.compile(
+    rf"(?<![\w'])(?:(?P<after>{_alternation(AFTER_WORDS)})|(?P<before>{_alternation(BEFORE_WORDS)})"
+    rf"|(?P<at>{_alternation(AT_WORDS)}))\s+{TIME_PATTERN}(?![\w/:.])"
+)
+BARE_TIME_RE = re.compile(rf"(?<![\w/:.]){TIME_PATTERN}(?![\w/:.])")
+
+TIME_OF_DAY = {
+    'morning': ['por la manana', 'en la manana', 'de la manana', 'in the morning', 'morning',
+                'утром', 'с утра', 'зранку', 'вранці', 'уранці'],
+    'afternoon': ['por la tarde', 'en la tarde', 'de la tarde', 'in the afternoon', 'afternoon',
+                  'днем', 'днём', 'после обеда', 'вдень', 'після обіду'],
+    'evening': ['por la noche', 'en la noche', 'de la noche', 'in the evening', 'evening',
+                'вечером', 'ввечері', 'увечері'],
+}
+
+RELATIVE_DAYS = [
+    (2, ['pasado manana', 'day after tomorrow', 'послезавтра', 'післязавтра']),
+    (1, ['manana', 'tomorrow', 'завтра']),
+    (0, ['hoy', 'today', 'сегодня', 'сьогодні']),
+]
+
+WEEKDAYS = [
+    r"lunes|monday|понедельник\w*|понеділ\w*",
+    r"martes|tuesday|вторник\w*|вівтор\w*",
+    r"miercoles|wednesday|сред[аеуы]|серед[аиуі]",
+    r"jueves|thursday|четверг\w*|четвер\w*",
+    r"viernes|friday|пятниц\w*|п'ятниц\w*",
+    r"sabado|saturday|суббот\w*|субот\w*",
+    r"domingo|sunday|воскресень\w*|неділ\w*",
+]
+NEXT_WORDS = r"proximo|proxima|next|следующ\w*|наступн\w*"
+WEEKDAY_RES = [
+    re.compile(rf"(?<![\w'])(?:(?P<next>{NEXT_WORDS})\s+)?(?:{pattern})(?![\w'])")
+    for pattern in WEEKDAYS
+]
+
+NUMERIC_DATE_RE = re.compile(r"(?<![\w:/.])(\d{1,2})[/.](\d{1,2})(?:[/.](\d{2}|\d{4}))?(?![\w:/.])")
+
+# Words that carry no booking information; they don't count against confidence
+FILLER_WORDS = {
+    # es
+    'hola', 'quiero', 'quisiera', 'necesito', 'me', 'gustaria', 'una', 'un', 'cita', 'reserva',
+    'reservar', 'para', 'el', 'la', 'los', 'las', 'de', 'del', 'a', 'en', 'y', 'por', 'favor',
+    'hay', 'tienes', 'teneis', 'disponibilidad', 'hueco', 'libre', 'este', 'esta', 'pedir',
+    # en
+    'hi', 'hello', 'i', 'want', 'would', 'like', 'need', 'to', 'book', 'an', 'appointment',
+    'for', 'on', 'the', 'please', 'is', 'there', 'any', 'availability', 'available', 'free',
+    'slot', 'slots', 'can', 'get', 'this', 'and',
+    # ru
+    'привет', 'здравствуйте', 'хочу', 'хотела', 'хотел', 'бы', 'записаться', 'запишите',
+    'запись', 'на', 'в', 'пожалуйста', 'можно', 'есть', 'свободно', 'свободное', 'время', 'мне',
+    'и', 'этот', 'эту',
+    # uk
+    'привіт', 'добрий', 'день', 'записатися', 'запишіть', 'запис', 'будь', 'ласка', 'можна',
+    'є', 'вільно', 'вільний', 'час', 'мені', 'та', 'цей', 'цю', 'у',
+}
+TOKEN_RE = re.compile(r"[\w']+")
+
+
+class FastIntentParser:
+    """Deterministic booking intent extraction without calling OpenAI"""
+
+    def __init__(self, today: ddate = None):
+        self.today = today or timezone.localdate()
+
+    def parse(self, message: str, company=None) -> Tuple[Dict[str, Any], float]:
+        """
+        Extract booking intent from a message
+
+        Returns (intent, confidence). Confidence is the share of meaningful
+        words the rules explained; 1.0 means nothing was left for OpenAI.
+        """
+        text = normalize_text(message)
+        if not text:
+            return {}, 0.0
+
+        total_words = self._meaningful_words(text)
+        intent = {}
+        dates = set()
+
+        text = self._extract_times(text, intent)
+        text = self._extract_time_of_day(text, intent)
+        text = self._extract_relative_days(text, dates)
+        text = self._extract_weekdays(text, dates)
+        text = self._extract_numeric_dates(text, dates)
+        if company is not None:
+            text = self._extract_service(text, company, intent)
+
+        if len(dates) > 1:
+            # "hoy o mañana" - let OpenAI decide
+            return {}, 0.0
+        if dates:
+            intent['date'] = dates.pop().strftime('%Y-%m-%d')
+
+        if not intent:
+            return {}, 0.0
+
+        left_words = self._meaningful_words(text)
+        if not total_words:
+            return intent, 1.0
+        confidence = 1.0 - len(left_words) / len(total_words)
+        return intent, round(confidence, 2)
+
+    def _meaningful_words(self, text: str) -> list:
+        return [w for w in TOKEN_RE.findall(text) if w not in FILLER_WORDS]
+
+    def _to_hhmm(self, match) -> str:
+        """Convert a TIME_PATTERN match to HH:MM, or None if it isn't a valid time"""
+        hour = int(match.group('h'))
+        minute = int(match.group('m') or 0)
+        ampm = (match.group('ampm') or '').replace('.', '')
+        part = match.group('part')
+
+        if hour > 23 or minute > 59:
+            return None
+        if ampm == 'pm' or part in PM_PARTS:
+            if hour < 12:
+                hour += 12
+        elif ampm == 'am' or part in AM_PARTS:
+            if hour == 12:
+                hour = 0
+        elif 1 <= hour <= 7:
+            # "a las 5" in a salon means 17:00
+            hour += 12
+        return f"{hour:02d}:{minute:02d}"
+
+    def _extract_times(self, text: str, intent: dict) -> str:
+        def replace_prep(match):
+            value = self._to_hhmm(match)
+            if not value:
+                return match.group(0)
+            if match.group('after'):
+                intent.setdefault('time_after', value)
+            elif match.group('before'):
+                intent.setdefault('time_before', value)
+            else:
+                intent.setdefault('time', value)
+            return ' '
+
+        def replace_bare(match):
+            # A lone number is a menu choice or a day, not a time
+            if not (match.group('m') or match.group('ampm') or match.group('part')):
+                return match.group(0)
+            value = self._to_hhmm(match)
+            if not value:
+                return match.group(0)
+            intent.setdefault('time', value)
+            return ' '
+
+        text = PREP_TIME_RE.sub(replace_prep, text)
+        return BARE_TIME_RE.sub(replace_bare, text)
+
+    def _extract_time_of_day(self, text: str, intent: dict) -> str:
+        for preference, phrases in TIME_OF_DAY.items():
+            pattern = re.compile(rf"(?<![\w'])(?:{_alternation(phrases)})(?![\w'])")
+            text, found = pattern.subn(' ', text)
+            if found and not any(intent.get(k) for k in ('time', 'time_after', 'time_before')):
+                intent.setdefault('time_preference', preference)
+        return text
+
+    def _extract_relative_days(self, text: str, dates: set) -> str:
+        for offset, words in RELATIVE_DAYS:
+            pattern = re.compile(rf"(?<![\w'])(?:{_alternation(words)})(?![\w'])")
+            text, found = pattern.subn(' ', text)
+            if found:
+                dates.add(self.today + timedelta(days=offset))
+        return text
+
+    def _extract_weekdays(self, text: str, dates: set) -> str:
+        for weekday, pattern in enumerate(WEEKDAY_RES):
+            def replace(match):
+                days_ahead = (weekday - self.today.weekday()) % 7
+                if match.group('next') and days_ahead == 0:
+                    days_ahead = 7
+                dates.add(self.today + timedelta(days=days_ahead))
+                return ' '
+            text = pattern.sub(replace, text)
+        return text
+
+    def _extract_numeric_dates(self, text: str, dates: set) -> str:
+        def replace(match):
+            day, month, year = match.group(1), match.group(2), match.group(3)
+            try:
+                if year:
+                    year = int(year) + (2000 if len(year) == 2 else 0)
+                    found = ddate(year, int(month), int(day))
+                else:
+                    found = ddate(self.today.year, int(month), int(day))
+                    if found < self.today:
+                        found = ddate(self.today.year + 1, int(month), int(day))
+            except ValueError:
+                return match.group(0)
+            dates.add(found)
+            return ' '
+        return NUMERIC_DATE_RE.sub(replace, text)
+
+    def _extract_service(self, text: str, company, intent: dict) -> str:
+        """Match the company's service names as whole phrases in the message"""
+        from .service_matcher import get_company_catalog
+
+        candidates = []
+        for name in get_company_catalog(company.id).services.names:
+            normalized = normalize_text(name.replace('(', ' ').replace(')', ' '))
+            if normalized:
+                candidates.append((normalized, name))
+
+        # Longest first so "manicura sin pintar" beats "manicura"
+        for normalized, name in sorted(candidates, key=lambda c: len(c[0]), reverse=True):
+            pattern = re.compile(rf"(?<![\w']){re.escape(normalized)}(?![\w'])")
+            if pattern.search(text):
+                intent['service'] = name
+                return pattern.sub(' ', text, count=1)
+        return text
+
+
+def extract_booking_intent(message: str, conversation_state: dict, company=None) -> Dict[str, Any]:
+    """
+    Extract booking intent, trying local rules before OpenAI
+
+    The fast path answers when its confidence reaches
+    WHATSAPP_FAST_PATH_MIN_CONFIDENCE; anything else goes to BookingAI.
+    """
+    from .ai_handler import BookingAI
+
+    min_confidence = getattr(settings, 'WHATSAPP_FAST_PATH_MIN_CONFIDENCE', 1.0)
+
+    started = time.monotonic()
+    intent, confidence = FastIntentParser().parse(message, company)
+    if intent and confidence >= min_confidence:
+        elapsed = time.monotonic() - started
+        intent_path_stats.record('fast', elapsed)
+        logger.info(f"Fast-path intent ({elapsed * 1000:.1f}ms, confidence={confidence}): {intent}")
+        return intent
+
+    ai = BookingAI()
+    intent = ai.extract_booking_intent(message, conversation_state, company=company)
+    elapsed = time.monotonic() - started
+    intent_path_stats.record('openai', elapsed)
+    logger.info(f"OpenAI intent ({elapsed * 1000:.1f}ms, fast-path confidence={confidence}): {intent}")
+    return intent
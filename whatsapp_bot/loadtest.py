@@ -0,0 +1,283 @@
+"""
+Load harness for WhatsApp Booking Bot
+Replays scripted conversations against whatsapp_webhook concurrently
+
+Twilio and OpenAI are replaced by local stand-ins: requests are signed with
+a throwaway auth token (so signature validation really runs), outgoing
+Twilio REST messages are only counted, and OpenAI answers deterministic JSON
+intents after a configurable delay. Run it against a scratch database: the
+conversations it plays create customers and bookings.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from types import SimpleNamespace
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from twilio.request_validator import RequestValidator
+
+from companies.models import Company, Service, Staff, WorkingHours
+from .intent_cache import intent_cache
+from .intent_parser import FastIntentParser
+
+logger = logging.getLogger(__name__)
+
+LOADTEST_SALON = 'Loadtest Salon'
+# +999 is not assigned to any country, so these never reach a real customer
+PHONE_PREFIX = 'whatsapp:+999'
+HOST = 'loadtest.local'
+AUTH_TOKEN = 'loadtest-auth-token'
+
+# One scripted conversation per language: salon link, language, menu, booking
+SCRIPTS = {
+    'es': ['hola {salon}', '1', '2', '1', '0', 'mañana por la tarde', '1', '{name}', 'sí'],
+    'en': ['hello {salon}', '2', 'menu', '{service} tomorrow after 3pm', '1', '{name}', 'yes'],
+    'ru': ['hi {salon}', '3', '3', '2', '1', '0', 'завтра', '2', '{name}', 'нет'],
+    'uk': ['привіт {salon}', '4', '5', '{service} завтра після 15:00', '1', '{name}', 'так'],
+}
+NAMES = ['Ana Garcia', 'John Smith', 'Ольга Иванова', 'Оксана Коваль', 'Lucia Perez']
+
+
+class StubOpenAI:
+    """Stands in for the OpenAI client: deterministic intents after a fixed delay"""
+
+    def __init__(self, latency_ms: float = 800, jitter_ms: float = 0, service_names: list = None, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.service_names = sorted(service_names or [], key=len, reverse=True)
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model: str, messages: list, **kwargs):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency_ms + self._random.uniform(0, self.jitter_ms)
+        time.sleep(delay / 1000)
+
+        message = messages[-1]['content']
+        intent, _ = FastIntentParser().parse(message)
+        lowered = message.lower()
+        for name in self.service_names:
+            if name.lower() in lowered:
+                intent['service'] = name
+                break
+        content = json.dumps(intent)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            # Roughly four characters per token
+            usage=SimpleNamespace(
+                prompt_tokens=sum(len(m['content']) for m in messages) // 4,
+                completion_tokens=len(content) // 4,
+            ),
+        )
+
+
+class StubTwilioClient:
+    """Stands in for twilio.rest.Client; outgoing messages are only counted"""
+
+    sent = 0
+    _lock = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        self.messages = SimpleNamespace(create=self._create)
+
+    def _create(self, **kwargs):
+        with StubTwilioClient._lock:
+            StubTwilioClient.sent += 1
+        return SimpleNamespace(sid=f"SMstub{StubTwilioClient.sent}", status='queued')
+
+
+def ensure_loadtest_salon() -> Company:
+    """Salon with a few services, staff and daily hours for the scripted conversations"""
+    company = Company.objects.filter(name=LOADTEST_SALON).first()
+    if company:
+        return company
+
+    admin, _ = User.objects.get_or_create(username='loadtest', defaults={'email': 'loadtest@example.com'})
+    company = Company.objects.create(
+        administrator=admin, name=LOADTEST_SALON, address='Calle Falsa 123', city='Madrid',
+        phone='+34900000000', email='loadtest@example.com', online_appointments_enabled=True
+    )
+    services = [
+        Service.objects.create(company=company, name=name, duration=duration, price=price)
+        for name, duration, price in [('Manicura', 45, 20), ('Pedicura', 60, 30), ('Corte de pelo', 30, 18)]
+    ]
+    for name in ['Maria', 'Olga', 'Lucia']:
+        staff = Staff.objects.create(company=company, name=name, working_days=list(range(7)))
+        staff.services.set(services)
+    for day in range(7):
+        WorkingHours.objects.create(company=company, day_of_week=day, start_time='09:00', end_time='20:00')
+    return company
+
+
+def scripted_conversations(count: int, company: Company, seed: int = 0) -> list:
+    """`count` conversations cycling through the scripts of every language"""
+    rng = random.Random(seed)
+    services = list(Service.objects.filter(company=company, is_active=True).values_list('name', flat=True)) or ['manicura']
+    languages = sorted(SCRIPTS)
+    conversations = []
+    for idx in range(count):
+        script = SCRIPTS[languages[idx % len(languages)]]
+        params = {'salon': company.name, 'name': rng.choice(NAMES), 'service': rng.choice(services).lower()}
+        conversations.append([message.format(**params) for message in script])
+    return conversations
+
+
+def load_conversations(path: str) -> list:
+    """Conversations from a JSONL file: one JSON list of messages (or {"messages": [...]}) per line"""
+    conversations = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                conversations.append(item['messages'] if isinstance(item, dict) else item)
+    return conversations
+
+
+def logged_conversations(limit: int) -> list:
+    """Inbound messages of the latest `limit` conversations in the message log, oldest first"""
+    from .models import WhatsAppConversation, WhatsAppMessage
+
+    conversation_ids = list(
+        WhatsAppConversation.objects.order_by('-updated_at').values_list('id', flat=True)[:limit]
+    )
+    by_conversation = {conversation_id: [] for conversation_id in conversation_ids}
+    for conversation_id, body in WhatsAppMessage.objects.filter(
+        conversation_id__in=conversation_ids, direction='inbound'
+    ).order_by('id').values_list('conversation_id', 'message_body'):
+        by_conversation[conversation_id].append(body)
+    return [messages for messages in by_conversation.values() if messages]
+
+
+def percentile(values: list, p: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(p / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class LoadTestRunner:
+    """Plays conversations concurrently, one virtual user per conversation"""
+
+    def __init__(self, conversations: list, concurrency: int = 10, openai_latency_ms: float = 800,
+                 openai_jitter_ms: float = 0, fast_path: bool = True, service_names: list = None, run_id: str = None):
+        self.conversations = conversations
+        self.concurrency = concurrency
+        self.fast_path = fast_path
+        self.run_id = run_id or str(int(time.time()))[-5:]
+        self.openai = StubOpenAI(openai_latency_ms, openai_jitter_ms, service_names)
+        self.path = reverse('whatsapp_bot:webhook')
+        self.url = f"http://{HOST}{self.path}"
+        self.validator = RequestValidator(AUTH_TOKEN)
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.queries = []
+        self.errors = []
+
+    def _play(self, idx: int, messages: list):
+        client = Client(SERVER_NAME=HOST)
+        phone = f"{PHONE_PREFIX}{self.run_id}{idx:05d}"
+        try:
+            for step, body in enumerate(messages):
+                data = {
+                    'From': phone,
+                    'To': 'whatsapp:+34900000000',
+                    'Body': body,
+                    'MessageSid': f"SMload{self.run_id}{idx:05d}{step:03d}",
+                }
+                signature = self.validator.compute_signature(self.url, data)
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = client.post(self.path, data, HTTP_X_TWILIO_SIGNATURE=signature)
+                    elapsed = time.perf_counter() - started
+                with self._lock:
+                    self.latencies.append(elapsed * 1000)
+                    self.queries.append(len(queries))
+                    if response.status_code != 200:
+                        self.errors.append(f"{phone} step {step}: HTTP {response.status_code}")
+        except Exception as e:
+            with self._lock:
+                self.errors.append(f"{phone}: {e}")
+        finally:
+            connection.close()
+
+    def run(self) -> dict:
+        overrides = {
+            'DEBUG': False,
+            'ALLOWED_HOSTS': list(settings.ALLOWED_HOSTS) + [HOST],
+            'TWILIO_AUTH_TOKEN': AUTH_TOKEN,
+            'OPENAI_API_KEY': 'loadtest',
+            'OPENAI_MODEL': getattr(settings, 'OPENAI_MODEL', '') or 'gpt-4o-mini',
+            'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+        }
+        if not self.fast_path:
+            # Nothing is confident enough, every free-text message goes to OpenAI
+            overrides['WHATSAPP_FAST_PATH_MIN_CONFIDENCE'] = 2.0
+
+        intent_cache.clear()
+        StubTwilioClient.sent = 0
+        with ExitStack() as stack:
+            stack.enter_context(override_settings(**overrides))
+            stack.enter_context(mock.patch('whatsapp_bot.ai_handler.get_openai_client', return_value=self.openai))
+            stack.enter_context(mock.patch('twilio.rest.Client', StubTwilioClient))
+            stack.enter_context(mock.patch('app.services.Client', StubTwilioClient))
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                for idx, messages in enumerate(self.conversations):
+                    pool.submit(self._play, idx, messages)
+            wall = time.perf_counter() - started
+
+        return self.report(wall)
+
+    def report(self, wall: float) -> dict:
+        count = len(self.latencies)
+        return {
+            'conversations': len(self.conversations),
+            'messages': count,
+            'errors': len(self.errors),
+            'error_samples': self.errors[:5],
+            'concurrency': self.concurrency,
+            'wall_seconds': round(wall, 2),
+            'throughput_msg_s': round(count / wall, 2) if wall else 0.0,
+            'latency_ms': {
+                'p50': round(percentile(self.latencies, 50), 1),
+                'p95': round(percentile(self.latencies, 95), 1),
+                'p99': round(percentile(self.latencies, 99), 1),
+                'max': round(max(self.latencies, default=0), 1),
+            },
+            'queries_per_message': {
+                'avg': round(sum(self.queries) / count, 1) if count else 0.0,
+                'p95': percentile(self.queries, 95),
+                'max': max(self.queries, default=0),
+            },
+            'openai_calls': self.openai.calls,
+            'twilio_messages': StubTwilioClient.sent,
+        }
+
+
+def cleanup_loadtest_data() -> dict:
+    """Delete conversations, customers and bookings created by previous runs"""
+    from bookings.models import Booking, Customer
+    from .models import WhatsAppConversation
+
+    phone = PHONE_PREFIX.replace('whatsapp:', '')
+    return {
+        'bookings': Booking.objects.filter(company__name=LOADTEST_SALON).delete()[0],
+        'conversations': WhatsAppConversation.objects.filter(phone_number__startswith=PHONE_PREFIX).delete()[0],
+        'customers': Customer.objects.filter(phone__startswith=phone).delete()[0],
+    }
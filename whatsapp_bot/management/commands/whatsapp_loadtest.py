@@ -0,0 +1,73 @@
+"""
+Management command to load test the WhatsApp webhook with stubbed Twilio and OpenAI
+"""
+import json
+from django.core.management.base import BaseCommand, CommandError
+from companies.models import Service
+from whatsapp_bot.loadtest import (
+    LoadTestRunner, cleanup_loadtest_data, ensure_loadtest_salon,
+    load_conversations, logged_conversations, scripted_conversations
+)
+
+
+class Command(BaseCommand):
+    help = 'Replay WhatsApp conversations concurrently against the webhook (use a scratch database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Number of conversations to play')
+        parser.add_argument('--concurrency', type=int, default=10, help='Conversations played at the same time')
+        parser.add_argument('--script', help='JSONL file with one conversation (list of messages) per line')
+        parser.add_argument('--from-log', action='store_true', help='Replay inbound messages from the message log')
+        parser.add_argument('--openai-latency-ms', type=float, default=800, help='Delay of the stub OpenAI client')
+        parser.add_argument('--openai-jitter-ms', type=float, default=0, help='Random extra delay, 0..N ms')
+        parser.add_argument('--no-fast-path', action='store_true', help='Send every free-text message to OpenAI')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+        parser.add_argument('--cleanup', action='store_true', help='Delete data created by load test runs and exit')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            deleted = cleanup_loadtest_data()
+            self.stdout.write(self.style.SUCCESS(
+                f"Deleted {deleted['bookings']} bookings, {deleted['conversations']} conversations, "
+                f"{deleted['customers']} customers"
+            ))
+            return
+
+        company = ensure_loadtest_salon()
+        if options['script']:
+            conversations = load_conversations(options['script'])[:options['users']]
+        elif options['from_log']:
+            conversations = logged_conversations(options['users'])
+        else:
+            conversations = scripted_conversations(options['users'], company)
+        if not conversations:
+            raise CommandError('No conversations to play')
+
+        runner = LoadTestRunner(
+            conversations,
+            concurrency=options['concurrency'],
+            openai_latency_ms=options['openai_latency_ms'],
+            openai_jitter_ms=options['openai_jitter_ms'],
+            fast_path=not options['no_fast_path'],
+            service_names=list(Service.objects.filter(company=company).values_list('name', flat=True)),
+        )
+        report = runner.run()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+            return
+
+        latency, queries = report['latency_ms'], report['queries_per_message']
+        self.stdout.write(f"\nConversations: {report['conversations']} ({report['concurrency']} at a time)")
+        self.stdout.write(f"Messages: {report['messages']} in {report['wall_seconds']}s "
+                          f"({report['throughput_msg_s']} msg/s)")
+        self.stdout.write(f"Latency ms: p50 {latency['p50']}  p95 {latency['p95']}  "
+                          f"p99 {latency['p99']}  max {latency['max']}")
+        self.stdout.write(f"Queries per message: avg {queries['avg']}  p95 {queries['p95']}  max {queries['max']}")
+        self.stdout.write(f"OpenAI calls: {report['openai_calls']}  Twilio messages: {report['twilio_messages']}")
+        if report['errors']:
+            self.stdout.write(self.style.ERROR(f"Errors: {report['errors']}"))
+            for sample in report['error_samples']:
+                self.stdout.write(f"  {sample}")
+        else:
+            self.stdout.write(self.style.SUCCESS('No errors'))
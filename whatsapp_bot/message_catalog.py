@@ -0,0 +1,524 @@
+"""
+Message catalog for WhatsApp Booking Bot
+All texts the bot sends, compiled once at import
+
+Templates use str.format placeholders. Per-company parts (service examples,
+contact footer) are cached until the company or its services change, checked
+against a version shared by all workers.
+"""
+import logging
+import string
+import threading
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from companies.cache_versions import bump_version, get_version
+from companies.models import Company, Service
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LANGUAGE = 'es'
+LANGUAGES = ['es', 'en', 'ru', 'uk']
+
+# Sent before a language is known, so in several languages at once
+LANGUAGE_MENU = """🌍 Please select your language / Elige tu idioma:
+
+1️⃣ Español (ES)
+2️⃣ English (EN)
+3️⃣ Русский (RU)
+4️⃣ Українська (UK)
+
+Reply with the number (1-4) or language code."""
+
+INVALID_LANGUAGE_SELECTION = """⚠️ Invalid selection / Selección inválida
+
+Please reply: 1, 2, 3, or 4
+Por favor responde: 1, 2, 3, o 4"""
+
+TECHNICAL_ERROR = "⚠️ Sorry, there was a technical error. Please try again in a moment or contact us directly."
+
+RATE_LIMITED = """⏳ Too many messages, please wait a minute / Demasiados mensajes, espera un minuto
+Слишком много сообщений, подождите минуту / Забагато повідомлень, зачекайте хвилину"""
+
+MESSAGES = {
+    # Menus and greetings
+    'welcome_menu_with_salon': {
+        'es': "👋 ¡Hola{name_greeting}! Bienvenido a **{company_name}**.\n\n¿Qué te gustaría hacer?\n\n1️⃣ 📅 Reservar una cita\n2️⃣ 💅 Ver servicios\n3️⃣ 👥 Ver equipo\n4️⃣ 📍 Ver ubicación\n5️⃣ 🕐 Consultar disponibilidad\n\n📝 Responde con el número (1-5) o escribe tu solicitud.",
+        'en': "👋 Hello{name_greeting}! Welcome to **{company_name}**.\n\nWhat would you like to do?\n\n1️⃣ 📅 Book an appointment\n2️⃣ 💅 View services\n3️⃣ 👥 View team\n4️⃣ 📍 View location\n5️⃣ 🕐 Check availability\n\n📝 Reply with the number (1-5) or type your request.",
+        'ru': "👋 Здравствуйте{name_greeting}! Добро пожаловать в **{company_name}**.\n\nЧто вы хотите сделать?\n\n1️⃣ 📅 Забронировать визит\n2️⃣ 💅 Посмотреть услуги\n3️⃣ 👥 Посмотреть команду\n4️⃣ 📍 Посмотреть адрес\n5️⃣ 🕐 Проверить доступность\n\n📝 Ответьте номером (1-5) или напишите ваш запрос.",
+        'uk': "👋 Привіт{name_greeting}! Ласкаво просимо до **{company_name}**.\n\nЩо ви хочете зробити?\n\n1️⃣ 📅 Забронювати візит\n2️⃣ 💅 Подивитися послуги\n3️⃣ 👥 Подивитися команду\n4️⃣ 📍 Подивитися адресу\n5️⃣ 🕐 Перевірити доступність\n\n📝 Відповідайте номером (1-5) або напишіть ваш запит.",
+    },
+    'welcome_menu_general': {
+        'es': "👋 ¡Hola{name_greeting}! Soy tu asistente de reservas.\n\n¿Qué te gustaría hacer?\n\n1️⃣ 📅 Reservar una cita\n2️⃣ 💅 Ver servicios\n3️⃣ 👥 Ver equipo\n4️⃣ 📍 Ver ubicación\n5️⃣ 🕐 Consultar disponibilidad\n\n📝 Responde con el número (1-5) o escribe tu solicitud.",
+        'en': "👋 Hello{name_greeting}! I'm your booking assistant.\n\nWhat would you like to do?\n\n1️⃣ 📅 Book an appointment\n2️⃣ 💅 View services\n3️⃣ 👥 View team\n4️⃣ 📍 View location\n5️⃣ 🕐 Check availability\n\n📝 Reply with the number (1-5) or type your request.",
+        'ru': "👋 Здравствуйте{name_greeting}! Я ваш помощник по бронированию.\n\nЧто вы хотите сделать?\n\n1️⃣ 📅 Забронировать визит\n2️⃣ 💅 Посмотреть услуги\n3️⃣ 👥 Посмотреть команду\n4️⃣ 📍 Посмотреть адрес\n5️⃣ 🕐 Проверить доступность\n\n📝 Ответьте номером (1-5) или напишите ваш запрос.",
+        'uk': "👋 Привіт{name_greeting}! Я ваш помічник з бронювання.\n\nЩо ви хочете зробити?\n\n1️⃣ 📅 Забронювати візит\n2️⃣ 💅 Подивитися послуги\n3️⃣ 👥 Подивитися команду\n4️⃣ 📍 Подивитися адресу\n5️⃣ 🕐 Перевірити доступність\n\n📝 Відповідайте номером (1-5) або напишіть ваш запит.",
+    },
+    'welcome_with_salon': {
+        'es': "👋 ¡Hola{name_greeting}! Bienvenido a {company_name}.\n\nPuedo ayudarte a reservar una cita. Por ejemplo:\n{examples}\n\n¿En qué puedo ayudarte?",
+        'en': "👋 Hello{name_greeting}! Welcome to {company_name}.\n\nI can help you book an appointment. For example:\n{examples}\n\nHow can I help you?",
+        'ru': "👋 Здравствуйте{name_greeting}! Добро пожаловать в {company_name}.\n\nЯ могу помочь вам забронировать визит. Например:\n{examples}\n\nЧем могу помочь?",
+        'uk': "👋 Привіт{name_greeting}! Ласкаво просимо до {company_name}.\n\nЯ можу допомогти вам забронювати візит. Наприклад:\n{examples}\n\nЯк я можу допомогти?",
+    },
+    'welcome_general': {
+        'es': "👋 ¡Hola{name_greeting}! Soy tu asistente de reservas inteligente.\n\nPuedo ayudarte a reservar una cita. Por ejemplo:\n{examples}\n\n¿En qué puedo ayudarte?",
+        'en': "👋 Hello{name_greeting}! I'm your smart booking assistant.\n\nI can help you book an appointment. For example:\n{examples}\n\nHow can I help you?",
+        'ru': "👋 Здравствуйте{name_greeting}! Я ваш умный помощник по бронированию.\n\nЯ могу помочь вам забронировать визит. Например:\n{examples}\n\nЧем могу помочь?",
+        'uk': "👋 Привіт{name_greeting}! Я ваш розумний асистент бронювання.\n\nЯ можу допомогти забронювати візит. Наприклад:\n{examples}\n\nЯк я можу допомогти?",
+    },
+    'generic_examples': {
+        'es': '• "Quiero una cita mañana a las 3pm"\n• "Disponibilidad el viernes después de las 5pm"\n• "Reserva para el lunes a las 2pm"',
+        'en': '• "I want an appointment tomorrow at 3pm"\n• "Availability on Friday after 5pm"\n• "Book for Monday at 2pm"',
+        'ru': '• "Хочу запись завтра в 3pm"\n• "Доступность в пятницу после 17:00"\n• "Забронировать на понедельник в 14:00"',
+        'uk': '• "Хочу відвідування завтра о 3pm"\n• "Доступність в п\'ятницю після 17:00"\n• "Забронюйте на понеділок о 14:00"',
+    },
+    'salon_switched': {
+        'es': '¡Perfecto! Ahora estás reservando en **{company_name}**.\n\nEscribe "menu" para ver las opciones.',
+        'en': 'Perfect! You are now booking at **{company_name}**.\n\nType "menu" to see options.',
+        'ru': 'Отлично! Теперь вы бронируете в **{company_name}**.\n\nНапишите "menu" чтобы увидеть опции.',
+        'uk': 'Чудово! Тепер ви бронюєте в **{company_name}**.\n\nНапишіть "menu" щоб побачити опції.',
+    },
+    'no_salon_selected': {
+        'es': "⚠️ Primero necesito saber en qué salón quieres reservar. Por favor, dime el nombre del salón.",
+        'en': "⚠️ First I need to know which salon you want to book at. Please tell me the salon name.",
+        'ru': "⚠️ Сначала мне нужно знать, в каком салоне вы хотите забронировать. Пожалуйста, скажите название салона.",
+        'uk': "⚠️ Спочатку мені потрібно знати, в якому салоні ви хочете забронювати. Будь ласка, скажіть назву салону.",
+    },
+    'invalid_menu_choice': {
+        'es': "⚠️ Por favor, elige un número del 1 al 5, o escribe 'menu' para ver las opciones.",
+        'en': "⚠️ Please choose a number from 1 to 5, or type 'menu' to see options.",
+        'ru': "⚠️ Пожалуйста, выберите номер от 1 до 5, или напишите 'menu' чтобы увидеть опции.",
+        'uk': "⚠️ Будь ласка, виберіть номер від 1 до 5, або напишіть 'menu' щоб побачити опції.",
+    },
+    'conversation_cancelled': {
+        'es': "❌ Conversación cancelada. Escribe 'menu' cuando quieras hacer una reserva.",
+        'en': "❌ Conversation cancelled. Type 'menu' when you want to make a booking.",
+        'ru': "❌ Разговор отменен. Напишите 'menu' когда захотите сделать бронирование.",
+        'uk': "❌ Розмову скасовано. Напишіть 'menu' коли захочете зробити бронювання.",
+    },
+    'service_error': {
+        'es': "⚠️ Lo siento, hay un problema con el servicio. Por favor, intenta más tarde o llama directamente al salón.",
+        'en': "⚠️ Sorry, there's a problem with the service. Please try again later or call the salon directly.",
+        'ru': "⚠️ Извините, проблема с сервисом. Пожалуйста, попробуйте позже или позвоните в салон напрямую.",
+        'uk': "⚠️ Вибачте, проблема з сервісом. Будь ласка, спробуйте пізніше або зателефонуйте безпосередньо до салону.",
+    },
+    'help_message': {
+        'es': "Puedo ayudarte a:\n• Hacer una reserva\n• Consultar disponibilidad\n• Ver servicios disponibles\n\nEscribe 'menu' para ver todas las opciones.\nEscribe 'idioma' para cambiar el idioma.\n\n¿Qué necesitas?",
+        'en': "I can help you:\n• Make a booking\n• Check availability\n• See available services\n\nType 'menu' to see all options.\nType 'language' to change language.\n\nWhat do you need?",
+        'ru': "Я могу помочь вам:\n• Сделать бронирование\n• Проверить доступность\n• Посмотреть доступные услуги\n\nНапишите 'menu' чтобы увидеть все опции.\nНапишите 'язык' чтобы изменить язык.\n\nЧто вам нужно?",
+        'uk': "Я можу допомогти вам:\n• Зробити бронювання\n• Перевірити доступність\n• Переглянути доступні послуги\n\nНапишіть 'menu' щоб побачити всі опції.\nНапишіть 'мова' щоб змінити мову.\n\nЩо вам потрібно?",
+    },
+    'salon_help': {
+        'es': "❓ Puedo ayudarte con:\n1️⃣ Reservar una cita\n2️⃣ Ver servicios\n3️⃣ Ver equipo\n4️⃣ Ver ubicación\n5️⃣ Consultar disponibilidad\n\n🌐 Para más información: {url}\n📞 Teléfono: {phone}\n\n📝 Escribe el número (1-5) o 'menu' para ver opciones.",
+        'en': "❓ I can help you with:\n1️⃣ Book an appointment\n2️⃣ View services\n3️⃣ View team\n4️⃣ View location\n5️⃣ Check availability\n\n🌐 For more information: {url}\n📞 Phone: {phone}\n\n📝 Type the number (1-5) or 'menu' to see options.",
+        'ru': "❓ Я могу помочь вам:\n1️⃣ Забронировать визит\n2️⃣ Посмотреть услуги\n3️⃣ Посмотреть команду\n4️⃣ Посмотреть адрес\n5️⃣ Проверить доступность\n\n🌐 Для дополнительной информации: {url}\n📞 Телефон: {phone}\n\n📝 Напишите номер (1-5) или 'menu' чтобы увидеть опции.",
+        'uk': "❓ Я можу допомогти вам:\n1️⃣ Забронювати візит\n2️⃣ Подивитися послуги\n3️⃣ Подивитися команду\n4️⃣ Подивитися адресу\n5️⃣ Перевірити доступність\n\n🌐 Для додаткової інформації: {url}\n📞 Телефон: {phone}\n\n📝 Напишіть номер (1-5) або 'menu' щоб побачити опції.",
+    },
+    'phone_unavailable': {
+        'es': "No disponible",
+        'en': "Not available",
+        'ru': "Недоступно",
+        'uk': "Недоступно",
+    },
+
+    # Salon information
+    'services_list': {
+        'es': "💅 **Servicios disponibles:**\n\n{services}\n\n📝 Responde con el número del servicio (1-{count}) o escribe el nombre del servicio.",
+        'en': "💅 **Available services:**\n\n{services}\n\n📝 Reply with the service number (1-{count}) or type the service name.",
+        'ru': "💅 **Доступные услуги:**\n\n{services}\n\n📝 Ответьте номером услуги (1-{count}) или напишите название услуги.",
+        'uk': "💅 **Доступні послуги:**\n\n{services}\n\n📝 Відповідайте номером послуги (1-{count}) або напишіть назву послуги.",
+    },
+    'minutes': {
+        'es': "min",
+        'en': "min",
+        'ru': "мин",
+        'uk': "хв",
+    },
+    'no_services_available': {
+        'es': "⚠️ Lo siento, no hay servicios disponibles en este momento.",
+        'en': "⚠️ Sorry, no services are available at this time.",
+        'ru': "⚠️ Извините, в данный момент нет доступных услуг.",
+        'uk': "⚠️ Вибачте, зараз немає доступних послуг.",
+    },
+    'staff_list': {
+        'es': "👥 **Nuestro equipo:**\n\n{staff}\n\n✨ Para reservar, escribe 'menu' o el nombre del servicio que deseas.",
+        'en': "👥 **Our team:**\n\n{staff}\n\n✨ To book, type 'menu' or the service name you want.",
+        'ru': "👥 **Наша команда:**\n\n{staff}\n\n✨ Для бронирования напишите 'menu' или название услуги.",
+        'uk': "👥 **Наша команда:**\n\n{staff}\n\n✨ Для бронювання напишіть 'menu' або назву послуги.",
+    },
+    'no_staff_available': {
+        'es': "⚠️ Lo siento, no hay información del equipo disponible.",
+        'en': "⚠️ Sorry, no team information is available.",
+        'ru': "⚠️ Извините, информация о команде недоступна.",
+        'uk': "⚠️ Вибачте, інформація про команду недоступна.",
+    },
+    'salon_location': {
+        'es': "📍 **{name}**\n\n{address}\n📞 {phone}\n✉️ {email}\n\n🔗 Ver en el sitio web: {url}",
+        'en': "📍 **{name}**\n\n{address}\n📞 {phone}\n✉️ {email}\n\n🔗 View on website: {url}",
+        'ru': "📍 **{name}**\n\n{address}\n📞 {phone}\n✉️ {email}\n\n🔗 Посмотреть на сайте: {url}",
+        'uk': "📍 **{name}**\n\n{address}\n📞 {phone}\n✉️ {email}\n\n🔗 Переглянути на сайті: {url}",
+    },
+    'availability_prompt': {
+        'es': "📅 Para ver horarios disponibles, dime:\n\n1️⃣ ¿Qué servicio te interesa?\n2️⃣ ¿Para qué día? (ej: mañana, viernes, 15 de abril)\n\nPuedes escribir: 'Manicura para mañana' o simplemente el nombre del servicio.",
+        'en': "📅 To see available times, tell me:\n\n1️⃣ Which service are you interested in?\n2️⃣ For what day? (e.g., tomorrow, Friday, April 15)\n\nYou can type: 'Manicure for tomorrow' or just the service name.",
+        'ru': "📅 Чтобы посмотреть доступное время, скажите:\n\n1️⃣ Какая услуга вас интересует?\n2️⃣ На какой день? (напр.: завтра, пятница, 15 апреля)\n\nМожете написать: 'Маникюр на завтра' или просто название услуги.",
+        'uk': "📅 Щоб подивитися доступний час, скажіть:\n\n1️⃣ Яка послуга вас цікавить?\n2️⃣ На який день? (напр.: завтра, п'ятниця, 15 квітня)\n\nМожете написати: 'Манікюр на завтра' або просто назву послуги.",
+    },
+
+    # Booking request
+    'ask_salon': {
+        'es': "¿En qué salón te gustaría reservar?\n\nPor favor, indica el nombre.",
+        'en': "Which salon would you like to book at?\n\nPlease indicate the name.",
+        'ru': "В каком салоне вы хотите забронировать?\n\nПожалуйста, укажите название.",
+        'uk': "В якому салоні ви хочете забронювати?\n\nБудь ласка, вкажіть назву.",
+    },
+    'choose_service': {
+        'es': "¿Qué servicio necesitas?\n\nServicios disponibles:\n{services}\n\n✏️ Responde con el número o el nombre del servicio. Solo puedes reservar un servicio a la vez.{contact}",
+        'en': "What service do you need?\n\nAvailable services:\n{services}\n\n✏️ Reply with the number or service name. You can only book one service at a time.{contact}",
+        'ru': "Какая услуга вам нужна?\n\nДоступные услуги:\n{services}\n\n✏️ Ответьте номером или названием услуги. Одновременно можно записаться на одну услугу.{contact}",
+        'uk': "Яка послуга вам потрібна?\n\nДоступні послуги:\n{services}\n\n✏️ Відповідь номером або назвою послуги. Одночасно можна записатися лише на одну послугу.{contact}",
+    },
+    'service_inquiries': {
+        'es': "\n\n💡 Para consultas sobre servicios específicos:",
+        'en': "\n\n💡 For specific service inquiries:",
+        'ru': "\n\n💡 Для вопросов о конкретных услугах:",
+        'uk': "\n\n💡 Для питань про конкретні послуги:",
+    },
+    'no_services_in_salon': {
+        'es': "No hay servicios disponibles en este salón.",
+        'en': "No services available in this salon.",
+        'ru': "В этом салоне нет доступных услуг.",
+        'uk': "Немає доступних послуг у цьому салоні.",
+    },
+    'ask_date': {
+        'es': "¿Para qué día quieres la cita? (ej: mañana, viernes, 15 de marzo)",
+        'en': "What day would you like the appointment? (e.g., tomorrow, Friday, March 15)",
+        'ru': "На какой день вы хотите записаться? (напр.: завтра, пятница, 15 марта)",
+        'uk': "На який день ви хочете записатися? (напр.: завтра, п'ятниця, 15 березня)",
+    },
+    'bad_date': {
+        'es': "No entendí la fecha. ¿Podrías especificarla? (ej: mañana, próximo lunes, 15/03/2026)",
+        'en': "I didn't understand the date. Could you specify it? (e.g., tomorrow, next Monday, 03/15/2026)",
+        'ru': "Я не понял дату. Можете уточнить? (напр.: завтра, следующий понедельник, 15/03/2026)",
+        'uk': "Я не зрозумів дату. Можете уточнити? (напр.: завтра, наступний понеділок, 15/03/2026)",
+    },
+    'past_date': {
+        'es': "Esa fecha ya pasó. Por favor, elige una fecha futura.",
+        'en': "That date has already passed. Please choose a future date.",
+        'ru': "Эта дата уже прошла. Пожалуйста, выберите будущую дату.",
+        'uk': "Ця дата вже минула. Будь ласка, виберіть майбутню дату.",
+    },
+    'no_slots': {
+        'es': "😔 Lo siento, no hay horarios disponibles para {service}{staff} el {date}{criteria}.\n\n¿Quieres probar otra fecha, horario o especialista?",
+        'en': "😔 Sorry, no times available for {service}{staff} on {date}{criteria}.\n\nWant to try another date, time or specialist?",
+        'ru': "😔 Извините, нет доступного времени для {service}{staff} {date}{criteria}.\n\nПопробовать другую дату, время или специалиста?",
+        'uk': "😔 Вибачте, немає доступних часів для {service}{staff} {date}{criteria}.\n\nСпробувати іншу дату, час або спеціаліста?",
+    },
+    'no_slots_alternatives': {
+        'es': "😔 Lo siento, no hay horarios disponibles para {service}{staff} el {date}{criteria}.\n\nEstas son las fechas más cercanas con horarios libres:\n",
+        'en': "😔 Sorry, no times available for {service}{staff} on {date}{criteria}.\n\nHere are the closest dates with free times:\n",
+        'ru': "😔 Извините, нет доступного времени для {service}{staff} {date}{criteria}.\n\nБлижайшие даты со свободным временем:\n",
+        'uk': "😔 Вибачте, немає доступних часів для {service}{staff} {date}{criteria}.\n\nНайближчі дати з вільним часом:\n",
+    },
+    'no_slots_with_staff': {
+        'es': " con {staff_name}",
+        'en': " with {staff_name}",
+        'ru': " у {staff_name}",
+        'uk': " у {staff_name}",
+    },
+    'no_slots_after': {
+        'es': " después de las {time}",
+        'en': " after {time}",
+        'ru': " после {time}",
+        'uk': " після {time}",
+    },
+    'no_slots_before': {
+        'es': " antes de las {time}",
+        'en': " before {time}",
+        'ru': " до {time}",
+        'uk': " до {time}",
+    },
+
+    # Numbered selections
+    'choose_number_between': {
+        'es': "⚠️ Por favor, elige un número entre {low} y {high}.",
+        'en': "⚠️ Please choose a number between {low} and {high}.",
+        'ru': "⚠️ Пожалуйста, выберите номер между {low} и {high}.",
+        'uk': "⚠️ Будь ласка, виберіть номер між {low} та {high}.",
+    },
+    'service_list_missing': {
+        'es': "⚠️ No encontré la lista de servicios. Por favor, empieza de nuevo.",
+        'en': "⚠️ I couldn't find the service list. Please start again.",
+        'ru': "⚠️ Я не нашел список услуг. Пожалуйста, начните заново.",
+        'uk': "⚠️ Я не знайшов список послуг. Будь ласка, почніть спочатку.",
+    },
+    'no_company_selected': {
+        'es': "⚠️ No se ha seleccionado un salón. Por favor, empieza de nuevo.",
+        'en': "⚠️ No salon selected. Please start again.",
+        'ru': "⚠️ Салон не выбран. Пожалуйста, начните заново.",
+        'uk': "⚠️ Салон не вибрано. Будь ласка, почніть спочатку.",
+    },
+    'service_not_found': {
+        'es': "⚠️ Servicio no encontrado. Por favor, empieza de nuevo.",
+        'en': "⚠️ Service not found. Please start again.",
+        'ru': "⚠️ Услуга не найдена. Пожалуйста, начните заново.",
+        'uk': "⚠️ Послугу не знайдено. Будь ласка, почніть спочатку.",
+    },
+    'no_staff_for_service': {
+        'es': "⚠️ No hay personal disponible para este servicio.",
+        'en': "⚠️ No staff available for this service.",
+        'ru': "⚠️ Нет доступных специалистов для этой услуги.",
+        'uk': "⚠️ Немає доступних спеціалістів для цієї послуги.",
+    },
+    'staff_selection': {
+        'es': "✅ **{service}** seleccionado.\n\n👥 **Selecciona un especialista:**\n\n0️⃣ Cualquier disponible\n{staff}\n\n📝 Responde con el número (0-{count}).",
+        'en': "✅ **{service}** selected.\n\n👥 **Select a specialist:**\n\n0️⃣ Any available\n{staff}\n\n📝 Reply with the number (0-{count}).",
+        'ru': "✅ **{service}** выбран.\n\n👥 **Выберите специалиста:**\n\n0️⃣ Любой доступный\n{staff}\n\n📝 Ответьте номером (0-{count}).",
+        'uk': "✅ **{service}** вибрано.\n\n👥 **Виберіть спеціаліста:**\n\n0️⃣ Будь-який доступний\n{staff}\n\n📝 Відповідайте номером (0-{count}).",
+    },
+    'any_staff_ask_date': {
+        'es': "✅ Buscaremos cualquier especialista disponible.\n\n¿Para qué día quieres la cita? (ej: mañana, viernes, 21 de abril)",
+        'en': "✅ We'll find any available specialist.\n\nWhat day would you like the appointment? (e.g., tomorrow, Friday, April 21)",
+        'ru': "✅ Найдём любого доступного специалиста.\n\nНа какой день вы хотите записаться? (напр.: завтра, пятница, 21 апреля)",
+        'uk': "✅ Знайдемо будь-якого доступного спеціаліста.\n\nНа який день ви хочете записатися? (напр.: завтра, п'ятниця, 21 квітня)",
+    },
+    'staff_selected_ask_date': {
+        'es': "✅ {staff_name} seleccionado.\n\n¿Para qué día quieres la cita? (ej: mañana, viernes, 21 de abril)",
+        'en': "✅ {staff_name} selected.\n\nWhat day would you like the appointment? (e.g., tomorrow, Friday, April 21)",
+        'ru': "✅ {staff_name} выбран.\n\nНа какой день вы хотите записаться? (напр.: завтра, пятница, 21 апреля)",
+        'uk': "✅ {staff_name} вибрано.\n\nНа який день ви хочете записатися? (напр.: завтра, п'ятниця, 21 квітня)",
+    },
+    'no_pending_booking': {
+        'es': "⚠️ No encontré una reserva pendiente. Por favor, empieza de nuevo.",
+        'en': "⚠️ I couldn't find a pending booking. Please start again.",
+        'ru': "⚠️ Я не нашел незавершенное бронирование. Пожалуйста, начните заново.",
+        'uk': "⚠️ Я не знайшов незавершене бронювання. Будь ласка, почніть спочатку.",
+    },
+    'ask_full_name': {
+        'es': "✅ Perfecto! ¿Cuál es tu nombre completo?",
+        'en': "✅ Perfect! What's your full name?",
+        'ru': "✅ Отлично! Как ваше полное имя?",
+        'uk': "✅ Чудово! Яке ваше повне ім'я?",
+    },
+
+    # Confirmation
+    'confirm_booking': {
+        'es': "📋 Por favor confirma tu reserva:\n\n📅 Fecha: {date}\n🕐 Hora: {time}\n✂️ Servicio: {service}\n👤 Especialista: {staff}\n👤 Cliente: {customer}\n📍 Salón: {company}\n\n✅ Responde 'sí' para confirmar\n❌ Responde 'no' para cancelar",
+        'en': "📋 Please confirm your booking:\n\n📅 Date: {date}\n🕐 Time: {time}\n✂️ Service: {service}\n👤 Specialist: {staff}\n👤 Customer: {customer}\n📍 Salon: {company}\n\n✅ Reply 'yes' to confirm\n❌ Reply 'no' to cancel",
+        'ru': "📋 Пожалуйста, подтвердите бронирование:\n\n📅 Дата: {date}\n🕐 Время: {time}\n✂️ Услуга: {service}\n👤 Специалист: {staff}\n👤 Клиент: {customer}\n📍 Салон: {company}\n\n✅ Ответьте 'да' для подтверждения\n❌ Ответьте 'нет' для отмены",
+        'uk': "📋 Будь ласка, підтвердіть бронювання:\n\n📅 Дата: {date}\n🕐 Час: {time}\n✂️ Послуга: {service}\n👤 Спеціаліст: {staff}\n👤 Клієнт: {customer}\n📍 Салон: {company}\n\n✅ Відповідайте 'так' для підтвердження\n❌ Відповідайте 'ні' для скасування",
+    },
+    'booking_cancelled': {
+        'es': "❌ Reserva cancelada.\n\n¿Quieres buscar otro horario o servicio?",
+        'en': "❌ Booking cancelled.\n\nWould you like to search for another time or service?",
+        'ru': "❌ Бронирование отменено.\n\nХотите найти другое время или услугу?",
+        'uk': "❌ Бронювання скасовано.\n\nБажаєте знайти інший час або послугу?",
+    },
+    'confirm_yes_no': {
+        'es': "⚠️ Por favor responde 'sí' para confirmar o 'no' para cancelar.",
+        'en': "⚠️ Please reply 'yes' to confirm or 'no' to cancel.",
+        'ru': "⚠️ Пожалуйста, ответьте 'да' для подтверждения или 'нет' для отмены.",
+        'uk': "⚠️ Будь ласка, відповідайте 'так' для підтвердження або 'ні' для скасування.",
+    },
+    'booking_error': {
+        'es': "❌ Hubo un error al crear la reserva: {error}\n\nPor favor, intenta de nuevo o contacta directamente con el salón.",
+        'en': "❌ There was an error creating the booking: {error}\n\nPlease try again or contact the salon directly.",
+        'ru': "❌ Произошла ошибка при создании бронирования: {error}\n\nПожалуйста, попробуйте еще раз или свяжитесь с салоном напрямую.",
+        'uk': "❌ Сталася помилка при створенні бронювання: {error}\n\nБудь ласка, спробуйте ще раз або зв'яжіться безпосередньо з салоном.",
+    },
+
+    # Replies built by BookingAI
+    'slots_header': {
+        'es': "✅ Horarios disponibles para {service} el {date}:\n\n",
+        'en': "✅ Available times for {service} on {date}:\n\n",
+        'ru': "✅ Доступное время для {service} {date}:\n\n",
+        'uk': "✅ Доступні часи для {service} {date}:\n\n",
+    },
+    'slots_footer': {
+        'es': "\n📝 Responde con el número de tu opción preferida (1-{count}).",
+        'en': "\n📝 Reply with your preferred option number (1-{count}).",
+        'ru': "\n📝 Ответьте номером вашего варианта (1-{count}).",
+        'uk': "\n📝 Відповідайте номером вашого варіанту (1-{count}).",
+    },
+    'booking_confirmed': {
+        'es': "✅ ¡Reserva confirmada!\n\n📅 Fecha: {date}\n🕐 Hora: {time}\n✂️ Servicio: {service}\n👤 Especialista: {staff}\n📍 Salón: {company}\n\n¡Nos vemos pronto! 👋",
+        'en': "✅ Booking confirmed!\n\n📅 Date: {date}\n🕐 Time: {time}\n✂️ Service: {service}\n👤 Specialist: {staff}\n📍 Salon: {company}\n\nSee you soon! 👋",
+        'ru': "✅ Бронирование подтверждено!\n\n📅 Дата: {date}\n🕐 Время: {time}\n✂️ Услуга: {service}\n👤 Специалист: {staff}\n📍 Салон: {company}\n\nДо встречи! 👋",
+        'uk': "✅ Бронювання підтверджено!\n\n📅 Дата: {date}\n🕐 Час: {time}\n✂️ Послуга: {service}\n👤 Спеціаліст: {staff}\n📍 Салон: {company}\n\nДо зустрічі! 👋",
+    },
+    'booking_details_link': {
+        'es': "\n🔗 Ver detalles: {url}",
+        'en': "\n🔗 View details: {url}",
+        'ru': "\n🔗 Просмотреть детали: {url}",
+        'uk': "\n🔗 Переглянути деталі: {url}",
+    },
+    'generic_help': {
+        'es': "¿En qué puedo ayudarte?",
+        'en': "How can I help you?",
+        'ru': "Чем могу помочь?",
+        'uk': "Як я можу допомогти?",
+    },
+}
+
+# Building blocks of per-company service examples ("Quiero manicura mañana a las 3pm")
+EXAMPLE_ACTIONS = {
+    'es': ['Quiero', 'Disponibilidad para', 'Reserva'],
+    'en': ['I want', 'Availability for', 'Book'],
+    'ru': ['Хочу', 'Доступность для', 'Забронировать'],
+    'uk': ['Хочу', 'Доступність для', 'Забронюйте'],
+}
+EXAMPLE_TIMES = {
+    'es': ['mañana a las 3pm', 'el viernes después de las 5pm', 'el lunes a las 2pm'],
+    'en': ['tomorrow at 3pm', 'on Friday after 5pm', 'Monday at 2pm'],
+    'ru': ['завтра в 3pm', 'в пятницу после 17:00', 'в понедельник в 14:00'],
+    'uk': ['завтра о 3pm', "в п'ятницю після 17:00", 'на понеділок о 14:00'],
+}
+
+GREETING_KEYS = {'welcome_with_salon', 'welcome_general', 'welcome_menu_with_salon', 'welcome_menu_general'}
+EXAMPLE_KEYS = {'welcome_with_salon', 'welcome_general'}
+
+
+class CompiledMessage:
+    """A template with its placeholder names worked out once"""
+
+    __slots__ = ('template', 'fields')
+
+    def __init__(self, template: str):
+        self.template = template
+        self.fields = frozenset(
+            field for _, field, _, _ in string.Formatter().parse(template) if field
+        )
+
+    def render(self, params: dict) -> str:
+        if not self.fields:
+            return self.template
+        return self.template.format_map(params)
+
+
+def _compile(messages: dict) -> dict:
+    catalog = {}
+    for key, translations in messages.items():
+        default = CompiledMessage(translations[DEFAULT_LANGUAGE])
+        for lang in LANGUAGES:
+            compiled = CompiledMessage(translations[lang]) if lang in translations else default
+            if compiled.fields != default.fields:
+                raise ValueError(f"Message '{key}' has different placeholders in '{lang}'")
+            catalog[key, lang] = compiled
+    return catalog
+
+
+CATALOG = _compile(MESSAGES)
+
+
+def render(key: str, lang: str, **params) -> str:
+    """Render a catalog message; unknown languages fall back to Spanish"""
+    compiled = CATALOG.get((key, lang)) or CATALOG.get((key, DEFAULT_LANGUAGE))
+    if compiled is None:
+        logger.error(f"Unknown message key '{key}'")
+        return ''
+    try:
+        return compiled.render(params)
+    except KeyError as e:
+        # If a required key is missing, log and return the unformatted template
+        logger.error(f"Missing key in message template '{key}': {e}")
+        return compiled.template
+
+
+def get_message(key: str, lang: str, company=None, **kwargs) -> str:
+    """Get predefined message in specified language"""
+    if key in EXAMPLE_KEYS:
+        kwargs['examples'] = service_examples(company, lang)
+
+    # Personalized greeting: ", Maria" (e.g., "¡Hola, Maria!")
+    if key in GREETING_KEYS:
+        customer_name = kwargs.get('customer_name')
+        kwargs['name_greeting'] = f", {customer_name}" if customer_name else ""
+
+    return render(key, lang, **kwargs)
+
+
+def company_url(company_id: int) -> str:
+    site_url = getattr(settings, 'SITE_URL', 'https://reserva-ya.es')
+    return f"{site_url}/companies/{company_id}/"
+
+
+# Per-company parts -----------------------------------------------------------
+
+COMPANY_TEXTS_VERSION = 'whatsapp_bot.texts'
+
+
+class CompanyTexts:
+    """Rendered per-company parts, keyed by (part, lang)"""
+
+    def __init__(self, company_id: int, version: int = 0):
+        self.company_id = company_id
+        self.version = version
+        self.parts = {}
+
+
+_company_texts = {}
+_company_texts_lock = threading.Lock()
+
+
+def _get_company_texts(company_id: int) -> CompanyTexts:
+    version = get_version(company_id, COMPANY_TEXTS_VERSION)
+    texts = _company_texts.get(company_id)
+    if texts is not None and texts.version == version:
+        return texts
+
+    texts = CompanyTexts(company_id, version)
+    with _company_texts_lock:
+        _company_texts[company_id] = texts
+    return texts
+
+
+def service_examples(company, lang: str) -> str:
+    """Bullet list of example requests using the company's own services"""
+    if company is None:
+        return render('generic_examples', lang)
+
+    texts = _get_company_texts(company.id)
+    part = texts.parts.get(('examples', lang))
+    if part is None:
+        names = list(
+            Service.objects.filter(company_id=company.id, is_active=True).values_list('name', flat=True)[:3]
+        )
+        actions = EXAMPLE_ACTIONS.get(lang, EXAMPLE_ACTIONS[DEFAULT_LANGUAGE])
+        times = EXAMPLE_TIMES.get(lang, EXAMPLE_TIMES[DEFAULT_LANGUAGE])
+        examples = [f'• "{action} {name.lower()} {time}"' for action, name, time in zip(actions, names, times)]
+        part = '\n'.join(examples) if examples else render('generic_examples', lang)
+        texts.parts[('examples', lang)] = part
+    return part
+
+
+def contact_footer(company, lang: str) -> str:
+    """Website and phone appended to service lists, empty without contact details"""
+    texts = _get_company_texts(company.id)
+    part = texts.parts.get(('contact', lang))
+    if part is None:
+        part = ''
+        if company.phone or company.email:
+            part = render('service_inquiries', lang) + f"\n🌐 {company_url(company.id)}"
+            if company.phone:
+                part += f"\n📞 {company.phone}"
+        texts.parts[('contact', lang)] = part
+    return part
+
+
+def invalidate_company_texts(company_id: int):
+    with _company_texts_lock:
+        _company_texts.pop(company_id, None)
+    bump_version(company_id, COMPANY_TEXTS_VERSION)
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_texts_on_company_change(sender, instance, **kwargs):
+    invalidate_company_texts(instance.id)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def invalidate_texts_on_service_change(sender, instance, **kwargs):
+    invalidate_company_texts(instance.company_id)
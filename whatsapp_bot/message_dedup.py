@@ -0,0 +1,126 @@
+"""
+Duplicate delivery detection for WhatsApp Booking Bot
+Twilio retries a webhook on timeout with the same MessageSid; the retry gets
+the reply generated the first time instead of running the pipeline again.
+
+The claim on a MessageSid is a unique row in ProcessedMessage, so a retry
+that lands on another worker sees it too.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import ProcessedMessage, WhatsAppMessage
+
+logger = logging.getLogger(__name__)
+
+
+def _cache_key(message_sid: str) -> str:
+    return f"whatsapp_bot:reply:{message_sid}"
+
+
+class ProcessedMessageStore:
+    """
+    Replies by MessageSid: in-process LRU, then the cache, then the claim
+    rows, then the message log (message_sid is unique in both tables, so
+    the lookups are index probes)
+    """
+
+    def __init__(self, max_size: int = 2000, ttl: int = None, wait_timeout: float = None):
+        self.max_size = max_size
+        self.ttl = ttl or getattr(settings, 'WHATSAPP_DEDUP_TTL', 24 * 3600)
+        self.wait_timeout = getattr(settings, 'WHATSAPP_DEDUP_WAIT', 5.0) if wait_timeout is None else wait_timeout
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, message_sid: str, reply: str):
+        with self._lock:
+            self._recent[message_sid] = reply
+            self._recent.move_to_end(message_sid)
+            while len(self._recent) > self.max_size:
+                self._recent.popitem(last=False)
+
+    def get_reply(self, message_sid: str):
+        """
+        Return the stored reply for an already handled message, None if unseen
+        or still being processed
+
+        An empty string means the message was handled but no reply is known.
+        """
+        with self._lock:
+            reply = self._recent.get(message_sid)
+        if reply is not None:
+            return reply
+
+        reply = cache.get(_cache_key(message_sid))
+        if reply is not None:
+            return reply
+
+        claimed = ProcessedMessage.objects.filter(message_sid=message_sid).values_list('reply', flat=True)
+        for reply in claimed:
+            if reply is not None:
+                self._remember(message_sid, reply)
+            return reply
+
+        inbound = WhatsAppMessage.objects.filter(
+            message_sid=message_sid
+        ).values('id', 'conversation_id').first()
+        if inbound is None:
+            return None
+        # The reply is the first outbound message logged after it
+        reply = WhatsAppMessage.objects.filter(
+            conversation_id=inbound['conversation_id'],
+            direction='outbound',
+            id__gt=inbound['id']
+        ).order_by('id').values_list('message_body', flat=True).first() or ''
+        self._remember(message_sid, reply)
+        return reply
+
+    def claim(self, message_sid: str) -> bool:
+        """Mark a message as being processed; False if another request has it"""
+        try:
+            with transaction.atomic():
+                ProcessedMessage.objects.create(message_sid=message_sid)
+        except IntegrityError:
+            return False
+        return True
+
+    def wait_for_reply(self, message_sid: str) -> str:
+        """Wait for the request that claimed the message; '' if it takes too long"""
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            claimed = list(ProcessedMessage.objects.filter(message_sid=message_sid).values_list('reply', flat=True))
+            if not claimed:
+                # Released after a failure
+                break
+            if claimed[0] is not None:
+                return claimed[0]
+            time.sleep(0.2)
+        return self.get_reply(message_sid) or ''
+
+    def store(self, message_sid: str, reply: str):
+        self._remember(message_sid, reply)
+        cache.set(_cache_key(message_sid), reply, self.ttl)
+        ProcessedMessage.objects.update_or_create(message_sid=message_sid, defaults={'reply': reply})
+
+    def release(self, message_sid: str):
+        """Forget a claim after a failure so a retry is processed normally"""
+        ProcessedMessage.objects.filter(message_sid=message_sid, reply__isnull=True).delete()
+
+
+def cleanup_processed_messages(ttl: int = None) -> int:
+    """Delete claims older than WHATSAPP_DEDUP_TTL; Twilio has stopped retrying them"""
+    ttl = ttl or getattr(settings, 'WHATSAPP_DEDUP_TTL', 24 * 3600)
+    deleted, _ = ProcessedMessage.objects.filter(
+        created_at__lt=timezone.now() - timedelta(seconds=ttl)
+    ).delete()
+    return deleted
+
+
+processed_messages = ProcessedMessageStore()
@@ -0,0 +1,243 @@
+"""
+Message log writer for WhatsApp Booking Bot
+Buffers WhatsAppMessage records and writes them with bulk_create
+
+Every record is first appended to a local write-ahead segment file, so
+nothing is lost if the process dies before the buffer is flushed.
+Segments left behind by dead processes are replayed on the next pass.
+A segment is flock-ed by its writer from before it gets its .wal name
+until it is flushed, so recovery in any process only takes segments
+whose writer is gone.
+"""
+import atexit
+import fcntl
+import glob
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import WhatsAppConversation, WhatsAppMessage
+
+logger = logging.getLogger(__name__)
+
+RECORD_FIELDS = ['conversation_id', 'from_number', 'to_number', 'message_body', 'direction', 'message_sid']
+
+
+def _default_log_dir() -> str:
+    return getattr(settings, 'WHATSAPP_MESSAGE_LOG_DIR', os.path.join(settings.BASE_DIR, 'var', 'whatsapp'))
+
+
+class MessageLogWriter:
+    """Buffered, crash-safe writer for WhatsAppMessage rows"""
+
+    def __init__(self, log_dir: str = None, flush_size: int = None, flush_interval: float = None,
+                 background: bool = None):
+        self.log_dir = log_dir or _default_log_dir()
+        self.flush_size = flush_size or getattr(settings, 'WHATSAPP_MESSAGE_LOG_FLUSH_SIZE', 50)
+        self.flush_interval = flush_interval or getattr(settings, 'WHATSAPP_MESSAGE_LOG_FLUSH_INTERVAL', 2.0)
+        self.background = getattr(settings, 'WHATSAPP_MESSAGE_LOG_ASYNC', True) if background is None else background
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffer = []
+        self._segment = None
+        self._sequence = 0
+        self._thread = None
+        self._pid = None
+
+    # Write-ahead segments -------------------------------------------------
+
+    def _open_segment(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+        self._sequence += 1
+        path = os.path.join(self.log_dir, f"messages-{os.getpid()}-{self._sequence}.wal")
+        handle = open(f"{path}.new", 'a', encoding='utf-8')
+        # Held until the segment is flushed; a free lock means its owner died. Taken
+        # before the rename so recover() never sees this segment unlocked.
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.rename(f"{path}.new", path)
+        self._segment = (path, handle)
+
+    def _close_segment(self, segment, delete: bool):
+        path, handle = segment
+        if delete:
+            os.remove(path)
+        handle.close()
+
+    # Public API -----------------------------------------------------------
+
+    def log(self, conversation, from_number: str, to_number: str, message_body: str,
+            direction: str, message_sid: str = None):
+        """Queue one message record; inbound records are fsynced before returning"""
+        record = {
+            'conversation_id': conversation.id,
+            'from_number': from_number,
+            'to_number': to_number,
+            'message_body': message_body,
+            'direction': direction,
+            'message_sid': message_sid or None,
+        }
+
+        with self._lock:
+            self._ensure_started()
+            if self._segment is None:
+                self._open_segment()
+            handle = self._segment[1]
+            handle.write(json.dumps(record, ensure_ascii=False) + '\n')
+            handle.flush()
+            if direction == 'inbound':
+                os.fsync(handle.fileno())
+            self._buffer.append(record)
+            full = len(self._buffer) >= self.flush_size
+
+        if full or not self.background:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write buffered records with one bulk_create; returns rows written"""
+        with self._flush_lock:
+            with self._lock:
+                records, segment = self._buffer, self._segment
+                self._buffer, self._segment = [], None
+
+            if segment is None:
+                return 0
+            try:
+                written = self._bulk_insert(records)
+            except Exception as e:
+                # Records stay in the segment; recover() replays them later
+                logger.error(f"Message log flush failed, {len(records)} records kept on disk: {e}")
+                self._close_segment(segment, delete=False)
+                return 0
+            self._close_segment(segment, delete=True)
+            return written
+
+    def recover(self) -> int:
+        """Replay segments whose owning process is gone"""
+        # Not while this process's flush is between taking a segment and removing it
+        with self._flush_lock:
+            return self._recover()
+
+    def _recover(self) -> int:
+        replayed = 0
+        for path in sorted(glob.glob(os.path.join(self.log_dir, 'messages-*.wal'))):
+            if self._segment and self._segment[0] == path:
+                continue
+            try:
+                handle = open(path, 'r+', encoding='utf-8')
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # Still owned by a live writer
+                handle.close()
+                continue
+            try:
+                if os.fstat(handle.fileno()).st_ino != os.stat(path).st_ino:
+                    raise FileNotFoundError(path)
+            except FileNotFoundError:
+                # Flushed and removed by its writer between open() and flock()
+                handle.close()
+                continue
+            try:
+                records = [json.loads(line) for line in handle if line.strip()]
+                replayed += self._bulk_insert(records)
+                os.remove(path)
+                logger.info(f"Replayed {len(records)} message records from {path}")
+            except Exception as e:
+                logger.error(f"Could not replay {path}: {e}")
+            finally:
+                handle.close()
+        return replayed
+
+    # Internals ------------------------------------------------------------
+
+    def _bulk_insert(self, records: list) -> int:
+        if not records:
+            return 0
+        # Conversations may have been cleaned up since the message arrived
+        conversation_ids = {r['conversation_id'] for r in records}
+        existing = set(
+            WhatsAppConversation.objects.filter(id__in=conversation_ids).values_list('id', flat=True)
+        )
+        messages = [
+            WhatsAppMessage(**{field: r.get(field) for field in RECORD_FIELDS})
+            for r in records if r['conversation_id'] in existing
+        ]
+        # ignore_conflicts: a replayed segment may contain rows already written
+        WhatsAppMessage.objects.bulk_create(messages, batch_size=500, ignore_conflicts=True)
+        return len(messages)
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        # First use in this process (or after a fork)
+        self._pid = os.getpid()
+        self._buffer, self._segment = [], None
+        if self.background:
+            self._thread = threading.Thread(target=self._run, name='whatsapp-message-log', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        passes = 0
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                close_old_connections()
+                self.flush()
+                passes += 1
+                if passes % 30 == 1:
+                    self.recover()
+            except Exception as e:
+                logger.error(f"Message log writer error: {e}", exc_info=True)
+
+
+message_log = MessageLogWriter()
+
+
+def archive_old_messages(retention_days: int = None, archive_dir: str = None, chunk_size: int = 1000) -> int:
+    """
+    Move messages older than the retention period to gzip files, one per month
+
+    Rows are appended to <archive_dir>/whatsapp_messages_YYYY-MM.jsonl.gz
+    (gzip members can be concatenated) and deleted chunk by chunk.
+    """
+    retention_days = retention_days or getattr(settings, 'WHATSAPP_MESSAGE_RETENTION_DAYS', 180)
+    archive_dir = archive_dir or getattr(settings, 'WHATSAPP_MESSAGE_ARCHIVE_DIR', os.path.join(_default_log_dir(), 'archive'))
+    os.makedirs(archive_dir, exist_ok=True)
+
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    archived = 0
+    while True:
+        chunk = list(
+            WhatsAppMessage.objects.filter(created_at__lt=cutoff).order_by('id').values(
+                'id', 'conversation_id', 'from_number', 'to_number', 'message_body',
+                'direction', 'message_sid', 'created_at'
+            )[:chunk_size]
+        )
+        if not chunk:
+            break
+
+        by_month = {}
+        for row in chunk:
+            month = timezone.localtime(row['created_at']).strftime('%Y-%m')
+            row['created_at'] = row['created_at'].isoformat()
+            by_month.setdefault(month, []).append(row)
+
+        for month, rows in by_month.items():
+            path = os.path.join(archive_dir, f"whatsapp_messages_{month}.jsonl.gz")
+            with gzip.open(path, 'at', encoding='utf-8') as archive:
+                for row in rows:
+                    archive.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+        WhatsAppMessage.objects.filter(id__in=[row['id'] for row in chunk]).delete()
+        archived += len(chunk)
+    return archived
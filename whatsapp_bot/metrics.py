@@ -0,0 +1,292 @@
+"""
+In-process metrics for the WhatsApp bot
+Lightweight counters and latency totals, safe to share between threads
+"""
+import atexit
+import bisect
+import logging
+import os
+import threading
+import time
+from collections import deque
+from decimal import Decimal
+from typing import Dict, Any
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyStats:
+    """Count calls and accumulate latency per path (e.g. 'fast', 'openai')"""
+
+    def __init__(self, name: str, report_every: int = 100):
+        self.name = name
+        self.report_every = report_every
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._total = {}
+        self._max = {}
+        self._calls = 0
+
+    def record(self, path: str, seconds: float):
+        """Record one call that went through `path` and took `seconds`"""
+        with self._lock:
+            self._counts[path] = self._counts.get(path, 0) + 1
+            self._total[path] = self._total.get(path, 0.0) + seconds
+            self._max[path] = max(self._max.get(path, 0.0), seconds)
+            self._calls += 1
+            should_report = self.report_every and self._calls % self.report_every == 0
+
+        if should_report:
+            logger.info(f"{self.name} stats: {self.snapshot()}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return hit rate and latency per path"""
+        with self._lock:
+            total_calls = sum(self._counts.values())
+            paths = {}
+            for path, count in self._counts.items():
+                paths[path] = {
+                    'count': count,
+                    'hit_rate': round(count / total_calls, 4) if total_calls else 0.0,
+                    'avg_ms': round(self._total[path] / count * 1000, 2),
+                    'max_ms': round(self._max[path] * 1000, 2),
+                }
+            return {'total': total_calls, 'paths': paths}
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+            self._total.clear()
+            self._max.clear()
+            self._calls = 0
+
+
+# Which path answered intent extraction: local rules or OpenAI
+intent_path_stats = LatencyStats('Intent extraction')
+
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open
+LATENCY_BUCKETS_MS = [100, 250, 500, 1000, 2000, 4000, 8000, 15000]
+
+
+class Histogram:
+    """Fixed-bucket latency histogram"""
+
+    def __init__(self, buckets: list = None):
+        self.buckets = buckets or LATENCY_BUCKETS_MS
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+
+    def percentile(self, p: float):
+        """Upper bound of the bucket holding the p-th percentile (None if open-ended)"""
+        if not self.count:
+            return 0
+        rank = p / 100 * self.count
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[idx] if idx < len(self.buckets) else None
+        return None
+
+    def merge(self, other: 'Histogram'):
+        for idx, count in enumerate(other.counts):
+            self.counts[idx] += count
+        self.count += other.count
+        self.total_ms += other.total_ms
+
+    def bucket_counts(self) -> Dict[str, int]:
+        labels = [str(bound) for bound in self.buckets] + ['inf']
+        return {label: count for label, count in zip(labels, self.counts) if count}
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / self.count, 2) if self.count else 0.0,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'buckets': self.bucket_counts(),
+        }
+
+
+def openai_call_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """USD cost of one call from OPENAI_PRICING (per million tokens); 0 for unknown models"""
+    pricing = getattr(settings, 'OPENAI_PRICING', {}).get(model)
+    if not pricing:
+        return 0.0
+    return (prompt_tokens * pricing['prompt'] + completion_tokens * pricing['completion']) / 1_000_000
+
+
+class _UsageTotals:
+    __slots__ = ('calls', 'failures', 'prompt_tokens', 'completion_tokens', 'cost', 'latency')
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.latency = Histogram()
+
+    def add(self, prompt_tokens: int, completion_tokens: int, cost: float, ms: float, success: bool):
+        self.calls += 1
+        self.failures += 0 if success else 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cost += cost
+        self.latency.observe(ms)
+
+    def merge(self, other: '_UsageTotals'):
+        self.calls += other.calls
+        self.failures += other.failures
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.cost += other.cost
+        self.latency.merge(other.latency)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'failures': self.failures,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'cost_usd': round(self.cost, 6),
+            'latency': self.latency.as_dict(),
+        }
+
+
+class OpenAIUsageStats:
+    """
+    Per-call OpenAI usage: model, tokens, latency, outcome, company and language
+
+    Totals are kept per model and per company for the metrics endpoint, and
+    unflushed deltas are added to OpenAIUsageDaily rows every flush_interval
+    by a background thread, so recording a call never waits for the database.
+    """
+
+    def __init__(self, flush_interval: float = None, recent_size: int = 200):
+        self.flush_interval = flush_interval or getattr(settings, 'OPENAI_USAGE_FLUSH_INTERVAL', 60.0)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._by_model = {}
+        self._by_company = {}
+        self._pending = {}
+        self._recent = deque(maxlen=recent_size)
+        self._thread = None
+        self._pid = None
+
+    def record(self, model: str, company_id, language: str, prompt_tokens: int,
+               completion_tokens: int, seconds: float, success: bool):
+        ms = seconds * 1000
+        cost = openai_call_cost(model, prompt_tokens, completion_tokens)
+        call = {
+            'at': timezone.now().isoformat(),
+            'model': model,
+            'company_id': company_id,
+            'language': language,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'latency_ms': round(ms, 1),
+            'cost_usd': round(cost, 6),
+            'success': success,
+        }
+        logger.info(f"OpenAI call: {call}")
+
+        key = (timezone.localdate(), company_id, model, language)
+        with self._lock:
+            self._ensure_started()
+            for totals, name in ((self._by_model, model), (self._by_company, company_id), (self._pending, key)):
+                if name not in totals:
+                    totals[name] = _UsageTotals()
+                totals[name].add(prompt_tokens, completion_tokens, cost, ms, success)
+            self._recent.append(call)
+
+    def flush(self) -> int:
+        """
+        Add pending deltas to the daily rollup rows; returns rows touched
+
+        Each row is updated in its own transaction. If one fails, it and the
+        rows after it go back to the pending deltas for the next flush.
+        """
+        from .models import OpenAIUsageDaily
+
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            applied = 0
+            try:
+                for (day, company_id, model, language), totals in pending.items():
+                    with transaction.atomic():
+                        row, _ = OpenAIUsageDaily.objects.select_for_update().get_or_create(
+                            date=day, company_id=company_id, model=model, language=language
+                        )
+                        row.calls += totals.calls
+                        row.failures += totals.failures
+                        row.prompt_tokens += totals.prompt_tokens
+                        row.completion_tokens += totals.completion_tokens
+                        row.cost += Decimal(str(round(totals.cost, 6)))
+                        row.latency_ms_total += int(totals.latency.total_ms)
+                        histogram = dict(row.latency_histogram)
+                        for bucket, count in totals.latency.bucket_counts().items():
+                            histogram[bucket] = histogram.get(bucket, 0) + count
+                        row.latency_histogram = histogram
+                        row.save()
+                    applied += 1
+            except Exception as e:
+                logger.error(f"Could not save OpenAI usage rollup: {e}", exc_info=True)
+                with self._lock:
+                    for key, totals in list(pending.items())[applied:]:
+                        if key in self._pending:
+                            self._pending[key].merge(totals)
+                        else:
+                            self._pending[key] = totals
+            return applied
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        # First call in this process (or after a fork)
+        self._pid = os.getpid()
+        self._pending = {}
+        self._thread = threading.Thread(target=self._run, name='openai-usage', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception as e:
+                logger.error(f"OpenAI usage writer error: {e}", exc_info=True)
+
+    def snapshot(self, top: int = 10) -> Dict[str, Any]:
+        with self._lock:
+            companies = sorted(self._by_company.items(), key=lambda item: -item[1].cost)[:top]
+            return {
+                'models': {model: totals.as_dict() for model, totals in self._by_model.items()},
+                'top_companies': [dict(company_id=company_id, **totals.as_dict()) for company_id, totals in companies],
+                'recent': list(self._recent)[-20:],
+            }
+
+    def reset(self):
+        with self._lock:
+            self._by_model.clear()
+            self._by_company.clear()
+            self._pending.clear()
+            self._recent.clear()
+
+
+# Every OpenAI intent extraction call (cache hits are not calls)
+openai_usage = OpenAIUsageStats()
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.17 on 2026-10-19 05:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_bot', '0002_rename_whatsapp_bo_phone_n_idx_whatsapp_bo_phone_n_8056eb_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whatsappconversation',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
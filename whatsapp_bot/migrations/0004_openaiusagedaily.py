@@ -0,0 +1,36 @@
+# Generated by Django 4.2.17 on 2026-10-19 05:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0022_add_staff_out_of_office_table'),
+        ('whatsapp_bot', '0003_whatsappconversation_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OpenAIUsageDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('model', models.CharField(max_length=100)),
+                ('language', models.CharField(max_length=10)),
+                ('calls', models.PositiveIntegerField(default=0)),
+                ('failures', models.PositiveIntegerField(default=0)),
+                ('prompt_tokens', models.PositiveBigIntegerField(default=0)),
+                ('completion_tokens', models.PositiveBigIntegerField(default=0)),
+                ('cost', models.DecimalField(decimal_places=6, default=0, max_digits=12)),
+                ('latency_ms_total', models.PositiveBigIntegerField(default=0)),
+                ('latency_histogram', models.JSONField(blank=True, default=dict)),
+                ('company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='companies.company')),
+            ],
+            options={
+                'ordering': ['-date', '-cost'],
+                'unique_together': {('date', 'company', 'model', 'language')},
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.17 on 2026-10-19 05:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0022_add_staff_out_of_office_table'),
+        ('bookings', '0014_booking_created_by'),
+        ('whatsapp_bot', '0004_openaiusagedaily'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageDeliveryStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_sid', models.CharField(max_length=100, unique=True)),
+                ('kind', models.CharField(choices=[('bot_reply', 'Bot reply'), ('reminder', 'Reminder')], default='bot_reply', max_length=20)),
+                ('to_number', models.CharField(blank=True, max_length=50)),
+                ('status', models.CharField(max_length=20)),
+                ('error_code', models.CharField(blank=True, max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('booking', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='bookings.booking')),
+                ('company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='companies.company')),
+            ],
+            options={
+                'verbose_name_plural': 'Message delivery statuses',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MessageDeliveryDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('kind', models.CharField(choices=[('bot_reply', 'Bot reply'), ('reminder', 'Reminder')], max_length=20)),
+                ('sent', models.PositiveIntegerField(default=0)),
+                ('delivered', models.PositiveIntegerField(default=0)),
+                ('read', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='companies.company')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'unique_together': {('date', 'company', 'kind')},
+            },
+        ),
+    ]
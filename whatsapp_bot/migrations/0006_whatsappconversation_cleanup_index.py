@@ -0,0 +1,17 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_bot', '0005_messagedeliverystatus'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='whatsappconversation',
+            index=models.Index(fields=['current_state', 'last_message_at'], name='whatsapp_bo_current_030c06_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_bot', '0006_whatsappconversation_cleanup_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WhatsAppPhoneLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_number', models.CharField(max_length=50, unique=True)),
+                ('token', models.CharField(max_length=32)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+    ]
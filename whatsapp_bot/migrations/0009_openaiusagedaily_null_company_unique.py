@@ -0,0 +1,47 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:27
+
+from django.db import migrations, models
+
+
+def merge_duplicate_rows(apps, schema_editor):
+    """Fold rows without a company that share a day, model and language into one"""
+    OpenAIUsageDaily = apps.get_model('whatsapp_bot', 'OpenAIUsageDaily')
+    kept = {}
+    for row in OpenAIUsageDaily.objects.filter(company__isnull=True).order_by('id'):
+        key = (row.date, row.model, row.language)
+        first = kept.setdefault(key, row)
+        if first is row:
+            continue
+        first.calls += row.calls
+        first.failures += row.failures
+        first.prompt_tokens += row.prompt_tokens
+        first.completion_tokens += row.completion_tokens
+        first.cost += row.cost
+        first.latency_ms_total += row.latency_ms_total
+        for bucket, count in row.latency_histogram.items():
+            first.latency_histogram[bucket] = first.latency_histogram.get(bucket, 0) + count
+        first.save()
+        row.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_bot', '0008_processedmessage'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rows, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='openaiusagedaily',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='openaiusagedaily',
+            constraint=models.UniqueConstraint(condition=models.Q(('company__isnull', False)), fields=('date', 'company', 'model', 'language'), name='openai_usage_daily_unique_company'),
+        ),
+        migrations.AddConstraint(
+            model_name='openaiusagedaily',
+            constraint=models.UniqueConstraint(condition=models.Q(('company__isnull', True)), fields=('date', 'model', 'language'), name='openai_usage_daily_unique_no_company'),
+        ),
+    ]
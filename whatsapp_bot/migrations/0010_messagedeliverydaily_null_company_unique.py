@@ -0,0 +1,40 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:29
+
+from django.db import migrations, models
+
+
+def merge_duplicate_rows(apps, schema_editor):
+    """Fold rows without a company that share a day and kind into one"""
+    MessageDeliveryDaily = apps.get_model('whatsapp_bot', 'MessageDeliveryDaily')
+    kept = {}
+    for row in MessageDeliveryDaily.objects.filter(company__isnull=True).order_by('id'):
+        first = kept.setdefault((row.date, row.kind), row)
+        if first is row:
+            continue
+        for stage in ('sent', 'delivered', 'read', 'failed'):
+            setattr(first, stage, getattr(first, stage) + getattr(row, stage))
+        first.save()
+        row.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_bot', '0009_openaiusagedaily_null_company_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rows, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='messagedeliverydaily',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='messagedeliverydaily',
+            constraint=models.UniqueConstraint(condition=models.Q(('company__isnull', False)), fields=('date', 'company', 'kind'), name='message_delivery_daily_unique_company'),
+        ),
+        migrations.AddConstraint(
+            model_name='messagedeliverydaily',
+            constraint=models.UniqueConstraint(condition=models.Q(('company__isnull', True)), fields=('date', 'kind'), name='message_delivery_daily_unique_no_company'),
+        ),
+    ]
@@ -14,17 +14,57 @@ class WhatsAppConversation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     last_message_at = models.DateTimeField(auto_now=True)
+    # Bumped on every write; persist_conversation() checks it to avoid lost updates
+    version = models.PositiveIntegerField(default=0)
     
     class Meta:
         ordering = ['-updated_at']
         indexes = [
             models.Index(fields=['phone_number', '-updated_at']),
+            models.Index(fields=['current_state', 'last_message_at']),  # Idle cleanup
         ]
     
+    def save(self, *args, **kwargs):
+        if self.pk:
+            self.version += 1
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return f"{self.phone_number} - {self.current_state}"
 
 
+class WhatsAppPhoneLock(models.Model):
+    """Held while a message from the number is handled, so every worker serializes on it"""
+    phone_number = models.CharField(max_length=50, unique=True)
+    token = models.CharField(max_length=32)
+    # A holder that died is taken over once this passes
+    expires_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.phone_number} until {self.expires_at}"
+
+
+class WhatsAppQueuedMessage(models.Model):
+    """A message waiting for its number's lock; the holder answers it in the same pass"""
+    phone_number = models.CharField(max_length=50, db_index=True)
+    item = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.phone_number} #{self.id}"
+
+
+class WhatsAppRateCounter(models.Model):
+    """Messages a number sent in its current rate-limit window"""
+    phone_number = models.CharField(max_length=50, unique=True)
+    # Seconds since the epoch // window length
+    window = models.BigIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.phone_number}: {self.count} in window {self.window}"
+
+
 class WhatsAppMessage(models.Model):
     """Log all WhatsApp messages"""
     conversation = models.ForeignKey(WhatsAppConversation, on_delete=models.CASCADE, related_name='messages')
@@ -42,6 +82,17 @@ class WhatsAppMessage(models.Model):
         return f"{self.direction} - {self.from_number[:20]}"
 
 
+class ProcessedMessage(models.Model):
+    """Claim on an inbound MessageSid and the reply it got, so retries on any worker reuse it"""
+    message_sid = models.CharField(max_length=100, unique=True)
+    # None while the first delivery is still being processed
+    reply = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"{self.message_sid}: {'pending' if self.reply is None else 'answered'}"
+
+
 class PendingBooking(models.Model):
     """Temporary storage for bookings in progress"""
     conversation = models.ForeignKey(WhatsAppConversation, on_delete=models.CASCADE)
@@ -59,3 +110,99 @@ class PendingBooking(models.Model):
     
     def __str__(self):
         return f"Pending: {self.service_name} on {self.booking_date}"
+
+
+class OpenAIUsageDaily(models.Model):
+    """OpenAI usage per day, company, model and language, rolled up by the bot workers"""
+    date = models.DateField()
+    company = models.ForeignKey(Company, on_delete=models.SET_NULL, null=True, blank=True)
+    model = models.CharField(max_length=100)
+    language = models.CharField(max_length=10)
+    calls = models.PositiveIntegerField(default=0)
+    failures = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.PositiveBigIntegerField(default=0)
+    completion_tokens = models.PositiveBigIntegerField(default=0)
+    cost = models.DecimalField(max_digits=12, decimal_places=6, default=0)  # USD
+    latency_ms_total = models.PositiveBigIntegerField(default=0)
+    # Histogram bucket upper bound in ms ('inf' for the last one) -> calls
+    latency_histogram = models.JSONField(default=dict, blank=True)
+    
+    class Meta:
+        ordering = ['-date', '-cost']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'company', 'model', 'language'],
+                condition=models.Q(company__isnull=False),
+                name='openai_usage_daily_unique_company',
+            ),
+            # NULLs never collide in a unique index: calls without a company need their own
+            models.UniqueConstraint(
+                fields=['date', 'model', 'language'],
+                condition=models.Q(company__isnull=True),
+                name='openai_usage_daily_unique_no_company',
+            ),
+        ]
+    
+    @property
+    def avg_latency_ms(self):
+        return round(self.latency_ms_total / self.calls) if self.calls else 0
+    
+    def __str__(self):
+        return f"{self.date} {self.company_id or '-'} {self.model}: {self.calls} calls"
+
+
+class MessageDeliveryStatus(models.Model):
+    """Latest Twilio delivery status of an outgoing message, applied in batches from status callbacks"""
+    KIND_CHOICES = [
+        ('bot_reply', 'Bot reply'),
+        ('reminder', 'Reminder'),
+    ]
+    
+    message_sid = models.CharField(max_length=100, unique=True)
+    company = models.ForeignKey(Company, on_delete=models.SET_NULL, null=True, blank=True)
+    booking = models.ForeignKey(Booking, on_delete=models.SET_NULL, null=True, blank=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='bot_reply')
+    to_number = models.CharField(max_length=50, blank=True)
+    status = models.CharField(max_length=20)  # Twilio MessageStatus
+    error_code = models.CharField(max_length=20, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    read_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = 'Message delivery statuses'
+    
+    def __str__(self):
+        return f"{self.message_sid}: {self.status}"
+
+
+class MessageDeliveryDaily(models.Model):
+    """Messages per day, company and kind that were sent, delivered, read or failed"""
+    date = models.DateField()
+    company = models.ForeignKey(Company, on_delete=models.SET_NULL, null=True, blank=True)
+    kind = models.CharField(max_length=20, choices=MessageDeliveryStatus.KIND_CHOICES)
+    sent = models.PositiveIntegerField(default=0)
+    delivered = models.PositiveIntegerField(default=0)
+    read = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'company', 'kind'],
+                condition=models.Q(company__isnull=False),
+                name='message_delivery_daily_unique_company',
+            ),
+            # NULLs never collide in a unique index: messages without a company need their own
+            models.UniqueConstraint(
+                fields=['date', 'kind'],
+                condition=models.Q(company__isnull=True),
+                name='message_delivery_daily_unique_no_company',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} {self.company_id or '-'} {self.kind}: {self.delivered}/{self.sent} delivered"
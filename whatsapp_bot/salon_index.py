@@ -0,0 +1,120 @@
+"""
+Salon name index for WhatsApp Booking Bot
+Process-wide trigram index over company names, rebuilt when a Company changes
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import NamedTuple
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from fuzzywuzzy import fuzz
+
+from companies.models import Company
+
+logger = logging.getLogger(__name__)
+
+# Bumped on every Company change so other workers notice (with a shared cache)
+VERSION_CACHE_KEY = 'whatsapp_bot:company_name_index:version'
+# Rebuild at least this often even if no invalidation was seen
+MAX_INDEX_AGE = 300
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _IndexSnapshot(NamedTuple):
+    """One build of the index; replaced as a whole so readers never mix two builds"""
+    names: dict
+    exact: dict
+    postings: dict
+    version: object
+    built_at: float
+
+
+EMPTY_SNAPSHOT = _IndexSnapshot({}, {}, {}, None, 0.0)
+
+
+class CompanyNameIndex:
+    """Trigram index over names of companies with online appointments enabled"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dirty = True
+        self._snapshot = EMPTY_SNAPSHOT
+
+    def invalidate(self):
+        self._dirty = True
+
+    def _needs_rebuild(self) -> bool:
+        snapshot = self._snapshot
+        if self._dirty or time.monotonic() - snapshot.built_at > MAX_INDEX_AGE:
+            return True
+        return cache.get(VERSION_CACHE_KEY) != snapshot.version
+
+    def _build(self):
+        version = cache.get(VERSION_CACHE_KEY)
+        self._dirty = False
+        names = {}
+        exact = {}
+        postings = defaultdict(set)
+        companies = Company.objects.filter(online_appointments_enabled=True).values_list('id', 'name')
+        for company_id, name in companies:
+            normalized = name.lower().strip()
+            names[company_id] = normalized
+            # Lowest id wins, like .first() on the default ordering
+            exact.setdefault(normalized, company_id)
+            for gram in _trigrams(normalized):
+                postings[gram].add(company_id)
+
+        self._snapshot = _IndexSnapshot(names, exact, dict(postings), version, time.monotonic())
+        logger.info(f"Built company name index: {len(names)} companies, {len(postings)} trigrams")
+
+    def _ensure_fresh(self) -> _IndexSnapshot:
+        if self._needs_rebuild():
+            with self._lock:
+                if self._needs_rebuild():
+                    self._build()
+        return self._snapshot
+
+    def exact(self, name: str):
+        """Return id of the company whose name equals `name` ignoring case"""
+        return self._ensure_fresh().exact.get(name.lower().strip())
+
+    def candidates(self, name: str, k: int = 10) -> list:
+        """
+        Return up to k (company_id, fuzz.ratio score) pairs, best first
+
+        Trigram overlap picks the candidates; fuzz.ratio scores them so the
+        acceptance threshold means the same as the old full scan.
+        """
+        snapshot = self._ensure_fresh()
+        query = name.lower()
+        names, postings = snapshot.names, snapshot.postings
+
+        overlap = defaultdict(int)
+        for gram in _trigrams(query.strip()):
+            for company_id in postings.get(gram, ()):
+                overlap[company_id] += 1
+
+        top = sorted(overlap, key=lambda company_id: (-overlap[company_id], company_id))[:k]
+        scored = [(company_id, fuzz.ratio(query, names[company_id])) for company_id in top]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored
+
+
+company_name_index = CompanyNameIndex()
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_company_name_index(sender, **kwargs):
+    company_name_index.invalidate()
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        cache.set(VERSION_CACHE_KEY, 1, None)
@@ -0,0 +1,199 @@
+"""
+Service and staff matching for WhatsApp Booking Bot
+Per-company matchers built once and cached until a Service or Staff changes;
+each lookup checks the shared catalog version so every worker sees the change
+"""
+import logging
+import re
+import threading
+from collections import Counter
+import numpy as np
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from fuzzywuzzy import fuzz
+
+from companies.cache_versions import bump_version, get_version
+from companies.models import Service, Staff
+
+logger = logging.getLogger(__name__)
+
+# Translation mapping for common service terms (ru/uk -> es)
+SERVICE_SYNONYMS = {
+    'маникюр': 'manicura',
+    'манікюр': 'manicura',
+    'педикюр': 'pedicura',
+    'педікюр': 'pedicura',
+    'стрижка': 'corte',
+    'окрашивание': 'tinte',
+    'фарбування': 'tinte',
+    'японский': 'japonesa',
+    'японська': 'japonesa',
+    'полуперманентный': 'semipermanente',
+    'напівперманентний': 'semipermanente',
+    'без покрытия': 'sin pintar',
+    'без покриття': 'sin pintar',
+    'наращивание': 'extensión',
+    'нарощування': 'extensión',
+    'ногтей': 'uñas',
+    'нігтів': 'uñas',
+}
+SYNONYM_RE = re.compile('|'.join(re.escape(term) for term in sorted(SERVICE_SYNONYMS, key=len, reverse=True)))
+
+# Top n-gram candidates that are also checked with fuzz.token_sort_ratio
+RERANK_CANDIDATES = 3
+
+CATALOG_VERSION = 'whatsapp_bot.catalog'
+
+
+def normalize_name(name: str) -> str:
+    return name.replace('(', '').replace(')', '').lower().strip()
+
+
+def translate_synonyms(text: str) -> str:
+    """Replace ru/uk service terms with their Spanish equivalents in one pass"""
+    return SYNONYM_RE.sub(lambda match: SERVICE_SYNONYMS[match.group(0)], text)
+
+
+def char_ngrams(text: str) -> Counter:
+    # Spaces are dropped so "hair cut" and "haircut" share every trigram
+    collapsed = f"  {''.join(text.split())} "
+    return Counter(collapsed[i:i + 3] for i in range(len(collapsed) - 2))
+
+
+class NameMatcher:
+    """
+    Fuzzy name matcher over a fixed list of (id, name)
+
+    Names are vectorized as character trigram counts once; a query is scored
+    against all of them with a single matrix-vector product (cosine).
+    """
+
+    def __init__(self, items: list, synonyms: bool = False):
+        self.synonyms = synonyms
+        self.ids = [item_id for item_id, _ in items]
+        self.names = [name for _, name in items]
+        self.normalized = [normalize_name(name) for name in self.names]
+        self._exact = {}
+        for idx, normalized in enumerate(self.normalized):
+            self._exact.setdefault(normalized, idx)
+
+        grams = [char_ngrams(normalized) for normalized in self.normalized]
+        self._vocabulary = {}
+        for counts in grams:
+            for gram in counts:
+                self._vocabulary.setdefault(gram, len(self._vocabulary))
+
+        matrix = np.zeros((len(grams), len(self._vocabulary)), dtype=np.float32)
+        for row, counts in enumerate(grams):
+            for gram, count in counts.items():
+                matrix[row, self._vocabulary[gram]] = count
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self._matrix = matrix / norms
+
+    def normalize_query(self, query: str) -> str:
+        normalized = normalize_name(query)
+        if self.synonyms:
+            normalized = translate_synonyms(normalized)
+        return normalized
+
+    def similarities(self, normalized_query: str) -> np.ndarray:
+        """Cosine similarity of the query against every name (0-1)"""
+        counts = char_ngrams(normalized_query)
+        vector = np.zeros(len(self._vocabulary), dtype=np.float32)
+        for gram, count in counts.items():
+            column = self._vocabulary.get(gram)
+            if column is not None:
+                vector[column] = count
+        # Out-of-vocabulary grams still count towards the query norm
+        query_norm = np.sqrt(sum(count * count for count in counts.values())) or 1.0
+        return self._matrix @ vector / query_norm
+
+    def match(self, query: str, threshold: int = 75):
+        """
+        Return (id, name, score) of the best match or None
+
+        score is 0-100: the better of n-gram cosine and token_sort_ratio.
+        """
+        if not query or not self.ids:
+            return None
+
+        normalized = self.normalize_query(query)
+        idx = self._exact.get(normalized)
+        if idx is not None:
+            return self.ids[idx], self.names[idx], 100
+
+        scores = self.similarities(normalized) * 100
+        best_idx, best_score = None, 0
+        for idx in np.argsort(-scores)[:RERANK_CANDIDATES]:
+            score = max(int(round(float(scores[idx]))), fuzz.token_sort_ratio(normalized, self.normalized[idx]))
+            if score > best_score:
+                best_idx, best_score = int(idx), score
+
+        if best_idx is not None and best_score >= threshold:
+            return self.ids[best_idx], self.names[best_idx], best_score
+        return None
+
+
+class CompanyCatalog:
+    """Everything the bot needs to match services and staff of one company"""
+
+    def __init__(self, company_id: int, version: int = 0):
+        self.company_id = company_id
+        self.version = version
+
+        services = list(
+            Service.objects.filter(company_id=company_id, is_active=True).values_list('id', 'name')
+        )
+        self.services = NameMatcher(services, synonyms=True)
+
+        staff_members = Staff.objects.filter(
+            company_id=company_id, is_active=True
+        ).order_by('name').prefetch_related('services')
+        self.staff_list = []
+        self.staff_by_service = {}
+        for staff in staff_members:
+            self.staff_list.append({'id': staff.id, 'name': staff.name, 'specialization': staff.specialization})
+            for service in staff.services.all():
+                self.staff_by_service.setdefault(service.id, []).append(self.staff_list[-1])
+        self.staff = NameMatcher([(s['id'], s['name']) for s in self.staff_list])
+
+    def staff_for_service(self, service_id: int) -> list:
+        """Active staff for a service, or all active staff if none is assigned"""
+        return self.staff_by_service.get(service_id) or self.staff_list
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_company_catalog(company_id: int) -> CompanyCatalog:
+    version = get_version(company_id, CATALOG_VERSION)
+    catalog = _catalogs.get(company_id)
+    if catalog is not None and catalog.version == version:
+        return catalog
+
+    catalog = CompanyCatalog(company_id, version)
+    with _catalogs_lock:
+        _catalogs[company_id] = catalog
+    return catalog
+
+
+def invalidate_company_catalog(company_id: int):
+    with _catalogs_lock:
+        _catalogs.pop(company_id, None)
+    bump_version(company_id, CATALOG_VERSION)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Staff)
+@receiver(post_delete, sender=Staff)
+def invalidate_catalog_on_change(sender, instance, **kwargs):
+    invalidate_company_catalog(instance.company_id)
+
+
+@receiver(m2m_changed, sender=Staff.services.through)
+def invalidate_catalog_on_staff_services(sender, instance, **kwargs):
+    if kwargs.get('action') in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_company_catalog(instance.company_id)
@@ -1,7 +1,10 @@
 """
 Tests for WhatsApp bot
 """
-from django.test import TestCase
+from unittest import mock
+from django.core.cache import cache
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.utils import timezone
 from datetime import datetime, timedelta
 from companies.models import Company, Service, Staff, WorkingHours
@@ -63,6 +66,39 @@ class BookingSearcherTest(TestCase):
         company = searcher.find_company("test saln")  # typo
         self.assertEqual(company.id, self.company.id)
     
+    def test_find_company_after_rename(self):
+        """Company name index is rebuilt when a company is saved"""
+        searcher = BookingSearcher()
+        self.assertEqual(searcher.find_company("Test Salon").id, self.company.id)
+        
+        self.company.name = "Anima Beauty"
+        self.company.save()
+        self.assertEqual(searcher.find_company("anima beaty").id, self.company.id)
+        self.assertIsNone(searcher.find_company("Test Salon"))
+    
+    def test_company_index_rebuild_during_lookup(self):
+        """A lookup keeps reading the build it started with"""
+        from .salon_index import company_name_index, fuzz
+        
+        other = Company.objects.create(
+            administrator=self.company.administrator, name="Test Salon Norte",
+            address="Test St", city="Test City", online_appointments_enabled=True
+        )
+        real_ratio = fuzz.ratio
+        
+        def ratio_then_rebuild(query, name):
+            # Another thread rebuilds without a company the lookup already picked
+            if Company.objects.filter(pk=other.pk).exists():
+                Company.objects.filter(pk=other.pk).delete()
+                company_name_index._build()
+            return real_ratio(query, name)
+        
+        company_name_index.invalidate()
+        with mock.patch('whatsapp_bot.salon_index.fuzz.ratio', side_effect=ratio_then_rebuild):
+            scored = company_name_index.candidates("test salon")
+        self.assertEqual({company_id for company_id, _ in scored}, {self.company.id, other.id})
+        self.assertEqual([company_id for company_id, _ in company_name_index.candidates("test salon")], [self.company.id])
+    
     def test_find_service(self):
         """Test service search"""
         searcher = BookingSearcher()
@@ -74,6 +110,27 @@ class BookingSearcherTest(TestCase):
         service = searcher.find_service(self.company, "hair cut")
         self.assertEqual(service.id, self.service.id)
     
+    def test_find_service_multilingual_and_after_change(self):
+        """Service matcher translates ru/uk terms and is rebuilt when services change"""
+        searcher = BookingSearcher()
+        self.assertIsNone(searcher.find_service(self.company, "маникюр"))
+        
+        manicure = Service.objects.create(
+            company=self.company,
+            name="Manicura",
+            duration=45,
+            price=20.00,
+            is_active=True
+        )
+        self.assertEqual(searcher.find_service(self.company, "маникюр").id, manicure.id)
+    
+    def test_find_staff(self):
+        """Test staff name search"""
+        searcher = BookingSearcher()
+        self.assertEqual(searcher.find_staff(self.company, "maria").id, self.staff.id)
+        self.assertEqual(searcher.find_staff(self.company, "Mariа").id, self.staff.id)
+        self.assertIsNone(searcher.find_staff(self.company, "Olga"))
+    
     def test_find_available_slots(self):
         """Test finding available time slots"""
         searcher = BookingSearcher()
@@ -84,3 +141,758 @@ class BookingSearcherTest(TestCase):
         self.assertGreater(len(slots), 0)
         self.assertEqual(slots[0]['staff'], 'Maria')
         self.assertEqual(slots[0]['price'], 25.00)
+    
+    def test_find_alternative_slots(self):
+        """Closest free dates are found with the same number of queries for any window"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from bookings.models import Booking
+        searcher = BookingSearcher()
+        
+        today = timezone.now().date()
+        friday = today + timedelta(days=(4 - today.weekday()) % 7 or 7)
+        monday = friday + timedelta(days=3)
+        customer = Customer.objects.create(name='Ana', phone='+34600000008')
+        Booking.objects.create(
+            company=self.company, staff=self.staff, service=self.service, customer=customer,
+            date=monday, start_time='09:00', end_time='09:30', status=1
+        )
+        
+        alternatives = searcher.find_alternative_slots(self.company, self.service, friday, time_before='10:00')
+        self.assertEqual([a['date'] for a in alternatives], [monday, monday + timedelta(days=1), monday + timedelta(days=2)])
+        self.assertEqual([s['time'] for s in alternatives[0]['slots']], ['09:30', '10:00'])
+        
+        with CaptureQueriesContext(connection) as short_window:
+            searcher.find_alternative_slots(self.company, self.service, friday, days=7, max_dates=10)
+        with CaptureQueriesContext(connection) as long_window:
+            searcher.find_alternative_slots(self.company, self.service, friday, days=28, max_dates=10)
+        self.assertEqual(len(short_window), len(long_window))
+
+
+class FastIntentParserTest(TestCase):
+    """Test rule-based intent extraction"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        user = User.objects.create_user('owner', 'owner@test.com', 'pass')
+        self.company = Company.objects.create(
+            administrator=user,
+            name="Parser Salon",
+            address="Test St",
+            city="Test City"
+        )
+        Service.objects.create(company=self.company, name="Manicura", duration=30, price=20)
+        Service.objects.create(company=self.company, name="Manicura sin pintar", duration=30, price=15)
+        # Monday
+        self.today = datetime(2026, 4, 20).date()
+
+    def parse(self, message, company=None):
+        from .intent_parser import FastIntentParser
+        return FastIntentParser(today=self.today).parse(message, company)
+
+    def test_relative_day_and_time(self):
+        intent, confidence = self.parse("mañana a las 5")
+        self.assertEqual(intent, {'date': '2026-04-21', 'time': '17:00'})
+        self.assertEqual(confidence, 1.0)
+
+    def test_time_after_and_weekdays(self):
+        intent, confidence = self.parse("tomorrow after 17:00")
+        self.assertEqual(intent, {'date': '2026-04-21', 'time_after': '17:00'})
+
+        intent, _ = self.parse("На пятницу после 16:30")
+        self.assertEqual(intent, {'date': '2026-04-24', 'time_after': '16:30'})
+
+        intent, _ = self.parse("в п'ятницю до 12:00")
+        self.assertEqual(intent, {'date': '2026-04-24', 'time_before': '12:00'})
+
+    def test_time_of_day_and_numeric_date(self):
+        intent, _ = self.parse("mañana por la mañana")
+        self.assertEqual(intent, {'date': '2026-04-21', 'time_preference': 'morning'})
+
+        intent, _ = self.parse("25/04 вечером")
+        self.assertEqual(intent, {'date': '2026-04-25', 'time_preference': 'evening'})
+
+    def test_service_from_catalog(self):
+        intent, confidence = self.parse("Quiero manicura sin pintar el lunes", self.company)
+        self.assertEqual(intent, {'service': 'Manicura sin pintar', 'date': '2026-04-20'})
+        self.assertEqual(confidence, 1.0)
+
+    def test_catalog_follows_changes_from_other_workers(self):
+        from companies.cache_versions import bump_version
+        from .service_matcher import CATALOG_VERSION, get_company_catalog
+
+        self.assertIn('Manicura sin pintar', get_company_catalog(self.company.id).services.names)
+        # Another worker deactivated the service: only the shared version tells this one
+        Service.objects.filter(company=self.company, name='Manicura sin pintar').update(is_active=False)
+        bump_version(self.company.id, CATALOG_VERSION)
+        self.assertEqual(get_company_catalog(self.company.id).services.names, ['Manicura'])
+
+    def test_unexplained_words_lower_confidence(self):
+        intent, confidence = self.parse("mañana con Anna")
+        self.assertEqual(intent, {'date': '2026-04-21'})
+        self.assertLess(confidence, 1.0)
+
+        intent, confidence = self.parse("hola")
+        self.assertEqual(intent, {})
+        self.assertEqual(confidence, 0.0)
+
+
+class IntentCacheTest(TestCase):
+    """Test the OpenAI intent cache"""
+
+    def test_key_is_normalized(self):
+        from .intent_cache import IntentCache
+        cache = IntentCache(max_size=10)
+        cache.set("Mañana  por la tarde!", 'es', {'date': '2026-04-21'})
+        self.assertEqual(cache.get("mañana por la tarde", 'es'), {'date': '2026-04-21'})
+        self.assertIsNone(cache.get("mañana por la tarde", 'en'))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_key_is_short_and_safe_for_any_backend(self):
+        from .intent_cache import IntentCache
+        cache = IntentCache(max_size=10)
+        message = 'quiero una cita\tpara\x07 ' + 'manicura ' * 100
+        key = cache.make_key(message, 'es', today=datetime(2026, 4, 20).date())
+        self.assertLess(len(key), 100)
+        self.assertRegex(key, r'^intent:es:2026-04-20:[0-9a-f]{40}$')
+        cache.set(message, 'es', {'service': 'manicura'}, today=datetime(2026, 4, 20).date())
+        self.assertIsNone(cache.get(message, 'es', today=datetime(2026, 4, 21).date()))
+
+    def test_lru_eviction_and_ttl(self):
+        from .intent_cache import IntentCache
+        cache = IntentCache(max_size=2)
+        cache.set("a", 'es', {'n': 1})
+        cache.set("b", 'es', {'n': 2})
+        cache.get("a", 'es')
+        cache.set("c", 'es', {'n': 3})
+        self.assertIsNone(cache.get("b", 'es'))
+        self.assertEqual(cache.get("a", 'es'), {'n': 1})
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+        expired = IntentCache(ttl=0)
+        expired.set("a", 'es', {'n': 1})
+        self.assertIsNone(expired.get("a", 'es'))
+        self.assertEqual(expired.stats()['expired'], 1)
+
+
+class BookingAIPromptTest(TestCase):
+    """Test OpenAI client reuse and prompt memoization"""
+
+    def test_client_and_prompt_are_reused(self):
+        from django.test import override_settings
+        from .ai_handler import BookingAI
+
+        with override_settings(OPENAI_API_KEY='sk-test', OPENAI_MODEL='gpt-4o-mini'):
+            first, second = BookingAI(), BookingAI()
+            self.assertIs(first.client, second.client)
+
+            prompt_es = first._build_extraction_prompt('es')
+            self.assertIs(prompt_es, second._build_extraction_prompt('es'))
+            # The calendar uses the same local date as the intent cache key
+            today_line = prompt_es.split('Today is ')[1].splitlines()[0]
+            self.assertTrue(today_line.endswith(timezone.localdate().isoformat()))
+
+            # Static rules form an identical prefix for every language and day
+            prompt_ru = first._build_extraction_prompt('ru')
+            static = first._build_static_prompt()
+            self.assertTrue(prompt_es.startswith(static))
+            self.assertTrue(prompt_ru.startswith(static))
+
+
+class ConversationStoreTest(TestCase):
+    """Test write-behind conversation persistence"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_changes_are_written_by_persist(self):
+        from .conversation_store import load_conversation, persist_conversation
+
+        conversation = load_conversation('whatsapp:+34600000001')
+        conversation.conversation_state['language'] = 'es'
+        conversation.current_state = 'selecting_service'
+
+        stored = WhatsAppConversation.objects.get(pk=conversation.pk)
+        self.assertEqual(stored.current_state, 'idle')
+        self.assertEqual(stored.conversation_state, {})
+
+        with self.assertNumQueries(1):
+            self.assertTrue(persist_conversation(conversation))
+        stored.refresh_from_db()
+        self.assertEqual(stored.current_state, 'selecting_service')
+        self.assertEqual(stored.conversation_state, {'language': 'es'})
+        self.assertEqual(stored.version, 1)
+
+        # Next message reads the same state back in one query
+        with self.assertNumQueries(1):
+            again = load_conversation('whatsapp:+34600000001')
+        self.assertEqual(again.pk, conversation.pk)
+        self.assertEqual(again.conversation_state, {'language': 'es'})
+
+    def test_save_still_writes_right_away(self):
+        from .conversation_store import load_conversation, persist_conversation
+
+        conversation = load_conversation('whatsapp:+34600000013')
+        conversation.current_state = 'confirming'
+        conversation.save()
+        self.assertEqual(WhatsAppConversation.objects.get(pk=conversation.pk).current_state, 'confirming')
+
+        conversation.conversation_state = {'language': 'en'}
+        self.assertTrue(persist_conversation(conversation))
+        stored = WhatsAppConversation.objects.get(pk=conversation.pk)
+        self.assertEqual((stored.current_state, stored.conversation_state), ('confirming', {'language': 'en'}))
+
+    def test_version_conflict_keeps_other_writes(self):
+        from .conversation_store import load_conversation, persist_conversation
+
+        conversation = load_conversation('whatsapp:+34600000002')
+        WhatsAppConversation.objects.filter(pk=conversation.pk).update(
+            current_state='confirming', version=5
+        )
+        conversation.conversation_state = {'language': 'en'}
+        self.assertTrue(persist_conversation(conversation))
+
+        stored = WhatsAppConversation.objects.get(pk=conversation.pk)
+        self.assertEqual(stored.conversation_state, {'language': 'en'})
+        self.assertEqual(stored.current_state, 'confirming')
+        self.assertEqual(stored.version, 6)
+
+    def test_next_message_sees_writes_of_other_workers(self):
+        from .conversation_store import load_conversation, persist_conversation
+
+        conversation = load_conversation('whatsapp:+34600000012')
+        conversation.current_state = 'selecting_service'
+        persist_conversation(conversation)
+
+        # Another worker handled the next message
+        WhatsAppConversation.objects.filter(pk=conversation.pk).update(current_state='confirming', version=2)
+        again = load_conversation('whatsapp:+34600000012')
+        self.assertEqual((again.current_state, again.version), ('confirming', 2))
+
+    def test_cleanup_idle_conversations(self):
+        from .conversation_store import cleanup_idle_conversations
+
+        old = WhatsAppConversation.objects.create(phone_number='whatsapp:+34600000003')
+        WhatsAppConversation.objects.filter(pk=old.pk).update(
+            last_message_at=timezone.now() - timedelta(hours=25)
+        )
+        recent = WhatsAppConversation.objects.create(phone_number='whatsapp:+34600000004')
+
+        self.assertEqual(cleanup_idle_conversations(), 1)
+        self.assertFalse(WhatsAppConversation.objects.filter(pk=old.pk).exists())
+        self.assertTrue(WhatsAppConversation.objects.filter(pk=recent.pk).exists())
+
+
+class MessageLogWriterTest(TestCase):
+    """Test buffered message logging and archival"""
+
+    def setUp(self):
+        import tempfile
+        self.log_dir = tempfile.mkdtemp()
+        self.conversation = WhatsAppConversation.objects.create(phone_number='whatsapp:+34600000005')
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+
+    def test_buffer_flushes_in_batches(self):
+        import os
+        from .message_log import MessageLogWriter
+        from .models import WhatsAppMessage
+
+        writer = MessageLogWriter(log_dir=self.log_dir, flush_size=3, background=True)
+        writer._pid = os.getpid()  # don't start the background thread
+        for n in range(2):
+            writer.log(self.conversation, 'whatsapp:+34600000005', 'whatsapp:+1', f'hi {n}', 'inbound', f'SM{n}')
+        self.assertEqual(WhatsAppMessage.objects.count(), 0)
+        self.assertEqual(len(os.listdir(self.log_dir)), 1)
+
+        writer.log(self.conversation, 'whatsapp:+1', 'whatsapp:+34600000005', 'hello', 'outbound')
+        self.assertEqual(WhatsAppMessage.objects.count(), 3)
+        self.assertEqual(os.listdir(self.log_dir), [])
+
+    def test_orphaned_segment_is_replayed(self):
+        import json
+        import os
+        from .message_log import MessageLogWriter
+        from .models import WhatsAppMessage
+
+        record = {
+            'conversation_id': self.conversation.id, 'from_number': 'whatsapp:+34600000005',
+            'to_number': 'whatsapp:+1', 'message_body': 'lost', 'direction': 'inbound', 'message_sid': 'SMlost'
+        }
+        with open(os.path.join(self.log_dir, 'messages-99999-1.wal'), 'w') as segment:
+            segment.write(json.dumps(record) + '\n')
+            segment.write(json.dumps(dict(record, message_sid='SMgone', conversation_id=0)) + '\n')
+
+        writer = MessageLogWriter(log_dir=self.log_dir, background=False)
+        self.assertEqual(writer.recover(), 1)
+        self.assertEqual(WhatsAppMessage.objects.get().message_sid, 'SMlost')
+        self.assertEqual(os.listdir(self.log_dir), [])
+
+    def test_recovery_never_takes_a_live_segment(self):
+        import fcntl
+        import os
+        from .message_log import MessageLogWriter
+        from .models import WhatsAppMessage
+
+        writer = MessageLogWriter(log_dir=self.log_dir, flush_size=100, background=True)
+        writer._pid = os.getpid()  # don't start the background thread
+        other_process = MessageLogWriter(log_dir=self.log_dir, background=False)
+        real_flock = fcntl.flock
+        recovered = []
+
+        def recover_first(handle, operation):
+            # Another process recovers just before the new segment is locked
+            if not recovered:
+                recovered.append(None)
+                recovered[0] = other_process.recover()
+            return real_flock(handle, operation)
+
+        with mock.patch('whatsapp_bot.message_log.fcntl.flock', side_effect=recover_first):
+            writer.log(self.conversation, 'whatsapp:+34600000005', 'whatsapp:+1', 'hola', 'inbound', 'SMlive')
+        self.assertEqual(recovered, [0])
+        self.assertEqual(len(os.listdir(self.log_dir)), 1)
+        self.assertEqual(writer.flush(), 1)
+        self.assertEqual(WhatsAppMessage.objects.get().message_sid, 'SMlive')
+        self.assertEqual(os.listdir(self.log_dir), [])
+
+    def test_archive_old_messages(self):
+        import gzip
+        import json
+        import os
+        from .message_log import archive_old_messages
+        from .models import WhatsAppMessage
+
+        old = WhatsAppMessage.objects.create(
+            conversation=self.conversation, from_number='a', to_number='b',
+            message_body='old', direction='inbound'
+        )
+        WhatsAppMessage.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=400))
+        WhatsAppMessage.objects.create(
+            conversation=self.conversation, from_number='a', to_number='b',
+            message_body='new', direction='inbound'
+        )
+
+        self.assertEqual(archive_old_messages(retention_days=180, archive_dir=self.log_dir), 1)
+        self.assertEqual(list(WhatsAppMessage.objects.values_list('message_body', flat=True)), ['new'])
+        [archive] = os.listdir(self.log_dir)
+        with gzip.open(os.path.join(self.log_dir, archive), 'rt') as f:
+            self.assertEqual(json.loads(f.readline())['message_body'], 'old')
+
+
+@override_settings(DEBUG=True)
+class DuplicateDeliveryTest(TransactionTestCase):
+    """Test that Twilio retries are answered without reprocessing"""
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        from .message_log import message_log
+        message_log.flush()
+
+    def post(self, sid):
+        return self.client.post('/whatsapp/webhook/', {
+            'From': 'whatsapp:+34600000006', 'To': 'whatsapp:+1', 'Body': 'hola', 'MessageSid': sid
+        })
+
+    def test_retry_returns_stored_reply(self):
+        with mock.patch('whatsapp_bot.views.process_message', return_value='first reply') as process:
+            first = self.post('SMretry')
+            second = self.post('SMretry')
+        self.assertEqual(process.call_count, 1)
+        self.assertContains(first, 'first reply')
+        self.assertEqual(first.content, second.content)
+
+    def test_reply_recovered_from_message_log(self):
+        from .message_dedup import ProcessedMessageStore
+        from .message_log import message_log
+
+        with mock.patch('whatsapp_bot.views.process_message', return_value='logged reply'):
+            self.post('SMlogged')
+        message_log.flush()
+        cache.clear()
+
+        store = ProcessedMessageStore()
+        self.assertEqual(store.get_reply('SMlogged'), 'logged reply')
+        self.assertIsNone(store.get_reply('SMunseen'))
+
+
+    def test_claim_is_visible_to_other_workers(self):
+        from .message_dedup import ProcessedMessageStore, cleanup_processed_messages
+        from .models import ProcessedMessage
+
+        # Two workers: separate stores, and nothing shared through the cache
+        first, second = ProcessedMessageStore(), ProcessedMessageStore(wait_timeout=0.5)
+        self.assertTrue(first.claim('SMshared'))
+        cache.clear()
+        self.assertIsNone(second.get_reply('SMshared'))
+        self.assertFalse(second.claim('SMshared'))
+
+        first.store('SMshared', 'stored reply')
+        cache.clear()
+        self.assertEqual(second.wait_for_reply('SMshared'), 'stored reply')
+
+        # A released claim lets the retry run again
+        self.assertTrue(first.claim('SMfailed'))
+        first.release('SMfailed')
+        self.assertTrue(second.claim('SMfailed'))
+
+        ProcessedMessage.objects.filter(message_sid='SMshared').update(created_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(cleanup_processed_messages(), 1)
+
+
+@override_settings(DEBUG=True)
+class BackpressureTest(TransactionTestCase):
+    """Test per-number rate limiting and burst coalescing"""
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        from .message_log import message_log
+        message_log.flush()
+
+    def test_rate_limit_sheds_before_processing(self):
+        from .backpressure import SenderRateLimiter
+
+        with mock.patch('whatsapp_bot.views.rate_limiter', SenderRateLimiter(limit=2, window=60)), \
+                mock.patch('whatsapp_bot.views.process_message', return_value='ok') as process:
+            responses = [
+                self.client.post('/whatsapp/webhook/', {
+                    'From': 'whatsapp:+34600000007', 'To': 'whatsapp:+1', 'Body': 'hola', 'MessageSid': f'SMrate{n}'
+                })
+                for n in range(4)
+            ]
+        self.assertEqual(process.call_count, 2)
+        self.assertContains(responses[2], 'Too many messages')
+        self.assertNotContains(responses[3], 'Too many messages')
+
+    def test_waiting_messages_are_handled_in_one_pass(self):
+        import threading
+        import time
+        from .backpressure import PhoneGate
+
+        gate = PhoneGate(coalesce_window=0.1, lock_wait=5)
+        results = {}
+
+        def send(name, hold=0.0):
+            with gate.burst('whatsapp:+34600000008', {'sid': name, 'body': name}) as burst:
+                time.sleep(hold)
+                results[name] = [item['body'] for item in burst] if burst else None
+
+        first = threading.Thread(target=send, args=('first', 0.3))
+        first.start()
+        time.sleep(0.05)
+        others = [threading.Thread(target=send, args=(name,)) for name in ('second', 'third')]
+        for thread in others:
+            thread.start()
+            time.sleep(0.02)
+        for thread in [first] + others:
+            thread.join()
+
+        self.assertEqual(results['first'], ['first'])
+        self.assertIn(['second', 'third'], results.values())
+        self.assertEqual(list(results.values()).count(None), 1)
+
+    def test_lock_is_shared_through_the_database(self):
+        from .backpressure import PhoneBusy, PhoneGate
+        from .models import WhatsAppPhoneLock
+
+        # Held by a request in another worker: wait, then give up instead of racing it
+        phone = 'whatsapp:+34600000010'
+        WhatsAppPhoneLock.objects.create(phone_number=phone, token='other', expires_at=timezone.now() + timedelta(minutes=1))
+        gate = PhoneGate(coalesce_window=0, lock_wait=0.2)
+        with self.assertRaises(PhoneBusy):
+            with gate.burst(phone, {'sid': 'SMbusy', 'body': 'hola'}):
+                pass
+
+        # A lock left behind by a dead worker is taken over once it expires
+        WhatsAppPhoneLock.objects.filter(phone_number=phone).update(expires_at=timezone.now() - timedelta(seconds=1))
+        with gate.burst(phone, {'sid': 'SMfree', 'body': 'hola'}) as burst:
+            self.assertEqual([item['sid'] for item in burst], ['SMfree'])
+            self.assertNotEqual(WhatsAppPhoneLock.objects.get(phone_number=phone).token, 'other')
+        self.assertFalse(WhatsAppPhoneLock.objects.exists())
+
+    def test_counters_and_queue_are_shared_by_workers(self):
+        from .backpressure import PhoneGate, SenderRateLimiter, cleanup_phone_gates
+        from .models import WhatsAppQueuedMessage, WhatsAppRateCounter
+
+        phone = 'whatsapp:+34600000011'
+        self.assertEqual([SenderRateLimiter(limit=5, window=60).hit(phone) for _ in range(2)], [1, 2])
+        self.assertEqual(SenderRateLimiter(limit=5, window=60).hit(phone), 3)
+
+        # Queued by a request waiting in another worker: the holder here answers it too
+        WhatsAppQueuedMessage.objects.create(phone_number=phone, item={'sid': 'SMother', 'body': 'mañana'})
+        with PhoneGate(coalesce_window=0).burst(phone, {'sid': 'SMhere', 'body': 'hola'}) as burst:
+            self.assertEqual([item['sid'] for item in burst], ['SMother', 'SMhere'])
+        self.assertFalse(WhatsAppQueuedMessage.objects.exists())
+
+        WhatsAppRateCounter.objects.update(window=F('window') - 2)
+        self.assertEqual(cleanup_phone_gates(window=60), 1)
+
+    def test_waiter_timing_out_after_the_holder_took_its_message(self):
+        from django.db.models import QuerySet
+        from .backpressure import PhoneGate
+        from .models import WhatsAppPhoneLock, WhatsAppQueuedMessage
+
+        phone = 'whatsapp:+34600000012'
+        WhatsAppPhoneLock.objects.create(phone_number=phone, token='other', expires_at=timezone.now() + timedelta(minutes=1))
+
+        def drained_by_holder(queryset):
+            # The holder drains the queue right after the waiter looked
+            WhatsAppQueuedMessage.objects.filter(phone_number=phone).delete()
+            return True
+
+        with mock.patch.object(QuerySet, 'exists', autospec=True, side_effect=drained_by_holder):
+            with PhoneGate(coalesce_window=0, lock_wait=0).burst(phone, {'sid': 'SMlate', 'body': 'hola'}) as burst:
+                self.assertIsNone(burst)
+
+    def test_coalesce_messages(self):
+        from .backpressure import coalesce_messages
+
+        self.assertEqual(
+            coalesce_messages(['quiero manicura', ' mañana a las 5', '2', 'sí']),
+            ['quiero manicura mañana a las 5', '2', 'sí']
+        )
+        self.assertEqual(coalesce_messages(['']), [''])
+
+
+@override_settings(DEBUG=True)
+class DeliveryStatusTest(TransactionTestCase):
+    """Test batched Twilio status callback ingestion and rollups"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        user = User.objects.create_user('delivery', 'delivery@test.com', 'pass')
+        self.company = Company.objects.create(
+            administrator=user, name='Delivery Salon', address='Calle 1', city='Madrid'
+        )
+
+    def test_out_of_order_callbacks_are_merged(self):
+        from .delivery_status import DeliveryStatusQueue, company_delivery_rollup
+        from .models import MessageDeliveryStatus
+
+        # Flushed explicitly below
+        queue = DeliveryStatusQueue(flush_size=100, flush_interval=3600, background=True)
+        for sid, status in [('SM1', 'sent'), ('SM1', 'read'), ('SM1', 'delivered'), ('SM2', 'queued'), ('SM2', 'failed')]:
+            queue.enqueue(sid, status, company_id=self.company.id, error_code='63016' if status == 'failed' else '')
+        self.assertEqual(queue.flush(), 2)
+
+        # A late duplicate does not move the status back or count twice
+        queue.enqueue('SM1', 'delivered', company_id=self.company.id)
+        queue.flush()
+
+        first = MessageDeliveryStatus.objects.get(message_sid='SM1')
+        self.assertEqual(first.status, 'read')
+        self.assertIsNotNone(first.delivered_at)
+        self.assertEqual(MessageDeliveryStatus.objects.get(message_sid='SM2').error_code, '63016')
+        rollup = company_delivery_rollup(self.company)['bot_reply']
+        self.assertEqual(
+            (rollup['sent'], rollup['delivered'], rollup['read'], rollup['failed']), (2, 1, 1, 1)
+        )
+        self.assertEqual(rollup['delivery_rate'], 0.5)
+
+    def test_failed_batch_is_requeued(self):
+        from unittest import mock
+        from .delivery_status import DeliveryStatusQueue
+        from .models import MessageDeliveryDaily, MessageDeliveryStatus
+
+        queue = DeliveryStatusQueue(flush_size=100, flush_interval=3600, background=True)
+        queue.enqueue('SMretry1', 'delivered')
+        with mock.patch.object(MessageDeliveryStatus.objects, 'bulk_create', side_effect=RuntimeError('db down')):
+            self.assertEqual(queue.flush(), 0)
+        self.assertFalse(MessageDeliveryStatus.objects.exists())
+
+        queue.enqueue('SMretry2', 'sent')
+        self.assertEqual(queue.flush(), 2)
+        # Messages without a company share one rollup row per day and kind
+        rollup = MessageDeliveryDaily.objects.get(company__isnull=True)
+        self.assertEqual((rollup.sent, rollup.delivered), (2, 1))
+
+    def test_status_callback_endpoint(self):
+        from .delivery_status import DeliveryStatusQueue
+        from .models import MessageDeliveryStatus
+
+        with mock.patch('whatsapp_bot.views.delivery_statuses', DeliveryStatusQueue(background=False)):
+            response = self.client.post(
+                f'/whatsapp/status/?kind=reminder&company={self.company.id}',
+                {'MessageSid': 'SMreminder', 'MessageStatus': 'delivered', 'To': 'whatsapp:+34600000009'}
+            )
+            self.assertEqual(response.status_code, 204)
+            self.assertEqual(self.client.post('/whatsapp/status/', {'MessageSid': 'SMx'}).status_code, 400)
+
+        row = MessageDeliveryStatus.objects.get(message_sid='SMreminder')
+        self.assertEqual((row.company_id, row.kind, row.status), (self.company.id, 'reminder', 'delivered'))
+
+
+class MessageCatalogTest(TestCase):
+    """Test the precompiled message catalog"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        user = User.objects.create_user('catalog', 'catalog@test.com', 'pass')
+        self.company = Company.objects.create(
+            name='Catalog Salon', administrator=user, email='salon@test.com', phone='+34600000007'
+        )
+        Service.objects.create(company=self.company, name='Manicura', duration=30, price=20, is_active=True)
+
+    def test_render_and_language_fallback(self):
+        from .message_catalog import render
+        self.assertEqual(render('choose_number_between', 'en', low=1, high=3), "⚠️ Please choose a number between 1 and 3.")
+        self.assertEqual(render('ask_date', 'de'), render('ask_date', 'es'))
+
+    def test_service_examples_cached_until_services_change(self):
+        from .message_catalog import get_message
+        message = get_message('welcome_with_salon', 'en', company=self.company, company_name=self.company.name)
+        self.assertIn('"I want manicura tomorrow at 3pm"', message)
+        # Only the shared version is read
+        with self.assertNumQueries(1):
+            get_message('welcome_with_salon', 'en', company=self.company, company_name=self.company.name)
+
+        Service.objects.create(company=self.company, name='Pedicura', duration=30, price=25, is_active=True)
+        message = get_message('welcome_with_salon', 'en', company=self.company, company_name=self.company.name)
+        self.assertIn('pedicura', message)
+
+    def test_texts_follow_changes_from_other_workers(self):
+        from companies.cache_versions import bump_version
+        from .message_catalog import COMPANY_TEXTS_VERSION, contact_footer
+
+        self.assertIn('+34600000007', contact_footer(self.company, 'en'))
+        # Another worker changed the phone: only the shared version tells this one
+        Company.objects.filter(pk=self.company.pk).update(phone='+34600000008')
+        self.company.refresh_from_db()
+        bump_version(self.company.id, COMPANY_TEXTS_VERSION)
+        self.assertIn('+34600000008', contact_footer(self.company, 'en'))
+
+    def test_contact_footer_follows_company_changes(self):
+        from .message_catalog import contact_footer
+        self.assertIn('📞 +34600000007', contact_footer(self.company, 'es'))
+        self.company.phone = ''
+        self.company.email = ''
+        self.company.save()
+        self.assertEqual(contact_footer(self.company, 'es'), '')
+
+
+class OpenAIUsageStatsTest(TestCase):
+    """Test OpenAI usage metrics and daily rollups"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        user = User.objects.create_user('usage', 'usage@test.com', 'pass')
+        self.company = Company.objects.create(administrator=user, name='Usage Salon')
+
+    def test_histogram_percentiles(self):
+        from .metrics import Histogram
+        histogram = Histogram()
+        for ms in [50] * 90 + [700] * 9 + [20000]:
+            histogram.observe(ms)
+        self.assertEqual(histogram.percentile(50), 100)
+        self.assertEqual(histogram.percentile(95), 1000)
+        self.assertIsNone(histogram.percentile(100))
+
+    def test_calls_rolled_up_per_day(self):
+        from decimal import Decimal
+        from .metrics import OpenAIUsageStats
+        from .models import OpenAIUsageDaily
+
+        with self.settings(OPENAI_PRICING={'gpt-4o-mini': {'prompt': 0.15, 'completion': 0.60}}):
+            stats = OpenAIUsageStats(flush_interval=3600)
+            stats.record('gpt-4o-mini', self.company.id, 'es', 1000, 100, 0.8, success=True)
+            stats.record('gpt-4o-mini', self.company.id, 'es', 1000, 0, 3.0, success=False)
+            self.assertEqual(stats.flush(), 1)
+            stats.record('gpt-4o-mini', self.company.id, 'es', 2000, 200, 0.2, success=True)
+            stats.flush()
+
+        row = OpenAIUsageDaily.objects.get()
+        self.assertEqual((row.calls, row.failures, row.prompt_tokens, row.completion_tokens), (3, 1, 4000, 300))
+        self.assertEqual(row.cost, Decimal('0.000780'))
+        self.assertEqual(row.latency_histogram, {'250': 1, '1000': 1, '4000': 1})
+        self.assertEqual(stats.snapshot()['top_companies'][0]['company_id'], self.company.id)
+
+    def test_record_never_writes_in_the_request(self):
+        import os
+        import time
+        from .metrics import OpenAIUsageStats
+
+        stats = OpenAIUsageStats(flush_interval=0.001)
+        stats._pid = os.getpid()  # don't start the background thread
+        time.sleep(0.01)
+        # Overdue, but the writer thread flushes, not the request that made the call
+        with self.assertNumQueries(0):
+            stats.record('gpt-4o-mini', self.company.id, 'es', 100, 10, 0.1, success=True)
+        self.assertEqual(stats.flush(), 1)
+
+    def test_failed_flush_keeps_unapplied_deltas(self):
+        from unittest import mock
+        from .metrics import OpenAIUsageStats
+        from .models import OpenAIUsageDaily
+
+        stats = OpenAIUsageStats(flush_interval=3600)
+        stats.record('gpt-4o-mini', None, 'es', 100, 10, 0.1, success=True)
+        stats.record('gpt-4o-mini', None, 'en', 100, 10, 0.1, success=True)
+        real_save = OpenAIUsageDaily.save
+        languages = []
+
+        def fail_on_second_row(row, *args, **kwargs):
+            if row.language not in languages:
+                languages.append(row.language)
+            if len(languages) == 2:
+                raise RuntimeError('database went away')
+            real_save(row, *args, **kwargs)
+
+        with mock.patch.object(OpenAIUsageDaily, 'save', fail_on_second_row):
+            self.assertEqual(stats.flush(), 1)
+        stats.record('gpt-4o-mini', None, languages[1], 100, 10, 0.1, success=True)
+        self.assertEqual(stats.flush(), 1)
+
+        # Rows without a company are unique too, and none was counted twice or lost
+        self.assertEqual(
+            dict(OpenAIUsageDaily.objects.values_list('language', 'calls')), {languages[0]: 1, languages[1]: 2}
+        )
+        from django.db import IntegrityError, transaction
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            OpenAIUsageDaily.objects.create(date=timezone.localdate(), model='gpt-4o-mini', language='es')
+
+    def test_metrics_endpoint_is_staff_only(self):
+        import json
+        from django.contrib.auth.models import AnonymousUser, User
+        from django.test import RequestFactory
+        from .views import bot_metrics
+
+        request = RequestFactory().get('/whatsapp/metrics/')
+        request.user = AnonymousUser()
+        self.assertEqual(bot_metrics(request).status_code, 302)
+
+        request.user = User.objects.create_user('ops', 'ops@test.com', 'pass', is_staff=True)
+        response = bot_metrics(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('openai', json.loads(response.content))
+
+
+class LoadTestHarnessTest(TransactionTestCase):
+    """Load harness plays conversations through the signed webhook"""
+
+    def tearDown(self):
+        from .message_log import message_log
+        from .metrics import openai_usage
+        message_log.flush()
+        openai_usage.flush()
+
+    def test_scripted_run(self):
+        from .loadtest import LoadTestRunner, ensure_loadtest_salon, percentile, scripted_conversations
+
+        company = ensure_loadtest_salon()
+        conversations = scripted_conversations(2, company)
+        runner = LoadTestRunner(conversations, concurrency=1, openai_latency_ms=0,
+                                fast_path=False, service_names=['Manicura'], run_id='00001')
+        report = runner.run()
+
+        self.assertEqual(report['errors'], 0, report['error_samples'])
+        self.assertEqual(report['messages'], sum(len(c) for c in conversations))
+        self.assertGreater(report['openai_calls'], 0)
+        self.assertGreater(report['queries_per_message']['avg'], 0)
+        self.assertEqual(percentile([5, 1, 3, 2, 4], 50), 3)
@@ -5,4 +5,6 @@ app_name = 'whatsapp_bot'
 
 urlpatterns = [
     path('webhook/', views.whatsapp_webhook, name='webhook'),
+    path('status/', views.whatsapp_status_callback, name='status_callback'),
+    path('metrics/', views.bot_metrics, name='metrics'),
 ]
@@ -4,19 +4,31 @@ WhatsApp Webhook Views
 import logging
 from datetime import datetime, timedelta
 from django.conf import settings
-from django.db import models
-from django.http import HttpResponse
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.utils import timezone
 from twilio.twiml.messaging_response import MessagingResponse
 from twilio.request_validator import RequestValidator
 
-from .models import WhatsAppConversation, WhatsAppMessage, PendingBooking
+from .models import WhatsAppConversation, PendingBooking
 from .ai_handler import BookingAI
 from .booking_handler import BookingSearcher
+from .intent_parser import extract_booking_intent
+from .service_matcher import get_company_catalog
+from .conversation_store import load_conversation, persist_conversation
+from .message_log import message_log
+from .intent_cache import intent_cache
+from .metrics import intent_path_stats, openai_usage
+from .message_dedup import processed_messages
+from .backpressure import PhoneBusy, rate_limiter, phone_gate, coalesce_messages
+from .delivery_status import delivery_statuses, status_callback_url
+from .message_catalog import (
+    LANGUAGE_MENU, INVALID_LANGUAGE_SELECTION, TECHNICAL_ERROR, RATE_LIMITED,
+    render, get_message, contact_footer, company_url
+)
 from bookings.models import Customer
-from bookings.utils import normalize_phone_number
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +42,7 @@ def whatsapp_webhook(request):
     Twilio will POST to this URL when a message is received
     """
     
+    message_sid = from_number = ''
     try:
         # Verify request is from Twilio (security)
         if not verify_twilio_request(request):
@@ -44,63 +57,100 @@ def whatsapp_webhook(request):
         
         logger.info(f"Received WhatsApp message from {from_number}: {message_body}")
         
-        # Get or create conversation
-        conversation = get_or_create_conversation(from_number)
-        
-        # Try to find and link existing customer
-        find_and_link_customer(conversation)
+        # Shed senders over the rate limit before any conversation or OpenAI work
+        sent = rate_limiter.hit(from_number)
+        if sent > rate_limiter.limit:
+            logger.warning(f"Rate limit exceeded by {from_number} ({sent} messages)")
+            response = MessagingResponse()
+            if sent == rate_limiter.limit + 1:
+                response.message(RATE_LIMITED)
+            return HttpResponse(str(response), content_type='text/xml')
         
-        # Log message
-        WhatsAppMessage.objects.create(
-            conversation=conversation,
-            from_number=from_number,
-            to_number=to_number,
-            message_body=message_body,
-            direction='inbound',
-            message_sid=message_sid
-        )
+        # Twilio retries on timeout with the same MessageSid: answer from the first run
+        if message_sid:
+            reply = processed_messages.get_reply(message_sid)
+            if reply is None and not processed_messages.claim(message_sid):
+                reply = processed_messages.wait_for_reply(message_sid)
+            if reply is not None:
+                logger.info(f"Duplicate delivery of {message_sid}, returning stored reply")
+                response = MessagingResponse()
+                if reply:
+                    response.message(reply, action=status_callback_url())
+                return HttpResponse(str(response), content_type='text/xml')
         
-        # Process message and generate response
-        try:
-            response_text = process_message(conversation, message_body)
+        # One message per number at a time; a burst is answered in one pass
+        with phone_gate.burst(from_number, {'sid': message_sid, 'body': message_body}) as burst:
+            if burst is None:
+                logger.info(f"Message {message_sid} from {from_number} answered together with the previous one")
+                if message_sid:
+                    processed_messages.store(message_sid, '')
+                return HttpResponse(str(MessagingResponse()), content_type='text/xml')
             
-            # Safety check: ensure we have a valid response
-            if not response_text or not isinstance(response_text, str):
-                logger.error(f"process_message returned invalid response: {type(response_text)}")
-                lang = conversation.conversation_state.get('language', 'es')
-                response_text = get_message('service_error', lang)
-        except Exception as e:
-            logger.error(f"Error in process_message: {e}", exc_info=True)
-            # Try to get language and show error message
-            try:
-                lang = conversation.conversation_state.get('language', 'es')
-                response_text = get_message('service_error', lang)
-            except:
-                response_text = "⚠️ Sorry, there was an error. Please try again."
+            # Get or create conversation (written once, at the end of the pass)
+            conversation = load_conversation(from_number)
+            
+            # Try to find and link existing customer
+            find_and_link_customer(conversation)
+            
+            # Log messages (buffered, written in batches)
+            for item in burst:
+                message_log.log(
+                    conversation=conversation,
+                    from_number=from_number,
+                    to_number=to_number,
+                    message_body=item['body'],
+                    direction='inbound',
+                    message_sid=item['sid']
+                )
+            
+            # Process messages and generate responses
+            replies = [
+                reply_to_message(conversation, text)
+                for text in coalesce_messages([item['body'] for item in burst])
+            ]
+            
+            # Persist conversation changes once for the whole pass
+            persist_conversation(conversation)
         
-        # Send response via Twilio
+        response_text = '\n\n'.join(replies)
+        if message_sid:
+            processed_messages.store(message_sid, response_text)
+        
+        # Send response via Twilio (delivery statuses come back to the status callback)
         response = MessagingResponse()
-        response.message(response_text)
+        for reply in replies:
+            response.message(reply, action=status_callback_url())
+            
+            # Log outbound message
+            message_log.log(
+                conversation=conversation,
+                from_number=to_number,
+                to_number=from_number,
+                message_body=reply,
+                direction='outbound'
+            )
         
-        # Log outbound message
-        WhatsAppMessage.objects.create(
-            conversation=conversation,
-            from_number=to_number,
-            to_number=from_number,
-            message_body=response_text,
-            direction='outbound'
-        )
+        return HttpResponse(str(response), content_type='text/xml')
         
+    except PhoneBusy:
+        # Still busy with an earlier message from this number: ask for a resend rather than race it
+        logger.warning(f"Timed out waiting for the lock of {from_number}, message {message_sid} not handled")
+        if message_sid:
+            processed_messages.release(message_sid)
+        response = MessagingResponse()
+        response.message(TECHNICAL_ERROR)
         return HttpResponse(str(response), content_type='text/xml')
         
     except Exception as e:
         # Log the full error for debugging
         logger.error(f"WhatsApp webhook error: {e}", exc_info=True)
+        if message_sid:
+            processed_messages.release(message_sid)
         
         # Return a friendly error message to the user
         try:
             response = MessagingResponse()
-            response.message("⚠️ Sorry, there was a technical error. Please try again in a moment or contact us directly.")
+            response.message(TECHNICAL_ERROR)
             return HttpResponse(str(response), content_type='text/xml', status=200)
         except:
             # If even creating the error response fails, return a simple 200
@@ -108,6 +158,68 @@ def whatsapp_webhook(request):
                               content_type='text/xml', status=200)
 
 
+@csrf_exempt
+@require_POST
+def whatsapp_status_callback(request):
+    """
+    Twilio delivery status callback for outgoing messages
+    
+    Events are queued and applied in batches; Twilio only needs a 2xx.
+    """
+    if not verify_twilio_request(request):
+        logger.warning("Invalid Twilio request signature on status callback")
+        return HttpResponse("Forbidden", status=403)
+    
+    message_sid = request.POST.get('MessageSid', '')
+    status = request.POST.get('MessageStatus', '')
+    if not message_sid or not status:
+        return HttpResponse(status=400)
+    
+    kind = request.GET.get('kind', 'bot_reply')
+    delivery_statuses.enqueue(
+        message_sid=message_sid,
+        status=status,
+        kind=kind if kind in ('bot_reply', 'reminder') else 'bot_reply',
+        company_id=int(request.GET['company']) if request.GET.get('company', '').isdigit() else None,
+        booking_id=int(request.GET['booking']) if request.GET.get('booking', '').isdigit() else None,
+        to_number=request.POST.get('To', ''),
+        error_code=request.POST.get('ErrorCode', ''),
+    )
+    return HttpResponse(status=204)
+
+
+def reply_to_message(conversation: WhatsAppConversation, message: str) -> str:
+    """Run process_message, falling back to an error text instead of raising"""
+    try:
+        response_text = process_message(conversation, message)
+        
+        # Safety check: ensure we have a valid response
+        if not response_text or not isinstance(response_text, str):
+            logger.error(f"process_message returned invalid response: {type(response_text)}")
+            lang = conversation.conversation_state.get('language', 'es')
+            response_text = get_message('service_error', lang)
+    except Exception as e:
+        logger.error(f"Error in process_message: {e}", exc_info=True)
+        # Try to get language and show error message
+        try:
+            lang = conversation.conversation_state.get('language', 'es')
+            response_text = get_message('service_error', lang)
+        except:
+            response_text = "⚠️ Sorry, there was an error. Please try again."
+    return response_text
+
+
+@login_required
+@user_passes_test(lambda user: user.is_superuser or user.is_staff)
+def bot_metrics(request):
+    """In-process bot metrics of this worker as JSON (intent paths, cache, OpenAI usage)"""
+    return JsonResponse({
+        'intent_paths': intent_path_stats.snapshot(),
+        'intent_cache': intent_cache.stats(),
+        'openai': openai_usage.snapshot(),
+    })
+
+
 def verify_twilio_request(request):
     """Verify that request came from Twilio"""
     if settings.DEBUG:
@@ -126,29 +238,6 @@ def verify_twilio_request(request):
     return validator.validate(url, request.POST, signature)
 
 
-def get_or_create_conversation(phone_number: str) -> WhatsAppConversation:
-    """Get existing conversation or create new one"""
-    # Clean up old conversations (older than 24 hours with idle state)
-    cutoff_time = timezone.now() - timedelta(hours=24)
-    WhatsAppConversation.objects.filter(
-        phone_number=phone_number,
-        current_state='idle',
-        last_message_at__lt=cutoff_time
-    ).delete()
-    
-    # Get or create active conversation
-    conversation, created = WhatsAppConversation.objects.get_or_create(
-        phone_number=phone_number,
-        current_state__in=['idle', 'selecting_language', 'selecting_service', 'selecting_staff', 'collecting_info', 'showing_slots', 'confirming'],
-        defaults={'current_state': 'idle'}
-    )
-
-    if created:
-        logger.info(f"Created new conversation for {phone_number}")
-    
-    return conversation
-
-
 def find_and_link_customer(conversation: WhatsAppConversation) -> Customer:
     """
     Find existing customer by phone number and link to conversation
@@ -161,17 +250,8 @@ def find_and_link_customer(conversation: WhatsAppConversation) -> Customer:
     if conversation.customer:
         return conversation.customer
     
-    # Normalize the WhatsApp phone number (format: whatsapp:+1234567890)
-    phone = conversation.phone_number
-    normalized_phone = normalize_phone_number(phone)
-    
-    # Try to find customer by phone number
-    # Check both normalized and various formats
-    customers = Customer.objects.filter(
-        models.Q(phone=phone) | 
-        models.Q(phone=normalized_phone) |
-        models.Q(phone=phone.replace('whatsapp:', ''))
-    ).first()
+    # Try to find customer by phone number (whatsapp:+1234567890, any stored spelling)
+    customers = Customer.find_by_phone(conversation.phone_number)
     
     if customers:
         # Link customer to conversation
@@ -185,7 +265,6 @@ def find_and_link_customer(conversation: WhatsAppConversation) -> Customer:
                 conversation.conversation_state = state
                 logger.info(f"Set language to {customers.preferred_language} for returning customer {customers.name}")
         
-        conversation.save()
         logger.info(f"Linked conversation to existing customer: {customers.name}")
         return customers
     
@@ -196,6 +275,9 @@ def process_message(conversation: WhatsAppConversation, message: str) -> str:
     """
     Process incoming message and return response
     
+    Handlers only change the conversation in memory; the webhook writes it
+    once with persist_conversation() after the whole burst is answered.
+    
     Flow:
     1. Check if user is selecting language (priority)
     2. Ask for language preference (if not set)
@@ -229,7 +311,6 @@ def process_message(conversation: WhatsAppConversation, message: str) -> str:
         else:
             # User wants to specify service by name instead
             conversation.current_state = 'idle'
-            conversation.save()
             # Fall through to intent processing below
     
     # Check if user is selecting staff by number
@@ -239,7 +320,6 @@ def process_message(conversation: WhatsAppConversation, message: str) -> str:
         else:
             # User wants to specify staff by name instead or go back
             conversation.current_state = 'idle'
-            conversation.save()
             # Fall through to intent processing below
     
     # Check if user is confirming a slot selection
@@ -250,7 +330,6 @@ def process_message(conversation: WhatsAppConversation, message: str) -> str:
             # User wants to refine search instead of selecting a slot
             # Reset to idle and reprocess the message
             conversation.current_state = 'idle'
-            conversation.save()
             # Fall through to intent processing below
     
     # Check if user is confirming booking
@@ -263,7 +342,6 @@ def process_message(conversation: WhatsAppConversation, message: str) -> str:
         state = conversation.conversation_state
         state['customer_name'] = message.strip()
         conversation.conversation_state = state
-        conversation.save()
         
         # Now show confirmation
         try:
@@ -280,7 +358,6 @@ def process_message(conversation: WhatsAppConversation, message: str) -> str:
         conversation.current_state = 'idle'
         state['selected_slot'] = None
         conversation.conversation_state = state
-        conversation.save()
         lang = state.get('language', 'es')
         return get_message('conversation_cancelled', lang)
     
@@ -293,26 +370,17 @@ def process_message(conversation: WhatsAppConversation, message: str) -> str:
     language_keywords = ['language', 'idioma', 'язык', 'мова', 'lingua', 'lengua']
     if message.lower() in language_keywords:
         conversation.current_state = 'selecting_language'
-        conversation.save()
-        return """🌍 Please select your language / Elige tu idioma:
-
-1️⃣ Español (ES)
-2️⃣ English (EN)
-3️⃣ Русский (RU)
-4️⃣ Українська (UK)
-
-Reply with the number (1-4) or language code."""
+        return LANGUAGE_MENU
     
     # Check if user is at idle state and enters a number (menu selection)
     if conversation.current_state == 'idle' and message.isdigit():
         menu_choice = int(message)
         return handle_menu_choice(conversation, menu_choice)
     
-    # Use AI to extract booking details
+    # Extract booking details (local rules first, OpenAI when they aren't sure)
     lang = state.get('language', 'es')  # Get language at the start
     try:
-        ai = BookingAI()
-        intent_data = ai.extract_booking_intent(message, conversation.conversation_state)
+        intent_data = extract_booking_intent(message, conversation.conversation_state, company=conversation.company)
         logger.info(f"AI extracted data: {intent_data}")
     except Exception as e:
         logger.error(f"AI error: {e}")
@@ -336,7 +404,6 @@ Reply with the number (1-4) or language code."""
             state = conversation.conversation_state
             state['company_name'] = potential_company.name
             conversation.conversation_state = state
-            conversation.save()
             logger.info(f"AI extracted company name as service: {potential_company.name}")
             return get_message('welcome_menu_with_salon', lang, company=potential_company, company_name=potential_company.name)
     
@@ -364,17 +431,9 @@ def ask_language_preference(conversation: WhatsAppConversation, first_message: s
     # Update conversation state
     conversation.current_state = 'selecting_language'
     conversation.conversation_state['first_message'] = first_message
-    conversation.save()
     
     # Ask in all supported languages
-    return """🌍 Please select your language / Elige tu idioma:
-
-1️⃣ Español (ES)
-2️⃣ English (EN)
-3️⃣ Русский (RU)
-4️⃣ Українська (UK)
-
-Reply with the number (1-4) or language code."""
+    return LANGUAGE_MENU
 
 
 def handle_language_selection(conversation: WhatsAppConversation, message: str) -> str:
@@ -392,17 +451,13 @@ def handle_language_selection(conversation: WhatsAppConversation, message: str)
     selected_language = language_map.get(message_clean)
     
     if not selected_language:
-        return """⚠️ Invalid selection / Selección inválida
-
-Please reply: 1, 2, 3, or 4
-Por favor responde: 1, 2, 3, o 4"""
+        return INVALID_LANGUAGE_SELECTION
     
     # Save language preference
     state = conversation.conversation_state
     state['language'] = selected_language
     conversation.conversation_state = state
     conversation.current_state = 'idle'
-    conversation.save()
     
     # Also save to customer record if linked
     if conversation.customer:
@@ -485,17 +540,10 @@ def show_services_list(conversation: WhatsAppConversation) -> str:
         return get_message('no_services_available', lang)
     
     # Build numbered list
-    message_templates = {
-        'es': "💅 **Servicios disponibles:**\n\n{services}\n\n📝 Responde con el número del servicio (1-{count}) o escribe el nombre del servicio.",
-        'en': "💅 **Available services:**\n\n{services}\n\n📝 Reply with the service number (1-{count}) or type the service name.",
-        'ru': "💅 **Доступные услуги:**\n\n{services}\n\n📝 Ответьте номером услуги (1-{count}) или напишите название услуги.",
-        'uk': "💅 **Доступні послуги:**\n\n{services}\n\n📝 Відповідайте номером послуги (1-{count}) або напишіть назву послуги."
-    }
-    
     services_text = ""
     service_list = []
+    duration_text = render('minutes', lang)
     for idx, service in enumerate(services, 1):
-        duration_text = {'es': 'min', 'en': 'min', 'ru': 'мин', 'uk': 'хв'}.get(lang, 'min')
         services_text += f"{idx}. **{service.name}** - {service.duration} {duration_text} - €{service.price}\n"
         service_list.append({'id': service.id, 'name': service.name})
     
@@ -504,10 +552,8 @@ def show_services_list(conversation: WhatsAppConversation) -> str:
     state['service_list'] = service_list
     conversation.conversation_state = state
     conversation.current_state = 'selecting_service'
-    conversation.save()
     
-    template = message_templates.get(lang, message_templates['es'])
-    return template.format(services=services_text, count=len(services))
+    return render('services_list', lang, services=services_text, count=len(services))
 
 
 def show_staff_list(conversation: WhatsAppConversation) -> str:
@@ -524,20 +570,12 @@ def show_staff_list(conversation: WhatsAppConversation) -> str:
         return get_message('no_staff_available', lang)
     
     # Build numbered list
-    message_templates = {
-        'es': "👥 **Nuestro equipo:**\n\n{staff}\n\n✨ Para reservar, escribe 'menu' o el nombre del servicio que deseas.",
-        'en': "👥 **Our team:**\n\n{staff}\n\n✨ To book, type 'menu' or the service name you want.",
-        'ru': "👥 **Наша команда:**\n\n{staff}\n\n✨ Для бронирования напишите 'menu' или название услуги.",
-        'uk': "👥 **Наша команда:**\n\n{staff}\n\n✨ Для бронювання напишіть 'menu' або назву послуги."
-    }
-    
     staff_text = ""
     for idx, staff in enumerate(staff_members, 1):
         specialization = f" - {staff.specialization}" if staff.specialization else ""
         staff_text += f"{idx}. **{staff.name}**{specialization}\n"
     
-    template = message_templates.get(lang, message_templates['es'])
-    return template.format(staff=staff_text)
+    return render('staff_list', lang, staff=staff_text)
 
 
 def show_salon_location(conversation: WhatsAppConversation) -> str:
@@ -549,24 +587,13 @@ def show_salon_location(conversation: WhatsAppConversation) -> str:
     
     company = conversation.company
     
-    message_templates = {
-        'es': "📍 **{name}**\n\n{address}\n📞 {phone}\n✉️ {email}\n\n🔗 Ver en el sitio web: {url}",
-        'en': "📍 **{name}**\n\n{address}\n📞 {phone}\n✉️ {email}\n\n🔗 View on website: {url}",
-        'ru': "📍 **{name}**\n\n{address}\n📞 {phone}\n✉️ {email}\n\n🔗 Посмотреть на сайте: {url}",
-        'uk': "📍 **{name}**\n\n{address}\n📞 {phone}\n✉️ {email}\n\n🔗 Переглянути на сайті: {url}"
-    }
-    
-    from django.conf import settings
-    site_url = getattr(settings, 'SITE_URL', 'https://reserva-ya.es')
-    company_url = f"{site_url}/companies/{company.id}/"
-    
-    template = message_templates.get(lang, message_templates['es'])
-    return template.format(
+    return render(
+        'salon_location', lang,
         name=company.name,
         address=company.address or "—",
         phone=company.phone or "—",
         email=company.email or "—",
-        url=company_url
+        url=company_url(company.id)
     )
 
 
@@ -578,14 +605,7 @@ def show_availability_prompt(conversation: WhatsAppConversation) -> str:
         return get_message('no_salon_selected', lang)
     
     # Ask user for service and date to check availability
-    message_templates = {
-        'es': "📅 Para ver horarios disponibles, dime:\n\n1️⃣ ¿Qué servicio te interesa?\n2️⃣ ¿Para qué día? (ej: mañana, viernes, 15 de abril)\n\nPuedes escribir: 'Manicura para mañana' o simplemente el nombre del servicio.",
-        'en': "📅 To see available times, tell me:\n\n1️⃣ Which service are you interested in?\n2️⃣ For what day? (e.g., tomorrow, Friday, April 15)\n\nYou can type: 'Manicure for tomorrow' or just the service name.",
-        'ru': "📅 Чтобы посмотреть доступное время, скажите:\n\n1️⃣ Какая услуга вас интересует?\n2️⃣ На какой день? (напр.: завтра, пятница, 15 апреля)\n\nМожете написать: 'Маникюр на завтра' или просто название услуги.",
-        'uk': "📅 Щоб подивитися доступний час, скажіть:\n\n1️⃣ Яка послуга вас цікавить?\n2️⃣ На який день? (напр.: завтра, п'ятниця, 15 квітня)\n\nМожете написати: 'Манікюр на завтра' або просто назву послуги."
-    }
-    
-    return message_templates.get(lang, message_templates['es'])
+    return render('availability_prompt', lang)
 
 
 def detect_salon_code(conversation: WhatsAppConversation, message: str) -> str:
@@ -639,7 +659,6 @@ def detect_salon_code(conversation: WhatsAppConversation, message: str) -> str:
             state['company_name'] = company.name
             state['salon_auto_selected'] = True
             conversation.conversation_state = state
-            conversation.save()
             
             # Clear any pending bookings for old salon
             PendingBooking.objects.filter(conversation=conversation).delete()
@@ -648,13 +667,7 @@ def detect_salon_code(conversation: WhatsAppConversation, message: str) -> str:
             
             # Return personalized welcome in selected language with menu
             if is_switch:
-                messages_switch = {
-                    'es': f'¡Perfecto! Ahora estás reservando en **{company.name}**.\n\nEscribe "menu" para ver las opciones.',
-                    'en': f'Perfect! You are now booking at **{company.name}**.\n\nType "menu" to see options.',
-                    'ru': f'Отлично! Теперь вы бронируете в **{company.name}**.\n\nНапишите "menu" чтобы увидеть опции.',
-                    'uk': f'Чудово! Тепер ви бронюєте в **{company.name}**.\n\nНапишіть "menu" щоб побачити опції.'
-                }
-                return messages_switch.get(lang, messages_switch['es'])
+                return render('salon_switched', lang, company_name=company.name)
             else:
                 return get_message('welcome_menu_with_salon', lang, company=company, company_name=company.name)
         else:
@@ -731,7 +744,6 @@ def handle_booking_request(conversation: WhatsAppConversation, intent_data: dict
         state['customer_name'] = customer_name
     
     conversation.conversation_state = state
-    conversation.save()
     
     # Find company - PRIORITY: 1) Pre-selected from QR/link, 2) From message, 3) Auto-select if only one
     company = None
@@ -753,13 +765,7 @@ def handle_booking_request(conversation: WhatsAppConversation, intent_data: dict
             # List available salons
             salon_list = "\n".join([f"• {c.name}" for c in companies[:10]])
             lang = state.get('language', 'es')
-            messages_salon = {
-                'es': f"¿En qué salón te gustaría reservar?\n\nPor favor, indica el nombre.",
-                'en': f"Which salon would you like to book at?\n\nPlease indicate the name.",
-                'ru': f"В каком салоне вы хотите забронировать?\n\nПожалуйста, укажите название.",
-                'uk': f"В якому салоні ви хочете забронювати?\n\nБудь ласка, вкажіть назву."
-            }
-            return messages_salon.get(lang, messages_salon['es'])
+            return render('ask_salon', lang)
     
     # Find service
     service = None
@@ -777,82 +783,38 @@ def handle_booking_request(conversation: WhatsAppConversation, intent_data: dict
             state['service_list'] = service_list_data
             conversation.conversation_state = state
             conversation.current_state = 'selecting_service'
-            conversation.save()
             
             # Create numbered list
             service_list = "\n".join([f"{i+1}️⃣ {s.name}" for i, s in enumerate(services)])
             
-            # Add contact info for complex inquiries
-            contact_info = ""
-            if company.phone or company.email:
-                contact_lines = {
-                    'es': "\n\n💡 Para consultas sobre servicios específicos:",
-                    'en': "\n\n💡 For specific service inquiries:",
-                    'ru': "\n\n💡 Для вопросов о конкретных услугах:",
-                    'uk': "\n\n💡 Для питань про конкретні послуги:"
-                }
-                contact_info = contact_lines.get(lang, contact_lines['es'])
-                public_page_url = f"https://reserva-ya.es/companies/{company.id}/"
-                contact_info += f"\n🌐 {public_page_url}"
-                if company.phone:
-                    contact_info += f"\n📞 {company.phone}"
-            
-            reply_instructions = {
-                'es': "\n\n✏️ Responde con el número o el nombre del servicio. Solo puedes reservar un servicio a la vez.",
-                'en': "\n\n✏️ Reply with the number or service name. You can only book one service at a time.",
-                'ru': "\n\n✏️ Ответьте номером или названием услуги. Одновременно можно записаться на одну услугу.",
-                'uk': "\n\n✏️ Відповідь номером або назвою послуги. Одночасно можна записатися лише на одну послугу."
-            }
-            
-            messages_service = {
-                'es': f"¿Qué servicio necesitas?\n\nServicios disponibles:\n{service_list}{reply_instructions['es']}{contact_info}",
-                'en': f"What service do you need?\n\nAvailable services:\n{service_list}{reply_instructions['en']}{contact_info}",
-                'ru': f"Какая услуга вам нужна?\n\nДоступные услуги:\n{service_list}{reply_instructions['ru']}{contact_info}",
-                'uk': f"Яка послуга вам потрібна?\n\nДоступні послуги:\n{service_list}{reply_instructions['uk']}{contact_info}"
-            }
-            return messages_service.get(lang, messages_service['es'])
+            # Contact info for complex inquiries (cached per company)
+            return render('choose_service', lang, services=service_list, contact=contact_footer(company, lang))
         else:
-            messages_no_service = {
-                'es': "No hay servicios disponibles en este salón.",
-                'en': "No services available in this salon.",
-                'ru': "В этом салоне нет доступных услуг.",
-                'uk': "Немає доступних послуг у цьому салоні."
-            }
-            return messages_no_service.get(lang, messages_no_service['es'])
+            return render('no_services_in_salon', lang)
+    
+    # Resolve a staff name mentioned in the message ("con Maria") to a staff member
+    if staff_name:
+        staff = searcher.find_staff(company, staff_name)
+        if staff:
+            state['staff_id'] = staff.id
+            state['staff_name'] = staff.name
+            conversation.conversation_state = state
     
     # Check date
     if not state.get('date'):
         lang = state.get('language', 'es')
-        messages_date = {
-            'es': "¿Para qué día quieres la cita? (ej: mañana, viernes, 15 de marzo)",
-            'en': "What day would you like the appointment? (e.g., tomorrow, Friday, March 15)",
-            'ru': "На какой день вы хотите записаться? (напр.: завтра, пятница, 15 марта)",
-            'uk': "На який день ви хочете записатися? (напр.: завтра, п'ятниця, 15 березня)"
-        }
-        return messages_date.get(lang, messages_date['es'])
+        return render('ask_date', lang)
     
     try:
         booking_date = datetime.strptime(state['date'], '%Y-%m-%d').date()
     except:
         lang = state.get('language', 'es')
-        messages_bad_date = {
-            'es': "No entendí la fecha. ¿Podrías especificarla? (ej: mañana, próximo lunes, 15/03/2026)",
-            'en': "I didn't understand the date. Could you specify it? (e.g., tomorrow, next Monday, 03/15/2026)",
-            'ru': "Я не понял дату. Можете уточнить? (напр.: завтра, следующий понедельник, 15/03/2026)",
-            'uk': "Я не зрозумів дату. Можете уточнити? (напр.: завтра, наступний понеділок, 15/03/2026)"
-        }
-        return messages_bad_date.get(lang, messages_bad_date['es'])
+        return render('bad_date', lang)
     
     # Check if date is in the past
     if booking_date < timezone.now().date():
         lang = state.get('language', 'es')
-        messages_past_date = {
-            'es': "Esa fecha ya pasó. Por favor, elige una fecha futura.",
-            'en': "That date has already passed. Please choose a future date.",
-            'ru': "Эта дата уже прошла. Пожалуйста, выберите будущую дату.",
-            'uk': "Ця дата вже минула. Будь ласка, виберіть майбутню дату."
-        }
-        return messages_past_date.get(lang, messages_past_date['es'])
+        return render('past_date', lang)
     
     # Find available slots
     try:
@@ -897,63 +859,57 @@ def handle_booking_request(conversation: WhatsAppConversation, intent_data: dict
         logger.warning(f"❌ NO SLOTS FOUND for {service.name} on {booking_date}")
         logger.warning(f"   Search criteria: time_after={state.get('time_after')}, time_before={state.get('time_before')}, time_preference={state.get('time_preference')}")
         
-        # Build a more helpful message
-        criteria_parts = []
+        # Build a more helpful message: only the first time constraint is mentioned
+        criteria = ''
         if state.get('time_after'):
-            criteria_parts.append({
-                'es': f"después de las {state['time_after']}",
-                'en': f"after {state['time_after']}",
-                'ru': f"после {state['time_after']}",
-                'uk': f"після {state['time_after']}"
-            })
-        if state.get('time_before'):
-            criteria_parts.append({
-                'es': f"antes de las {state['time_before']}",
-                'en': f"before {state['time_before']}",
-                'ru': f"до {state['time_before']}",
-                'uk': f"до {state['time_before']}"
-            })
-        
-        # Initialize as dictionaries with empty strings
-        criteria_text = {'es': '', 'en': '', 'ru': '', 'uk': ''}
-        if criteria_parts:
-            criteria_text = {
-                'es': f" {criteria_parts[0]['es']}",
-                'en': f" {criteria_parts[0]['en']}",
-                'ru': f" {criteria_parts[0]['ru']}",
-                'uk': f" {criteria_parts[0]['uk']}"
-            }
+            criteria = render('no_slots_after', lang, time=state['time_after'])
+        elif state.get('time_before'):
+            criteria = render('no_slots_before', lang, time=state['time_before'])
         
         # Add staff name if specific staff was selected
-        staff_text = {'es': '', 'en': '', 'ru': '', 'uk': ''}
+        staff_text = ''
         if state.get('staff_name'):
-            staff_text = {
-                'es': f" con {state['staff_name']}",
-                'en': f" with {state['staff_name']}",
-                'ru': f" у {state['staff_name']}",
-                'uk': f" у {state['staff_name']}"
-            }
+            staff_text = render('no_slots_with_staff', lang, staff_name=state['staff_name'])
         
-        messages_no_slots = {
-            'es': f"😔 Lo siento, no hay horarios disponibles para {service.name}{staff_text.get('es', '')} el {booking_date.strftime('%d/%m/%Y')}{criteria_text.get('es', '')}.\n\n¿Quieres probar otra fecha, horario o especialista?",
-            'en': f"😔 Sorry, no times available for {service.name}{staff_text.get('en', '')} on {booking_date.strftime('%d/%m/%Y')}{criteria_text.get('en', '')}.\n\nWant to try another date, time or specialist?",
-            'ru': f"😔 Извините, нет доступного времени для {service.name}{staff_text.get('ru', '')} {booking_date.strftime('%d/%m/%Y')}{criteria_text.get('ru', '')}.\n\nПопробовать другую дату, время или специалиста?",
-            'uk': f"😔 Вибачте, немає доступних часів для {service.name}{staff_text.get('uk', '')} {booking_date.strftime('%d/%m/%Y')}{criteria_text.get('uk', '')}.\n\nСпробувати іншу дату, час або спеціаліста?"
+        no_slots_params = {
+            'service': service.name,
+            'staff': staff_text,
+            'date': booking_date.strftime('%d/%m/%Y'),
+            'criteria': criteria,
         }
-        return messages_no_slots.get(lang, messages_no_slots['es'])
-    
-    # Store pending booking data
-    pending, _ = PendingBooking.objects.get_or_create(conversation=conversation)
-    pending.company = company
-    pending.service = service
-    pending.service_name = service.name
-    pending.booking_date = booking_date
-    pending.available_slots = slots
-    pending.save()
+        
+        # Offer the closest dates that do have room in the same reply
+        try:
+            alternatives = searcher.find_alternative_slots(
+                company,
+                service,
+                booking_date,
+                staff_id=state.get('staff_id'),
+                time_preference=state.get('time_preference'),
+                time_after=state.get('time_after'),
+                time_before=state.get('time_before')
+            )
+        except Exception as e:
+            logger.error(f"Error finding alternative dates: {e}", exc_info=True)
+            alternatives = []
+        
+        if not alternatives:
+            return render('no_slots', lang, **no_slots_params)
+        
+        response = render('no_slots_alternatives', lang, **no_slots_params)
+        slots = []
+        for alternative in alternatives:
+            response += f"\n📅 {alternative['date'].strftime('%d/%m/%Y')}\n"
+            for slot in alternative['slots']:
+                # Slots from other days carry their own date
+                slots.append(dict(slot, date=alternative['date'].isoformat()))
+                response += f"{len(slots)}. {slot['time']} - {slot['staff']}\n"
+        response += render('slots_footer', lang, count=len(slots))
+        
+        store_pending_slots(conversation, company, service, alternatives[0]['date'], slots)
+        return response
     
-    # Update conversation state
-    conversation.current_state = 'showing_slots'
-    conversation.save()
+    store_pending_slots(conversation, company, service, booking_date, slots)
     
     # Generate response with AI
     lang = state.get('language', 'es')
@@ -970,6 +926,28 @@ def handle_booking_request(conversation: WhatsAppConversation, intent_data: dict
     return response
 
 
+def store_pending_slots(conversation: WhatsAppConversation, company, service, booking_date, slots: list):
+    """Keep offered slots until the user picks one by number"""
+    # Store pending booking data
+    pending, _ = PendingBooking.objects.get_or_create(conversation=conversation)
+    pending.company = company
+    pending.service = service
+    pending.service_name = service.name
+    pending.booking_date = booking_date
+    pending.available_slots = slots
+    pending.save()
+    
+    # Update conversation state
+    conversation.current_state = 'showing_slots'
+
+
+def get_slot_date(pending: PendingBooking, slot: dict):
+    """Date of an offered slot (alternatives from other days carry their own)"""
+    if slot.get('date'):
+        return datetime.strptime(slot['date'], '%Y-%m-%d').date()
+    return pending.booking_date
+
+
 def handle_service_selection(conversation: WhatsAppConversation, service_number: int) -> str:
     """Handle when user selects a service by number"""
     lang = conversation.conversation_state.get('language', 'es')
@@ -979,25 +957,12 @@ def handle_service_selection(conversation: WhatsAppConversation, service_number:
     service_list = state.get('service_list', [])
     
     if not service_list:
-        messages_no_list = {
-            'es': "⚠️ No encontré la lista de servicios. Por favor, empieza de nuevo.",
-            'en': "⚠️ I couldn't find the service list. Please start again.",
-            'ru': "⚠️ Я не нашел список услуг. Пожалуйста, начните заново.",
-            'uk': "⚠️ Я не знайшов список послуг. Будь ласка, почніть спочатку."
-        }
         conversation.current_state = 'idle'
-        conversation.save()
-        return messages_no_list.get(lang, messages_no_list['es'])
+        return render('service_list_missing', lang)
     
     # Validate service number
     if service_number < 1 or service_number > len(service_list):
-        messages_invalid_service = {
-            'es': f"⚠️ Por favor, elige un número entre 1 y {len(service_list)}.",
-            'en': f"⚠️ Please choose a number between 1 and {len(service_list)}.",
-            'ru': f"⚠️ Пожалуйста, выберите номер между 1 и {len(service_list)}.",
-            'uk': f"⚠️ Будь ласка, виберіть номер між 1 та {len(service_list)}."
-        }
-        return messages_invalid_service.get(lang, messages_invalid_service['es'])
+        return render('choose_number_between', lang, low=1, high=len(service_list))
     
     # Get selected service
     selected_service = service_list[service_number - 1]
@@ -1010,7 +975,6 @@ def handle_service_selection(conversation: WhatsAppConversation, service_number:
     state.pop('time_before', None)
     state.pop('time_preference', None)
     conversation.conversation_state = state
-    conversation.save()
     
     # Show staff list for this service
     return show_staff_selection(conversation, selected_service)
@@ -1021,75 +985,38 @@ def show_staff_selection(conversation: WhatsAppConversation, selected_service: d
     lang = conversation.conversation_state.get('language', 'es')
     
     if not conversation.company:
-        messages_no_company = {
-            'es': "⚠️ No se ha seleccionado un salón. Por favor, empieza de nuevo.",
-            'en': "⚠️ No salon selected. Please start again.",
-            'ru': "⚠️ Салон не выбран. Пожалуйста, начните заново.",
-            'uk': "⚠️ Салон не вибрано. Будь ласка, почніть спочатку."
-        }
-        return messages_no_company.get(lang, messages_no_company['es'])
+        return render('no_company_selected', lang)
     
-    from companies.models import Staff, Service
+    from companies.models import Service
     
     # Get the service object to find related staff
     try:
         service = Service.objects.get(id=selected_service['id'], company=conversation.company)
     except Service.DoesNotExist:
-        messages_service_not_found = {
-            'es': "⚠️ Servicio no encontrado. Por favor, empieza de nuevo.",
-            'en': "⚠️ Service not found. Please start again.",
-            'ru': "⚠️ Услуга не найдена. Пожалуйста, начните заново.",
-            'uk': "⚠️ Послугу не знайдено. Будь ласка, почніть спочатку."
-        }
-        return messages_service_not_found.get(lang, messages_service_not_found['es'])
-    
-    # Get staff who can perform this service
-    staff_members = Staff.objects.filter(
-        company=conversation.company,
-        is_active=True,
-        services=service
-    ).order_by('name')
-    
-    # If no staff assigned to service, get all active staff
-    if not staff_members.exists():
-        staff_members = Staff.objects.filter(
-            company=conversation.company,
-            is_active=True
-        ).order_by('name')
-    
-    if not staff_members.exists():
-        messages_no_staff = {
-            'es': "⚠️ No hay personal disponible para este servicio.",
-            'en': "⚠️ No staff available for this service.",
-            'ru': "⚠️ Нет доступных специалистов для этой услуги.",
-            'uk': "⚠️ Немає доступних спеціалістів для цієї послуги."
-        }
-        return messages_no_staff.get(lang, messages_no_staff['es'])
+        return render('service_not_found', lang)
     
-    # Build staff list with "Any Available" option
-    message_templates = {
-        'es': "✅ **{service}** seleccionado.\n\n👥 **Selecciona un especialista:**\n\n0️⃣ Cualquier disponible\n{staff}\n\n📝 Responde con el número (0-{count}).",
-        'en': "✅ **{service}** selected.\n\n👥 **Select a specialist:**\n\n0️⃣ Any available\n{staff}\n\n📝 Reply with the number (0-{count}).",
-        'ru': "✅ **{service}** выбран.\n\n👥 **Выберите специалиста:**\n\n0️⃣ Любой доступный\n{staff}\n\n📝 Ответьте номером (0-{count}).",
-        'uk': "✅ **{service}** вибрано.\n\n👥 **Виберіть спеціаліста:**\n\n0️⃣ Будь-який доступний\n{staff}\n\n📝 Відповідайте номером (0-{count})."
-    }
+    # Get staff who can perform this service (all active staff if none assigned)
+    staff_members = get_company_catalog(conversation.company.id).staff_for_service(service.id)
     
+    if not staff_members:
+        return render('no_staff_for_service', lang)
+    
+    # Build staff list with "Any Available" option
     staff_text = ""
     staff_list = []
     for idx, staff in enumerate(staff_members, 1):
-        specialization = f" - {staff.specialization}" if staff.specialization else ""
-        staff_text += f"{idx}️⃣ {staff.name}{specialization}\n"
-        staff_list.append({'id': staff.id, 'name': staff.name})
+        specialization = f" - {staff['specialization']}" if staff['specialization'] else ""
+        staff_text += f"{idx}️⃣ {staff['name']}{specialization}\n"
+        staff_list.append({'id': staff['id'], 'name': staff['name']})
     
     # Save staff list to state
     state = conversation.conversation_state
     state['staff_list'] = staff_list
     conversation.conversation_state = state
     conversation.current_state = 'selecting_staff'
-    conversation.save()
     
-    template = message_templates.get(lang, message_templates['es'])
-    return template.format(
+    return render(
+        'staff_selection', lang,
         service=selected_service['name'],
         staff=staff_text.strip(),
         count=len(staff_list)
@@ -1115,26 +1042,13 @@ def handle_staff_selection(conversation: WhatsAppConversation, staff_number: int
         state.pop('time_preference', None)
         conversation.conversation_state = state
         conversation.current_state = 'idle'
-        conversation.save()
         
         # Ask for date
-        messages_date = {
-            'es': "✅ Buscaremos cualquier especialista disponible.\n\n¿Para qué día quieres la cita? (ej: mañana, viernes, 21 de abril)",
-            'en': "✅ We'll find any available specialist.\n\nWhat day would you like the appointment? (e.g., tomorrow, Friday, April 21)",
-            'ru': "✅ Найдём любого доступного специалиста.\n\nНа какой день вы хотите записаться? (напр.: завтра, пятница, 21 апреля)",
-            'uk': "✅ Знайдемо будь-якого доступного спеціаліста.\n\nНа який день ви хочете записатися? (напр.: завтра, п'ятниця, 21 квітня)"
-        }
-        return messages_date.get(lang, messages_date['es'])
+        return render('any_staff_ask_date', lang)
     
     # Validate staff number
     if staff_number < 0 or staff_number > len(staff_list):
-        messages_invalid_staff = {
-            'es': f"⚠️ Por favor, elige un número entre 0 y {len(staff_list)}.",
-            'en': f"⚠️ Please choose a number between 0 and {len(staff_list)}.",
-            'ru': f"⚠️ Пожалуйста, выберите номер между 0 и {len(staff_list)}.",
-            'uk': f"⚠️ Будь ласка, виберіть номер між 0 та {len(staff_list)}."
-        }
-        return messages_invalid_staff.get(lang, messages_invalid_staff['es'])
+        return render('choose_number_between', lang, low=0, high=len(staff_list))
     
     # Get selected staff
     selected_staff = staff_list[staff_number - 1]
@@ -1148,16 +1062,9 @@ def handle_staff_selection(conversation: WhatsAppConversation, staff_number: int
     state.pop('time_preference', None)
     conversation.conversation_state = state
     conversation.current_state = 'idle'
-    conversation.save()
     
     # Ask for date
-    messages_date = {
-        'es': f"✅ {selected_staff['name']} seleccionado.\n\n¿Para qué día quieres la cita? (ej: mañana, viernes, 21 de abril)",
-        'en': f"✅ {selected_staff['name']} selected.\n\nWhat day would you like the appointment? (e.g., tomorrow, Friday, April 21)",
-        'ru': f"✅ {selected_staff['name']} выбран.\n\nНа какой день вы хотите записаться? (напр.: завтра, пятница, 21 апреля)",
-        'uk': f"✅ {selected_staff['name']} вибрано.\n\nНа який день ви хочете записатися? (напр.: завтра, п'ятниця, 21 квітня)"
-    }
-    return messages_date.get(lang, messages_date['es'])
+    return render('staff_selected_ask_date', lang, staff_name=selected_staff['name'])
 
 
 def handle_slot_selection(conversation: WhatsAppConversation, slot_number: int) -> str:
@@ -1167,23 +1074,11 @@ def handle_slot_selection(conversation: WhatsAppConversation, slot_number: int)
     try:
         pending = PendingBooking.objects.get(conversation=conversation)
     except PendingBooking.DoesNotExist:
-        messages_no_pending = {
-            'es': "⚠️ No encontré una reserva pendiente. Por favor, empieza de nuevo.",
-            'en': "⚠️ I couldn't find a pending booking. Please start again.",
-            'ru': "⚠️ Я не нашел незавершенное бронирование. Пожалуйста, начните заново.",
-            'uk': "⚠️ Я не знайшов незавершене бронювання. Будь ласка, почніть спочатку."
-        }
-        return messages_no_pending.get(lang, messages_no_pending['es'])
+        return render('no_pending_booking', lang)
     
     # Validate slot number
     if slot_number < 1 or slot_number > len(pending.available_slots):
-        messages_invalid_slot = {
-            'es': f"⚠️ Por favor, elige un número entre 1 y {len(pending.available_slots)}.",
-            'en': f"⚠️ Please choose a number between 1 and {len(pending.available_slots)}.",
-            'ru': f"⚠️ Пожалуйста, выберите номер между 1 и {len(pending.available_slots)}.",
-            'uk': f"⚠️ Будь ласка, виберіть номер між 1 та {len(pending.available_slots)}."
-        }
-        return messages_invalid_slot.get(lang, messages_invalid_slot['es'])
+        return render('choose_number_between', lang, low=1, high=len(pending.available_slots))
     
     # Get selected slot
     slot = pending.available_slots[slot_number - 1]
@@ -1196,14 +1091,7 @@ def handle_slot_selection(conversation: WhatsAppConversation, slot_number: int)
         state = conversation.conversation_state
         state['selected_slot'] = slot
         conversation.conversation_state = state
-        conversation.save()
-        messages_ask_name = {
-            'es': "✅ Perfecto! ¿Cuál es tu nombre completo?",
-            'en': "✅ Perfect! What's your full name?",
-            'ru': "✅ Отлично! Как ваше полное имя?",
-            'uk': "✅ Чудово! Яке ваше повне ім'я?"
-        }
-        return messages_ask_name.get(lang, messages_ask_name['es'])
+        return render('ask_full_name', lang)
     
     # Show confirmation preview
     return show_booking_confirmation_preview(conversation, pending, slot, customer_name)
@@ -1224,14 +1112,13 @@ def create_booking_from_pending(conversation: WhatsAppConversation,
             staff_id=slot['staff_id'],
             customer_phone=conversation.phone_number,
             customer_name=customer_name,
-            booking_date=pending.booking_date,
+            booking_date=get_slot_date(pending, slot),
             booking_time=slot['time']
         )
         
         # Update conversation
         conversation.current_state = 'idle'
         conversation.conversation_state = {'language': lang}  # Keep language preference
-        conversation.save()
         
         # Update pending booking
         pending.created_booking = booking
@@ -1249,13 +1136,7 @@ def create_booking_from_pending(conversation: WhatsAppConversation,
         
     except Exception as e:
         logger.error(f"Error creating booking: {e}")
-        messages_error = {
-            'es': f"❌ Hubo un error al crear la reserva: {str(e)}\n\nPor favor, intenta de nuevo o contacta directamente con el salón.",
-            'en': f"❌ There was an error creating the booking: {str(e)}\n\nPlease try again or contact the salon directly.",
-            'ru': f"❌ Произошла ошибка при создании бронирования: {str(e)}\n\nПожалуйста, попробуйте еще раз или свяжитесь с салоном напрямую.",
-            'uk': f"❌ Сталася помилка при створенні бронювання: {str(e)}\n\nБудь ласка, спробуйте ще раз або зв'яжіться безпосередньо з салоном."
-        }
-        return messages_error.get(lang, messages_error['es'])
+        return render('booking_error', lang, error=str(e))
 
 
 def show_booking_confirmation_preview(conversation: WhatsAppConversation, pending: PendingBooking, slot: dict, customer_name: str) -> str:
@@ -1268,58 +1149,10 @@ def show_booking_confirmation_preview(conversation: WhatsAppConversation, pendin
     state['customer_name'] = customer_name
     conversation.conversation_state = state
     conversation.current_state = 'confirming'
-    conversation.save()
-    
-    messages = {
-        'es': """📋 Por favor confirma tu reserva:
-
-📅 Fecha: {date}
-🕐 Hora: {time}
-✂️ Servicio: {service}
-👤 Especialista: {staff}
-👤 Cliente: {customer}
-📍 Salón: {company}
-
-✅ Responde 'sí' para confirmar
-❌ Responde 'no' para cancelar""",
-        'en': """📋 Please confirm your booking:
-
-📅 Date: {date}
-🕐 Time: {time}
-✂️ Service: {service}
-👤 Specialist: {staff}
-👤 Customer: {customer}
-📍 Salon: {company}
-
-✅ Reply 'yes' to confirm
-❌ Reply 'no' to cancel""",
-        'ru': """📋 Пожалуйста, подтвердите бронирование:
-
-📅 Дата: {date}
-🕐 Время: {time}
-✂️ Услуга: {service}
-👤 Специалист: {staff}
-👤 Клиент: {customer}
-📍 Салон: {company}
-
-✅ Ответьте 'да' для подтверждения
-❌ Ответьте 'нет' для отмены""",
-        'uk': """📋 Будь ласка, підтвердіть бронювання:
-
-📅 Дата: {date}
-🕐 Час: {time}
-✂️ Послуга: {service}
-👤 Спеціаліст: {staff}
-👤 Клієнт: {customer}
-📍 Салон: {company}
-
-✅ Відповідайте 'так' для підтвердження
-❌ Відповідайте 'ні' для скасування"""
-    }
     
-    template = messages.get(lang, messages['es'])
-    return template.format(
-        date=pending.booking_date.strftime('%d/%m/%Y'),
+    return render(
+        'confirm_booking', lang,
+        date=get_slot_date(pending, slot).strftime('%d/%m/%Y'),
         time=slot['time'],
         service=pending.service.name,
         staff=slot['staff'],
@@ -1359,25 +1192,12 @@ def handle_booking_confirmation(conversation: WhatsAppConversation, message: str
         state = conversation.conversation_state
         state.pop('selected_slot', None)
         conversation.conversation_state = state
-        conversation.save()
         
-        messages_cancelled = {
-            'es': "❌ Reserva cancelada.\n\n¿Quieres buscar otro hora rio o servicio?",
-            'en': "❌ Booking cancelled.\n\nWould you like to search for another time or service?",
-            'ru': "❌ Бронирование отменено.\n\nХотите найти другое время или услугу?",
-            'uk': "❌ Бронювання скасовано.\n\nБажаєте знайти інший час або послугу?"
-        }
-        return messages_cancelled.get(lang, messages_cancelled['es'])
+        return render('booking_cancelled', lang)
     
     else:
         # Unclear response
-        messages_unclear = {
-            'es': "⚠️ Por favor responde 'sí' para confirmar o 'no' para cancelar.",
-            'en': "⚠️ Please reply 'yes' to confirm or 'no' to cancel.",
-            'ru': "⚠️ Пожалуйста, ответьте 'да' для подтверждения или 'нет' для отмены.",
-            'uk': "⚠️ Будь ласка, відповідайте 'так' для підтвердження або 'ні' для скасування."
-        }
-        return messages_unclear.get(lang, messages_unclear['es'])
+        return render('confirm_yes_no', lang)
 
 
 def handle_question(conversation: WhatsAppConversation, message: str) -> str:
@@ -1388,215 +1208,11 @@ def handle_question(conversation: WhatsAppConversation, message: str) -> str:
     if conversation.company:
         company = conversation.company
         
-        # Build public page URL
-        from django.conf import settings
-        site_url = getattr(settings, 'SITE_URL', 'https://reserva-ya.es')
-        public_page_url = f"{site_url}/companies/{company.id}/"
-        
-        contact_messages = {
-            'es': f"""❓ Puedo ayudarte con:
-1️⃣ Reservar una cita
-2️⃣ Ver servicios
-3️⃣ Ver equipo
-4️⃣ Ver ubicación
-5️⃣ Consultar disponibilidad
-
-🌐 Para más información: {public_page_url}
-📞 Teléfono: {company.phone if company.phone else 'No disponible'}
-
-📝 Escribe el número (1-5) o 'menu' para ver opciones.""",
-            'en': f"""❓ I can help you with:
-1️⃣ Book an appointment
-2️⃣ View services
-3️⃣ View team
-4️⃣ View location
-5️⃣ Check availability
-
-🌐 For more information: {public_page_url}
-📞 Phone: {company.phone if company.phone else 'Not available'}
-
-📝 Type the number (1-5) or 'menu' to see options.""",
-            'ru': f"""❓ Я могу помочь вам:
-1️⃣ Забронировать визит
-2️⃣ Посмотреть услуги
-3️⃣ Посмотреть команду
-4️⃣ Посмотреть адрес
-5️⃣ Проверить доступность
-
-🌐 Для дополнительной информации: {public_page_url}
-📞 Телефон: {company.phone if company.phone else 'Недоступно'}
-
-📝 Напишите номер (1-5) или 'menu' чтобы увидеть опции.""",
-            'uk': f"""❓ Я можу допомогти вам:
-1️⃣ Забронювати візит
-2️⃣ Подивитися послуги
-3️⃣ Подивитися команду
-4️⃣ Подивитися адресу
-5️⃣ Перевірити доступність
-
-🌐 Для додаткової інформації: {public_page_url}
-📞 Телефон: {company.phone if company.phone else 'Недоступно'}
-
-📝 Напишіть номер (1-5) або 'menu' щоб побачити опції."""
-        }
-        return contact_messages.get(lang, contact_messages['es'])
+        return render(
+            'salon_help', lang,
+            url=company_url(company.id),
+            phone=company.phone or render('phone_unavailable', lang)
+        )
     
     # If no salon set, show general help
     return get_message('help_message', lang)
-
-
-
-def get_service_examples(company, lang: str) -> list:
-    """Generate dynamic service examples based on company's actual services"""
-    from companies.models import Service
-    
-    if not company:
-        return []
-    
-    # Get up to 3 active services from the company
-    services = Service.objects.filter(company=company, is_active=True)[:3]
-    
-    if not services:
-        return []
-    
-    # Time examples in different languages
-    time_examples = {
-        'es': ['mañana a las 3pm', 'el viernes después de las 5pm', 'el lunes a las 2pm'],
-        'en': ['tomorrow at 3pm', 'on Friday after 5pm', 'Monday at 2pm'],
-        'ru': ['завтра в 3pm', 'в пятницу после 17:00', 'в понедельник в 14:00'],
-        'uk': ['завтра о 3pm', "в п'ятницю після 17:00", 'на понеділок о 14:00'],
-    }
-    
-    # Action phrases in different languages
-    action_phrases = {
-        'es': ['Quiero', 'Disponibilidad para', 'Reserva'],
-        'en': ['I want', 'Availability for', 'Book'],
-        'ru': ['Хочу', 'Доступность для', 'Забронировать'],
-        'uk': ['Хочу', 'Доступність для', 'Забронюйте'],
-    }
-    
-    times = time_examples.get(lang, time_examples['es'])
-    actions = action_phrases.get(lang, action_phrases['es'])
-    
-    examples = []
-    for i, service in enumerate(services):
-        if i < len(times) and i < len(actions):
-            examples.append(f'{actions[i]} {service.name.lower()} {times[i]}')
-    
-    return examples
-
-
-def get_message(key: str, lang: str, company=None, **kwargs) -> str:
-    """Get predefined message in specified language"""
-    
-    # Generate dynamic service examples if company is provided
-    service_examples = get_service_examples(company, lang) if company else []
-    
-    # Build examples string
-    if service_examples:
-        examples_str = '\n'.join([f'• "{ex}"' for ex in service_examples])
-    else:
-        # Fallback to generic examples
-        generic_examples = {
-            'es': '• "Quiero una cita mañana a las 3pm"\n• "Disponibilidad el viernes después de las 5pm"\n• "Reserva para el lunes a las 2pm"',
-            'en': '• "I want an appointment tomorrow at 3pm"\n• "Availability on Friday after 5pm"\n• "Book for Monday at 2pm"',
-            'ru': '• "Хочу запись завтра в 3pm"\n• "Доступность в пятницу после 17:00"\n• "Забронировать на понедельник в 14:00"',
-            'uk': '• "Хочу відвідування завтра о 3pm"\n• "Доступність в п\'ятницю після 17:00"\n• "Забронюйте на понеділок о 14:00"',
-        }
-        examples_str = generic_examples.get(lang, generic_examples['es'])
-    
-    messages = {
-        'welcome_menu_with_salon': {
-            'es': "👋 ¡Hola{name_greeting}! Bienvenido a **{company_name}**.\n\n¿Qué te gustaría hacer?\n\n1️⃣ 📅 Reservar una cita\n2️⃣ 💅 Ver servicios\n3️⃣ 👥 Ver equipo\n4️⃣ 📍 Ver ubicación\n5️⃣ 🕐 Consultar disponibilidad\n\n📝 Responde con el número (1-5) o escribe tu solicitud.",
-            'en': "👋 Hello{name_greeting}! Welcome to **{company_name}**.\n\nWhat would you like to do?\n\n1️⃣ 📅 Book an appointment\n2️⃣ 💅 View services\n3️⃣ 👥 View team\n4️⃣ 📍 View location\n5️⃣ 🕐 Check availability\n\n📝 Reply with the number (1-5) or type your request.",
-            'ru': "👋 Здравствуйте{name_greeting}! Добро пожаловать в **{company_name}**.\n\nЧто вы хотите сделать?\n\n1️⃣ 📅 Забронировать визит\n2️⃣ 💅 Посмотреть услуги\n3️⃣ 👥 Посмотреть команду\n4️⃣ 📍 Посмотреть адрес\n5️⃣ 🕐 Проверить доступность\n\n📝 Ответьте номером (1-5) или напишите ваш запрос.",
-            'uk': "👋 Привіт{name_greeting}! Ласкаво просимо до **{company_name}**.\n\nЩо ви хочете зробити?\n\n1️⃣ 📅 Забронювати візит\n2️⃣ 💅 Подивитися послуги\n3️⃣ 👥 Подивитися команду\n4️⃣ 📍 Подивитися адресу\n5️⃣ 🕐 Перевірити доступність\n\n📝 Відповідайте номером (1-5) або напишіть ваш запит.",
-        },
-        'welcome_menu_general': {
-            'es': "👋 ¡Hola{name_greeting}! Soy tu asistente de reservas.\n\n¿Qué te gustaría hacer?\n\n1️⃣ 📅 Reservar una cita\n2️⃣ 💅 Ver servicios\n3️⃣ 👥 Ver equipo\n4️⃣ 📍 Ver ubicación\n5️⃣ 🕐 Consultar disponibilidad\n\n📝 Responde con el número (1-5) o escribe tu solicitud.",
-            'en': "👋 Hello{name_greeting}! I'm your booking assistant.\n\nWhat would you like to do?\n\n1️⃣ 📅 Book an appointment\n2️⃣ 💅 View services\n3️⃣ 👥 View team\n4️⃣ 📍 View location\n5️⃣ 🕐 Check availability\n\n📝 Reply with the number (1-5) or type your request.",
-            'ru': "👋 Здравствуйте{name_greeting}! Я ваш помощник по бронированию.\n\nЧто вы хотите сделать?\n\n1️⃣ 📅 Забронировать визит\n2️⃣ 💅 Посмотреть услуги\n3️⃣ 👥 Посмотреть команду\n4️⃣ 📍 Посмотреть адрес\n5️⃣ 🕐 Проверить доступность\n\n📝 Ответьте номером (1-5) или напишите ваш запрос.",
-            'uk': "👋 Привіт{name_greeting}! Я ваш помічник з бронювання.\n\nЩо ви хочете зробити?\n\n1️⃣ 📅 Забронювати візит\n2️⃣ 💅 Подивитися послуги\n3️⃣ 👥 Подивитися команду\n4️⃣ 📍 Подивитися адресу\n5️⃣ 🕐 Перевірити доступність\n\n📝 Відповідайте номером (1-5) або напишіть ваш запит.",
-        },
-        'welcome_with_salon': {
-            'es': "👋 ¡Hola{name_greeting}! Bienvenido a {company_name}.\n\nPuedo ayudarte a reservar una cita. Por ejemplo:\n{examples}\n\n¿En qué puedo ayudarte?",
-            'en': "👋 Hello{name_greeting}! Welcome to {company_name}.\n\nI can help you book an appointment. For example:\n{examples}\n\nHow can I help you?",
-            'ru': "👋 Здравствуйте{name_greeting}! Добро пожаловать в {company_name}.\n\nЯ могу помочь вам забронировать визит. Например:\n{examples}\n\nЧем могу помочь?",
-            'uk': "👋 Привіт{name_greeting}! Ласкаво просимо до {company_name}.\n\nЯ можу допомогти вам забронювати візит. Наприклад:\n{examples}\n\nЯк я можу допомогти?",
-        },
-        'welcome_general': {
-            'es': "👋 ¡Hola{name_greeting}! Soy tu asistente de reservas inteligente.\n\nPuedo ayudarte a reservar una cita. Por ejemplo:\n{examples}\n\n¿En qué puedo ayudarte?",
-            'en': "👋 Hello{name_greeting}! I'm your smart booking assistant.\n\nI can help you book an appointment. For example:\n{examples}\n\nHow can I help you?",
-            'ru': "👋 Здравствуйте{name_greeting}! Я ваш умный помощник по бронированию.\n\nЯ могу помочь вам забронировать визит. Например:\n{examples}\n\nЧем могу помочь?",
-            'uk': "👋 Привіт{name_greeting}! Я ваш розумний асистент бронювання.\n\nЯ можу допомогти забронювати візит. Наприклад:\n{examples}\n\nЯк я можу допомогти?",
-        },
-        'no_salon_selected': {
-            'es': "⚠️ Primero necesito saber en qué salón quieres reservar. Por favor, dime el nombre del salón.",
-            'en': "⚠️ First I need to know which salon you want to book at. Please tell me the salon name.",
-            'ru': "⚠️ Сначала мне нужно знать, в каком салоне вы хотите забронировать. Пожалуйста, скажите название салона.",
-            'uk': "⚠️ Спочатку мені потрібно знати, в якому салоні ви хочете забронювати. Будь ласка, скажіть назву салону.",
-        },
-        'invalid_menu_choice': {
-            'es': "⚠️ Por favor, elige un número del 1 al 5, o escribe 'menu' para ver las opciones.",
-            'en': "⚠️ Please choose a number from 1 to 5, or type 'menu' to see options.",
-            'ru': "⚠️ Пожалуйста, выберите номер от 1 до 5, или напишите 'menu' чтобы увидеть опции.",
-            'uk': "⚠️ Будь ласка, виберіть номер від 1 до 5, або напишіть 'menu' щоб побачити опції.",
-        },
-        'no_services_available': {
-            'es': "⚠️ Lo siento, no hay servicios disponibles en este momento.",
-            'en': "⚠️ Sorry, no services are available at this time.",
-            'ru': "⚠️ Извините, в данный момент нет доступных услуг.",
-            'uk': "⚠️ Вибачте, зараз немає доступних послуг.",
-        },
-        'no_staff_available': {
-            'es': "⚠️ Lo siento, no hay información del equipo disponible.",
-            'en': "⚠️ Sorry, no team information is available.",
-            'ru': "⚠️ Извините, информация о команде недоступна.",
-            'uk': "⚠️ Вибачте, інформація про команду недоступна.",
-        },
-        'conversation_cancelled': {
-            'es': "❌ Conversación cancelada. Escribe 'menu' cuando quieras hacer una reserva.",
-            'en': "❌ Conversation cancelled. Type 'menu' when you want to make a booking.",
-            'ru': "❌ Разговор отменен. Напишите 'menu' когда захотите сделать бронирование.",
-            'uk': "❌ Розмову скасовано. Напишіть 'menu' коли захочете зробити бронювання.",
-        },
-        'service_error': {
-            'es': "⚠️ Lo siento, hay un problema con el servicio. Por favor, intenta más tarde o llama directamente al salón.",
-            'en': "⚠️ Sorry, there's a problem with the service. Please try again later or call the salon directly.",
-            'ru': "⚠️ Извините, проблема с сервисом. Пожалуйста, попробуйте позже или позвоните в салон напрямую.",
-            'uk': "⚠️ Вибачте, проблема з сервісом. Будь ласка, спробуйте пізніше або зателефонуйте безпосередньо до салону.",
-        },
-        'help_message': {
-            'es': "Puedo ayudarte a:\n• Hacer una reserva\n• Consultar disponibilidad\n• Ver servicios disponibles\n\nEscribe 'menu' para ver todas las opciones.\nEscribe 'idioma' para cambiar el idioma.\n\n¿Qué necesitas?",
-            'en': "I can help you:\n• Make a booking\n• Check availability\n• See available services\n\nType 'menu' to see all options.\nType 'language' to change language.\n\nWhat do you need?",
-            'ru': "Я могу помочь вам:\n• Сделать бронирование\n• Проверить доступность\n• Посмотреть доступные услуги\n\nНапишите 'menu' чтобы увидеть все опции.\nНапишите 'язык' чтобы изменить язык.\n\nЧто вам нужно?",
-            'uk': "Я можу допомогти вам:\n• Зробити бронювання\n• Перевірити доступність\n• Переглянути доступні послуги\n\nНапишіть 'menu' щоб побачити всі опції.\nНапишіть 'мова' щоб змінити мову.\n\nЩо вам потрібно?",
-        },
-    }
-    
-    message_dict = messages.get(key, {})
-    template = message_dict.get(lang, message_dict.get('es', ''))
-    
-    # Add examples to kwargs for welcome messages
-    if key in ['welcome_with_salon', 'welcome_general']:
-        kwargs['examples'] = examples_str
-    
-    # Add personalized name greeting if customer name is provided for all welcome/menu messages
-    if key in ['welcome_with_salon', 'welcome_general', 'welcome_menu_with_salon', 'welcome_menu_general']:
-        # Add personalized name greeting if customer name is provided
-        customer_name = kwargs.get('customer_name')
-        if customer_name:
-            # Format: ", [Name]" (e.g., "¡Hola, Maria!")
-            kwargs['name_greeting'] = f", {customer_name}"
-        else:
-            kwargs['name_greeting'] = ""
-    
-    # Format with kwargs if provided
-    try:
-        if kwargs:
-            return template.format(**kwargs)
-        return template
-    except KeyError as e:
-        # If a required key is missing, log and return a safe default
-        logger.error(f"Missing key in message template '{key}': {e}")
-        return template  # Return unformatted template as fallback